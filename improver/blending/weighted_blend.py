@@ -49,6 +49,8 @@ from improver.metadata.probabilistic import find_percentile_coordinate
 from improver.utilities.cube_manipulation import (
     MergeCubes, build_coordinate, enforce_coordinate_ordering,
     sort_coord_in_cube)
+from improver.utilities.mathematical_operations import (
+    interpolate_multiple_rows)
 from improver.utilities.temporal import cycletime_to_number
 
 
@@ -270,16 +272,12 @@ class PercentileBlendingAggregator:
         # Flatten the data that is not percentile or coord data
         data = data.reshape(input_shape)
         arr_weights = arr_weights.reshape(input_shape)
-        # Create the resulting data array, which is the shape of the original
-        # data without dimension we are collapsing over
-        result = np.zeros(input_shape[1:], dtype=np.float32)
-        # Loop over the flattened data, i.e. across all the data points in
-        # each slice of the coordinate we are collapsing over, finding the
-        # blended percentile values at each point.
-        for i in range(data.shape[-1]):
-            result[:, i] = (
-                PercentileBlendingAggregator.blend_percentiles(
-                    data[:, :, i], arr_percent, arr_weights[:, :, i]))
+        # Find the blended percentile values at all the data points in each
+        # slice of the coordinate we are collapsing over at once. The result
+        # is the shape of the original data without the dimension we are
+        # collapsing over.
+        result = PercentileBlendingAggregator.blend_percentiles_at_points(
+            data, arr_percent, arr_weights)
         # Reshape the data and put the percentile dimension
         # back in the right place
         shape = arr_percent.shape + shape
@@ -321,10 +319,44 @@ class PercentileBlendingAggregator:
                 Array containing the weighted percentile blend data
                 across the chosen coord
         """
-        # Find the size of the dimension we want to blend over.
+        weights = np.asarray(weights)
+        weights = weights.reshape(weights.shape + (1,) * (3 - weights.ndim))
+        result = PercentileBlendingAggregator.blend_percentiles_at_points(
+            perc_values[:, :, np.newaxis], percentiles, weights)
+        return result[:, 0]
+
+    @staticmethod
+    def blend_percentiles_at_points(perc_values, percentiles, weights):
+        """ Blend percentiles function, to calculate the weighted blend across
+            a given axis of percentile data for many grid points at once.
+
+        Args:
+            perc_values (numpy.ndarray):
+                Array containing the percentile values to blend, with
+                shape: (length of coord to blend, num of percentiles,
+                num of points)
+            percentiles (numpy.ndarray):
+                Array of percentile values e.g [0, 20.0, 50.0, 70.0, 100.0],
+                same size as the percentile dimension of data.
+            weights (numpy.ndarray):
+                Array of weights, with the same shape as perc_values or
+                broadcastable to it, that we will blend over.
+
+        Returns:
+            numpy.ndarray:
+                Array containing the weighted percentile blend data across
+                the chosen coord, with shape:
+                (num of percentiles, num of points)
+        """
+        # Find the size of the dimension we want to blend over, and put the
+        # points before the percentiles so that each point is a row.
         num = perc_values.shape[0]
-        # Create an array to store the weighted blending pdf
-        combined_pdf = np.zeros((num, len(percentiles)), dtype=np.float32)
+        weights = np.moveaxis(
+            np.broadcast_to(weights, perc_values.shape), 2, 1)
+        perc_values = np.moveaxis(perc_values, 2, 1)
+        # Create an array to store the weighted blending pdf at each point
+        combined_pdf = np.zeros(perc_values.shape, dtype=np.float32)
+        unsorted = ~np.all(np.diff(perc_values, axis=2) >= 0, axis=2)
         # Loop over the axis we are blending over finding the values for the
         # probability at each threshold in the pdf, for each of the other
         # points in the axis we are blending over. Use the values from the
@@ -337,27 +369,35 @@ class PercentileBlendingAggregator:
                 if i == j:
                     recalc_values_in_pdf = percentiles
                 else:
-                    recalc_values_in_pdf = np.interp(perc_values[i],
-                                                     perc_values[j],
-                                                     percentiles)
+                    recalc_values_in_pdf = interpolate_multiple_rows(
+                        perc_values[i], perc_values[j], percentiles)
+                    # Where the percentile values are not in increasing
+                    # order, the result depends on the search numpy.interp
+                    # happens to do, so use it directly at those points.
+                    for point in np.flatnonzero(unsorted[j]):
+                        recalc_values_in_pdf[point] = np.interp(
+                            perc_values[i, point], perc_values[j, point],
+                            percentiles)
                 # Add the resulting probabilities multiplied by the right
                 # weight to the running total for the combined pdf.
                 combined_pdf[i] += recalc_values_in_pdf*weights[j]
 
         # Combine and sort the threshold values for all the points
         # we are blending.
-        combined_perc_thres_data = np.sort(perc_values.flatten())
+        num_points = perc_values.shape[1]
+        combined_perc_thres_data = np.sort(
+            np.moveaxis(perc_values, 1, 0).reshape(num_points, -1), axis=1)
 
         # Combine and sort blended probability values.
-        combined_perc_values = np.sort(combined_pdf.flatten())
+        combined_perc_values = np.sort(
+            np.moveaxis(combined_pdf, 1, 0).reshape(num_points, -1), axis=1)
 
         # Find the percentile values from this combined data by interpolating
         # back from probability values to the original percentiles.
-        new_combined_perc = np.interp(percentiles,
-                                      combined_perc_values,
-                                      combined_perc_thres_data).astype(
-                                          np.float32)
-        return new_combined_perc
+        new_combined_perc = interpolate_multiple_rows(
+            percentiles, combined_perc_values,
+            combined_perc_thres_data).astype(np.float32)
+        return new_combined_perc.T
 
 
 class WeightedBlendAcrossWholeDimension(BasePlugin):
@@ -30,10 +30,11 @@
 # POSSIBILITY OF SUCH DAMAGE.
 """init for cli and clize"""
 
+import json
 import pathlib
 import shlex
 from collections import OrderedDict
-from functools import partial
+from functools import lru_cache, partial
 
 import clize
 from clize import parameters
@@ -195,6 +196,28 @@ def inputpath(to_convert):
     return maybe_coerce_with(pathlib.Path, to_convert)
 
 
+@value_converter(name='PROFILE')
+def save_profile(to_convert):
+    """Checks that a string is the name of a save profile.
+
+    Args:
+        to_convert (string):
+            Name of a profile in improver.utilities.save.SAVE_PROFILES.
+
+    Returns:
+        The name of the profile.
+
+    Raises:
+        clize.errors.CliValueError: If the profile is not recognised.
+    """
+    from improver.utilities.save import SAVE_PROFILES
+    if to_convert not in SAVE_PROFILES:
+        raise clize.errors.CliValueError(
+            'Unknown save profile {}, choose from {}'.format(
+                to_convert, ', '.join(sorted(SAVE_PROFILES))))
+    return to_convert
+
+
 def create_constrained_inputcubelist_converter(*constraints):
     """Makes function that the input constraints are used in a loop.
 
@@ -237,8 +260,9 @@ def create_constrained_inputcubelist_converter(*constraints):
 
 
 @decorator
-def with_output(wrapped, *args, output=None, **kwargs):
-    """Add `output` keyword only argument.
+def with_output(wrapped, *args, output=None,
+                output_profile: save_profile = 'default', **kwargs):
+    """Add `output` and `output_profile` keyword only arguments.
 
     This is used to add an extra `output` CLI option. If provided, it saves
     the result of calling `wrapped` to file and returns None, otherwise it
@@ -250,6 +274,11 @@ def with_output(wrapped, *args, output=None, **kwargs):
         output (str, optional):
             Output file name. If not supplied, the output object will be
             printed instead.
+        output_profile (str, optional):
+            Name of the compression and chunking profile used to save the
+            output file: "default", "intermediate" (uncompressed, for files
+            which are only read once), "archive" (more compression) or
+            "spot" (chunked along sites).
 
     Returns:
         Result of calling `wrapped` or None if `output` is given.
@@ -257,7 +286,7 @@ def with_output(wrapped, *args, output=None, **kwargs):
     from improver.utilities.save import save_netcdf
     result = wrapped(*args, **kwargs)
     if output:
-        save_netcdf(result, output)
+        save_netcdf(result, output, profile=output_profile)
         return
     return result
 
@@ -302,9 +331,24 @@ def clizefy(obj=None, helper_class=DocutilizeClizeHelp, **kwargs):
 
 @clizefy(help_names=())
 def improver_help(prog_name: parameters.pass_name,
-                  command=None, *, usage=False):
-    """Show command help."""
+                  command=None, *, usage=False, import_times=False):
+    """Show command help.
+
+    Args:
+        prog_name:
+            The program name from argv[0].
+        command (str):
+            Command to show help for. Shows help for all commands if not
+            given.
+        usage (bool):
+            Show only the usage of the command(s).
+        import_times (bool):
+            Report the time taken to import the command(s), each measured
+            in a new process.
+    """
     prog_name = prog_name.split()[0]
+    if import_times:
+        return subcommand_import_times([command] if command else None)
     args = filter(None, [command, '--help', usage and '--usage'])
     result = execute_command(SUBCOMMANDS_DISPATCHER, prog_name, *args)
     if not command and usage:
@@ -313,17 +357,167 @@ def improver_help(prog_name: parameters.pass_name,
     return result
 
 
+SUBCOMMANDS_MANIFEST = pathlib.Path(__file__).parent / 'subcommands.json'
+
+
+@lru_cache()
+def _subcommands_manifest():
+    """Load the help summaries of the subcommands.
+
+    Returns:
+        dict:
+            Description and usages of each subcommand, keyed by module name.
+            Empty if the manifest file does not exist.
+    """
+    try:
+        with SUBCOMMANDS_MANIFEST.open() as manifest_file:
+            return json.load(manifest_file)
+    except FileNotFoundError:
+        return {}
+
+
+class _ManifestHelper:
+    """Help summary of a subcommand, as used for listing subcommands."""
+
+    def __init__(self, description, usages):
+        self.description = description
+        self._usages = usages
+
+    def usages(self):
+        """Return the usages of the subcommand."""
+        return iter(self._usages)
+
+
+class LazySubcommand:
+    """Subcommand that imports its module only when it is run.
+
+    The CLI object is built from the module's process function the first
+    time the subcommand is called. Until then, help summaries are taken
+    from the subcommands manifest, so listing all subcommands does not need
+    to import them.
+    """
+
+    def __init__(self, name):
+        """
+        Args:
+            name (str):
+                Name of the module within improver.cli.
+        """
+        self.name = name
+        self.import_time = None
+        self._cli = None
+
+    def __repr__(self):
+        return '<LazySubcommand: {}>'.format(self.name)
+
+    @property
+    def cli(self):
+        """This object is used as its own CLI, so that building the
+        subcommands dispatcher does not load it."""
+        return self
+
+    def load(self):
+        """Import the module and build its CLI object.
+
+        The time taken is recorded in the import_time attribute.
+
+        Returns:
+            clize.runner.Clize:
+                CLI object for the module's process function.
+        """
+        if self._cli is None:
+            import importlib
+            import time
+            start = time.perf_counter()
+            module = importlib.import_module('improver.cli.' + self.name)
+            self._cli = Clize.get_cli(clizefy(module.process))
+            self.import_time = time.perf_counter() - start
+        return self._cli
+
+    @property
+    def helper(self):
+        """Help summary of the subcommand, from the manifest if available."""
+        try:
+            summary = _subcommands_manifest()[self.name]
+        except KeyError:
+            return self.load().helper
+        return _ManifestHelper(summary['description'], summary['usages'])
+
+    def __call__(self, *args, **kwargs):
+        return self.load()(*args, **kwargs)
+
+
 def _cli_items():
-    """Dynamically discover CLIs."""
-    import importlib
+    """Discover CLIs without importing them."""
     import pkgutil
     from improver.cli import __path__ as improver_cli_pkg_path
     yield ('help', improver_help)
     for minfo in pkgutil.iter_modules(improver_cli_pkg_path):
         mod_name = minfo.name
         if mod_name != '__main__':
-            mcli = importlib.import_module('improver.cli.' + mod_name)
-            yield (mod_name, clizefy(mcli.process))
+            yield (mod_name, LazySubcommand(mod_name))
+
+
+def build_subcommands_manifest():
+    """Import all the subcommands to build their help summaries.
+
+    Returns:
+        dict:
+            Description and usages of each subcommand, keyed by module name.
+    """
+    manifest = OrderedDict()
+    for name, command in SUBCOMMANDS_TABLE.items():
+        if isinstance(command, LazySubcommand):
+            helper = command.load().helper
+            manifest[name] = {'description': str(helper.description),
+                              'usages': list(helper.usages())}
+    return manifest
+
+
+def write_subcommands_manifest():
+    """Write the subcommands manifest used for listing the subcommands.
+
+    This should be run whenever a CLI is added or its arguments or
+    docstring are changed.
+    """
+    with SUBCOMMANDS_MANIFEST.open('w') as manifest_file:
+        json.dump(build_subcommands_manifest(), manifest_file, indent=2)
+        manifest_file.write('\n')
+
+
+def subcommand_import_times(names=None):
+    """Measure the time taken to import subcommands.
+
+    Each subcommand is imported in a new Python process, so that the times
+    are not affected by modules that have already been imported by other
+    subcommands, and include all the imports needed to run the subcommand.
+
+    Args:
+        names (list of str or None):
+            Names of the subcommands, either as module names or as command
+            names. All subcommands are timed if not given.
+
+    Returns:
+        str:
+            Table of import times in seconds.
+    """
+    import subprocess
+    import sys
+    script = ('import sys; from improver.cli import SUBCOMMANDS_TABLE; '
+              'command = SUBCOMMANDS_TABLE[sys.argv[1]]; command.load(); '
+              'print(command.import_time)')
+    if names is None:
+        names = [name for name, command in SUBCOMMANDS_TABLE.items()
+                 if isinstance(command, LazySubcommand)]
+    lines = []
+    for name in names:
+        name = name.replace('-', '_')
+        output = subprocess.run(
+            [sys.executable, '-c', script, name], check=True,
+            stdout=subprocess.PIPE, universal_newlines=True).stdout
+        lines.append('{:<40} {:.3f}'.format(
+            name.replace('_', '-'), float(output)))
+    return '\n'.join(lines)
 
 
 SUBCOMMANDS_TABLE = OrderedDict(sorted(_cli_items()))
@@ -45,7 +45,10 @@ def process(*cubes: cli.inputcube,
             units=None,
             predictor_of_mean='mean',
             tolerance: float = 0.01,
-            max_iterations: int = 1000):
+            max_iterations: int = 1000,
+            use_gradient=False,
+            point_by_point=False,
+            processes: int = 1):
     """Estimate coefficients for Ensemble Model Output Statistics.
 
     Loads in arguments for estimating coefficients for Ensemble Model
@@ -94,12 +97,26 @@ def process(*cubes: cli.inputcube,
             If the predictor_of_mean is "realizations", then the number of
             iterations may require increasing, as there will be more
             coefficients to solve.
+        use_gradient (bool):
+            If True, minimise the CRPS using the L-BFGS-B algorithm with
+            analytic gradients of the CRPS, which is much faster than the
+            default Nelder-Mead algorithm. If this does not converge, the
+            Nelder-Mead algorithm is used instead.
+        point_by_point (bool):
+            If True, estimate a separate set of coefficients at each grid
+            point or spot site, rather than a single set of coefficients for
+            the whole domain. The output cube then has the spatial
+            coordinates of the historical forecasts.
+        processes (int):
+            Number of processes used to estimate the coefficients at each
+            point, if point_by_point is True.
 
     Returns:
         iris.cube.Cube:
             Cube containing the coefficients estimated using EMOS. The cube
             contains a coefficient_index dimension coordinate and a
-            coefficient_name auxiliary coordinate.
+            coefficient_name auxiliary coordinate, and any spatial
+            dimensions if point_by_point is True.
 
     Raises:
         RuntimeError:
@@ -157,5 +174,7 @@ def process(*cubes: cli.inputcube,
     return EstimateCoefficientsForEnsembleCalibration(
         distribution, cycletime, desired_units=units,
         predictor_of_mean_flag=predictor_of_mean,
-        tolerance=tolerance, max_iterations=max_iterations).process(
+        tolerance=tolerance, max_iterations=max_iterations,
+        use_gradient=use_gradient, point_by_point=point_by_point,
+        processes=processes).process(
             forecast, truth, landsea_mask=land_sea_mask)
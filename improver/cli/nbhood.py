@@ -49,6 +49,7 @@ def process(cube: cli.inputcube,
             area_sum=False,
             remask=False,
             percentiles: cli.comma_separated_list = DEFAULT_PERCENTILES,
+            percentile_bins: int = None,
             halo_radius: float = None):
     """Runs neighbourhood processing.
 
@@ -105,6 +106,12 @@ def process(cube: cli.inputcube,
             Calculates value at the specified percentiles from the
             neighbourhood surrounding each grid point. This argument has no
             effect if the output is probabilities.
+        percentile_bins (int):
+            Calculate the percentiles from a histogram of the neighbourhood
+            values with this number of bins, rather than exactly. This is
+            faster for large neighbourhoods, and exact if the data contain
+            no more distinct values than bins. This argument has no effect
+            if the output is probabilities.
         halo_radius (float):
             Set this radius in metres to define the excess halo to clip. Used
             where a larger grid was defined than the standard grid and we want
@@ -164,7 +171,8 @@ def process(cube: cli.inputcube,
             GeneratePercentilesFromANeighbourhood(
                 neighbourhood_shape, radius_or_radii,
                 lead_times=lead_times,
-                percentiles=percentiles
+                percentiles=percentiles,
+                num_bins=percentile_bins
             ).process(cube))
 
     if degrees_as_complex:
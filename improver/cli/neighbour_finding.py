@@ -48,7 +48,8 @@ def process(orography: cli.inputcube,
             site_coordinate_system=None,
             site_coordinate_options=None,
             site_x_coordinate=None,
-            site_y_coordinate=None):
+            site_y_coordinate=None,
+            kdtree_cache_directory=None):
     """Create neighbour cubes for extracting spot data.
 
     Determine grid point coordinates within the provided cubes that neighbour
@@ -110,6 +111,11 @@ def process(orography: cli.inputcube,
         site_y_coordinate (str):
             The key that identifies site y coordinates in the provided site
             dictionary. Defaults to latitude.
+        kdtree_cache_directory (str):
+            Directory in which the nodes of the KDTrees built for the
+            land_constraint and similar_altitude options are cached.
+            Subsequent runs on the same model grid build the trees from the
+            cached nodes rather than transforming the grid coordinates again.
 
     Returns:
         iris.cube.Cube:
@@ -155,7 +161,8 @@ def process(orography: cli.inputcube,
         'site_coordinate_options': site_coordinate_options,
         'site_x_coordinate': site_x_coordinate,
         'node_limit': node_limit,
-        'site_y_coordinate': site_y_coordinate
+        'site_y_coordinate': site_y_coordinate,
+        'cache_directory': kdtree_cache_directory
     }
     fargs = (site_list, orography, land_sea_mask)
     kwargs = {k: v for (k, v) in args.items() if v is not None}
@@ -176,16 +183,8 @@ def process(orography: cli.inputcube,
             globe=crs_globe, **scrs_opts)
     # Call plugin to generate neighbour cubes
     if all_methods:
-        methods = [
-            {**kwargs, 'land_constraint': False, 'minimum_dz': False},
-            {**kwargs, 'land_constraint': True, 'minimum_dz': False},
-            {**kwargs, 'land_constraint': False, 'minimum_dz': True},
-            {**kwargs, 'land_constraint': True, 'minimum_dz': True}
-        ]
-
-        all_methods = iris.cube.CubeList([])
-        for method in methods:
-            all_methods.append(NeighbourSelection(**method).process(*fargs))
+        all_methods = NeighbourSelection(**kwargs).process_all_methods(
+            *fargs)
 
         squeezed_cubes = iris.cube.CubeList([])
         for index, cube in enumerate(all_methods):
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# (C) British Crown Copyright 2017-2019 Met Office.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Script to run a pipeline of IMPROVER commands."""
+
+from improver import cli
+
+
+@cli.clizefy
+def process(config: cli.inputjson, *, processes: int = 1):
+    """Run a pipeline of IMPROVER commands, passing results in memory.
+
+    The pipeline is defined as a set of named steps, each of which runs an
+    IMPROVER command. Results of steps are passed directly to the steps
+    that use them, without being saved to and loaded from files, and are
+    only saved for steps that declare an output file.
+
+    Args:
+        config (dict):
+            Pipeline definition, with a "steps" dictionary mapping the name
+            of each step to a dictionary containing its "command", an
+            optional list of command line "args", an optional "output"
+            file and an optional "output_profile" for saving it. An
+            argument of the form {"step": "name"} is replaced by the result
+            of the named step. For example:
+            {"steps": {"threshold": {"command": "threshold", "args":
+            ["input.nc", "--threshold-values=280"]}, "nbhood": {"command":
+            "nbhood", "args": [{"step": "threshold"},
+            "--neighbourhood-output=probabilities",
+            "--neighbourhood-shape=square", "--radii=20000"],
+            "output": "output.nc"}}}
+        processes (int):
+            Number of processes used to run independent steps concurrently.
+
+    Returns:
+        None
+    """
+    from improver.utilities.pipeline import RunPipeline
+    RunPipeline(processes=processes)(config)
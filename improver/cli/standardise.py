@@ -49,7 +49,8 @@ def process(cube: cli.inputcube,
             coords_to_remove: cli.comma_separated_list = None,
             new_name: str = None,
             new_units: str = None,
-            fix_float64=False):
+            fix_float64=False,
+            regrid_weights_cache_directory: str = None):
     """Standardises a cube by one or more of regridding, updating meta-data etc
 
     Standardise a source cube. Available options are regridding (bi-linear or
@@ -106,6 +107,9 @@ def process(cube: cli.inputcube,
             If True, checks and fixes cube for float64 data. Without this
             option an exception will be raised if float64 data is found but no
             fix applied.
+        regrid_weights_cache_directory (str):
+            Directory in which to store regridding weights, so that later
+            runs regridding between the same grids can reuse them.
 
     Returns:
         iris.cube.Cube:
@@ -130,7 +134,8 @@ def process(cube: cli.inputcube,
     plugin = StandardiseGridAndMetadata(
         regrid_mode=regrid_mode, extrapolation_mode=extrapolation_mode,
         landmask=land_sea_mask,
-        landmask_vicinity=land_sea_mask_vicinity)
+        landmask_vicinity=land_sea_mask_vicinity,
+        weights_cache_directory=regrid_weights_cache_directory)
     output_data = plugin.process(
         cube, target_grid, new_name=new_name, new_units=new_units,
         regridded_title=regridded_title, coords_to_remove=coords_to_remove,
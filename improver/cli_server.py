@@ -0,0 +1,388 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# (C) British Crown Copyright 2017-2019 Met Office.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Persistent server for running IMPROVER CLIs without start up costs.
+
+Starting a new Python process for every call of ``bin/improver`` means that
+the CLI modules and their dependencies (iris, scipy, cartopy...) are
+imported again for each invocation, which can take longer than the
+processing itself for small inputs. This module provides an opt-in server
+which imports everything once, then runs each request in a forked worker
+process. The client passes its command line arguments, working directory,
+environment and its stdin, stdout and stderr file descriptors to the server,
+so that output files, printed output and the exit status are the same as
+for a one-shot invocation.
+
+Start the server with::
+
+    python3 -m improver.cli_server --serve SOCKET_PATH
+
+and set IMPROVER_SERVER_SOCKET=SOCKET_PATH for ``bin/improver`` to send
+commands to it. If the server cannot be reached, the client falls back to
+running the command in a new process.
+
+Only standard library modules are imported at module level, so that the
+client starts quickly.
+"""
+
+import array
+import json
+import os
+import signal
+import socket
+import struct
+import sys
+
+SOCKET_ENV_VAR = 'IMPROVER_SERVER_SOCKET'
+STANDARD_STREAMS = (0, 1, 2)
+
+
+def _send_message(conn, message, fds=None):
+    """Send a message, optionally with file descriptors, over a socket.
+
+    Args:
+        conn (socket.socket):
+            Connected Unix socket.
+        message (dict):
+            JSON serialisable message.
+        fds (list of int or None):
+            File descriptors to pass to the receiving process.
+    """
+    data = json.dumps(message).encode() + b'\n'
+    ancillary = []
+    if fds:
+        ancillary = [(socket.SOL_SOCKET, socket.SCM_RIGHTS,
+                      array.array('i', fds))]
+    sent = conn.sendmsg([data], ancillary)
+    conn.sendall(data[sent:])
+
+
+def _receive_message(conn, max_fds=0):
+    """Receive a message, optionally with file descriptors, from a socket.
+
+    Args:
+        conn (socket.socket):
+            Connected Unix socket.
+        max_fds (int):
+            Maximum number of file descriptors expected with the message.
+
+    Returns:
+        (tuple): tuple containing:
+            **message** (dict or None):
+                The decoded message, or None if the connection was closed
+                before a complete message was received.
+            **fds** (list of int):
+                File descriptors received with the message.
+    """
+    fds = array.array('i')
+    data = b''
+    while not data.endswith(b'\n'):
+        chunk, ancillary, _, _ = conn.recvmsg(
+            65536, socket.CMSG_SPACE(max_fds * fds.itemsize))
+        for level, kind, fd_data in ancillary:
+            if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+                fds.frombytes(
+                    fd_data[:len(fd_data) - len(fd_data) % fds.itemsize])
+        if not chunk:
+            return None, list(fds)
+        data += chunk
+    return json.loads(data.decode()), list(fds)
+
+
+def exit_status(exc):
+    """Convert a SystemExit exception into a process exit status, in the
+    same way as the Python interpreter.
+
+    Args:
+        exc (SystemExit):
+            Exception raised to exit the process.
+
+    Returns:
+        int:
+            Exit status.
+    """
+    if exc.code is None:
+        return 0
+    if isinstance(exc.code, int):
+        return exc.code
+    print(exc.code, file=sys.stderr)
+    return 1
+
+
+def preload():
+    """Import the IMPROVER CLIs and all IMPROVER modules, so that they are
+    shared by the worker processes."""
+    import importlib
+    import pkgutil
+    import improver
+    from improver import cli
+    for command in cli.SUBCOMMANDS_TABLE.values():
+        if isinstance(command, cli.LazySubcommand):
+            command.load()
+    for minfo in pkgutil.walk_packages(improver.__path__, 'improver.',
+                                       onerror=lambda name: None):
+        try:
+            importlib.import_module(minfo.name)
+        except Exception:  # pylint: disable=broad-except
+            # Modules with optional dependencies are imported on demand
+            pass
+
+
+def _run_worker(conn):
+    """Run a single command in a forked worker process.
+
+    Receives the request from the client, takes over its standard streams,
+    working directory and environment, runs the command and sends back the
+    exit status. This function does not return.
+
+    Args:
+        conn (socket.socket):
+            Connection to the client.
+    """
+    import atexit
+    import random
+    import traceback
+    status = 1
+    try:
+        request, fds = _receive_message(conn, len(STANDARD_STREAMS))
+        if request is None or len(fds) != len(STANDARD_STREAMS):
+            os._exit(status)
+        for fd, target in zip(fds, STANDARD_STREAMS):
+            os.dup2(fd, target)
+            os.close(fd)
+        # Open new streams, with buffering chosen for the client's files as
+        # it would be in a new process
+        sys.stdin = open(0, 'r', closefd=False)
+        sys.stdout = open(1, 'w', closefd=False)
+        sys.stderr = open(2, 'w', buffering=1, errors='backslashreplace',
+                          closefd=False)
+        os.chdir(request['cwd'])
+        os.environ.clear()
+        os.environ.update(request['env'])
+        # Don't share random states between workers
+        random.seed()
+        if 'numpy' in sys.modules:
+            sys.modules['numpy'].random.seed()
+        _send_message(conn, {'pid': os.getpid()})
+
+        from improver import cli
+        try:
+            cli.run_main(request['argv'])
+            status = 0
+        except SystemExit as exc:
+            status = exit_status(exc)
+        except BaseException:  # pylint: disable=broad-except
+            traceback.print_exc()
+            status = 1
+        atexit._run_exitfuncs()  # pylint: disable=protected-access
+    finally:
+        for stream in (sys.stdout, sys.stderr):
+            try:
+                stream.flush()
+            except Exception:  # pylint: disable=broad-except
+                pass
+        try:
+            _send_message(conn, {'status': status})
+        finally:
+            os._exit(status)
+
+
+def _reap_workers():
+    """Collect the exit status of any finished worker processes."""
+    while True:
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            return
+
+
+def _peer_uid(conn):
+    """Return the user ID of the process at the other end of a Unix socket.
+
+    Args:
+        conn (socket.socket):
+            Connected Unix socket.
+
+    Returns:
+        int or None:
+            User ID of the peer, or None if the platform does not report it.
+    """
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return None
+    credentials = conn.getsockopt(
+        socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+    _, uid, _ = struct.unpack('3i', credentials)
+    return uid
+
+
+def serve(socket_path, preload_modules=True):
+    """Serve requests to run IMPROVER CLIs until terminated.
+
+    The socket is only accessible by the user running the server, as a
+    client can run any command as that user. Connections from other users
+    are also closed without being served, where the platform reports the
+    user at the other end of the socket.
+
+    Args:
+        socket_path (str):
+            Path of the Unix socket to listen on.
+        preload_modules (bool):
+            If True, import all IMPROVER modules before accepting requests.
+
+    Raises:
+        OSError: If the socket path exists and is not a socket.
+    """
+    if preload_modules:
+        preload()
+    if os.path.exists(socket_path):
+        # Remove a stale socket left by a previous server
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(socket_path)
+            except ConnectionRefusedError:
+                os.unlink(socket_path)
+            else:
+                raise OSError(
+                    "Server already running at {}".format(socket_path))
+
+    def terminate(signum, frame):
+        """Raise SystemExit to shut down cleanly on SIGTERM."""
+        sys.exit(128 + signum)
+
+    signal.signal(signal.SIGTERM, terminate)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        # Create the socket without group or other permissions, rather than
+        # changing them after it has been created
+        umask = os.umask(0o177)
+        try:
+            server.bind(socket_path)
+        finally:
+            os.umask(umask)
+        server.listen(socket.SOMAXCONN)
+        server.settimeout(1)
+        while True:
+            _reap_workers()
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                continue
+            conn.settimeout(None)
+            if _peer_uid(conn) not in (None, os.getuid()):
+                conn.close()
+                continue
+            if os.fork() == 0:
+                server.close()
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                _run_worker(conn)
+            conn.close()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def run_command(socket_path, argv):
+    """Run an IMPROVER command in the server listening at socket_path.
+
+    SIGINT and SIGTERM received by the client are forwarded to the worker.
+
+    Args:
+        socket_path (str):
+            Path of the server's Unix socket.
+        argv (list of str):
+            Command line arguments, starting with the program name.
+
+    Returns:
+        int:
+            Exit status of the command.
+
+    Raises:
+        OSError: If the server cannot be reached.
+        ConnectionError: If the server closes the connection before the
+            command completes.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.connect(socket_path)
+        request = {'argv': list(argv), 'cwd': os.getcwd(),
+                   'env': dict(os.environ)}
+        _send_message(conn, request, fds=list(STANDARD_STREAMS))
+        message, _ = _receive_message(conn)
+        if message is None:
+            raise ConnectionError("Server closed connection")
+        worker_pid = message['pid']
+
+        def forward(signum, frame):
+            """Forward a signal to the worker process."""
+            os.kill(worker_pid, signum)
+
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, forward)
+        message, _ = _receive_message(conn)
+        if message is None:
+            raise ConnectionError("Server closed connection")
+        return message['status']
+
+
+def main(argv=None):
+    """Run the server or the client.
+
+    With ``--serve [SOCKET_PATH]``, runs the server. Otherwise, runs the
+    arguments as an IMPROVER command in the server given by the
+    IMPROVER_SERVER_SOCKET environment variable, or in this process if the
+    server cannot be reached.
+
+    Args:
+        argv (list of str):
+            Command line arguments, excluding the program name.
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] == '--serve':
+        socket_path = argv[1] if len(argv) > 1 else os.environ[SOCKET_ENV_VAR]
+        serve(socket_path)
+        return
+    socket_path = os.environ.get(SOCKET_ENV_VAR)
+    if socket_path:
+        try:
+            sys.exit(run_command(socket_path, ['improver'] + argv))
+        except (ConnectionRefusedError, FileNotFoundError):
+            pass
+    from improver import cli
+    cli.run_main(['improver'] + argv)
+
+
+if __name__ == '__main__':
+    main()
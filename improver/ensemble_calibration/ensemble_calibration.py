@@ -33,6 +33,7 @@ This module defines all the "plugins" specific for ensemble calibration.
 
 """
 import datetime
+import multiprocessing
 import warnings
 
 import iris
@@ -69,6 +70,11 @@ class ContinuousRankedProbabilityScoreMinimisers:
     Note that the BFGS algorithm was initially trialled but had a bug
     in comparison to comparative results generated in R.
 
+    Alternatively, the minimisation can be performed using the L-BFGS-B
+    algorithm with analytic gradients of the CRPS, which needs far fewer
+    evaluations of the CRPS. If this does not converge, the Nelder-Mead
+    algorithm is used instead.
+
     """
     # The tolerated percentage change for the final iteration when
     # performing the minimisation.
@@ -78,7 +84,8 @@ class ContinuousRankedProbabilityScoreMinimisers:
     # as part of the minimisation.
     BAD_VALUE = np.float64(999999)
 
-    def __init__(self, tolerance=0.01, max_iterations=1000):
+    def __init__(self, tolerance=0.01, max_iterations=1000,
+                 use_gradient=False):
         """
         Initialise class for performing minimisation of the Continuous
         Ranked Probability Score (CRPS).
@@ -101,6 +108,11 @@ class ContinuousRankedProbabilityScoreMinimisers:
                 predictor_of_mean is "realizations", then the number of
                 iterations may require increasing, as there will be
                 more coefficients to solve for.
+            use_gradient (bool):
+                If True, minimise using the L-BFGS-B algorithm with analytic
+                gradients of the CRPS, falling back to the Nelder-Mead
+                algorithm if this does not converge. The tolerance only
+                applies to the Nelder-Mead algorithm.
 
         """
         # Dictionary containing the functions that will be minimised,
@@ -108,9 +120,16 @@ class ContinuousRankedProbabilityScoreMinimisers:
         self.minimisation_dict = {
             "gaussian": self.calculate_normal_crps,
             "truncated_gaussian": self.calculate_truncated_normal_crps}
+        # Dictionary containing the functions returning the CRPS and its
+        # gradient, for minimisation using the L-BFGS-B algorithm.
+        self.gradient_minimisation_dict = {
+            "gaussian": self.calculate_normal_crps_and_gradient,
+            "truncated_gaussian": (
+                self.calculate_truncated_normal_crps_and_gradient)}
         self.tolerance = tolerance
         # Maximum iterations for minimisation using Nelder-Mead.
         self.max_iterations = max_iterations
+        self.use_gradient = use_gradient
 
     def __repr__(self):
         """Represent the configured plugin instance as a string."""
@@ -200,45 +219,6 @@ class ContinuousRankedProbabilityScoreMinimisers:
             Warning: If the minimisation did not converge.
 
         """
-        def calculate_percentage_change_in_last_iteration(allvecs):
-            """
-            Calculate the percentage change that has occurred within
-            the last iteration of the minimisation. If the percentage change
-            between the last iteration and the last-but-one iteration exceeds
-            the threshold, a warning message is printed.
-
-            Args:
-                allvecs (list):
-                    List of numpy arrays containing the optimised coefficients,
-                    after each iteration.
-
-            Warns:
-                Warning: If a satisfactory minimisation has not been achieved.
-            """
-            last_iteration_percentage_change = np.absolute(
-                (allvecs[-1] - allvecs[-2]) / allvecs[-2])*100
-            if (np.any(last_iteration_percentage_change >
-                       self.TOLERATED_PERCENTAGE_CHANGE)):
-                np.set_printoptions(suppress=True)
-                msg = ("The final iteration resulted in a percentage change "
-                       "that is greater than the accepted threshold of 5% "
-                       "i.e. {}. "
-                       "\nA satisfactory minimisation has not been achieved. "
-                       "\nLast iteration: {}, "
-                       "\nLast-but-one iteration: {}"
-                       "\nAbsolute difference: {}\n").format(
-                           last_iteration_percentage_change, allvecs[-1],
-                           allvecs[-2], np.absolute(allvecs[-2]-allvecs[-1]))
-                warnings.warn(msg)
-
-        try:
-            minimisation_function = self.minimisation_dict[distribution]
-        except KeyError as err:
-            msg = ("Distribution requested {} is not supported in {}"
-                   "Error message is {}".format(
-                       distribution, self.minimisation_dict, err))
-            raise KeyError(msg)
-
         # Ensure predictor_of_mean_flag is valid.
         check_predictor_of_mean_flag(predictor_of_mean_flag)
 
@@ -255,6 +235,88 @@ class ContinuousRankedProbabilityScoreMinimisers:
             forecast_predictor_data = flatten_ignoring_masked_data(
                 forecast_predictor.data, preserve_leading_dimension=True).T
 
+        return self.minimise_arrays(
+            initial_guess, forecast_predictor_data, truth_data,
+            forecast_var_data, predictor_of_mean_flag, distribution)
+
+    def _calculate_percentage_change_in_last_iteration(self, allvecs):
+        """
+        Calculate the percentage change that has occurred within
+        the last iteration of the minimisation. If the percentage change
+        between the last iteration and the last-but-one iteration exceeds
+        the threshold, a warning message is printed.
+
+        Args:
+            allvecs (list):
+                List of numpy arrays containing the optimised coefficients,
+                after each iteration.
+
+        Warns:
+            Warning: If a satisfactory minimisation has not been achieved.
+        """
+        last_iteration_percentage_change = np.absolute(
+            (allvecs[-1] - allvecs[-2]) / allvecs[-2])*100
+        if (np.any(last_iteration_percentage_change >
+                   self.TOLERATED_PERCENTAGE_CHANGE)):
+            np.set_printoptions(suppress=True)
+            msg = ("The final iteration resulted in a percentage change "
+                   "that is greater than the accepted threshold of 5% "
+                   "i.e. {}. "
+                   "\nA satisfactory minimisation has not been achieved. "
+                   "\nLast iteration: {}, "
+                   "\nLast-but-one iteration: {}"
+                   "\nAbsolute difference: {}\n").format(
+                       last_iteration_percentage_change, allvecs[-1],
+                       allvecs[-2], np.absolute(allvecs[-2]-allvecs[-1]))
+            warnings.warn(msg)
+
+    def minimise_arrays(
+            self, initial_guess, forecast_predictor_data, truth_data,
+            forecast_var_data, predictor_of_mean_flag, distribution):
+        """
+        Estimate optimised values for the coefficients from flattened
+        arrays of training data, from which any missing data have been
+        removed. See process.
+
+        Args:
+            initial_guess (list or numpy.ndarray):
+                List of optimised coefficients.
+                Order of coefficients is [gamma, delta, alpha, beta].
+            forecast_predictor_data (numpy.ndarray):
+                Data to be used as the predictor, either the ensemble mean,
+                or the ensemble realizations with a column for each
+                realization.
+            truth_data (numpy.ndarray):
+                Data to be used as truth.
+            forecast_var_data (numpy.ndarray):
+                Ensemble variance data.
+            predictor_of_mean_flag (str):
+                String to specify the input to calculate the calibrated mean.
+                Currently the ensemble mean ("mean") and the ensemble
+                realizations ("realizations") are supported as the predictors.
+            distribution (str):
+                String used to access the appropriate function for use in the
+                minimisation within self.minimisation_dict.
+
+        Returns:
+            numpy.ndarray:
+                Array of optimised coefficients.
+                Order of coefficients is [gamma, delta, alpha, beta].
+
+        Raises:
+            KeyError: If the distribution is not supported.
+
+        Warns:
+            Warning: If the minimisation did not converge.
+        """
+        try:
+            minimisation_function = self.minimisation_dict[distribution]
+        except KeyError as err:
+            msg = ("Distribution requested {} is not supported in {}"
+                   "Error message is {}".format(
+                       distribution, self.minimisation_dict, err))
+            raise KeyError(msg)
+
         # Increased precision is needed for stable coefficient calculation.
         # The resulting coefficients are cast to float32 prior to output.
         initial_guess = np.array(initial_guess, dtype=np.float64)
@@ -262,19 +324,27 @@ class ContinuousRankedProbabilityScoreMinimisers:
         forecast_var_data = forecast_var_data.astype(np.float64)
         truth_data = truth_data.astype(np.float64)
         sqrt_pi = np.sqrt(np.pi).astype(np.float64)
-        optimised_coeffs = minimize(
-            minimisation_function, initial_guess,
-            args=(forecast_predictor_data, truth_data,
-                  forecast_var_data, sqrt_pi, predictor_of_mean_flag),
-            method="Nelder-Mead", tol=self.tolerance,
-            options={"maxiter": self.max_iterations, "return_all": True})
+        optimised_coeffs = None
+        if self.use_gradient:
+            optimised_coeffs = self._minimise_with_gradient(
+                self.gradient_minimisation_dict[distribution], initial_guess,
+                forecast_predictor_data, truth_data, forecast_var_data,
+                sqrt_pi, predictor_of_mean_flag)
+        if optimised_coeffs is None:
+            optimised_coeffs = minimize(
+                minimisation_function, initial_guess,
+                args=(forecast_predictor_data, truth_data,
+                      forecast_var_data, sqrt_pi, predictor_of_mean_flag),
+                method="Nelder-Mead", tol=self.tolerance,
+                options={"maxiter": self.max_iterations, "return_all": True})
 
         if not optimised_coeffs.success:
             msg = ("Minimisation did not result in convergence after "
                    "{} iterations. \n{}".format(
                        self.max_iterations, optimised_coeffs.message))
             warnings.warn(msg)
-        calculate_percentage_change_in_last_iteration(optimised_coeffs.allvecs)
+        self._calculate_percentage_change_in_last_iteration(
+            optimised_coeffs.allvecs)
         return optimised_coeffs.x.astype(np.float32)
 
     def calculate_normal_crps(
@@ -404,6 +474,333 @@ class ContinuousRankedProbabilityScoreMinimisers:
             result = self.BAD_VALUE
         return result
 
+    def _minimise_with_gradient(
+            self, minimisation_function, initial_guess, forecast_predictor,
+            truth, forecast_var, sqrt_pi, predictor_of_mean_flag):
+        """
+        Minimise the CRPS using the L-BFGS-B algorithm with analytic
+        gradients. The design matrix of a column of ones and the predictor
+        is constructed once, rather than on every evaluation of the CRPS.
+        The default convergence criteria of the L-BFGS-B algorithm are used,
+        as the CRPS tolerance used for the Nelder-Mead algorithm stops the
+        minimisation too early when the coefficients are poorly scaled.
+
+        Args:
+            minimisation_function (function):
+                Function returning the CRPS and its gradient.
+            initial_guess (numpy.ndarray):
+                Initial guess for the coefficients.
+                Order of coefficients is [gamma, delta, alpha, beta].
+            forecast_predictor (numpy.ndarray):
+                Data to be used as the predictor,
+                either the ensemble mean or the ensemble realizations.
+            truth (numpy.ndarray):
+                Data to be used as truth.
+            forecast_var (numpy.ndarray):
+                Ensemble variance data.
+            sqrt_pi (numpy.ndarray):
+                Square root of Pi
+            predictor_of_mean_flag (str):
+                String to specify the input to calculate the calibrated mean.
+                Currently the ensemble mean ("mean") and the ensemble
+                realizations ("realizations") are supported as the predictors.
+
+        Returns:
+            scipy.optimize.OptimizeResult or None:
+                Result of the minimisation, with the coefficients after each
+                iteration in its allvecs attribute, or None if the
+                minimisation did not converge to a finite CRPS.
+        """
+        design_matrix = np.column_stack(
+            (np.ones(truth.shape, dtype=np.float64), forecast_predictor))
+        allvecs = [initial_guess]
+        optimised_coeffs = minimize(
+            minimisation_function, initial_guess, jac=True,
+            args=(design_matrix, truth, forecast_var, sqrt_pi,
+                  predictor_of_mean_flag),
+            method="L-BFGS-B",
+            callback=lambda coeffs: allvecs.append(coeffs.copy()),
+            options={"maxiter": self.max_iterations})
+        if (not optimised_coeffs.success or
+                not np.isfinite(optimised_coeffs.fun) or
+                optimised_coeffs.fun >= self.BAD_VALUE):
+            return None
+        if len(allvecs) < 2:
+            allvecs.append(optimised_coeffs.x)
+        optimised_coeffs.allvecs = allvecs
+        return optimised_coeffs
+
+    @staticmethod
+    def _location_and_scale_with_gradients(
+            coeffs, design_matrix, forecast_var, predictor_of_mean_flag):
+        """
+        Calculate the location and scale parameters of the distribution,
+        and the factors needed for their gradients with respect to the
+        coefficients.
+
+        Args:
+            coeffs (numpy.ndarray):
+                Coefficients in the order [gamma, delta, alpha, beta].
+            design_matrix (numpy.ndarray):
+                Column of ones followed by the predictor data.
+            forecast_var (numpy.ndarray):
+                Ensemble variance data.
+            predictor_of_mean_flag (str):
+                String to specify the input to calculate the calibrated mean.
+
+        Returns:
+            (tuple): tuple containing:
+                **mu** (numpy.ndarray):
+                    Location parameter at each point.
+                **sigma** (numpy.ndarray):
+                    Scale parameter at each point.
+                **dbeta** (numpy.ndarray):
+                    Derivative of each term of the location parameter
+                    with respect to the alpha and beta coefficients.
+        """
+        if predictor_of_mean_flag.lower() == "mean":
+            beta = coeffs[2:]
+            dbeta = np.ones(beta.shape)
+        elif predictor_of_mean_flag.lower() == "realizations":
+            beta = np.concatenate((coeffs[2:3], coeffs[3:]**2))
+            dbeta = np.concatenate(([1.], 2 * coeffs[3:]))
+        mu = np.dot(design_matrix, beta)
+        sigma = np.sqrt(coeffs[0]**2 + coeffs[1]**2 * forecast_var)
+        return mu, sigma, dbeta
+
+    @staticmethod
+    def _mean_crps_and_gradient(
+            crps, dcrps_dmu, dcrps_dsigma, coeffs, design_matrix, sigma,
+            forecast_var, dbeta):
+        """
+        Calculate the mean CRPS and its gradient with respect to the
+        coefficients, from the CRPS and its derivatives with respect to the
+        location and scale parameters at each point. Points with a NaN
+        CRPS are ignored.
+
+        Args:
+            crps (numpy.ndarray):
+                CRPS at each point.
+            dcrps_dmu (numpy.ndarray):
+                Derivative of the CRPS with respect to the location parameter.
+            dcrps_dsigma (numpy.ndarray):
+                Derivative of the CRPS with respect to the scale parameter.
+            coeffs (numpy.ndarray):
+                Coefficients in the order [gamma, delta, alpha, beta].
+            design_matrix (numpy.ndarray):
+                Column of ones followed by the predictor data.
+            sigma (numpy.ndarray):
+                Scale parameter at each point.
+            forecast_var (numpy.ndarray):
+                Ensemble variance data.
+            dbeta (numpy.ndarray):
+                Derivative of each term of the location parameter with
+                respect to the alpha and beta coefficients.
+
+        Returns:
+            (tuple): tuple containing:
+                **result** (float):
+                    Mean CRPS.
+                **gradient** (numpy.ndarray):
+                    Gradient of the mean CRPS with respect to the
+                    coefficients.
+        """
+        valid = ~np.isnan(crps)
+        num_valid = np.count_nonzero(valid)
+        dcrps_dmu = np.where(valid, dcrps_dmu, 0.)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            dcrps_dsigma = np.where(valid, dcrps_dsigma / sigma, 0.)
+        gradient = np.empty(len(coeffs))
+        gradient[0] = coeffs[0] * np.sum(dcrps_dsigma)
+        gradient[1] = coeffs[1] * np.dot(dcrps_dsigma, forecast_var)
+        gradient[2:] = dbeta * np.dot(dcrps_dmu, design_matrix)
+        return np.nanmean(crps), gradient / num_valid
+
+    def calculate_normal_crps_and_gradient(
+            self, initial_guess, design_matrix, truth, forecast_var,
+            sqrt_pi, predictor_of_mean_flag):
+        """
+        Calculate the CRPS for a normal distribution, and its gradient with
+        respect to the coefficients. See calculate_normal_crps.
+
+        Args:
+            initial_guess (numpy.ndarray):
+                List of optimised coefficients.
+                Order of coefficients is [gamma, delta, alpha, beta].
+            design_matrix (numpy.ndarray):
+                Column of ones followed by the data to be used as the
+                predictor, either the ensemble mean or the ensemble
+                realizations.
+            truth (numpy.ndarray):
+                Data to be used as truth.
+            forecast_var (numpy.ndarray):
+                Ensemble variance data.
+            sqrt_pi (numpy.ndarray):
+                Square root of Pi
+            predictor_of_mean_flag (str):
+                String to specify the input to calculate the calibrated mean.
+                Currently the ensemble mean ("mean") and the ensemble
+                realizations ("realizations") are supported as the predictors.
+
+        Returns:
+            (tuple): tuple containing:
+                **result** (float):
+                    CRPS for the current set of coefficients. This CRPS is a
+                    mean value across all points.
+                **gradient** (numpy.ndarray):
+                    Gradient of the CRPS with respect to the coefficients.
+        """
+        mu, sigma, dbeta = self._location_and_scale_with_gradients(
+            initial_guess, design_matrix, forecast_var,
+            predictor_of_mean_flag)
+        if not np.isfinite(np.min(mu/sigma)):
+            return self.BAD_VALUE, np.zeros(len(initial_guess))
+        xz = (truth - mu) / sigma
+        normal_cdf = norm.cdf(xz)
+        normal_pdf = norm.pdf(xz)
+        crps = sigma * (
+            xz * (2 * normal_cdf - 1) + 2 * normal_pdf - 1 / sqrt_pi)
+        dcrps_dmu = 1 - 2 * normal_cdf
+        dcrps_dsigma = 2 * normal_pdf - 1 / sqrt_pi
+        return self._mean_crps_and_gradient(
+            crps, dcrps_dmu, dcrps_dsigma, initial_guess, design_matrix,
+            sigma, forecast_var, dbeta)
+
+    def calculate_truncated_normal_crps_and_gradient(
+            self, initial_guess, design_matrix, truth, forecast_var,
+            sqrt_pi, predictor_of_mean_flag):
+        """
+        Calculate the CRPS for a truncated normal distribution with zero
+        as the lower bound, and its gradient with respect to the
+        coefficients. See calculate_truncated_normal_crps.
+
+        Args:
+            initial_guess (numpy.ndarray):
+                List of optimised coefficients.
+                Order of coefficients is [gamma, delta, alpha, beta].
+            design_matrix (numpy.ndarray):
+                Column of ones followed by the data to be used as the
+                predictor, either the ensemble mean or the ensemble
+                realizations.
+            truth (numpy.ndarray):
+                Data to be used as truth.
+            forecast_var (numpy.ndarray):
+                Ensemble variance data.
+            sqrt_pi (numpy.ndarray):
+                Square root of Pi
+            predictor_of_mean_flag (str):
+                String to specify the input to calculate the calibrated mean.
+                Currently the ensemble mean ("mean") and the ensemble
+                realizations ("realizations") are supported as the predictors.
+
+        Returns:
+            (tuple): tuple containing:
+                **result** (float):
+                    CRPS for the current set of coefficients. This CRPS is a
+                    mean value across all points.
+                **gradient** (numpy.ndarray):
+                    Gradient of the CRPS with respect to the coefficients.
+        """
+        mu, sigma, dbeta = self._location_and_scale_with_gradients(
+            initial_guess, design_matrix, forecast_var,
+            predictor_of_mean_flag)
+        x0 = mu / sigma
+        if not (np.isfinite(np.min(x0)) or (np.min(x0) >= -3)):
+            return self.BAD_VALUE, np.zeros(len(initial_guess))
+        xz = (truth - mu) / sigma
+        normal_cdf = norm.cdf(xz)
+        normal_pdf = norm.pdf(xz)
+        normal_cdf_0 = norm.cdf(x0)
+        normal_pdf_0 = norm.pdf(x0)
+        normal_cdf_root_two = norm.cdf(np.sqrt(2) * x0)
+        # The CRPS is sigma * F(xz, x0), where F is a function of the
+        # standardised truth and the standardised truncation point.
+        terms = xz * normal_cdf_0 * (2 * normal_cdf + normal_cdf_0 - 2) + (
+            2 * normal_pdf * normal_cdf_0 - normal_cdf_root_two / sqrt_pi)
+        func = terms / normal_cdf_0**2
+        dfunc_dxz = (2 * normal_cdf + normal_cdf_0 - 2) / normal_cdf_0
+        dterms_dx0 = normal_pdf_0 * (
+            xz * (2 * normal_cdf + 2 * normal_cdf_0 - 2) +
+            2 * normal_pdf) - (
+                np.sqrt(2) * norm.pdf(np.sqrt(2) * x0) / sqrt_pi)
+        dfunc_dx0 = (dterms_dx0 - 2 * func * normal_cdf_0 * normal_pdf_0) / (
+            normal_cdf_0**2)
+        crps = sigma * func
+        dcrps_dmu = dfunc_dx0 - dfunc_dxz
+        dcrps_dsigma = func - xz * dfunc_dxz - x0 * dfunc_dx0
+        return self._mean_crps_and_gradient(
+            crps, dcrps_dmu, dcrps_dsigma, initial_guess, design_matrix,
+            sigma, forecast_var, dbeta)
+
+
+def _minimise_at_points(
+        minimiser_kwargs, initial_guess, forecast_predictor, truth,
+        forecast_var, predictor_of_mean_flag, distribution):
+    """
+    Estimate the coefficients independently at each of a set of points.
+    Samples with missing data are excluded from the minimisation at each
+    point, and the coefficients at points without any valid samples are
+    set to NaN. This is a module level function, so that it can be run
+    in a pool of worker processes.
+
+    Args:
+        minimiser_kwargs (dict):
+            Keyword arguments used to create the
+            ContinuousRankedProbabilityScoreMinimisers plugin.
+        initial_guess (numpy.ndarray):
+            Initial guess for the coefficients, used at every point.
+            Order of coefficients is [gamma, delta, alpha, beta].
+        forecast_predictor (numpy.ndarray):
+            Predictor at each point, with shape (points, times) if the
+            ensemble mean is the predictor, or (points, times, realizations)
+            if the ensemble realizations are the predictor. Missing data are
+            NaN.
+        truth (numpy.ndarray):
+            Truth at each point, with shape (points, times).
+        forecast_var (numpy.ndarray):
+            Ensemble variance at each point, with shape (points, times).
+        predictor_of_mean_flag (str):
+            String to specify the input to calculate the calibrated mean.
+            Currently the ensemble mean ("mean") and the ensemble
+            realizations ("realizations") are supported as the predictors.
+        distribution (str):
+            String used to access the appropriate function for use in the
+            minimisation.
+
+    Returns:
+        (tuple): tuple containing:
+            **optimised_coeffs** (numpy.ndarray):
+                Optimised coefficients, with shape (points, coefficients).
+            **unsatisfactory_points** (int):
+                Number of points at which the minimisation raised a warning,
+                as it did not converge or did not reach a stable solution.
+    """
+    minimiser = ContinuousRankedProbabilityScoreMinimisers(**minimiser_kwargs)
+    optimised_coeffs = np.full(
+        (len(truth), len(initial_guess)), np.nan, dtype=np.float32)
+    if np.any(np.isnan(initial_guess)):
+        return optimised_coeffs, 0
+
+    valid = np.isfinite(truth) & np.isfinite(forecast_var)
+    if predictor_of_mean_flag.lower() == "realizations":
+        valid &= np.all(np.isfinite(forecast_predictor), axis=-1)
+    else:
+        valid &= np.isfinite(forecast_predictor)
+
+    unsatisfactory_points = 0
+    for index in np.flatnonzero(np.any(valid, axis=1)):
+        point_valid = valid[index]
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            optimised_coeffs[index] = minimiser.minimise_arrays(
+                initial_guess, forecast_predictor[index][point_valid],
+                truth[index][point_valid], forecast_var[index][point_valid],
+                predictor_of_mean_flag, distribution)
+        if any(issubclass(warning.category, UserWarning)
+               for warning in caught):
+            unsatisfactory_points += 1
+    return optimised_coeffs, unsatisfactory_points
+
 
 class EstimateCoefficientsForEnsembleCalibration(BasePlugin):
     """
@@ -419,7 +816,8 @@ class EstimateCoefficientsForEnsembleCalibration(BasePlugin):
 
     def __init__(self, distribution, current_cycle, desired_units=None,
                  predictor_of_mean_flag="mean", tolerance=0.01,
-                 max_iterations=1000):
+                 max_iterations=1000, use_gradient=False,
+                 point_by_point=False, processes=1):
         """
         Create an ensemble calibration plugin that, for Nonhomogeneous Gaussian
         Regression, calculates coefficients based on historical forecasts and
@@ -458,9 +856,23 @@ class EstimateCoefficientsForEnsembleCalibration(BasePlugin):
                 predictor_of_mean is "realizations", then the number of
                 iterations may require increasing, as there will be
                 more coefficients to solve for.
+            use_gradient (bool):
+                If True, minimise the CRPS using the L-BFGS-B algorithm with
+                analytic gradients, falling back to the Nelder-Mead algorithm
+                if this does not converge.
+            point_by_point (bool):
+                If True, estimate a separate set of coefficients for each
+                grid point or spot site, using the historic forecasts and
+                truths at that point alone. Otherwise, a single set of
+                coefficients is estimated from all points.
+            processes (int):
+                Number of processes used to estimate the coefficients if
+                point_by_point is True. If 1, all points are processed in
+                this process.
 
         Raises:
             ValueError: If the given distribution is not valid.
+            ValueError: If processes is less than 1.
 
         Warns:
             ImportWarning: If the statsmodels module can't be imported.
@@ -472,6 +884,10 @@ class EstimateCoefficientsForEnsembleCalibration(BasePlugin):
                    "distributions are {}".format(
                        distribution, valid_distributions))
             raise ValueError(msg)
+        if processes < 1:
+            raise ValueError(
+                "Invalid number of processes: must be >= 1: {}".format(
+                    processes))
         self.distribution = distribution
         self.current_cycle = current_cycle
         self.desired_units = desired_units
@@ -481,7 +897,10 @@ class EstimateCoefficientsForEnsembleCalibration(BasePlugin):
         self.tolerance = tolerance
         self.max_iterations = max_iterations
         self.minimiser = ContinuousRankedProbabilityScoreMinimisers(
-            tolerance=self.tolerance, max_iterations=self.max_iterations)
+            tolerance=self.tolerance, max_iterations=self.max_iterations,
+            use_gradient=use_gradient)
+        self.point_by_point = point_by_point
+        self.processes = processes
 
         # Setting default values for coeff_names. Beta is the final
         # coefficient name in the list, as there can potentially be
@@ -518,11 +937,126 @@ class EstimateCoefficientsForEnsembleCalibration(BasePlugin):
                   'minimiser: {}; '
                   'coeff_names: {}; '
                   'tolerance: {}; '
-                  'max_iterations: {}>')
+                  'max_iterations: {}; '
+                  'point_by_point: {}; '
+                  'processes: {}>')
         return result.format(
             self.distribution, self.current_cycle, self.desired_units,
             self.predictor_of_mean_flag, self.minimiser.__class__,
-            self.coeff_names, self.tolerance, self.max_iterations)
+            self.coeff_names, self.tolerance, self.max_iterations,
+            self.point_by_point, self.processes)
+
+    @staticmethod
+    def _spatial_dims(cube):
+        """
+        Find the dimensions of a cube which are neither time nor realization
+        dimensions, i.e. the dimensions of the grid or the spot sites.
+
+        Args:
+            cube (iris.cube.Cube):
+                Cube of historic forecasts, truths or predictors.
+
+        Returns:
+            list of int:
+                Spatial dimensions of the cube, in ascending order.
+        """
+        other_dims = []
+        for coord_name in ["time", "realization"]:
+            if cube.coords(coord_name):
+                other_dims.extend(cube.coord_dims(coord_name))
+        return [dim for dim in range(cube.ndim) if dim not in other_dims]
+
+    def _data_by_point(self, cube):
+        """
+        Rearrange the data of a cube so that the leading dimension
+        runs over the grid points or spot sites, followed by the time
+        dimension and then any realization dimension. Masked data are
+        filled with NaN.
+
+        Args:
+            cube (iris.cube.Cube):
+                Cube of truths, ensemble variances or predictors.
+
+        Returns:
+            numpy.ndarray:
+                Data with shape (points, times) or
+                (points, times, realizations).
+        """
+        spatial_dims = self._spatial_dims(cube)
+        time_dims = list(cube.coord_dims("time"))
+        realization_dims = []
+        if cube.coords("realization"):
+            realization_dims = list(cube.coord_dims("realization"))
+        data = np.ma.filled(
+            np.ma.asarray(cube.data, dtype=np.float32), np.nan)
+        data = data.transpose(spatial_dims + time_dims + realization_dims)
+        data = data.reshape((-1,) + data.shape[len(spatial_dims):])
+        if not time_dims:
+            data = np.expand_dims(data, 1)
+        return data
+
+    def _estimate_coefficients_by_point(
+            self, initial_guess, forecast_predictor, truth, forecast_var):
+        """
+        Estimate a separate set of coefficients at each grid point or spot
+        site. The points are divided into chunks, which are processed in a
+        pool of worker processes if more than one process is requested.
+
+        Args:
+            initial_guess (numpy.ndarray):
+                Initial guess for the coefficients, used at every point.
+                Order of coefficients is [gamma, delta, alpha, beta].
+            forecast_predictor (iris.cube.Cube):
+                Cube containing the fields to be used as the predictor,
+                either the ensemble mean or the ensemble realizations.
+            truth (iris.cube.Cube):
+                Cube containing the field, which will be used as truth.
+            forecast_var (iris.cube.Cube):
+                Cube containg the field containing the ensemble variance.
+
+        Returns:
+            numpy.ndarray:
+                Optimised coefficients, with a leading coefficient dimension
+                followed by the spatial dimensions of the truth.
+
+        Warns:
+            Warning: If the minimisation did not converge, or did not reach
+                a stable solution, at some points.
+        """
+        spatial_shape = tuple(
+            truth.shape[dim] for dim in self._spatial_dims(truth))
+        arrays = [self._data_by_point(cube)
+                  for cube in [forecast_predictor, truth, forecast_var]]
+        n_points = len(arrays[1])
+        n_chunks = 1
+        if self.processes > 1:
+            n_chunks = max(1, min(n_points, 4 * self.processes))
+        minimiser_kwargs = {"tolerance": self.tolerance,
+                            "max_iterations": self.max_iterations,
+                            "use_gradient": self.minimiser.use_gradient}
+        tasks = [
+            (minimiser_kwargs, initial_guess, predictor, truth_data,
+             var_data, self.predictor_of_mean_flag, self.distribution.lower())
+            for predictor, truth_data, var_data in zip(
+                *[np.array_split(array, n_chunks) for array in arrays])]
+
+        if self.processes == 1:
+            results = [_minimise_at_points(*task) for task in tasks]
+        else:
+            # Workers are spawned rather than forked, as forking a process in
+            # which dask has started its thread pool can deadlock.
+            with multiprocessing.get_context('spawn').Pool(
+                    self.processes) as pool:
+                results = pool.starmap(_minimise_at_points, tasks)
+
+        unsatisfactory_points = sum(result[1] for result in results)
+        if unsatisfactory_points:
+            msg = ("Minimisation did not result in convergence, or did not "
+                   "reach a stable solution, at {} of {} points.".format(
+                       unsatisfactory_points, n_points))
+            warnings.warn(msg)
+        optimised_coeffs = np.concatenate([result[0] for result in results])
+        return optimised_coeffs.T.reshape((-1,) + spatial_shape)
 
     def create_coefficients_cube(
             self, optimised_coeffs, historic_forecast):
@@ -533,9 +1067,12 @@ class EstimateCoefficientsForEnsembleCalibration(BasePlugin):
            ensemble_calibration/create_coefficients_cube.rst
 
         Args:
-            optimised_coeffs (list):
+            optimised_coeffs (list or numpy.ndarray):
                 List of optimised coefficients.
                 Order of coefficients is [gamma, delta, alpha, beta].
+                If the coefficients have been estimated at each point, this
+                is an array with a leading coefficient dimension followed by
+                the spatial dimensions of the historic forecast.
             historic_forecast (iris.cube.Cube):
                 The cube containing the historic forecast.
 
@@ -546,7 +1083,11 @@ class EstimateCoefficientsForEnsembleCalibration(BasePlugin):
                 a coefficient_index dimension coordinate where the points
                 of the coordinate are integer values and a
                 coefficient_name auxiliary coordinate where the points of
-                the coordinate are e.g. gamma, delta, alpha, beta.
+                the coordinate are e.g. gamma, delta, alpha, beta. If the
+                coefficients have been estimated at each point, the cube also
+                has the spatial coordinates of the historic forecast.
+                Otherwise, the x and y coordinates are scalar coordinates
+                with bounds spanning the domain of the historic forecast.
 
         Raises:
             ValueError: If the number of coefficients in the optimised_coeffs
@@ -608,15 +1149,30 @@ class EstimateCoefficientsForEnsembleCalibration(BasePlugin):
                 time_coord = historic_forecast.coord("time").copy(time_point)
                 aux_coords_and_dims.append((time_coord, None))
 
-        # Create x and y coordinates
-        for axis in ["x", "y"]:
-            historic_coord_points = historic_forecast.coord(axis=axis).points
-            coord_point = np.median(historic_coord_points)
-            coord_bounds = [historic_coord_points[0],
-                            historic_coord_points[-1]]
-            new_coord = historic_forecast.coord(axis=axis).copy(
-                points=coord_point, bounds=coord_bounds)
-            aux_coords_and_dims.append((new_coord, None))
+        if np.ndim(optimised_coeffs) > 1:
+            # Copy the coordinates of the grid or the spot sites.
+            spatial_dims = self._spatial_dims(historic_forecast)
+            for coord in historic_forecast.coords():
+                coord_dims = historic_forecast.coord_dims(coord)
+                if not coord_dims or not set(coord_dims) <= set(spatial_dims):
+                    continue
+                new_dims = tuple(
+                    spatial_dims.index(dim) + 1 for dim in coord_dims)
+                if coord in historic_forecast.coords(dim_coords=True):
+                    dim_coords_and_dims.append((coord.copy(), new_dims[0]))
+                else:
+                    aux_coords_and_dims.append((coord.copy(), new_dims))
+        else:
+            # Create x and y coordinates
+            for axis in ["x", "y"]:
+                historic_coord_points = (
+                    historic_forecast.coord(axis=axis).points)
+                coord_point = np.median(historic_coord_points)
+                coord_bounds = [historic_coord_points[0],
+                                historic_coord_points[-1]]
+                new_coord = historic_forecast.coord(axis=axis).copy(
+                    points=coord_point, bounds=coord_bounds)
+                aux_coords_and_dims.append((new_coord, None))
 
         attributes = {"diagnostic_standard_name": historic_forecast.name()}
         for attribute in historic_forecast.attributes.keys():
@@ -847,7 +1403,9 @@ class EstimateCoefficientsForEnsembleCalibration(BasePlugin):
         6. Calculate initial guess at coefficient values by performing a
            linear regression, if requested, otherwise default values are
            used.
-        7. Perform minimisation.
+        7. Perform minimisation, either once using all points, or at each
+           point separately if point_by_point is True. In the latter case,
+           the initial guess from all points is used at each point.
 
         Args:
             historic_forecast (iris.cube.Cube):
@@ -865,7 +1423,9 @@ class EstimateCoefficientsForEnsembleCalibration(BasePlugin):
             iris.cube.Cube:
                 Cube containing the coefficients estimated using EMOS.
                 The cube contains a coefficient_index dimension coordinate
-                and a coefficient_name auxiliary coordinate.
+                and a coefficient_name auxiliary coordinate. If
+                point_by_point is True, the cube also has the spatial
+                dimensions of the historic forecast.
 
         Raises:
             ValueError: If either the historic_forecast or truth cubes were not
@@ -919,8 +1479,11 @@ class EstimateCoefficientsForEnsembleCalibration(BasePlugin):
             self.ESTIMATE_COEFFICIENTS_FROM_LINEAR_MODEL_FLAG,
             no_of_realizations=no_of_realizations)
 
+        if self.point_by_point:
+            optimised_coeffs = self._estimate_coefficients_by_point(
+                initial_guess, forecast_predictor, truth, forecast_var)
         # Calculate coefficients if there are no nans in the initial guess.
-        if np.any(np.isnan(initial_guess)):
+        elif np.any(np.isnan(initial_guess)):
             optimised_coeffs = initial_guess
         else:
             optimised_coeffs = (
@@ -1004,7 +1567,8 @@ class ApplyCoefficientsFromEnsembleCalibration(BasePlugin):
     def _spatial_domain_match(self):
         """
         Check that the domain of the current forecast and coefficients cube
-        match.
+        match. If the coefficients have been estimated at each point, the
+        x and y coordinates must match at every point.
 
         Raises:
             ValueError: If the domain information of the current_forecast and
@@ -1014,6 +1578,18 @@ class ApplyCoefficientsFromEnsembleCalibration(BasePlugin):
                "does not match the domain given by the coefficients cube {}.")
 
         for axis in ["x", "y"]:
+            coefficients_coord = self.coefficients_cube.coord(axis=axis)
+            if self.coefficients_cube.coord_dims(coefficients_coord):
+                current_forecast_points = (
+                    self.current_forecast.coord(axis=axis).points)
+                if (current_forecast_points.shape !=
+                        coefficients_coord.points.shape or
+                        not np.allclose(current_forecast_points,
+                                        coefficients_coord.points)):
+                    raise ValueError(
+                        msg.format(axis, current_forecast_points,
+                                   coefficients_coord.points))
+                continue
             current_forecast_points = [
                 self.current_forecast.coord(axis=axis).points[0],
                 self.current_forecast.coord(axis=axis).points[-1]]
@@ -1026,7 +1602,8 @@ class ApplyCoefficientsFromEnsembleCalibration(BasePlugin):
     def _calculate_location_parameter_from_mean(self, optimised_coeffs):
         """
         Function to calculate the location parameter when the ensemble mean at
-        each grid point is the predictor.
+        each grid point is the predictor. The coefficients are either scalars
+        or arrays on the grid or sites of the current forecast.
 
         Please see the equations below:
 
@@ -1065,7 +1642,8 @@ class ApplyCoefficientsFromEnsembleCalibration(BasePlugin):
             self, optimised_coeffs):
         """
         Function to calculate the location parameter when the ensemble
-        realizations are the predictor.
+        realizations are the predictor. The coefficients are either scalars
+        or arrays on the grid or sites of the current forecast.
 
         Please see the equations below:
 
@@ -1094,6 +1672,17 @@ class ApplyCoefficientsFromEnsembleCalibration(BasePlugin):
         # Calculate location parameter = a + b1*X1 .... + bn*Xn, where X is the
         # ensemble realizations. The number of b and X terms depends upon the
         # number of ensemble realizations. In this case, b = beta^2.
+        if np.ndim(optimised_coeffs["alpha"]) > 0:
+            realizations = np.moveaxis(
+                forecast_predictor.data,
+                forecast_predictor.coord_dims("realization")[0], 0)
+            beta_values = [optimised_coeffs[key] for key in optimised_coeffs
+                           if key.startswith("beta")]
+            location_parameter = optimised_coeffs["alpha"] + sum(
+                beta**2 * realization
+                for beta, realization in zip(beta_values, realizations))
+            return location_parameter.astype(np.float32)
+
         beta_values = np.array([], dtype=np.float32)
         for key in optimised_coeffs.keys():
             if key.startswith("beta"):
@@ -1193,7 +1782,10 @@ class ApplyCoefficientsFromEnsembleCalibration(BasePlugin):
                 The cube contains a coefficient_index dimension coordinate
                 where the points of the coordinate are integer values and a
                 coefficient_name auxiliary coordinate where the points of
-                the coordinate are e.g. gamma, delta, alpha, beta.
+                the coordinate are e.g. gamma, delta, alpha, beta. If the
+                coefficients have been estimated at each point, the cube also
+                has the spatial coordinates of the current forecast, and the
+                coefficients are applied at each point.
             landsea_mask (iris.cube.Cube or None):
                 The optional cube containing a land-sea mask. If provided, only
                 land points are calibrated using the provided coefficients.
@@ -48,11 +48,12 @@ from improver.ensemble_copula_coupling.utilities import (
     restore_non_probabilistic_dimensions)
 from improver.metadata.probabilistic import (
     find_percentile_coordinate, find_threshold_coordinate)
-from improver.utilities.cube_checker import (
-    check_cube_coordinates, check_for_x_and_y_axes)
+from improver.utilities.cube_checker import check_for_x_and_y_axes
 from improver.utilities.cube_manipulation import (
     concatenate_cubes, enforce_coordinate_ordering)
 from improver.utilities.indexing_operations import choose
+from improver.utilities.mathematical_operations import (
+    interpolate_multiple_rows)
 
 
 class RebadgePercentilesAsRealizations(BasePlugin):
@@ -242,17 +243,9 @@ class ResamplePercentiles(BasePlugin):
                 original_percentiles, forecast_at_reshaped_percentiles,
                 bounds_pairing))
 
-        forecast_at_interpolated_percentiles = (
-            np.empty(
-                (len(desired_percentiles),
-                 forecast_at_reshaped_percentiles.shape[0]),
-                dtype=np.float32
-            )
-        )
-        for index in range(forecast_at_reshaped_percentiles.shape[0]):
-            forecast_at_interpolated_percentiles[:, index] = np.interp(
-                desired_percentiles, original_percentiles,
-                forecast_at_reshaped_percentiles[index, :])
+        forecast_at_interpolated_percentiles = interpolate_multiple_rows(
+            desired_percentiles, original_percentiles,
+            forecast_at_reshaped_percentiles).T.astype(np.float32)
 
         # Reshape forecast_at_percentiles, so the percentiles dimension is
         # first, and any other dimension coordinates follow.
@@ -494,14 +487,9 @@ class GeneratePercentilesFromProbabilities(BasePlugin):
         percentiles_as_fractions = np.array(
             [x/100.0 for x in percentiles], dtype=np.float32)
 
-        forecast_at_percentiles = (
-            np.empty((len(percentiles), probabilities_for_cdf.shape[0]),
-                     dtype=np.float32)
-        )
-        for index in range(probabilities_for_cdf.shape[0]):
-            forecast_at_percentiles[:, index] = np.interp(
-                percentiles_as_fractions, probabilities_for_cdf[index, :],
-                threshold_points)
+        forecast_at_percentiles = interpolate_multiple_rows(
+            percentiles_as_fractions, probabilities_for_cdf,
+            threshold_points).T.astype(np.float32)
 
         # Reshape forecast_at_percentiles, so the percentiles dimension is
         # first, and any other dimension coordinates follow.
@@ -1114,16 +1102,18 @@ class EnsembleReordering(BasePlugin):
                 Cube for post-processed percentiles. The percentiles are
                 assumed to be in ascending order.
             raw_forecast_realizations (iris.cube.Cube):
-                Cube containing the raw (not post-processed) forecasts.
-                The probabilistic dimension is assumed to be the zeroth
-                dimension.
+                Cube containing the raw (not post-processed) forecasts,
+                with the same dimension coordinates as the post-processed
+                forecast, other than realization in place of percentile.
             random_ordering (bool):
                 If random_ordering is True, the post-processed forecasts are
                 reordered randomly, rather than using the ordering of the
                 raw ensemble.
             random_seed (int or None):
                 If random_seed is an integer, the integer value is used for
-                the random seed.
+                the random seed. The same random values are used to split
+                ties at every time, so that the result for each time does not
+                depend on the other times within the cubes.
                 If random_seed is None, no random seed is set, so the random
                 values generated are not reproducible.
 
@@ -1134,40 +1124,54 @@ class EnsembleReordering(BasePlugin):
                 the ranking from the raw ensemble.
 
         """
-        results = iris.cube.CubeList([])
-        for rawfc, calfc in zip(
-                raw_forecast_realizations.slices_over("time"),
-                post_processed_forecast_percentiles.slices_over("time")):
-            if random_seed is not None:
-                random_seed = int(random_seed)
-            random_seed = np.random.RandomState(random_seed)
-            random_data = random_seed.rand(*rawfc.data.shape)
-            if random_ordering:
-                # Returns the indices that would sort the array.
-                # As these indices are from a random dataset, only an argsort
-                # is used.
-                ranking = np.argsort(random_data, axis=0)
-            else:
-                # Lexsort returns the indices sorted firstly by the
-                # primary key, the raw forecast data (unless random_ordering
-                # is enabled), and secondly by the secondary key, an array of
-                # random data, in order to split tied values randomly.
-                sorting_index = np.lexsort((random_data, rawfc.data), axis=0)
-                # Returns the indices that would sort the array.
-                ranking = np.argsort(sorting_index, axis=0)
-            # Index the post-processed forecast data using the ranking array.
-            # The following uses a custom choose function that reproduces the
-            # required elements of the np.choose method without the limitation
-            # of having < 32 arrays or a leading dimension < 32 in the
-            # input data array. This function allows indexing of a 3d array
-            # using a 3d array.
-            calfc.data = choose(ranking, calfc.data)
-            results.append(calfc)
-        # Ensure we haven't lost any dimensional coordinates with only one
-        # value in.
-        results = results.merge_cube()
-        results = check_cube_coordinates(
-            post_processed_forecast_percentiles, results)
+        # Order the dimensions of the raw forecast data to match those of
+        # the post-processed forecast.
+        raw_dims = [raw_forecast_realizations.coord_dims("realization")[0]]
+        for dim in range(1, post_processed_forecast_percentiles.ndim):
+            coord = post_processed_forecast_percentiles.coord(
+                dimensions=dim, dim_coords=True)
+            raw_dims.extend(
+                raw_forecast_realizations.coord_dims(coord.name()))
+        raw_data = np.transpose(raw_forecast_realizations.data, raw_dims)
+        try:
+            time_dims = post_processed_forecast_percentiles.coord_dims("time")
+        except CoordinateNotFoundError:
+            time_dims = ()
+
+        # Generate random data for splitting ties that is the same for every
+        # time, so that the reordering of each time does not depend on the
+        # other times within the cube.
+        if random_seed is not None:
+            random_seed = int(random_seed)
+        random_state = np.random.RandomState(random_seed)
+        slice_shape = [1 if dim in time_dims else length
+                       for dim, length in enumerate(raw_data.shape)]
+        random_data = random_state.rand(
+            *[length for dim, length in enumerate(raw_data.shape)
+              if dim not in time_dims])
+        random_data = np.broadcast_to(
+            random_data.reshape(slice_shape), raw_data.shape)
+
+        if random_ordering:
+            # Returns the indices that would sort the array.
+            # As these indices are from a random dataset, only an argsort
+            # is used.
+            ranking = np.argsort(random_data, axis=0)
+        else:
+            # Lexsort returns the indices sorted firstly by the
+            # primary key, the raw forecast data (unless random_ordering
+            # is enabled), and secondly by the secondary key, an array of
+            # random data, in order to split tied values randomly.
+            sorting_index = np.lexsort((random_data, raw_data), axis=0)
+            # Returns the indices that would sort the array.
+            ranking = np.argsort(sorting_index, axis=0)
+        # Index the post-processed forecast data using the ranking array.
+        # The following uses a custom choose function that reproduces the
+        # required elements of the np.choose method without the limitation
+        # of having < 32 arrays or a leading dimension < 32 in the
+        # input data array.
+        results = post_processed_forecast_percentiles.copy(
+            data=choose(ranking, post_processed_forecast_percentiles.data))
         return results
 
     def process(
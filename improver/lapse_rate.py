@@ -34,8 +34,6 @@ import iris
 import numpy as np
 from iris.analysis.maths import multiply
 from iris.exceptions import CoordinateNotFoundError
-from numpy.linalg import lstsq
-from scipy.ndimage import generic_filter
 
 from improver import BasePlugin
 from improver.constants import DALR
@@ -115,51 +113,6 @@ def apply_gridded_lapse_rate(temperature, lapse_rate, source_orog, dest_orog):
     return iris.cube.CubeList(adjusted_temperature).merge_cube()
 
 
-class SaveNeighbourhood:
-    """Saves the neighbourhood around each central point.
-
-    The "generic_filter" module extracts the neighbourhood around each
-    point as "buffer". This buffer is passed to the "SaveNeighbourhood" class.
-    The "filter" function then saves this buffer into the "allbuffers" array.
-
-    """
-    def __init__(self, allbuffers):
-        """Initialise the class.
-
-        Create the global variables that allows the "filter" function
-        to save each extracted buffer into "allbuffers".
-
-        Args:
-            allbuffers (numpy.ndarray):
-                Where to save each extracted buffer.
-
-        """
-        # Initialises the iterator.
-        self.i = 0
-        # Saves all the buffers into this array.
-        self.allbuffers = allbuffers
-
-    def filter(self, buffer):
-        """Defines filter function to be applied to extracted buffers.
-
-        Saves the contents of the buffer into "allbuffers" array. Therefore
-        a return value isn't required. However "generic_filter"
-        requires a return value - so use zero.
-
-        Args:
-            buffer (numpy.ndarray):
-                Array containing neighourbood points.
-
-        Returns:
-            zero (float)
-                Blank return value required by "generic_filter".
-
-        """
-        self.allbuffers[self.i, :] = buffer
-        self.i += 1
-        return 0.0
-
-
 class LapseRate(BasePlugin):
     """
     Plugin to calculate the lapse rate from orography and temperature
@@ -172,26 +125,24 @@ class LapseRate(BasePlugin):
     Code methodology:
 
     1) Apply land/sea mask to temperature and orography datasets. Mask sea
-       points as NaN since image processing module does not recognise Numpy
-       masks.
-    2) Extracts neighbourhoods from both datasets:
-       Apply "generic_filter" image processing module to temperature data
-       to extract a neighbourhood for each single point and save this
-       neighbourhood into a larger array.
-       Repeat for orography data.
-       generic_filter mode="constant" ensures that points beyond edges of
-       dataset will be filled with "cval". (NaN in this case)
-    3) For all the stored orography neighbourhoods - take the neighbours around
-       the central point and create a mask where the height difference from
-       the central point is greater than 35m.
-    4) Loop through array of neighbourhoods and take the height and temperature
-       of all grid points and calculate the
-       temperature/height gradient = lapse rate
-    5) Constrain the returned lapse rates between min_lapse_rate and
+       points as NaN. Points beyond the edges of the datasets are also
+       treated as NaN.
+    2) For each offset within the neighbourhood, compare the neighbouring
+       points with the central points of all neighbourhoods at once. Exclude
+       neighbours with NaN temperatures or where the height difference from
+       the central point is greater than 35m, and accumulate the sums needed
+       for a least-squares fit over the remaining points.
+    3) Calculate the temperature/height gradient = lapse rate of every
+       neighbourhood, for all realizations together, from the closed form of
+       the least-squares fit.
+    4) Constrain the returned lapse rates between min_lapse_rate and
        max_lapse_rate. These default to > DALR and < -3.0*DALR but are user
        configurable
     """
 
+    # Approximate number of rows of a single realization processed at once.
+    ROWS_PER_BLOCK = 32
+
     def __init__(self, max_height_diff=35, nbhood_radius=7,
                  max_lapse_rate=-3*DALR, min_lapse_rate=DALR):
         """
@@ -239,12 +190,6 @@ class LapseRate(BasePlugin):
         # central point.
         self.nbhood_size = int((2*nbhood_radius) + 1)
 
-        # generic_filter extracts the neighbourhood and returns a 1D array.
-        # ind_central_point indicates where the central point would be on
-        # this array
-        self.nbhoodarray_size = self.nbhood_size**2
-        self.ind_central_point = int(self.nbhoodarray_size/2)
-
     def __repr__(self):
         """Represent the configured plugin instance as a string."""
         desc = ('<LapseRate: max_height_diff: {}, nbhood_radius: {},'
@@ -253,81 +198,133 @@ class LapseRate(BasePlugin):
                         self.max_lapse_rate, self.min_lapse_rate))
         return desc
 
-    def _calc_lapse_rate(self, temperature, orography):
-        """Function to calculate the lapse rate.
+    def _calc_lapse_rates(self, temperature, orography):
+        """Function to calculate the lapse rates.
 
-        This holds the function to determine the local lapse rate at a point by
-        calculating a least-squares fit to local temperature and altitude data
-        to find the local lapse rate.
+        This determines the local lapse rate at every point by calculating a
+        least-squares fit to the temperature and altitude data of the
+        neighbouring points, excluding those with NaN temperatures or a
+        height difference from the central point of at least
+        max_height_diff. Rather than extracting every neighbourhood, the sums
+        required by the fit are accumulated over the offsets within the
+        neighbourhood, relative to the central points.
 
         Args:
-            temperature (1D numpy.ndarray):
-                Contains the temperature values for the central point and its
-                neighbours.
+            temperature (numpy.ndarray):
+                3D array of temperatures, with NaN at sea points, for which
+                the leading dimension is realization.
 
-            orography (1D numpy.ndarray):
-                Contains the height values for the central point and its
-                neighbours.
+            orography (numpy.ndarray):
+                2D array of heights, with NaN at sea points.
 
         Returns:
-            float:
-                The gradient of the temperature/orography values. This
-                represents the lapse rate.
+            numpy.ndarray:
+                3D array of the gradients of the temperature/orography values,
+                which represent the lapse rates. DALR is returned where the
+                central temperature is NaN, or all the temperatures and
+                heights in the neighbourhood are the same.
 
         """
-
-        # If central point NaN then return blank value.
-        if np.isnan(temperature[self.ind_central_point]):
-            return DALR
-
-        # Remove points where there are NaN temperature values from both arrays
-        # before calculation.
-        y_data = temperature[~np.isnan(temperature)]
-        x_data = orography[~np.isnan(temperature)]
-
-        # Return DALR if standard deviation of both datasets = 0 (where all
-        # points are the same value).
-        if np.isclose(np.std(x_data), 0.0) and np.isclose(np.std(y_data), 0.0):
-            return DALR
-
-        matrix = np.stack([x_data, np.ones(len(x_data))], axis=0).T
-        gradient, _ = lstsq(matrix, y_data, rcond=None)[0]
-
+        # Neighbourhoods are compared in the precision of the extracted
+        # data, with the fit itself calculated in double precision.
+        temperature = temperature.astype(np.float32)
+        orography = orography.astype(np.float32)
+        radius = self.nbhood_radius
+        padded_temperature = np.pad(
+            temperature, ((0, 0), (radius, radius), (radius, radius)),
+            mode='constant', constant_values=np.nan).astype(np.float64)
+        padded_orography = np.pad(
+            orography, radius, mode='constant', constant_values=np.nan)
+
+        # Process blocks of rows, so that the arrays of sums remain small
+        # enough to be held in the cache.
+        block_rows = max(1, self.ROWS_PER_BLOCK // temperature.shape[0])
+        gradient = np.empty(temperature.shape, dtype=np.float32)
+        for start in range(0, temperature.shape[1], block_rows):
+            stop = min(start + block_rows, temperature.shape[1])
+            gradient[:, start:stop] = self._calc_block_lapse_rates(
+                padded_temperature[:, start:stop + 2*radius],
+                padded_orography[start:stop + 2*radius])
         return gradient
 
-    def _create_heightdiff_mask(self, all_orog_subsections):
-        """
-        Function to create a mask for any neighbouring points where the height
-        difference from the central point is greater than max_height_diff.
-
-        Slice through the orography subsection array to remove central
-        points.
-        Extracts the height value of each central point and masks out the
-        neighbouring points where their height difference is greater than
-        the maximum.
+    def _calc_block_lapse_rates(self, temperature, orography):
+        """Function to calculate the lapse rates of a block of rows.
 
         Args:
-            all_orog_subsections(2D numpy.ndarray):
-               Each row contains the height values of each neighbourhood.
+            temperature (numpy.ndarray):
+                3D array of temperatures, padded with NaN by nbhood_radius
+                points in the spatial dimensions.
+
+            orography (numpy.ndarray):
+                2D array of heights, padded with NaN by nbhood_radius points.
 
         Returns:
             numpy.ndarray:
-                A 2D array of boolean values.
+                3D array of lapse rates for the points within the padding.
 
         """
-
-        self.all_orog_subsections = all_orog_subsections
-
-        central_points = self.all_orog_subsections[:, self.ind_central_point]
-        central_points = np.swapaxes([central_points], 0, 1)
-
-        height_diff = np.subtract(self.all_orog_subsections, central_points)
-        height_diff = np.absolute(height_diff)
-
-        height_diff_mask = np.where(height_diff >= self.max_height_diff, True,
-                                    False)
-
-        return height_diff_mask
+        radius = self.nbhood_radius
+        ny = orography.shape[0] - 2*radius
+        nx = orography.shape[1] - 2*radius
+        central_temperature = temperature[:, radius:radius+ny,
+                                          radius:radius+nx]
+        central_orography = orography[radius:radius+ny, radius:radius+nx]
+        central_height = central_orography.astype(np.float64)
+
+        # Sums over the points included in the fit of the values relative to
+        # those of the central point, which is itself included unless its
+        # temperature is NaN.
+        shape = central_temperature.shape
+        count = np.zeros(shape)
+        sum_x = np.zeros(shape)
+        sum_y = np.zeros(shape)
+        sum_xx = np.zeros(shape)
+        sum_xy = np.zeros(shape)
+        sum_yy = np.zeros(shape)
+
+        for i in range(self.nbhood_size):
+            for j in range(self.nbhood_size):
+                neighbour_orography = orography[i:i+ny, j:j+nx]
+                with np.errstate(invalid='ignore'):
+                    excluded = (np.absolute(
+                        neighbour_orography - central_orography) >=
+                        self.max_height_diff)
+                x_data = np.where(
+                    excluded, np.nan, neighbour_orography - central_height)
+                y_data = (temperature[:, i:i+ny, j:j+nx] -
+                          central_temperature) + x_data * 0.
+                valid = ~np.isnan(y_data)
+                x_data = np.where(valid, x_data, 0.)
+                y_data[~valid] = 0.
+                count += valid
+                sum_x += x_data
+                sum_y += y_data
+                sum_xx += x_data * x_data
+                sum_xy += x_data * y_data
+                sum_yy += y_data * y_data
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            gradient = ((count * sum_xy - sum_x * sum_y) /
+                        (count * sum_xx - sum_x * sum_x))
+
+            # Where all the heights are the same the least-squares problem is
+            # rank deficient, so use the minimum norm solution.
+            constant_x = sum_xx == 0.
+            mean_temperature = central_temperature + sum_y / count
+            gradient = np.where(
+                constant_x,
+                central_height * mean_temperature /
+                (central_height * central_height + 1.),
+                gradient)
+
+        # Return DALR if all points have the same values, or if the central
+        # point is NaN.
+        dalr_points = (constant_x & (sum_yy == 0.)) | (count == 0.)
+        if not self.max_height_diff > 0:
+            dalr_points[...] = True
+        gradient = np.where(dalr_points, DALR, gradient)
+
+        return gradient.astype(np.float32)
 
     def process(self, temperature_cube, orography_cube, land_sea_mask_cube):
         """Calculates the lapse rate from the temperature and orography cubes.
@@ -384,82 +381,35 @@ class LapseRate(BasePlugin):
         # Fill sea points with NaN values.
         orography_data = np.where(land_sea_mask, orography_data, np.nan)
 
-        # Extract data array dimensions to define output arrays.
-        dataarray_shape = next(temperature_cube.slices([y_coord,
-                                                        x_coord])).shape
-        dataarray_size = dataarray_shape[0] * dataarray_shape[1]
-
-        # Array containing all of the subsections extracted from data array.
-        # Also enforce single precision to speed up calculations.
-        all_temp_subsections = np.zeros(
-            (dataarray_size, self.nbhoodarray_size), dtype=np.float32)
-        all_orog_subsections = np.zeros(
-            (dataarray_size, self.nbhoodarray_size), dtype=np.float32)
-
         # Attempts to extract realizations. If cube doesn't contain the
         # dimension then place within list.
         try:
-            slices_over_realization = temperature_cube.slices_over(
-                "realization")
+            slices_over_realization = list(temperature_cube.slices_over(
+                "realization"))
         except iris.exceptions.CoordinateNotFoundError:
             slices_over_realization = [temperature_cube]
 
+        # Fill sea points with NaN values, and calculate the lapse rates of
+        # all realizations together.
+        temperature_data = np.stack(
+            [np.where(land_sea_mask, temp_slice.data, np.nan)
+             for temp_slice in slices_over_realization])
+        lapse_rate_data = self._calc_lapse_rates(temperature_data,
+                                                 orography_data)
+
+        # Enforces upper and lower limits on lapse rate values.
+        lapse_rate_data = np.where(lapse_rate_data < self.min_lapse_rate,
+                                   self.min_lapse_rate, lapse_rate_data)
+        lapse_rate_data = np.where(lapse_rate_data > self.max_lapse_rate,
+                                   self.max_lapse_rate, lapse_rate_data)
+
         # Creates cube list to hold lapse rate data.
         lapse_rate_cube_list = iris.cube.CubeList([])
 
-        for temp_slice in slices_over_realization:
-
+        for temp_slice, lapse_rate_array in zip(slices_over_realization,
+                                                lapse_rate_data):
             # Create slice to store lapse rate values.
             lapse_rate_slice = temp_slice
-
-            temperature_data = temp_slice.data
-
-            # Fill sea points with NaN values. Can't use Numpy mask since not
-            # recognised by "generic_filter" function.
-            temperature_data = np.where(land_sea_mask, temperature_data,
-                                        np.nan)
-
-            # Saves all neighbourhoods into "all_temp_subsections".
-            # cval is value given to points outside the array.
-            fnc = SaveNeighbourhood(allbuffers=all_temp_subsections)
-            generic_filter(temperature_data, fnc.filter,
-                           size=self.nbhood_size,
-                           mode='constant', cval=np.nan)
-
-            fnc = SaveNeighbourhood(allbuffers=all_orog_subsections)
-            generic_filter(orography_data, fnc.filter,
-                           size=self.nbhood_size,
-                           mode='constant', cval=np.nan)
-
-            # height_diff_mask is True for points where the height
-            # difference between the central point and its neighbours
-            # is > max_height_diff.
-            height_diff_mask = self._create_heightdiff_mask(
-                all_orog_subsections)
-
-            # Mask points with extreme height differences as NaN.
-            all_orog_subsections = np.where(height_diff_mask, np.nan,
-                                            all_orog_subsections)
-            all_temp_subsections = np.where(height_diff_mask, np.nan,
-                                            all_temp_subsections)
-
-            # Loop through both arrays and find gradient of each subsection.
-            # The gradient indicates lapse rate - save into another array.
-            # TODO: This for loop is the bottleneck in the code and needs to
-            # be parallelised.
-            lapse_rate_array = [self._calc_lapse_rate(temp, orog)
-                                for temp, orog in zip(all_temp_subsections,
-                                                      all_orog_subsections)]
-
-            lapse_rate_array = np.array(
-                lapse_rate_array, dtype=np.float32).reshape(dataarray_shape)
-
-            # Enforces upper and lower limits on lapse rate values.
-            lapse_rate_array = np.where(lapse_rate_array < self.min_lapse_rate,
-                                        self.min_lapse_rate, lapse_rate_array)
-            lapse_rate_array = np.where(lapse_rate_array > self.max_lapse_rate,
-                                        self.max_lapse_rate, lapse_rate_array)
-
             lapse_rate_slice.data = lapse_rate_array
             lapse_rate_cube_list.append(lapse_rate_slice)
 
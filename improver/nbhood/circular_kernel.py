@@ -221,7 +221,7 @@ class GeneratePercentilesFromACircularNeighbourhood:
     A maximum kernel radius of 500 grid cells is imposed in order to
     avoid computational ineffiency and possible memory errors.
     """
-    def __init__(self, percentiles=DEFAULT_PERCENTILES):
+    def __init__(self, percentiles=DEFAULT_PERCENTILES, num_bins=None):
         """
         Initialise class.
 
@@ -229,18 +229,182 @@ class GeneratePercentilesFromACircularNeighbourhood:
             percentiles (list or float):
                 Percentile values at which to calculate; if not provided uses
                 DEFAULT_PERCENTILES.
-
+            num_bins (int or None):
+                If None, the exact percentiles of the values within each
+                neighbourhood are calculated. Otherwise, the percentiles are
+                calculated from a histogram of the neighbourhood values with
+                this number of bins. This is exact if the data contain no
+                more than num_bins distinct values, and approximate
+                otherwise, but the cost does not increase with the size of
+                the neighbourhood.
+
+        Raises:
+            ValueError: If num_bins is less than 1.
         """
         try:
             self.percentiles = tuple(percentiles)
         except TypeError:
             self.percentiles = tuple([percentiles])
+        if num_bins is not None and num_bins < 1:
+            raise ValueError(
+                "Invalid number of bins: must be >= 1: {}".format(num_bins))
+        self.num_bins = num_bins
 
     def __repr__(self):
         """Represent the configured class instance as a string."""
         result = ('<GeneratePercentilesFromACircularNeighbourhood: '
-                  'percentiles: {}>')
-        return result.format(self.percentiles)
+                  'percentiles: {}, num_bins: {}>')
+        return result.format(self.percentiles, self.num_bins)
+
+    @staticmethod
+    def _neighbourhood_windows(padded, window_mask):
+        """
+        Create a read-only view of a padded array containing the rectangular
+        window of points around each point of the unpadded domain.
+
+        Args:
+            padded (numpy.ndarray):
+                2D array padded with a halo of half the window size.
+            window_mask (numpy.ndarray):
+                2D boolean array defining the points within each window that
+                form the neighbourhood.
+
+        Returns:
+            numpy.ndarray:
+                4D view of the padded array, where element [i, j, k, l] is
+                point [k, l] of the window for point [i, j] of the unpadded
+                domain.
+        """
+        shape = (padded.shape[0] - window_mask.shape[0] + 1,
+                 padded.shape[1] - window_mask.shape[1] + 1)
+        return np.lib.stride_tricks.as_strided(
+            padded, shape=shape + window_mask.shape,
+            strides=padded.strides * 2, writeable=False)
+
+    def _exact_percentiles(self, padded, window_mask):
+        """
+        Calculate the percentiles of the values within the neighbourhood of
+        each point of the unpadded domain.
+
+        The neighbourhood values are gathered for a block of rows at a time,
+        so that the memory used is limited to a few times the size of the
+        padded array, regardless of the size of the neighbourhood.
+
+        Args:
+            padded (numpy.ndarray):
+                2D array padded with a halo of half the window size.
+            window_mask (numpy.ndarray):
+                2D boolean array defining the points within each window that
+                form the neighbourhood.
+
+        Returns:
+            numpy.ndarray:
+                Array of percentiles, with the percentiles as the leading
+                dimension, followed by the dimensions of the unpadded domain.
+        """
+        windows = self._neighbourhood_windows(padded, window_mask)
+        n_rows, n_columns = windows.shape[:2]
+        n_points = np.count_nonzero(window_mask)
+        block_size = max(1, padded.size // (n_points * n_columns))
+
+        perc_data = np.empty((len(self.percentiles), n_rows, n_columns),
+                             dtype=np.float32)
+        for start in range(0, n_rows, block_size):
+            block = slice(start, start + block_size)
+            perc_data[:, block] = np.percentile(
+                windows[block][..., window_mask],
+                np.array(self.percentiles, dtype=np.float32),
+                axis=-1)
+        return perc_data
+
+    def _binned_percentiles(self, padded, window_mask):
+        """
+        Calculate the percentiles of the values within the neighbourhood of
+        each point of the unpadded domain from a histogram of the
+        neighbourhood values.
+
+        For each bin in turn, the number of neighbourhood points with values
+        up to the upper edge of the bin is calculated as a convolution of the
+        window with the points below that edge. Each order statistic that
+        is needed to interpolate the requested percentiles is then found from
+        the first bin in which this count exceeds its rank.
+
+        If the data contain no more than num_bins distinct values, these
+        values are used as the bins and the percentiles are exact.
+        Otherwise, num_bins equal width bins spanning the data are used,
+        and the order statistics are linearly interpolated within each bin.
+        NaN values are excluded from the bins, and the percentiles of any
+        neighbourhood containing a NaN value are NaN, as for numpy.percentile.
+
+        Args:
+            padded (numpy.ndarray):
+                2D array padded with a halo of half the window size.
+            window_mask (numpy.ndarray):
+                2D boolean array defining the points within each window that
+                form the neighbourhood.
+
+        Returns:
+            numpy.ndarray:
+                Array of percentiles, with the percentiles as the leading
+                dimension, followed by the dimensions of the unpadded domain.
+        """
+        n_points = np.count_nonzero(window_mask)
+        n_rows = padded.shape[0] - window_mask.shape[0] + 1
+        n_columns = padded.shape[1] - window_mask.shape[1] + 1
+
+        nan_points = np.isnan(padded)
+        bin_edges = np.unique(padded[~nan_points])
+        exact = len(bin_edges) <= self.num_bins
+        if not exact:
+            bin_edges = np.linspace(
+                bin_edges[0], bin_edges[-1], self.num_bins + 1)
+
+        # Ranks of the order statistics either side of each percentile, as
+        # used for linear interpolation by numpy.percentile.
+        positions = (n_points - 1) * np.array(self.percentiles) / 100.
+        lower_ranks = np.floor(positions).astype(int)
+        upper_ranks = np.minimum(lower_ranks + 1, n_points - 1)
+        ranks = np.unique(np.concatenate([lower_ranks, upper_ranks]))
+        order_statistics = np.full((len(ranks), n_rows, n_columns), np.nan)
+
+        # The neighbourhood count is a circular convolution of the padded
+        # domain with the window, which does not wrap around for any point
+        # within the unpadded domain.
+        kernel_fft = np.fft.rfft2(window_mask[::-1, ::-1], s=padded.shape)
+
+        def neighbourhood_count(points):
+            """Count the points within the neighbourhood of each point."""
+            count = np.fft.irfft2(
+                np.fft.rfft2(points) * kernel_fft, s=padded.shape)
+            return np.rint(count[window_mask.shape[0]-1:,
+                                 window_mask.shape[1]-1:])
+
+        lower_count = np.zeros((n_rows, n_columns))
+        if exact:
+            lower_edges = upper_edges = bin_edges
+        else:
+            lower_edges, upper_edges = bin_edges[:-1], bin_edges[1:]
+        for lower_edge, upper_edge in zip(lower_edges, upper_edges):
+            upper_count = neighbourhood_count(padded <= upper_edge)
+            for index, rank in enumerate(ranks):
+                found = (upper_count > rank) & np.isnan(
+                    order_statistics[index])
+                if exact:
+                    order_statistics[index][found] = upper_edge
+                else:
+                    fraction = ((rank + 0.5 - lower_count[found]) /
+                                (upper_count[found] - lower_count[found]))
+                    order_statistics[index][found] = (
+                        lower_edge + fraction * (upper_edge - lower_edge))
+            lower_count = upper_count
+
+        lower_values = order_statistics[np.searchsorted(ranks, lower_ranks)]
+        upper_values = order_statistics[np.searchsorted(ranks, upper_ranks)]
+        weights = (positions - lower_ranks)[:, np.newaxis, np.newaxis]
+        perc_data = lower_values + weights * (upper_values - lower_values)
+        if nan_points.any():
+            perc_data[:, neighbourhood_count(nan_points) > 0] = np.nan
+        return perc_data.astype(np.float32)
 
     def pad_and_unpad_cube(self, slice_2d, kernel):
         """
@@ -358,36 +522,18 @@ class GeneratePercentilesFromACircularNeighbourhood:
         ranges_xy[1] = int(np.floor(kernel.shape[1] / 2.0))
         padded = np.pad(slice_2d.data, ranges_xy, mode='mean',
                         stat_length=np.max(ranges_xy))
-        padshape = np.shape(padded)  # Store size to make unflatten easier
-        padded = padded.flatten()
-        # Add 2nd dimension with each point's neighbourhood points along it.
-        # nbhood_slices is a list of numpy arrays where each array contains the
-        # total number of points within the padded array. The number of arrays
-        # is equal to the number of points within the kernel.
-        nbhood_slices = [
-            np.roll(padded, (padshape[1]*j)+i)
-            for i in range(-ranges_xy[1], ranges_xy[1]+1)
-            for j in range(-ranges_xy[0], ranges_xy[0]+1)
-            if kernel[..., i+ranges_xy[1], j+ranges_xy[0]] > 0.]
-
-        # Collapse this dimension into percentiles (a new 2nd dimension)
-        perc_data = np.percentile(
-            nbhood_slices,
-            np.array(self.percentiles, dtype=np.float32),
-            axis=0
-        )
-
-        # Convert back to float32 (np.percentile always gives float64 here...)
-        perc_data = perc_data.astype(np.float32)
-
-        # Return to 3D
-        perc_data = perc_data.reshape(
-            len(self.percentiles), padshape[0], padshape[1])
+        # Boolean mask of the points within the window around each point
+        # that form its neighbourhood, oriented to match the kernel.
+        window_mask = kernel[::-1, ::-1].T > 0.
+
+        if self.num_bins is None:
+            perc_data = self._exact_percentiles(padded, window_mask)
+        else:
+            perc_data = self._binned_percentiles(padded, window_mask)
+
         # Create a cube for these data:
         pctcube = self.make_percentile_cube(slice_2d)
-        # And put in data, removing the padding
-        pctcube.data = perc_data[:, ranges_xy[0]:-ranges_xy[0],
-                                 ranges_xy[1]:-ranges_xy[1]]
+        pctcube.data = perc_data
         return pctcube
 
     def run(self, cube, radius, mask_cube=None):
@@ -38,10 +38,12 @@ from improver.constants import DEFAULT_PERCENTILES
 from improver.metadata.forecast_times import forecast_period_coord
 from improver.nbhood.circular_kernel import (
     CircularNeighbourhood, GeneratePercentilesFromACircularNeighbourhood)
-from improver.nbhood.square_kernel import SquareNeighbourhood
+from improver.nbhood.square_kernel import (
+    MAX_RADIUS_IN_GRID_CELLS, SquareNeighbourhood)
 from improver.utilities.cube_checker import (
     check_cube_coordinates, find_dimension_coordinate_mismatch)
-from improver.utilities.cube_manipulation import concatenate_cubes
+from improver.utilities.spatial import (
+    convert_distance_into_number_of_grid_cells)
 
 
 class BaseNeighbourhoodProcessing(BasePlugin):
@@ -59,7 +61,8 @@ class BaseNeighbourhoodProcessing(BasePlugin):
 
     """
 
-    def __init__(self, neighbourhood_method, radii, lead_times=None):
+    def __init__(self, neighbourhood_method, radii, lead_times=None,
+                 chunk_realizations=False):
         """
         Create a neighbourhood processing plugin that applies a smoothing
         to points in a cube.
@@ -77,8 +80,13 @@ class BaseNeighbourhoodProcessing(BasePlugin):
                 List of lead times or forecast periods, at which the radii
                 within 'radii' are defined. The lead times are expected
                 in hours.
+            chunk_realizations (bool):
+                If True, realise and process one realization of the cube at
+                a time, rather than the whole cube at once. This bounds the
+                memory needed for the input data of lazily loaded cubes.
         """
         self.neighbourhood_method = neighbourhood_method
+        self.chunk_realizations = chunk_realizations
 
         if isinstance(radii, list):
             self.radii = [float(x) for x in radii]
@@ -112,6 +120,104 @@ class BaseNeighbourhoodProcessing(BasePlugin):
         radii = np.interp(cube_lead_times, self.lead_times, self.radii)
         return radii
 
+    @staticmethod
+    def _realization_chunks(cube):
+        """
+        Split a cube into single realizations, keeping the realization
+        dimension, so that each can be realised and processed in turn.
+
+        Args:
+            cube (iris.cube.Cube):
+                Cube to be split.
+
+        Returns:
+            list of iris.cube.Cube:
+                Cubes containing a single realization each, or the input
+                cube if it has no realization dimension.
+        """
+        if not cube.coords('realization', dim_coords=True):
+            return [cube]
+        realization_dim, = cube.coord_dims('realization')
+        chunks = []
+        for index in range(cube.shape[realization_dim]):
+            keys = [slice(None)] * cube.ndim
+            keys[realization_dim] = slice(index, index + 1)
+            chunks.append(cube[tuple(keys)])
+        return chunks
+
+    def _radius_blocks(self, cube):
+        """
+        Split a cube into contiguous blocks of time slices that share the
+        same neighbourhood radius in grid cells, so that each block can be
+        neighbourhood processed in a single call.
+
+        Args:
+            cube (iris.cube.Cube):
+                Cube to be neighbourhood processed.
+
+        Returns:
+            list of tuple:
+                Tuples of the cube for each block and the radius in metres
+                with which to process it.
+        """
+        if self.lead_times is None:
+            return [(cube, self.radii)]
+
+        # Interpolate to find the radius at each required lead time.
+        fp_coord = forecast_period_coord(cube)
+        fp_coord.convert_units("hours")
+        required_radii = self._find_radii(cube_lead_times=fp_coord.points)
+        if len(required_radii) == 1:
+            return [(cube, required_radii[0])]
+
+        time_dim, = cube.coord_dims('time')
+        grid_cells = [
+            convert_distance_into_number_of_grid_cells(
+                cube, radius,
+                max_distance_in_grid_cells=MAX_RADIUS_IN_GRID_CELLS)
+            for radius in required_radii]
+        blocks = []
+        start = 0
+        for index in range(1, len(grid_cells) + 1):
+            if (index == len(grid_cells) or
+                    grid_cells[index] != grid_cells[start]):
+                keys = [slice(None)] * cube.ndim
+                keys[time_dim] = slice(start, index)
+                blocks.append((cube[tuple(keys)], required_radii[start]))
+                start = index
+        return blocks
+
+    @staticmethod
+    def _restore_time_coords(block, result):
+        """
+        Restore any auxiliary coordinates associated with the time dimension
+        of a block that have been demoted to scalar coordinates by the
+        neighbourhood method, as happens when the block contains a single
+        time, so that the blocks can be concatenated.
+
+        Args:
+            block (iris.cube.Cube):
+                Cube that was neighbourhood processed.
+            result (iris.cube.Cube):
+                Cube returned by the neighbourhood method. This is modified
+                in place.
+
+        Returns:
+            iris.cube.Cube:
+                Cube returned by the neighbourhood method, with auxiliary
+                coordinates on the time dimension.
+        """
+        if (not block.coords('time', dim_coords=True) or
+                not result.coords('time', dim_coords=True)):
+            return result
+        time_dim = result.coord_dims('time')
+        for coord in block.coords(dimensions=block.coord_dims('time'),
+                                  dim_coords=False):
+            if result.coords(coord.name(), dimensions=[]):
+                result.remove_coord(coord.name())
+                result.add_aux_coord(coord.copy(), time_dim)
+        return result
+
     def __repr__(self):
         """Represent the configured plugin instance as a string."""
         if callable(self.neighbourhood_method):
@@ -149,49 +255,29 @@ class BaseNeighbourhoodProcessing(BasePlugin):
                        self.neighbourhood_method))
             raise ValueError(msg)
 
-        # Check if a dimensional realization coordinate exists. If so, the
-        # cube is sliced, so that it becomes a scalar coordinate.
-        try:
-            cube.coord('realization', dim_coords=True)
-        except iris.exceptions.CoordinateNotFoundError:
-            slices_over_realization = [cube]
+        if self.chunk_realizations:
+            realization_chunks = self._realization_chunks(cube)
         else:
-            slices_over_realization = cube.slices_over("realization")
-
-        if np.isnan(cube.data).any():
-            raise ValueError("Error: NaN detected in input cube data")
-
-        cubes_real = []
-        for cube_realization in slices_over_realization:
-            if self.lead_times is None:
-                cube_new = self.neighbourhood_method.run(
-                    cube_realization, self.radii, mask_cube=mask_cube)
+            realization_chunks = [cube]
+
+        # Apply the neighbourhood processing to each contiguous block of
+        # time slices that share a radius, and join the blocks together
+        # along time.
+        cubes_real = iris.cube.CubeList([])
+        for cube_realization in realization_chunks:
+            cubes_time = iris.cube.CubeList([])
+            for block, radius in self._radius_blocks(cube_realization):
+                if np.isnan(block.data).any():
+                    raise ValueError("Error: NaN detected in input cube data")
+                cubes_time.append(self._restore_time_coords(
+                    block, self.neighbourhood_method.run(
+                        block, radius, mask_cube=mask_cube)))
+            if len(cubes_time) > 1:
+                cubes_real.append(cubes_time.concatenate_cube())
             else:
-                # Interpolate to find the radius at each required lead time.
-                fp_coord = forecast_period_coord(cube_realization)
-                fp_coord.convert_units("hours")
-                required_radii = self._find_radii(
-                    cube_lead_times=fp_coord.points)
-
-                cubes_time = iris.cube.CubeList([])
-                # Find the number of grid cells required for creating the
-                # neighbourhood, and then apply the neighbourhood
-                # processing method to smooth the field.
-                for cube_slice, radius in (
-                        zip(cube_realization.slices_over("time"),
-                            required_radii)):
-                    cube_slice = self.neighbourhood_method.run(
-                        cube_slice, radius, mask_cube=mask_cube)
-                    cubes_time.append(cube_slice)
-                if len(cubes_time) > 1:
-                    cube_new = concatenate_cubes(
-                        cubes_time, coords_to_slice_over=["time"])
-                else:
-                    cube_new = cubes_time[0]
-            cubes_real.append(cube_new)
+                cubes_real.append(cubes_time[0])
         if len(cubes_real) > 1:
-            combined_cube = concatenate_cubes(
-                cubes_real, coords_to_slice_over=["realization"])
+            combined_cube = cubes_real.concatenate_cube()
         else:
             combined_cube = cubes_real[0]
 
@@ -210,7 +296,8 @@ class GeneratePercentilesFromANeighbourhood(BaseNeighbourhoodProcessing):
 
     def __init__(
             self, neighbourhood_method, radii, lead_times=None,
-            percentiles=DEFAULT_PERCENTILES):
+            percentiles=DEFAULT_PERCENTILES, num_bins=None,
+            chunk_realizations=False):
         """
         Create a neighbourhood processing subclass that generates percentiles
         from a neighbourhood of points.
@@ -230,15 +317,25 @@ class GeneratePercentilesFromANeighbourhood(BaseNeighbourhoodProcessing):
             percentiles (list):
                 Percentile values at which to calculate; if not provided uses
                 DEFAULT_PERCENTILES.
+            num_bins (int or None):
+                If set, the percentiles are calculated from a histogram of
+                the neighbourhood values with this number of bins, rather
+                than exactly. See
+                GeneratePercentilesFromACircularNeighbourhood.
+            chunk_realizations (bool):
+                If True, realise and process one realization of the cube at
+                a time, rather than the whole cube at once.
         """
         super(GeneratePercentilesFromANeighbourhood, self).__init__(
-            neighbourhood_method, radii, lead_times=lead_times)
+            neighbourhood_method, radii, lead_times=lead_times,
+            chunk_realizations=chunk_realizations)
 
         methods = {
             "circular": GeneratePercentilesFromACircularNeighbourhood}
         try:
             method = methods[neighbourhood_method]
-            self.neighbourhood_method = method(percentiles=percentiles)
+            self.neighbourhood_method = method(
+                percentiles=percentiles, num_bins=num_bins)
         except KeyError:
             msg = ("The neighbourhood_method requested: {} is not a "
                    "supported method. Please choose from: {}".format(
@@ -254,7 +351,7 @@ class NeighbourhoodProcessing(BaseNeighbourhoodProcessing):
     def __init__(
             self, neighbourhood_method, radii, lead_times=None,
             weighted_mode=True, sum_or_fraction="fraction",
-            re_mask=False):
+            re_mask=False, chunk_realizations=False):
         """
         Create a neighbourhood processing subclass that applies a smoothing
         to points in a cube.
@@ -290,9 +387,13 @@ class NeighbourhoodProcessing(BaseNeighbourhoodProcessing):
                 mask is not applied. Therefore, the neighbourhood processing
                 may result in values being present in areas that were
                 originally masked.
+            chunk_realizations (bool):
+                If True, realise and process one realization of the cube at
+                a time, rather than the whole cube at once.
         """
         super(NeighbourhoodProcessing, self).__init__(
-            neighbourhood_method, radii, lead_times=lead_times)
+            neighbourhood_method, radii, lead_times=lead_times,
+            chunk_realizations=chunk_realizations)
 
         methods = {
             "circular": CircularNeighbourhood,
@@ -31,14 +31,13 @@
 """Module to apply a recursive filter to neighbourhooded data."""
 import warnings
 
-import iris
 import numpy as np
 
 from improver import BasePlugin
 from improver.nbhood.square_kernel import SquareNeighbourhood
 from improver.utilities.cube_checker import check_cube_coordinates
-from improver.utilities.pad_spatial import (
-    pad_cube_with_halo, remove_halo_from_cube)
+from improver.utilities.cube_manipulation import enforce_coordinate_ordering
+from improver.utilities.pad_spatial import pad_cube_with_halo
 
 
 class RecursiveFilter(BasePlugin):
@@ -120,6 +119,36 @@ class RecursiveFilter(BasePlugin):
         return result.format(self.alpha_x, self.alpha_y, self.iterations,
                              self.edge_width)
 
+    @staticmethod
+    def _recursion_views(grid, alphas, axis):
+        """
+        Create views of the data and alphas arrays with the axis over which
+        to recurse moved to the front. Any leading dimensions of the data
+        array are retained, so that indexing a single row of the returned
+        data view broadcasts against the matching row of the alphas view.
+
+        Args:
+            grid (numpy.ndarray):
+                Array of data, where the last two dimensions match the
+                alphas array.
+            alphas (numpy.ndarray):
+                2D array of alpha values.
+            axis (int):
+                Index of the spatial axis (0 or 1) of the alphas array over
+                which to recurse.
+
+        Returns:
+            (tuple): tuple containing:
+                **grid_view** (numpy.ndarray):
+                    View of the data array with the recursion axis first.
+                **alphas_view** (numpy.ndarray):
+                    View of the alphas array with the recursion axis first.
+        """
+        grid_axis = axis % alphas.ndim - alphas.ndim
+        grid_view = np.moveaxis(grid, grid_axis, 0)
+        alphas_view = np.moveaxis(alphas, axis, 0)
+        return grid_view, alphas_view
+
     @staticmethod
     def _recurse_forward(grid, alphas, axis):
         """
@@ -135,28 +164,28 @@ class RecursiveFilter(BasePlugin):
 
         Args:
             grid (numpy.ndarray):
-                2D array containing the input data to which the recursive
-                filter will be applied.
+                Array containing the input data to which the recursive
+                filter will be applied. The last two dimensions must match
+                the alphas array; any leading dimensions are filtered
+                together as a stack of 2D slices.
             alphas (numpy.ndarray):
                 Matching 2D array of alpha values that will be used when
                 applying the recursive filter along the specified axis.
             axis (int):
-                Index of the spatial axis (0 or 1) over which to recurse.
+                Index of the spatial axis (0 or 1) of the alphas array over
+                which to recurse.
 
         Returns:
             numpy.ndarray:
-                2D array containing the smoothed field after the recursive
+                Array containing the smoothed field after the recursive
                 filter method has been applied to the input array in the
                 forward direction along the specified axis.
         """
-        lim = grid.shape[axis]
-        for i in range(1, lim):
-            if axis == 0:
-                grid[i, :] = ((1. - alphas[i, :]) * grid[i, :] +
-                              alphas[i, :] * grid[i-1, :])
-            if axis == 1:
-                grid[:, i] = ((1. - alphas[:, i]) * grid[:, i] +
-                              alphas[:, i] * grid[:, i-1])
+        grid_view, alphas = RecursiveFilter._recursion_views(
+            grid, alphas, axis)
+        for i in range(1, grid_view.shape[0]):
+            grid_view[i] = ((1. - alphas[i]) * grid_view[i] +
+                            alphas[i] * grid_view[i-1])
         return grid
 
     @staticmethod
@@ -174,28 +203,28 @@ class RecursiveFilter(BasePlugin):
 
         Args:
             grid (numpy.ndarray):
-                2D array containing the input data to which the recursive
-                filter will be applied.
+                Array containing the input data to which the recursive
+                filter will be applied. The last two dimensions must match
+                the alphas array; any leading dimensions are filtered
+                together as a stack of 2D slices.
             alphas (numpy.ndarray):
                 Matching 2D array of alpha values that will be used when
                 applying the recursive filter along the specified axis.
             axis (int):
-                Index of the spatial axis (0 or 1) over which to recurse.
+                Index of the spatial axis (0 or 1) of the alphas array over
+                which to recurse.
 
         Returns:
             numpy.ndarray:
-                2D array containing the smoothed field after the recursive
+                Array containing the smoothed field after the recursive
                 filter method has been applied to the input array in the
                 backwards direction along the specified axis.
         """
-        lim = grid.shape[axis]
-        for i in range(lim-2, -1, -1):
-            if axis == 0:
-                grid[i, :] = ((1. - alphas[i, :]) * grid[i, :] +
-                              alphas[i, :] * grid[i+1, :])
-            if axis == 1:
-                grid[:, i] = ((1. - alphas[:, i]) * grid[:, i] +
-                              alphas[:, i] * grid[:, i+1])
+        grid_view, alphas = RecursiveFilter._recursion_views(
+            grid, alphas, axis)
+        for i in range(grid_view.shape[0]-2, -1, -1):
+            grid_view[i] = ((1. - alphas[i]) * grid_view[i] +
+                            alphas[i] * grid_view[i+1])
         return grid
 
     @staticmethod
@@ -223,19 +252,48 @@ class RecursiveFilter(BasePlugin):
         """
         x_index, = cube.coord_dims(cube.coord(axis="x").name())
         y_index, = cube.coord_dims(cube.coord(axis="y").name())
-        output = cube.data
+        cube.data = RecursiveFilter._run_recursion_on_array(
+            cube.data, alphas_x.data, alphas_y.data, iterations,
+            x_index=x_index, y_index=y_index)
+        return cube
+
+    @staticmethod
+    def _run_recursion_on_array(data, alphas_x, alphas_y, iterations,
+                                x_index=1, y_index=0):
+        """
+        Method to run the recursive filter over an array. The array may
+        contain a stack of 2D slices, in which case each sweep of the filter
+        is applied to all of the slices at once.
 
+        Args:
+            data (numpy.ndarray):
+                Array containing the input data to which the recursive
+                filter will be applied. The last two dimensions must match
+                the alphas arrays. This array is modified in place.
+            alphas_x (numpy.ndarray):
+                2D array of alpha values that will be used when applying the
+                recursive filter along the x-axis.
+            alphas_y (numpy.ndarray):
+                2D array of alpha values that will be used when applying the
+                recursive filter along the y-axis.
+            iterations (int):
+                The number of iterations of the recursive filter
+            x_index (int):
+                Index of the x-axis within the alphas arrays.
+            y_index (int):
+                Index of the y-axis within the alphas arrays.
+
+        Returns:
+            numpy.ndarray:
+                Array containing the smoothed field after the recursive filter
+                method has been applied.
+        """
         for _ in range(iterations):
-            output = RecursiveFilter._recurse_forward(output, alphas_x.data,
-                                                      x_index)
-            output = RecursiveFilter._recurse_backward(output, alphas_x.data,
-                                                       x_index)
-            output = RecursiveFilter._recurse_forward(output, alphas_y.data,
-                                                      y_index)
-            output = RecursiveFilter._recurse_backward(output, alphas_y.data,
-                                                       y_index)
-            cube.data = output
-        return cube
+            data = RecursiveFilter._recurse_forward(data, alphas_x, x_index)
+            data = RecursiveFilter._recurse_backward(data, alphas_x, x_index)
+            data = RecursiveFilter._recurse_forward(data, alphas_y, y_index)
+            data = RecursiveFilter._recurse_backward(data, alphas_y, y_index)
+        return data
 
     def _set_alphas(self, cube, alpha, alphas_cube):
         """
@@ -296,20 +354,18 @@ class RecursiveFilter(BasePlugin):
 
         The steps undertaken are:
 
-        1. Split the input cube into slices determined by the co-ordinates in
-           the x and y directions.
-        2. Construct an array of filter parameters (alphas_x and alphas_y) for
-           each cube slice that are used to weight the recursive filter in
-           the x- and y-directions.
-        3. Pad each cube slice with a square-neighbourhood halo and apply
-           the recursive filter for the required number of iterations.
-        4. Remove the halo from the cube slice and append the recursed cube
-           slice to a 'recursed cube'.
-        5. Merge all the cube slices in the 'recursed cube' into a 'new cube'.
-        6. Modify the 'new cube' so that its scalar dimension co-ordinates are
-           consistent with those in the original input cube.
-        7. Return the 'new cube' which now contains the recursively filtered
-           values for the original input cube.
+        1. Construct an array of filter parameters (alphas_x and alphas_y)
+           that are used to weight the recursive filter in the x- and
+           y-directions.
+        2. Reorder the input cube so that the y and x dimensions are last
+           and view its data as a stack of x-y slices.
+        3. Pad every slice in the stack with a square-neighbourhood halo and
+           apply the recursive filter for the required number of iterations.
+           Each sweep of the filter is applied to all slices at once.
+        4. Remove the halo from the stack, re-apply the mask if required and
+           copy the recursed data into a 'new cube'.
+        5. Restore the dimension order of the original input cube and return
+           the 'new cube' which now contains the recursively filtered values.
 
         Args:
             cube (iris.cube.Cube):
@@ -339,38 +395,45 @@ class RecursiveFilter(BasePlugin):
                     "All alpha values must be less than 0.5. A large alpha"
                     "value leads to poor conservation of probabilities")
 
-        cube_format = next(cube.slices([cube.coord(axis='y'),
-                                        cube.coord(axis='x')]))
+        y_name = cube.coord(axis='y').name()
+        x_name = cube.coord(axis='x').name()
+        cube_format = next(cube.slices([y_name, x_name]))
         alphas_x = self._set_alphas(cube_format, self.alpha_x, alphas_x)
         alphas_y = self._set_alphas(cube_format, self.alpha_y, alphas_y)
 
-        recursed_cube = iris.cube.CubeList()
-        for output in cube.slices([cube.coord(axis='y'),
-                                   cube.coord(axis='x')]):
-
-            # Setup cube and mask for processing.
-            # This should set up a mask full of 1.0 if None is provided
-            # and set the data 0.0 where mask is 0.0 or the data is NaN
-            output, mask, nan_array = (
-                SquareNeighbourhood().set_up_cubes_to_be_neighbourhooded(
-                    output, mask_cube))
-            mask = mask.data.squeeze()
-
-            padded_cube = pad_cube_with_halo(
-                output, 2*self.edge_width, 2*self.edge_width)
-
-            new_cube = self._run_recursion(padded_cube, alphas_x, alphas_y,
-                                           self.iterations)
-            new_cube = remove_halo_from_cube(
-                new_cube, 2*self.edge_width, 2*self.edge_width)
-            if self.re_mask:
-                new_cube.data[nan_array.astype(bool)] = np.nan
-                new_cube.data = np.ma.masked_array(new_cube.data,
-                                                   mask=np.logical_not(mask))
-
-            recursed_cube.append(new_cube)
-
-        new_cube = recursed_cube.merge_cube()
+        new_cube = cube.copy()
+        enforce_coordinate_ordering(
+            new_cube, [y_name, x_name], anchor_start=False)
+        data_stack = new_cube.data.reshape((-1,) + cube_format.shape)
+
+        # Setup data and mask for processing.
+        # This should set up a mask full of 1.0 if None is provided
+        # and set the data 0.0 where mask is 0.0 or the data is NaN
+        mask_data = mask_cube.data if mask_cube is not None else None
+        data_stack, mask, nan_array = (
+            SquareNeighbourhood().set_up_arrays_to_be_neighbourhooded(
+                data_stack, mask_data))
+
+        # Pad only the x and y dimensions of the stack, matching the halo
+        # that pad_cube_with_halo would add to each slice.
+        width = 2*self.edge_width
+        padded_data = np.pad(
+            data_stack, ((0, 0), (width, width), (width, width)),
+            "mean", stat_length=((1, 1), (0.5*width, 0.5*width),
+                                 (0.5*width, 0.5*width)))
+        padded_data = self._run_recursion_on_array(
+            padded_data, alphas_x.data, alphas_y.data, self.iterations)
+        end = -width if width != 0 else None
+        recursed_data = padded_data[:, width:end, width:end]
+
+        if self.re_mask:
+            recursed_data[nan_array] = np.nan
+            recursed_data = np.ma.masked_array(recursed_data,
+                                               mask=np.logical_not(mask))
+
+        new_cube.data = recursed_data.reshape(new_cube.shape)
+        enforce_coordinate_ordering(
+            new_cube, [coord.name() for coord in cube.coords(dim_coords=True)])
         new_cube = check_cube_coordinates(cube, new_cube)
 
         return new_cube
@@ -33,17 +33,20 @@
 import iris
 import numpy as np
 
-from improver.utilities.cube_checker import (
-    check_cube_coordinates, check_for_x_and_y_axes)
+from improver.utilities.cube_checker import check_for_x_and_y_axes
 from improver.utilities.cube_manipulation import clip_cube_data
 from improver.utilities.pad_spatial import (
-    pad_cube_with_halo, remove_halo_from_cube)
+    pad_coord, pad_cube_with_halo, remove_halo_from_cube)
 from improver.utilities.spatial import (
     convert_distance_into_number_of_grid_cells)
 
 # Maximum radius of the neighbourhood width in grid cells.
 MAX_RADIUS_IN_GRID_CELLS = 500
 
+# Maximum number of grid cells to neighbourhood process in a single batch.
+# This limits the memory used by the high precision summed area tables.
+MAX_BATCH_SIZE_IN_GRID_CELLS = 2**20
+
 
 class SquareNeighbourhood:
 
@@ -354,6 +357,50 @@ class SquareNeighbourhood:
             cube.data.dtype)
         return cube, mask, nan_array
 
+    @staticmethod
+    def set_up_arrays_to_be_neighbourhooded(data, mask=None):
+        """
+        Set up a stack of x-y slices ready for neighbourhooding the data.
+
+        This is the array equivalent of set_up_cubes_to_be_neighbourhooded,
+        for use when all the x-y slices of a cube are processed at once.
+        Neither of the input arrays is modified.
+
+        Args:
+            data (numpy.ndarray or numpy.ma.MaskedArray):
+                Array that will be checked for whether the data is masked
+                or nan. The last two dimensions must be the y and x
+                dimensions.
+            mask (numpy.ndarray or None):
+                Array to be used as a mask. This must be broadcastable to
+                the shape of the data array, so will generally be 2D.
+
+        Returns:
+            (tuple): tuple containing:
+                **data** (numpy.ndarray):
+                    Array with masked or NaN values set to 0.0
+                **mask** (numpy.ndarray):
+                    Mask array matching the shape of the data, with masked
+                    or NaN values set to 0.0
+                **nan_array** (numpy.ndarray):
+                    numpy array to be used to set the values within
+                    the data of the output to be NaN.
+        """
+        data_mask = np.ma.getmaskarray(data)
+        data = np.array(np.ma.getdata(data))
+        if mask is None:
+            mask = np.real(np.ones_like(data))
+        else:
+            mask = np.array(np.broadcast_to(mask, data.shape))
+        mask[data_mask] = 0.0
+        # Set NaN values to 0 in both the data and mask.
+        nan_array = np.isnan(data)
+        mask[nan_array] = 0.0
+        data[nan_array] = 0.0
+        # Set data to 0.0 where mask is 0.0
+        data = (data * mask).astype(data.dtype)
+        return data, mask, nan_array
+
     def _pad_and_calculate_neighbourhood(
             self, cube, mask, grid_cells_x, grid_cells_y):
         """
@@ -451,18 +498,255 @@ class SquareNeighbourhood:
                                minimum_value, maximum_value))
         return neighbourhood_averaged_cube
 
+    @staticmethod
+    def _summed_area_table(data, dtype):
+        """
+        Calculate the cumulative sum of a stack of x-y slices along the y and
+        x dimensions, with a leading row and column of zeros. Each grid point
+        [..., i+1, j+1] of the returned array contains the sum of the input
+        data from the origin to grid point [..., i, j]. The leading zeros
+        mean that sums over neighbourhoods that overlap the edge of the
+        domain can be found by clipping the neighbourhood indices, without
+        padding the input data.
+
+        Args:
+            data (numpy.ndarray):
+                Array with y and x as the last two dimensions.
+            dtype (numpy.dtype):
+                Data type in which to accumulate the sums.
+
+        Returns:
+            numpy.ndarray:
+                Array of cumulative sums, one larger than the input data
+                in each of the last two dimensions.
+        """
+        n_rows, n_columns = data.shape[-2:]
+        summed_data = np.zeros(data.shape[:-2] + (n_rows+1, n_columns+1),
+                               dtype=dtype)
+        summed_view = summed_data[..., 1:, 1:]
+        np.cumsum(data, axis=-2, dtype=dtype, out=summed_view)
+        np.cumsum(summed_view, axis=-1, out=summed_view)
+        return summed_data
+
+    @staticmethod
+    def _neighbourhood_totals(summed_data, cells_x, cells_y):
+        """
+        Calculate neighbourhood totals for every grid point of a stack of
+        summed area tables using the 4-point algorithm described in
+        calculate_neighbourhood. The four corner points are gathered by
+        clipping indices to the domain, rather than rolling copies of a
+        padded array, so neighbourhoods overlapping the edge of the domain
+        only include the points within it.
+
+        Args:
+            summed_data (numpy.ndarray):
+                Array returned by _summed_area_table.
+            cells_x (int):
+                The radius of the neighbourhood in grid points, in the x
+                direction (excluding the central grid point).
+            cells_y (int):
+                The radius of the neighbourhood in grid points, in the y
+                direction (excluding the central grid point).
+
+        Returns:
+            numpy.ndarray:
+                Array of neighbourhood totals, with the shape of the data
+                used to create the summed area table.
+        """
+        n_rows = summed_data.shape[-2] - 1
+        n_columns = summed_data.shape[-1] - 1
+        rows = np.arange(n_rows)
+        columns = np.arange(n_columns)
+        ymax = np.clip(rows + cells_y + 1, 0, n_rows)[:, np.newaxis]
+        ymin = np.clip(rows - cells_y, 0, n_rows)[:, np.newaxis]
+        xmax = np.clip(columns + cells_x + 1, 0, n_columns)
+        xmin = np.clip(columns - cells_x, 0, n_columns)
+
+        # Neighbourhood sum = B - D + C - A, as in calculate_neighbourhood.
+        neighbourhood_total = summed_data[..., ymax, xmax]
+        neighbourhood_total -= summed_data[..., ymin, xmax]
+        neighbourhood_total += summed_data[..., ymin, xmin]
+        neighbourhood_total -= summed_data[..., ymax, xmin]
+        return neighbourhood_total
+
+    def _neighbourhood_stack(self, data, mask, cells_x, cells_y,
+                             iscomplex=False, isprobability=False,
+                             neighbourhood_area=None):
+        """
+        Apply square neighbourhood processing to a stack of x-y slices in a
+        single batch. This is equivalent to applying
+        set_up_cubes_to_be_neighbourhooded, _pad_and_calculate_neighbourhood
+        and _remove_padding_and_mask to each slice in turn.
+
+        Args:
+            data (numpy.ndarray or numpy.ma.MaskedArray):
+                Array with y and x as the last two dimensions.
+            mask (numpy.ndarray or None):
+                Array to be used as a mask, broadcastable to the shape of
+                the data.
+            cells_x (int):
+                The radius of the neighbourhood in grid points, in the x
+                direction (excluding the central grid point).
+            cells_y (int):
+                The radius of the neighbourhood in grid points, in the y
+                direction (excluding the central grid point).
+            iscomplex (bool):
+                Flag indicating whether the data contains complex values.
+            isprobability (bool):
+                Flag indicating whether the data are probabilities, in which
+                case the sums do not need to be calculated at high precision.
+            neighbourhood_area (numpy.ndarray or None):
+                Precalculated neighbourhood totals of the mask, broadcastable
+                to the shape of the data. This may only be given if the data
+                contain no masked or NaN points, which would otherwise be
+                removed from the mask.
+
+        Returns:
+            (tuple): tuple containing:
+                **result** (numpy.ndarray):
+                    Neighbourhood processed data, as float32 (or complex
+                    if iscomplex).
+                **result_mask** (numpy.ndarray or None):
+                    Boolean mask to apply to the result, or None if no
+                    re-masking is required.
+        """
+        data, mask, nan_array = self.set_up_arrays_to_be_neighbourhooded(
+            data, mask)
+
+        # Only sum a single copy of the mask if it is the same for every
+        # slice, as it is when the data are unmasked and contain no NaNs.
+        mask_to_sum = mask
+        if neighbourhood_area is None and (mask == mask[:1]).all():
+            mask_to_sum = mask[:1]
+
+        if iscomplex:
+            dtype = complex
+        elif isprobability:
+            # No need for high precision calculation, just between 0 and 1.
+            dtype = np.float32
+        else:
+            dtype = np.float64
+        neighbourhood_total = self._neighbourhood_totals(
+            self._summed_area_table(data, dtype), cells_x, cells_y)
+
+        if self.sum_or_fraction == "fraction":
+            if neighbourhood_area is None:
+                neighbourhood_area = self._neighbourhood_totals(
+                    self._summed_area_table(mask_to_sum, np.float64),
+                    cells_x, cells_y)
+            result = neighbourhood_total.astype(
+                complex if iscomplex else float, copy=False)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                result /= neighbourhood_area.astype(result.dtype, copy=False)
+            result[~np.isfinite(result)] = np.nan
+        else:
+            result = neighbourhood_total
+        result = result.astype(complex if iscomplex else np.float32,
+                               copy=False)
+
+        result_mask = None
+        if self.re_mask and mask.min() < 1.0:
+            # Only re-mask slices that contain masked points, matching
+            # the behaviour of _remove_padding_and_mask for each slice.
+            result_mask = np.logical_not(mask)
+            result_mask[mask.min(axis=(-2, -1)) >= 1.0] = False
+        # Clip each slice to the range of the original slice.
+        if self.sum_or_fraction == "fraction":
+            minimum_value = np.nanmin(data, axis=(-2, -1), keepdims=True)
+            maximum_value = np.nanmax(data, axis=(-2, -1), keepdims=True)
+            result = np.clip(result, minimum_value, maximum_value)
+        result[nan_array] = np.nan
+        if result_mask is not None:
+            result_mask[nan_array] = False
+        return result, result_mask
+
+    def neighbourhood_with_masks(self, data, masks, cells_x, cells_y,
+                                 iscomplex=False, isprobability=False):
+        """
+        Apply square neighbourhood processing to each of a stack of x-y
+        slices with each of a stack of masks, such as topographic bands.
+        This is equivalent to calling run for every combination of slice and
+        mask, but the summed area tables of the masks are only calculated
+        once, and the slices are processed in batches of up to
+        MAX_BATCH_SIZE_IN_GRID_CELLS grid points.
+
+        Args:
+            data (numpy.ndarray or numpy.ma.MaskedArray):
+                Array of x-y slices, with shape (slices, y, x).
+            masks (numpy.ndarray):
+                Array of masks, with shape (masks, y, x).
+            cells_x (int):
+                The radius of the neighbourhood in grid points, in the x
+                direction (excluding the central grid point).
+            cells_y (int):
+                The radius of the neighbourhood in grid points, in the y
+                direction (excluding the central grid point).
+            iscomplex (bool):
+                Flag indicating whether the data contains complex values.
+            isprobability (bool):
+                Flag indicating whether the data are probabilities, in which
+                case the sums do not need to be calculated at high precision.
+
+        Returns:
+            (tuple): tuple containing:
+                **result** (numpy.ndarray):
+                    Neighbourhood processed data, with shape
+                    (slices, masks, y, x), as float32 (or complex if
+                    iscomplex).
+                **result_mask** (numpy.ndarray or None):
+                    Boolean mask to apply to the result, or None if no
+                    re-masking is required.
+        """
+        stack_shape = (data.shape[0],) + masks.shape
+        data_mask = np.ma.getmaskarray(data)
+        data = np.ma.getdata(data)
+
+        # The masks only change from slice to slice where the data are
+        # masked or NaN, so otherwise their neighbourhood areas are
+        # calculated once for all the slices.
+        neighbourhood_area = None
+        if (self.sum_or_fraction == "fraction" and not data_mask.any() and
+                not np.isnan(data).any()):
+            neighbourhood_area = self._neighbourhood_totals(
+                self._summed_area_table(masks, np.float64), cells_x, cells_y)
+
+        result = np.empty(stack_shape,
+                          dtype=complex if iscomplex else np.float32)
+        result_mask = None
+        batch_size = max(1, MAX_BATCH_SIZE_IN_GRID_CELLS // masks.size)
+        for start in range(0, data.shape[0], batch_size):
+            batch = slice(start, start + batch_size)
+            batch_shape = (len(data[batch]),) + masks.shape
+            batch_data = np.ma.masked_array(
+                np.broadcast_to(data[batch, np.newaxis], batch_shape),
+                mask=np.broadcast_to(data_mask[batch, np.newaxis],
+                                     batch_shape))
+            result[batch], batch_result_mask = self._neighbourhood_stack(
+                batch_data, masks, cells_x, cells_y, iscomplex=iscomplex,
+                isprobability=isprobability,
+                neighbourhood_area=neighbourhood_area)
+            if batch_result_mask is not None:
+                if result_mask is None:
+                    result_mask = np.zeros(stack_shape, dtype=bool)
+                result_mask[batch] = batch_result_mask
+        return result, result_mask
+
     def run(self, cube, radius, mask_cube=None):
         """
         Call the methods required to apply a square neighbourhood
         method to a cube.
 
-        The steps undertaken are:
+        All x-y slices of the cube are processed together in batches of up
+        to MAX_BATCH_SIZE_IN_GRID_CELLS grid points, and the output cube is
+        built once from the input cube. For each batch, the steps undertaken
+        are:
 
-        1. Set up cubes by determining, if the arrays are masked.
-        2. Pad the input array with a halo and then calculate the neighbourhood
-           of the haloed array.
-        3. Remove the halo from the neighbourhooded array and deal with a mask,
-           if required.
+        1. Set up the data and mask arrays by determining whether the data
+           are masked or contain NaNs.
+        2. Calculate summed area tables for the stack of data and mask
+           slices, and gather the neighbourhood totals from them.
+        3. Deal with a mask, if required, and clip fractions to the range of
+           each original slice.
 
         Args:
             cube (iris.cube.Cube):
@@ -479,38 +763,49 @@ class SquareNeighbourhood:
                 Cube containing the smoothed field after the square
                 neighbourhood method has been applied.
         """
-        # If the data is masked, the mask will be processed as well as the
-        # original_data * mask array.
-        original_attributes = cube.attributes
-        original_methods = cube.cell_methods
         grid_cells_x = (
             convert_distance_into_number_of_grid_cells(
                 cube, radius,
                 max_distance_in_grid_cells=MAX_RADIUS_IN_GRID_CELLS))
         grid_cells_y = grid_cells_x
-        result_slices = iris.cube.CubeList()
-        for cube_slice in cube.slices([cube.coord(axis='y'),
-                                       cube.coord(axis='x')]):
-            (cube_slice, mask, nan_array) = (
-                self.set_up_cubes_to_be_neighbourhooded(cube_slice,
-                                                        mask_cube))
-            neighbourhood_averaged_cube = (
-                self._pad_and_calculate_neighbourhood(
-                    cube_slice, mask,
-                    grid_cells_x, grid_cells_y))
-            neighbourhood_averaged_cube = (
-                self._remove_padding_and_mask(
-                    neighbourhood_averaged_cube,
-                    cube_slice, mask,
-                    grid_cells_x, grid_cells_y))
-            neighbourhood_averaged_cube.data[nan_array.astype(bool)] = np.nan
-            result_slices.append(neighbourhood_averaged_cube)
-
-        neighbourhood_averaged_cube = result_slices.merge_cube()
-
-        neighbourhood_averaged_cube.cell_methods = original_methods
-        neighbourhood_averaged_cube.attributes = original_attributes
 
-        neighbourhood_averaged_cube = check_cube_coordinates(
-            cube, neighbourhood_averaged_cube)
+        # View the data as a stack of x-y slices, without copying the cube.
+        y_dim, = cube.coord_dims(cube.coord(axis='y'))
+        x_dim, = cube.coord_dims(cube.coord(axis='x'))
+        data = np.moveaxis(cube.data, [y_dim, x_dim], [-2, -1])
+        stack_shape = data.shape
+        data = data.reshape((-1,) + stack_shape[-2:])
+        mask = None if mask_cube is None else mask_cube.data
+
+        iscomplex = np.any(np.iscomplex(data))
+        isprobability = cube.name().startswith("probability_of")
+        result = np.empty(data.shape,
+                          dtype=complex if iscomplex else np.float32)
+        result_mask = None
+
+        slice_size = data.shape[-2] * data.shape[-1]
+        batch_size = max(1, MAX_BATCH_SIZE_IN_GRID_CELLS // slice_size)
+        for start in range(0, data.shape[0], batch_size):
+            batch = slice(start, start + batch_size)
+            result[batch], batch_result_mask = self._neighbourhood_stack(
+                data[batch], mask, grid_cells_x, grid_cells_y,
+                iscomplex=iscomplex, isprobability=isprobability)
+            if batch_result_mask is not None:
+                if result_mask is None:
+                    result_mask = np.zeros(data.shape, dtype=bool)
+                result_mask[batch] = batch_result_mask
+
+        if result_mask is not None:
+            result = np.ma.masked_array(result, mask=result_mask)
+        result = np.moveaxis(result.reshape(stack_shape),
+                             [-2, -1], [y_dim, x_dim])
+        neighbourhood_averaged_cube = cube.copy(data=result)
+
+        # Match the spatial coordinates of a cube that has been padded and
+        # unpadded by pad_cube_with_halo and remove_halo_from_cube.
+        for axis, grid_cells in zip(['x', 'y'], [grid_cells_x, grid_cells_y]):
+            coord = neighbourhood_averaged_cube.coord(axis=axis)
+            neighbourhood_averaged_cube.replace_coord(pad_coord(
+                pad_coord(coord, grid_cells+1, 'add'), grid_cells+1,
+                'remove'))
         return neighbourhood_averaged_cube
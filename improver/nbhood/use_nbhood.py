@@ -36,9 +36,14 @@ import numpy.ma as ma
 
 from improver import BasePlugin
 from improver.blending.weights import WeightsUtilities
+from improver.metadata.forecast_times import forecast_period_coord
 from improver.nbhood.nbhood import NeighbourhoodProcessing
+from improver.nbhood.square_kernel import MAX_RADIUS_IN_GRID_CELLS
 from improver.utilities.cube_checker import (
     check_cube_coordinates, find_dimension_coordinate_mismatch)
+from improver.utilities.pad_spatial import pad_coord
+from improver.utilities.spatial import (
+    convert_distance_into_number_of_grid_cells)
 
 
 class ApplyNeighbourhoodProcessingWithAMask(BasePlugin):
@@ -143,13 +148,52 @@ class ApplyNeighbourhoodProcessingWithAMask(BasePlugin):
             self.lead_times, self.weighted_mode,
             self.sum_or_fraction, self.re_mask)
 
+    def _slice_radii(self, cube, plugin):
+        """
+        Find the neighbourhood radius for each x-y slice of the cube, taking
+        the lead time of each slice into account if radii are defined at
+        lead times.
+
+        Args:
+            cube (iris.cube.Cube):
+                Cube containing the array to which the square neighbourhood
+                will be applied.
+            plugin (improver.nbhood.nbhood.NeighbourhoodProcessing):
+                Neighbourhood processing plugin set up with the radii and
+                lead times.
+
+        Returns:
+            numpy.ndarray:
+                Radius for each x-y slice, in the order of cube.slices over
+                the y and x coordinates.
+        """
+        yname = cube.coord(axis='y').name()
+        xname = cube.coord(axis='x').name()
+        spatial_dims = (cube.coord_dims(yname) + cube.coord_dims(xname))
+        n_slices = int(np.prod([length for dim, length in enumerate(cube.shape)
+                                if dim not in spatial_dims]))
+        if self.lead_times is None:
+            return np.full(n_slices, plugin.radii)
+
+        # Find the lead time of each slice from a copy of the cube reduced
+        # to a single grid point, to avoid copying the data.
+        point_cube = cube[tuple(slice(0, 1) if dim in spatial_dims
+                                else slice(None) for dim in range(cube.ndim))]
+        lead_times = []
+        for point_slice in point_cube.slices([yname, xname]):
+            fp_coord = forecast_period_coord(point_slice)
+            fp_coord.convert_units("hours")
+            lead_times.append(fp_coord.points[0])
+        return plugin._find_radii(cube_lead_times=np.array(lead_times))
+
     def process(self, cube, mask_cube):
         """
-        1. Iterate over the chosen coordinate within the mask_cube and apply
-           the mask at each iteration to the cube that is to be neighbourhood
-           processed.
-        2. Concatenate the cubes from each iteration together to create a
-           single cube.
+        1. Apply each mask along the chosen coordinate within the mask_cube
+           to every x-y slice of the cube that is to be neighbourhood
+           processed. The neighbourhood areas of the masks are calculated
+           once for each radius and all the slices are processed together.
+        2. Stack the results for each mask to create a single cube with the
+           chosen coordinate as a new dimension.
 
         Args:
             cube (iris.cube.Cube):
@@ -166,46 +210,82 @@ class ApplyNeighbourhoodProcessingWithAMask(BasePlugin):
                 The resulting cube is concatenated so that the dimension
                 coordinates match the input cube.
 
+        Raises:
+            ValueError: If the cube contains NaNs.
         """
-        yname = cube.coord(axis='y').name()
-        xname = cube.coord(axis='x').name()
-        result_slices = iris.cube.CubeList([])
-        # Take 2D slices of the input cube for memory issues.
-        prev_x_y_slice = None
-        for x_y_slice in cube.slices([yname, xname]):
-            if (prev_x_y_slice is not None and
-                    np.array_equal(prev_x_y_slice.data, x_y_slice.data)):
-                # Use same result as last time!
-                prev_result = result_slices[-1].copy()
-                for coord in x_y_slice.coords(dim_coords=False):
-                    prev_result.coord(coord).points = coord.points.copy()
-                result_slices.append(prev_result)
-                continue
-            prev_x_y_slice = x_y_slice
-
-            cube_slices = iris.cube.CubeList([])
-            # Apply each mask in in mask_cube to the 2D input slice.
-            for cube_slice in mask_cube.slices_over(self.coord_for_masking):
-                output_cube = NeighbourhoodProcessing(
-                    self.neighbourhood_method, self.radii,
-                    lead_times=self.lead_times,
-                    weighted_mode=self.weighted_mode,
-                    sum_or_fraction=self.sum_or_fraction, re_mask=self.re_mask
-                    ).process(x_y_slice, mask_cube=cube_slice)
-                coord_object = cube_slice.coord(self.coord_for_masking).copy()
-                output_cube.add_aux_coord(coord_object)
-                output_cube = iris.util.new_axis(
-                    output_cube, self.coord_for_masking)
-                cube_slices.append(output_cube)
-            concatenated_cube = cube_slices.concatenate_cube()
-            exception_coordinates = (
-                find_dimension_coordinate_mismatch(
-                    x_y_slice, concatenated_cube, two_way_mismatch=False))
-            concatenated_cube = check_cube_coordinates(
-                x_y_slice, concatenated_cube,
-                exception_coordinates=exception_coordinates)
-            result_slices.append(concatenated_cube)
-        result = result_slices.merge_cube()
+        plugin = NeighbourhoodProcessing(
+            self.neighbourhood_method, self.radii, lead_times=self.lead_times,
+            weighted_mode=self.weighted_mode,
+            sum_or_fraction=self.sum_or_fraction, re_mask=self.re_mask)
+        if np.isnan(cube.data).any():
+            raise ValueError("Error: NaN detected in input cube data")
+
+        # View the data as a stack of x-y slices, and the masks as a stack
+        # of x-y masks.
+        y_dim, = cube.coord_dims(cube.coord(axis='y'))
+        x_dim, = cube.coord_dims(cube.coord(axis='x'))
+        data = np.moveaxis(cube.data, [y_dim, x_dim], [-2, -1])
+        leading_shape = data.shape[:-2]
+        data = data.reshape((-1,) + data.shape[-2:])
+        mask_dim, = mask_cube.coord_dims(self.coord_for_masking)
+        masks = np.moveaxis(mask_cube.data, [
+            mask_dim, mask_cube.coord_dims(mask_cube.coord(axis='y'))[0],
+            mask_cube.coord_dims(mask_cube.coord(axis='x'))[0]], [0, -2, -1])
+
+        # Process the slices that share each neighbourhood radius together.
+        radii = self._slice_radii(cube, plugin)
+        iscomplex = np.any(np.iscomplex(data))
+        isprobability = cube.name().startswith("probability_of")
+        result = np.empty((data.shape[0],) + masks.shape,
+                          dtype=complex if iscomplex else np.float32)
+        result_mask = None
+        for radius in np.unique(radii):
+            grid_cells = convert_distance_into_number_of_grid_cells(
+                cube, radius,
+                max_distance_in_grid_cells=MAX_RADIUS_IN_GRID_CELLS)
+            slices = np.flatnonzero(radii == radius)
+            result[slices], radius_result_mask = (
+                plugin.neighbourhood_method.neighbourhood_with_masks(
+                    data[slices], masks, grid_cells, grid_cells,
+                    iscomplex=iscomplex, isprobability=isprobability))
+            if radius_result_mask is not None:
+                if result_mask is None:
+                    result_mask = np.zeros(result.shape, dtype=bool)
+                result_mask[slices] = radius_result_mask
+        if result_mask is not None:
+            result = np.ma.masked_array(result, mask=result_mask)
+        result = result.reshape(leading_shape + masks.shape)
+
+        # Build a cube for each mask, with spatial coordinates matching those
+        # from the square neighbourhood method, and stack them along the
+        # coordinate used for masking.
+        grid_cells = convert_distance_into_number_of_grid_cells(
+            cube, radii[0],
+            max_distance_in_grid_cells=MAX_RADIUS_IN_GRID_CELLS)
+        spatial_coords = [
+            pad_coord(pad_coord(cube.coord(axis=axis), grid_cells+1, 'add'),
+                      grid_cells+1, 'remove') for axis in ['x', 'y']]
+        mask_dim = len(leading_shape)
+        cube_slices = iris.cube.CubeList([])
+        for index, mask_slice in enumerate(
+                mask_cube.slices_over(self.coord_for_masking)):
+            output_cube = cube.copy(data=np.moveaxis(
+                result[..., index, :, :], [-2, -1], [y_dim, x_dim]))
+            for coord in spatial_coords:
+                output_cube.replace_coord(coord)
+            output_cube.add_aux_coord(
+                mask_slice.coord(self.coord_for_masking).copy())
+            output_cube = iris.util.new_axis(
+                output_cube, self.coord_for_masking)
+            cube_slices.append(output_cube)
+        result = cube_slices.concatenate_cube()
+
+        # Order the dimensions as the leading dimensions of the cube, the
+        # coordinate used for masking, then y and x, before matching the
+        # order of the input cube.
+        leading_dims = [dim + 1 for dim in range(cube.ndim)
+                        if dim not in (y_dim, x_dim)]
+        result.transpose(leading_dims[:mask_dim] + [0, y_dim + 1, x_dim + 1])
         exception_coordinates = (
             find_dimension_coordinate_mismatch(
                 cube, result, two_way_mismatch=False))
@@ -102,52 +102,15 @@ class AdvectField(BasePlugin):
         return result
 
     @staticmethod
-    def _increment_output_array(indata, outdata, cond, xdest_grid, ydest_grid,
-                                xsrc_grid, ysrc_grid, x_weight, y_weight):
+    def _advection_operator(grid_vel_x, grid_vel_y, timestep):
         """
-        Calculate and add contribution to the advected array from one source
-        grid point, for all points where boolean condition "cond" is valid.
+        Calculate the source points and weights needed to advect any field
+        on the velocity grid by a given time step, using a backwards method.
+        Each point on the output grid takes a distance-weighted contribution
+        from the (up to) four grid points surrounding its fractional source
+        location.
 
         Args:
-            indata (numpy.ndarray):
-                2D numpy array of source data to be advected
-            outdata (numpy.ndarray):
-                2D numpy array for advected output, modified in place by
-                this method (is both input and output).
-            cond (numpy.ndarray):
-                2D boolean mask of points to be processed
-            xdest_grid (numpy.ndarray):
-                Integer x-coordinates of all points on destination grid
-            ydest_grid (numpy.ndarray):
-                Integer y-coordinates of all points on destination grid
-            xsrc_grid (numpy.ndarray):
-                Integer x-coordinates of all points on source grid
-            ysrc_grid (numpy.ndarray):
-                Integer y-coordinates of all points on source grid
-            x_weight (numpy.ndarray):
-                Fractional contribution to destination grid of source data
-                advected along the x-axis.  Positive definite.
-            y_weight (numpy.ndarray):
-                Fractional contribution to destination grid of source data
-                advected along the y-axis.  Positive definite.
-        """
-        xdest = xdest_grid[cond]
-        ydest = ydest_grid[cond]
-        xsrc = xsrc_grid[cond]
-        ysrc = ysrc_grid[cond]
-        outdata[ydest, xdest] += (
-            indata[ysrc, xsrc]*x_weight[ydest, xdest]*y_weight[ydest, xdest])
-
-    def _advect_field(self, data, grid_vel_x, grid_vel_y, timestep):
-        """
-        Performs a dimensionless grid-based extrapolation of spatial data
-        using advection velocities via a backwards method.  Points where data
-        cannot be extrapolated (ie the source is out of bounds) are given a
-        fill value of np.nan and masked.
-
-        Args:
-            data (numpy.ndarray or numpy.ma.MaskedArray):
-                2D numpy data array to be advected
             grid_vel_x (numpy.ndarray):
                 Velocity in the x direction (in grid points per second)
             grid_vel_y (numpy.ndarray):
@@ -156,44 +119,43 @@ class AdvectField(BasePlugin):
                 Advection time step in seconds
 
         Returns:
-            numpy.ma.MaskedArray:
-                2D float array of advected data values with masked "no data"
-                regions
+            (tuple): tuple containing:
+                **in_bounds** (numpy.ndarray):
+                    2D boolean array, True where the source location of the
+                    output point lies within the domain
+                **source_indices** (numpy.ndarray):
+                    Integer array of shape (4, ny, nx) containing the
+                    flattened index of each of the four source points of
+                    each output point.  Source points outside the domain
+                    are given the index ny*nx, which refers to a zero
+                    appended to the flattened data.
+                **x_weights** (numpy.ndarray):
+                    Array of shape (4, ny, nx) containing the fractional
+                    contribution of each source point along the x-axis
+                **y_weights** (numpy.ndarray):
+                    Array of shape (4, ny, nx) containing the fractional
+                    contribution of each source point along the y-axis
         """
-        # Cater for special case where timestep (int) is 0
-        if timestep == 0:
-            return data
-
-        # Initialise advected field with np.nan
-        adv_field = np.full(data.shape, np.nan, dtype=np.float32)
-
-        # Set up grids of data coordinates (meshgrid inverts coordinate order)
-        ydim, xdim = data.shape
-        (xgrid, ygrid) = np.meshgrid(np.arange(xdim),
-                                     np.arange(ydim))
+        ydim, xdim = grid_vel_x.shape
+        xgrid = np.arange(xdim, dtype=np.float32)[np.newaxis, :]
+        ygrid = np.arange(ydim, dtype=np.float32)[:, np.newaxis]
 
         # For each grid point on the output field, trace its (x,y) "source"
         # location backwards using advection velocities.  The source location
         # is generally fractional: eg with advection velocities of 0.5 grid
         # squares per second, the value at [2, 2] is represented by the value
         # that was at [1.5, 1.5] 1 second ago.
-        xsrc_point_frac = -grid_vel_x * timestep + xgrid.astype(np.float32)
-        ysrc_point_frac = -grid_vel_y * timestep + ygrid.astype(np.float32)
+        xsrc_point_frac = -grid_vel_x * timestep + xgrid
+        ysrc_point_frac = -grid_vel_y * timestep + ygrid
 
-        # For all the points where fractional source coordinates are within
-        # the bounds of the field, set the output field to 0
-        def point_in_bounds(x, y, nx, ny):
-            """Check point (y, x) lies within defined bounds"""
-            return (x >= 0.) & (x < nx) & (y >= 0.) & (y < ny)
-
-        cond_pt = point_in_bounds(xsrc_point_frac, ysrc_point_frac, xdim, ydim)
-        adv_field[cond_pt] = 0
+        # Find the points where fractional source coordinates are within
+        # the bounds of the field
+        in_bounds = ((xsrc_point_frac >= 0.) & (xsrc_point_frac < xdim) &
+                     (ysrc_point_frac >= 0.) & (ysrc_point_frac < ydim))
 
         # Find the integer points surrounding the fractional source coordinates
         xsrc_point_lower = xsrc_point_frac.astype(int)
         ysrc_point_lower = ysrc_point_frac.astype(int)
-        x_points = [xsrc_point_lower, xsrc_point_lower + 1]
-        y_points = [ysrc_point_lower, ysrc_point_lower + 1]
 
         # Calculate the distance-weighted fractional contribution of points
         # surrounding the source coordinates
@@ -204,24 +166,95 @@ class AdvectField(BasePlugin):
         y_weights = np.array([1. - y_weight_upper, y_weight_upper],
                              dtype=np.float32)
 
+        source_indices = np.empty((4, ydim, xdim), dtype=np.intp)
+        all_x_weights = np.empty((4, ydim, xdim), dtype=np.float32)
+        all_y_weights = np.empty((4, ydim, xdim), dtype=np.float32)
+        corner = 0
+        for xoffset, xwt in enumerate(x_weights):
+            xpt = xsrc_point_lower + xoffset
+            for yoffset, ywt in enumerate(y_weights):
+                ypt = ysrc_point_lower + yoffset
+                valid = in_bounds & (xpt < xdim) & (ypt < ydim)
+                source_indices[corner] = np.where(
+                    valid, ypt * xdim + xpt, ydim * xdim)
+                all_x_weights[corner] = xwt
+                all_y_weights[corner] = ywt
+                corner += 1
+
+        return in_bounds, source_indices, all_x_weights, all_y_weights
+
+    @staticmethod
+    def _apply_advection_operator(data, operator):
+        """
+        Advect a field using source points and weights precalculated by
+        "_advection_operator".  Points where data cannot be extrapolated (ie
+        the source is out of bounds) are given a fill value of np.nan and
+        masked.
+
+        Args:
+            data (numpy.ndarray or numpy.ma.MaskedArray):
+                2D numpy data array to be advected
+            operator (tuple):
+                Tuple of arrays returned by "_advection_operator"
+
+        Returns:
+            numpy.ma.MaskedArray:
+                2D float array of advected data values with masked "no data"
+                regions
+        """
+        in_bounds, source_indices, x_weights, y_weights = operator
+
         # Check whether the input data is masked - if so substitute NaNs for
         # the masked data.  Note there is an implicit type conversion here: if
         # data is of integer type this unmasking will convert it to float.
         if isinstance(data, np.ma.MaskedArray):
             data = np.where(data.mask, np.nan, data.data)
 
-        # Advect data from each of the four source points onto the output grid
-        for xpt, xwt in zip(x_points, x_weights):
-            for ypt, ywt in zip(y_points, y_weights):
-                cond = point_in_bounds(xpt, ypt, xdim, ydim) & cond_pt
-                self._increment_output_array(
-                    data, adv_field, cond, xgrid, ygrid, xpt, ypt, xwt, ywt)
+        # Append a zero to the flattened data, to be picked up by source
+        # points that lie outside the domain
+        source_data = np.zeros(data.size + 1, dtype=data.dtype)
+        source_data[:-1] = data.ravel()
+
+        # Sum the contributions from each of the four source points
+        adv_field = np.zeros(data.shape, dtype=np.float32)
+        for indices, xwt, ywt in zip(source_indices, x_weights, y_weights):
+            adv_field += source_data[indices] * xwt * ywt
+        adv_field[~in_bounds] = np.nan
 
         # Replace NaNs with a mask
         adv_field = np.ma.masked_where(~np.isfinite(adv_field), adv_field)
 
         return adv_field
 
+    def _advect_field(self, data, grid_vel_x, grid_vel_y, timestep):
+        """
+        Performs a dimensionless grid-based extrapolation of spatial data
+        using advection velocities via a backwards method.  Points where data
+        cannot be extrapolated (ie the source is out of bounds) are given a
+        fill value of np.nan and masked.
+
+        Args:
+            data (numpy.ndarray or numpy.ma.MaskedArray):
+                2D numpy data array to be advected
+            grid_vel_x (numpy.ndarray):
+                Velocity in the x direction (in grid points per second)
+            grid_vel_y (numpy.ndarray):
+                Velocity in the y direction (in grid points per second)
+            timestep (int):
+                Advection time step in seconds
+
+        Returns:
+            numpy.ma.MaskedArray:
+                2D float array of advected data values with masked "no data"
+                regions
+        """
+        # Cater for special case where timestep (int) is 0
+        if timestep == 0:
+            return data
+
+        operator = self._advection_operator(grid_vel_x, grid_vel_y, timestep)
+        return self._apply_advection_operator(data, operator)
+
     def process(self, cube, timestep):
         """
         Extrapolates input cube data and updates validity time.  The input
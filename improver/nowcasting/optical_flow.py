@@ -38,7 +38,7 @@ import iris
 import numpy as np
 from iris.exceptions import (
     CoordinateCollapseError, CoordinateNotFoundError, InvalidCubeError)
-from scipy import ndimage, signal
+from scipy import ndimage, sparse
 
 from improver import BasePlugin
 from improver.metadata.amend import amend_attributes
@@ -277,46 +277,46 @@ class OpticalFlow(BasePlugin):
         smoothed_diffs[1:-1, 1:-1] = self.interp_to_midpoint(tdiff)
         return self.interp_to_midpoint(smoothed_diffs)
 
-    def _make_subboxes(self, field):
+    def _sum_over_boxes(self, field):
         """
-        Generate a list of non-overlapping "boxes" of size self.boxsize**2
-        from the input field, along with weights based on data values at times
-        1 and 2.  The final boxes in the list will be smaller if the size of
-        the data field is not an exact multiple of "boxsize".
+        Sum an input field over each of the non-overlapping "boxes" of size
+        self.boxsize**2.  The final boxes along each axis are smaller if the
+        size of the field is not an exact multiple of "boxsize".
+
+        Args:
+            field (numpy.ndarray):
+                Input field
+
+        Returns:
+            numpy.ndarray:
+                2D array of the sum over each box, on the box grid
+        """
+        row_starts = np.arange(0, field.shape[0], self.boxsize)
+        column_starts = np.arange(0, field.shape[1], self.boxsize)
+        return np.add.reduceat(
+            np.add.reduceat(field, row_starts, axis=0), column_starts, axis=1)
+
+    def _box_weights(self):
+        """
+        Calculate the weight of each box based on data values at times
+        1 and 2.
 
         Note that the weights calculated below are valid for precipitation
         rates in mm/hr. This is a result of the constant 0.8 that is used,
         noting that in the source paper a value of 0.75 is used; see equation
         8. in Bowler et al. 2004.
 
-        Args:
-            field (numpy.ndarray):
-                Input field (partial derivative)
-
         Returns:
-            (tuple): tuple containing:
-                **boxes** (list of numpy.ndarray):
-                    List of numpy.ndarrays of size boxsize*boxsize containing
-                    slices of data from input field.
-                **weights** (numpy.ndarray):
-                    1D numpy array containing weights values associated with
-                    each listed box.
-
+            numpy.ndarray:
+                2D array containing the weight of each box, on the box grid
         """
-        boxes = []
-        weights = []
         weighting_factor = 0.5 / self.boxsize**2.
-        for i in range(0, field.shape[0], self.boxsize):
-            for j in range(0, field.shape[1], self.boxsize):
-                boxes.append(field[i:i+self.boxsize, j:j+self.boxsize])
-                weight = weighting_factor*(
-                    (self.data1[i:i+self.boxsize, j:j+self.boxsize]).sum() +
-                    (self.data2[i:i+self.boxsize, j:j+self.boxsize]).sum())
-                weight = 1. - np.exp(-1.*weight/0.8)
-                weights.append(weight)
-        weights = np.array(weights, dtype=np.float32)
+        weights = weighting_factor*(
+            self._sum_over_boxes(self.data1) +
+            self._sum_over_boxes(self.data2))
+        weights = (1. - np.exp(-1.*weights/0.8)).astype(np.float32)
         weights[weights < 0.01] = 0
-        return boxes, weights
+        return weights
 
     def _box_to_grid(self, box_data):
         """
@@ -396,9 +396,15 @@ class OpticalFlow(BasePlugin):
 
         """
         if method == 'kernel':
-            kernel = self.makekernel(radius)
-            smoothed_field = signal.convolve2d(
-                field, kernel, mode='same', boundary="symm")
+            # The kernel is the outer product of a 1D kernel with itself, so
+            # smooth along each axis in turn.  The "reflect" mode is
+            # equivalent to symmetric boundary conditions.
+            kernel_1d = 1 - np.abs(np.linspace(-1, 1, radius*2+1))
+            kernel_1d /= kernel_1d.sum()
+            smoothed_field = field.astype(np.float64)
+            for axis in range(2):
+                smoothed_field = ndimage.convolve1d(
+                    smoothed_field, kernel_1d, axis=axis, mode='reflect')
         elif method == 'box':
             smoothed_field = ndimage.filters.uniform_filter(
                 field, size=radius*2+1, mode='nearest')
@@ -406,56 +412,82 @@ class OpticalFlow(BasePlugin):
         smoothed_field = smoothed_field.astype(field.dtype)
         return smoothed_field
 
-    def _smart_smooth(self, vel_point, vel_iter, weights):
+    def _smart_smoothing_operator(self, vel_point, weights):
         """
-        Performs a single iteration of "smart smoothing" over a point and its
-        neighbours as implemented in STEPS.  This smoothing (through the
-        "weights" argument) ignores advection displacements which are
-        identically zero, as these are assumed to occur only where there is no
-        data structure from which to calculate displacements.
+        Construct the affine operator that performs a single iteration of
+        "smart smoothing" over a point and its neighbours as implemented in
+        STEPS.  This smoothing (through the "weights" argument) ignores
+        advection displacements which are identically zero, as these are
+        assumed to occur only where there is no data structure from which to
+        calculate displacements.  As the weights and the
+        original data are the same for every iteration, each iteration is a
+        fixed linear combination of the values of a point and its neighbours
+        from the previous iteration, plus a fixed contribution from the
+        original data.
 
         Args:
             vel_point (numpy.ndarray):
                 Original unsmoothed data
-            vel_iter (numpy.ndarray):
-                Latest iteration of smart-smoothed displacement
             weights (numpy.ndarray):
                 Weight of each grid point for averaging
 
         Returns:
-            numpy.ndarray:
-                Next iteration of smart-smoothed displacement
+            (tuple): tuple containing:
+                **matrix** (scipy.sparse.csr_matrix):
+                    Matrix giving the contribution of the flattened values
+                    of the latest iteration to the next iteration
+                **offset** (numpy.ndarray):
+                    Flattened contribution of the original data to the next
+                    iteration
         """
         # define kernel for neighbour weighting
         neighbour_kernel = (np.array([[0.5, 1, 0.5],
                                       [1.0, 0, 1.0],
                                       [0.5, 1, 0.5]])/6.).astype(np.float32)
-
-        # smooth input data and weights fields
-        vel_neighbour = ndimage.convolve(weights*vel_iter, neighbour_kernel)
+        weights = np.asarray(weights, dtype=np.float64)
         neighbour_weights = ndimage.convolve(weights, neighbour_kernel)
 
-        # initialise output data from latest iteration
-        vel = ndimage.convolve(vel_iter, neighbour_kernel)
-
         # create "point" and "neighbour" validity masks using original and
         # kernel-smoothed weights
         pmask = abs(weights) > 0
         nmask = abs(neighbour_weights) > 0
 
-        # where neighbouring points have weight, set up a "background" of
-        # weighted average neighbouring values
-        vel[nmask] = vel_neighbour[nmask] / neighbour_weights[nmask]
-
-        # where a point has weight, calculate a weighted sum of the original
-        # (uniterated) point value and its smoothed neighbours
+        # Where a point has weight, the next iteration is a weighted sum of
+        # the original (uniterated) point value and the weighted average of
+        # its neighbours.  Otherwise where neighbouring points have weight,
+        # it is the weighted average of the neighbouring values, and if
+        # not, the unweighted average.
         nweight = 1.0 - self.point_weight
         pweight = self.point_weight * weights
         norm = nweight * neighbour_weights + pweight
-
-        vel[pmask] = (vel_neighbour[pmask] * nweight +
-                      vel_point[pmask] * pweight[pmask]) / norm[pmask]
-        return vel
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scale = np.where(
+                pmask, nweight / norm,
+                np.where(nmask, 1. / neighbour_weights, 1.))
+            offset = np.where(pmask, vel_point * pweight / norm, 0.)
+
+        # Find the neighbours of each point, reflecting at the edges as
+        # ndimage.convolve does.
+        nrows, ncols = weights.shape
+        rows, cols = np.indices(weights.shape)
+        point_index = np.ravel_multi_index((rows, cols), weights.shape)
+        matrix_rows, matrix_cols, matrix_data = [], [], []
+        for i, j in zip(*np.nonzero(neighbour_kernel)):
+            neighbour_rows = np.clip(rows + i - 1, 0, nrows - 1)
+            neighbour_cols = np.clip(cols + j - 1, 0, ncols - 1)
+            neighbour_weight = np.where(
+                pmask | nmask, weights[neighbour_rows, neighbour_cols], 1.)
+            matrix_rows.append(point_index)
+            matrix_cols.append(np.ravel_multi_index(
+                (neighbour_rows, neighbour_cols), weights.shape))
+            matrix_data.append(
+                neighbour_kernel[i, j] * neighbour_weight * scale)
+        matrix = sparse.csr_matrix(
+            (np.concatenate(matrix_data, axis=None),
+             (np.concatenate(matrix_rows, axis=None),
+              np.concatenate(matrix_cols, axis=None))),
+            shape=(weights.size, weights.size))
+        return matrix, offset.flatten()
 
     def _smooth_advection_fields(self, box_data, weights):
         """
@@ -468,7 +500,7 @@ class OpticalFlow(BasePlugin):
 
         Args:
             box_data (numpy.ndarray):
-                Displacements on box grid (modified by this function)
+                Displacements on box grid
             weights (numpy.ndarray):
                 Weights for smart smoothing
 
@@ -477,11 +509,13 @@ class OpticalFlow(BasePlugin):
                 Smoothed displacement vectors on input data grid
 
         """
-        v_orig = np.copy(box_data)
-
-        # iteratively smooth umat and vmat
+        # iteratively smooth umat and vmat, constructing the operator for
+        # a single iteration once
+        matrix, offset = self._smart_smoothing_operator(box_data, weights)
+        vel = box_data.flatten().astype(np.float64)
         for _ in range(self.iterations):
-            box_data = self._smart_smooth(v_orig, box_data, weights)
+            vel = matrix.dot(vel) + offset
+        box_data = vel.reshape(box_data.shape).astype(box_data.dtype)
 
         # reshape smoothed box velocity arrays to match input data grid
         grid_data = self._box_to_grid(box_data)
@@ -513,17 +547,47 @@ class OpticalFlow(BasePlugin):
                 2-column matrix (u, v) containing scalar displacement values
 
         """
-        deriv_t = deriv_t.reshape([deriv_t.size, 1])
+        deriv_xy = np.asarray(deriv_xy, dtype=np.float64)
+        deriv_t = np.asarray(deriv_t, dtype=np.float64).flatten()
         m_to_invert = (deriv_xy.transpose()).dot(deriv_xy)
-        try:
-            m_inverted = np.linalg.inv(m_to_invert)
-        except np.linalg.LinAlgError:
-            # if matrix is not invertible, set velocities to zero
-            velocity = np.array([0, 0])
-        else:
-            scale = (deriv_xy.transpose()).dot(deriv_t)
-            velocity = -m_inverted.dot(scale)[:, 0]
-        return velocity
+        scale = (deriv_xy.transpose()).dot(deriv_t)
+        u, v = OpticalFlow._solve_normal_equations(
+            m_to_invert[0, 0], m_to_invert[0, 1], m_to_invert[1, 1],
+            scale[0], scale[1])
+        return np.array([u, v])
+
+    @staticmethod
+    def _solve_normal_equations(sum_xx, sum_xy, sum_yy, sum_xt, sum_yt):
+        """
+        Solve the 2x2 normal equations of the optical flow least-squares
+        problem in closed form, for any number of boxes at once.  Where the
+        matrix to invert is singular, the displacements are set to 0.
+
+        Args:
+            sum_xx (numpy.ndarray or float):
+                Sum of the squared derivatives d/dx over each box
+            sum_xy (numpy.ndarray or float):
+                Sum of the products of the derivatives d/dx and d/dy
+            sum_yy (numpy.ndarray or float):
+                Sum of the squared derivatives d/dy
+            sum_xt (numpy.ndarray or float):
+                Sum of the products of the derivatives d/dx and d/dt
+            sum_yt (numpy.ndarray or float):
+                Sum of the products of the derivatives d/dy and d/dt
+
+        Returns:
+            (tuple): tuple containing:
+                **u** (numpy.ndarray or float):
+                    Displacement in the x direction for each box
+                **v** (numpy.ndarray or float):
+                    Displacement in the y direction for each box
+        """
+        determinant = sum_xx * sum_yy - sum_xy * sum_xy
+        singular = determinant == 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            u = -(sum_yy * sum_xt - sum_xy * sum_yt) / determinant
+            v = -(sum_xx * sum_yt - sum_xy * sum_xt) / determinant
+        return np.where(singular, 0., u)[()], np.where(singular, 0., v)[()]
 
     @staticmethod
     def extreme_value_check(umat, vmat, weights):
@@ -567,35 +631,27 @@ class OpticalFlow(BasePlugin):
                     2D array of displacements in the y-direction
         """
 
-        # (a) Generate lists of subboxes over which velocity is constant
-        dx_boxed, box_weights = self._make_subboxes(partial_dx)
-        dy_boxed, _ = self._make_subboxes(partial_dy)
-        dt_boxed, _ = self._make_subboxes(partial_dt)
-
-        # (b) Solve optical flow displacement calculation on each subbox
-        velocity = ([], [])
-        for deriv_x, deriv_y, deriv_t in zip(dx_boxed, dy_boxed, dt_boxed):
-
-            # Flatten arrays to create the system of linear simultaneous
-            # equations to solve for this subbox
-            deriv_x = deriv_x.flatten()
-            deriv_y = deriv_y.flatten()
-            deriv_t = deriv_t.flatten()
-            # deriv_xy must be float64 in order to work OK.
-            deriv_xy = (
-                np.array([deriv_x, deriv_y], dtype=np.float64)).transpose()
-
-            # Solve equations for u and v through matrix inversion
-            u, v = self.solve_for_uv(deriv_xy, deriv_t)
-            velocity[0].append(u)
-            velocity[1].append(v)
-
-        # (c) Reshape displacement arrays to match array of subbox points
-        newshape = [int((self.shape[0]-1)/self.boxsize) + 1,
-                    int((self.shape[1]-1)/self.boxsize) + 1]
-        umat = np.array(velocity[0], dtype=np.float32).reshape(newshape)
-        vmat = np.array(velocity[1], dtype=np.float32).reshape(newshape)
-        weights = box_weights.reshape(newshape)
+        # (a) Sum the terms of the equations over each subbox, over which
+        #     velocity is constant.  These must be float64 in order to work
+        #     OK.
+        deriv_x = partial_dx.astype(np.float64)
+        deriv_y = partial_dy.astype(np.float64)
+        deriv_t = partial_dt.astype(np.float64)
+        sum_xx = self._sum_over_boxes(deriv_x * deriv_x)
+        sum_xy = self._sum_over_boxes(deriv_x * deriv_y)
+        sum_yy = self._sum_over_boxes(deriv_y * deriv_y)
+        sum_xt = self._sum_over_boxes(deriv_x * deriv_t)
+        sum_yt = self._sum_over_boxes(deriv_y * deriv_t)
+
+        # (b) Solve optical flow displacement calculation on all subboxes at
+        #     once, giving displacement arrays on the grid of subboxes
+        umat, vmat = self._solve_normal_equations(
+            sum_xx, sum_xy, sum_yy, sum_xt, sum_yt)
+        umat = umat.astype(np.float32)
+        vmat = vmat.astype(np.float32)
+
+        # (c) Calculate the weight of each subbox
+        weights = self._box_weights()
 
         # (d) Check for extreme advection displacements (over a significant
         #     proportion of the domain size) and set to zero
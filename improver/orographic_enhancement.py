@@ -301,38 +301,52 @@ class OrographicEnhancement(BasePlugin):
             numerator[mask], self.temperature.data[mask])
         return np.where(point_orogenh > 0, point_orogenh, 0)
 
-    def _get_point_distances(self, wind_speed, max_sin_cos):
+    def _get_max_range_of_influence(self, max_sin_cos):
+        """
+        Calculate the maximum upstream range of influence at each grid cell
+
+        Args:
+            max_sin_cos (numpy.ndarray):
+                2D array containing the larger of sin(wind_direction) or
+                cos(wind_direction) with respect to grid north
+
+        Returns:
+            numpy.ndarray:
+                2D array of maximum ranges of influence in grid squares
+        """
+        upstream_roi = (
+            self.upstream_range_of_influence_km / self.grid_spacing_km)
+        return (upstream_roi * max_sin_cos).astype(int)
+
+    @staticmethod
+    def _get_point_distances(max_roi, max_sin_cos, steps=None):
         """
         Generate 3d array of distances to upstream components
 
         Args:
-            wind_speed (numpy.ndarray):
-                2D array of wind speeds
             max_roi (numpy.ndarray):
                 2D array of maximum ranges of influence in grid squares
             max_sin_cos (numpy.ndarray):
                 2D array containing the larger of sin(wind_direction) or
                 cos(wind_direction) with respect to grid north
+            steps (slice or None):
+                Range of upstream steps, along the leading dimension of the
+                returned array, for which to generate distances. If None,
+                distances are generated for all steps up to the largest
+                range of influence.
 
         Returns:
             numpy.ndarray:
                 3D array of source-to-destination distances in grid points,
                 with np.nan filled in for out of range values
         """
-        # calculate maximum upstream radius of influence at each grid cell
-        upstream_roi = (
-            self.upstream_range_of_influence_km / self.grid_spacing_km)
-        max_roi = (upstream_roi * max_sin_cos).astype(int)
-
-        length = np.amax(max_roi)
-        shape = (length, wind_speed.shape[0], wind_speed.shape[1])
-        distance = np.full(shape, np.nan, dtype=np.float32)
-        for y in range(distance.shape[1]):
-            for x in range(distance.shape[2]):
-                distance[:max_roi[y, x], y, x] = (
-                    np.arange(max_roi[y, x]) / max_sin_cos[y, x])
-
-        return distance
+        step = np.arange(np.amax(max_roi))
+        if steps is not None:
+            step = step[steps]
+        step = step.reshape(-1, 1, 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            distance = np.where(step < max_roi, step / max_sin_cos, np.nan)
+        return distance.astype(np.float32)
 
     @staticmethod
     def _locate_source_points(
@@ -405,10 +419,8 @@ class OrographicEnhancement(BasePlugin):
                 **sum_of_weights** (numpy.ndarray):
                     2D array containing weights for normalisation
         """
-        source_values = np.fromiter(
-            (point_orogenh[y, x] for (x, y) in zip(x_source.flatten(),
-                                                   y_source.flatten())),
-            np.float32, count=x_source.size).reshape(x_source.shape)
+        source_values = np.asarray(
+            point_orogenh, dtype=np.float32)[y_source, x_source]
 
         # set standard deviation for Gaussian weighting function in grid
         # squares
@@ -454,16 +466,21 @@ class OrographicEnhancement(BasePlugin):
         max_sin_cos = np.where(abs(sin_wind_dir) > abs(cos_wind_dir),
                                abs(sin_wind_dir), abs(cos_wind_dir))
 
-        # generate 3D array of distances to source points
-        distance = self._get_point_distances(wind_speed, max_sin_cos)
-
-        # calculate positions of source points
-        x_source, y_source = self._locate_source_points(
-            wind_speed, distance, sin_wind_dir, cos_wind_dir)
-
-        # compute weighted enhancements summed over all source points
-        orogenh, sum_of_weights = self._compute_weighted_values(
-            point_orogenh, x_source, y_source, distance, wind_speed)
+        # compute weighted enhancements summed over all source points, one
+        # upstream distance step at a time so that the 3D arrays of distances
+        # and source points are never held in full
+        orogenh = np.zeros(wind_speed.shape, dtype=np.float32)
+        sum_of_weights = np.zeros(wind_speed.shape, dtype=np.float32)
+        max_roi = self._get_max_range_of_influence(max_sin_cos)
+        for step in range(np.amax(max_roi)):
+            distance = self._get_point_distances(
+                max_roi, max_sin_cos, steps=slice(step, step + 1))
+            x_source, y_source = self._locate_source_points(
+                wind_speed, distance, sin_wind_dir, cos_wind_dir)
+            step_orogenh, step_weights = self._compute_weighted_values(
+                point_orogenh, x_source, y_source, distance, wind_speed)
+            orogenh += step_orogenh
+            sum_of_weights += step_weights
 
         # normalise by weights and scale by efficiency factor
         orogenh[mask] = self.efficiency_factor * np.divide(
@@ -204,24 +204,29 @@ class Utilities:
         WetBulbTemperature.check_range(temperature.data, 173., 373.)
 
         data = temperature.data.copy()
-        for cell in np.nditer(data, op_flags=['readwrite']):
-            if cell > triple_pt:
-                n0 = constants[1] * (1. - triple_pt / cell)
-                n1 = constants[2] * np.log10(cell / triple_pt)
-                n2 = constants[3] * (1. - np.power(10.,
-                                                   (constants[4] *
-                                                    (cell / triple_pt - 1.))))
-                n3 = constants[5] * (np.power(10., (constants[6] *
-                                                    (1. - triple_pt / cell))) -
-                                     1.)
-                log_es = n0 - n1 + n2 + n3 + constants[7]
-                cell[...] = (np.power(10., log_es))
-            else:
-                n0 = constants[8] * ((triple_pt / cell) - 1.)
-                n1 = constants[9] * np.log10(triple_pt / cell)
-                n2 = constants[10] * (1. - (cell / triple_pt))
-                log_es = n0 - n1 + n2 + constants[11]
-                cell[...] = (np.power(10., log_es))
+        # Evaluate in double precision, as for the scalar form of the
+        # equation, casting back to the input type on assignment.
+        values = np.ma.getdata(data).astype(np.float64)
+        log_es = np.empty_like(values)
+
+        above = values > triple_pt
+        cell = values[above]
+        n0 = constants[1] * (1. - triple_pt / cell)
+        n1 = constants[2] * np.log10(cell / triple_pt)
+        n2 = constants[3] * (1. - np.power(10., (constants[4] *
+                                                 (cell / triple_pt - 1.))))
+        n3 = constants[5] * (np.power(10., (constants[6] *
+                                            (1. - triple_pt / cell))) - 1.)
+        log_es[above] = n0 - n1 + n2 + n3 + constants[7]
+
+        below = ~above
+        cell = values[below]
+        n0 = constants[8] * ((triple_pt / cell) - 1.)
+        n1 = constants[9] * np.log10(triple_pt / cell)
+        n2 = constants[10] * (1. - (cell / triple_pt))
+        log_es[below] = n0 - n1 + n2 + constants[11]
+
+        np.ma.getdata(data)[...] = np.power(10., log_es)
 
         # Create SVP cube
         svp = iris.cube.Cube(
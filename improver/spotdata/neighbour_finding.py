@@ -31,14 +31,19 @@
 
 """Neighbour finding for the Improver site specific process chain."""
 
+import copy
+import hashlib
+import os
+import tempfile
 import warnings
 
 import cartopy.crs as ccrs
+import iris
 import numpy as np
 from scipy.spatial import cKDTree
 
 from improver import BasePlugin
-from improver.metadata.utilities import create_coordinate_hash
+from improver.metadata.utilities import create_coordinate_hash, generate_hash
 from improver.spotdata.build_spotdata_cube import build_spotdata_cube
 from improver.utilities.cube_manipulation import enforce_coordinate_ordering
 
@@ -67,7 +72,7 @@ class NeighbourSelection(BasePlugin):
                  search_radius=1.0E4,
                  site_coordinate_system=ccrs.PlateCarree(),
                  site_x_coordinate='longitude', site_y_coordinate='latitude',
-                 node_limit=36):
+                 node_limit=36, cache_directory=None):
         """
         Args:
             land_constraint (bool):
@@ -94,6 +99,13 @@ class NeighbourSelection(BasePlugin):
                 The upper limit for the number of nearest neighbours to return
                 when querying the tree for a selection of neighbours from which
                 one matching the minimum_dz constraint will be picked.
+            cache_directory (str or None):
+                Directory in which the nodes of KDTrees built for
+                land_constraint or minimum_dz neighbour finding are stored,
+                keyed by the model grid and the grid points included in the
+                tree.  Trees are built from nodes found here rather than from
+                the grid coordinates.  The directory is created if
+                necessary.  If None, trees are not cached.
         """
         self.minimum_dz = minimum_dz
         self.land_constraint = land_constraint
@@ -103,6 +115,7 @@ class NeighbourSelection(BasePlugin):
         self.site_y_coordinate = site_y_coordinate
         self.site_altitude = 'altitude'
         self.node_limit = node_limit
+        self.cache_directory = cache_directory
         self.global_coordinate_system = False
 
     def __repr__(self):
@@ -323,17 +336,136 @@ class NeighbourSelection(BasePlugin):
 
         x_indices = included_points[0]
         y_indices = included_points[1]
-        x_coords = land_mask.coord(axis='x').points[x_indices]
-        y_coords = land_mask.coord(axis='y').points[y_indices]
 
-        if self.global_coordinate_system:
-            nodes = self.geocentric_cartesian(land_mask, x_coords, y_coords)
+        cached = None
+        if self.cache_directory is not None:
+            cache_key = self._kdtree_cache_key(land_mask, x_indices, y_indices)
+            cached = self._load_cached_nodes(cache_key)
+
+        if cached is not None:
+            nodes, index_nodes = cached
         else:
-            nodes = list(zip(x_coords, y_coords))
+            x_coords = land_mask.coord(axis='x').points[x_indices]
+            y_coords = land_mask.coord(axis='y').points[y_indices]
+
+            if self.global_coordinate_system:
+                nodes = self.geocentric_cartesian(
+                    land_mask, x_coords, y_coords)
+            else:
+                nodes = np.stack((x_coords, y_coords), axis=1)
+            index_nodes = np.stack((x_indices, y_indices), axis=1)
+
+            if self.cache_directory is not None:
+                self._save_cached_nodes(cache_key, nodes, index_nodes)
+
+        tree = cKDTree(nodes)
+        return tree, index_nodes
+
+    def _kdtree_cache_key(self, land_mask, x_indices, y_indices):
+        """
+        Generate a key that identifies a KDTree by the model grid, whether the
+        grid is global and the grid points that are included in the tree.
+
+        Args:
+            land_mask (iris.cube.Cube):
+                A land mask cube for the model/grid from which grid point
+                neighbours are being selected.
+            x_indices (numpy.ndarray):
+                The x indices of the grid points included in the tree.
+            y_indices (numpy.ndarray):
+                The y indices of the grid points included in the tree.
+        Returns:
+            str:
+                A hexadecimal string identifying the tree.
+        """
+        included_points_hash = hashlib.sha256(
+            np.ascontiguousarray(x_indices).tobytes() +
+            np.ascontiguousarray(y_indices).tobytes()).hexdigest()
+        return generate_hash([create_coordinate_hash(land_mask),
+                              self.global_coordinate_system,
+                              land_mask.shape, included_points_hash])
+
+    def _cache_paths(self, cache_key):
+        """
+        Return the paths of the files in which the nodes of a cached KDTree
+        and its index nodes are stored.
+
+        Args:
+            cache_key (str):
+                The key identifying the tree.
+        Returns:
+            (tuple): tuple containing:
+                **str**:
+                    Path of the tree nodes array.
+                **str**:
+                    Path of the index nodes array.
+        """
+        prefix = os.path.join(self.cache_directory, 'kdtree_{}'.format(
+            cache_key))
+        return prefix + '_nodes.npy', prefix + '_index_nodes.npy'
+
+    def _load_cached_nodes(self, cache_key):
+        """
+        Load the nodes of a KDTree and its index nodes from the cache
+        directory.  Both arrays are memory-mapped rather than read into
+        memory, and only plain numpy arrays are accepted, so that a file in
+        the cache directory cannot run code when it is loaded.
+
+        Args:
+            cache_key (str):
+                The key identifying the tree.
+        Returns:
+            tuple or None:
+                The tree nodes, as coordinates of shape (n_nodes, 2) or
+                (n_nodes, 3), and the index nodes, or None if they are not
+                in the cache or cannot be read.
+        """
+        nodes_path, index_path = self._cache_paths(cache_key)
+        try:
+            nodes = np.load(nodes_path, mmap_mode='r', allow_pickle=False)
+            index_nodes = np.load(index_path, mmap_mode='r',
+                                  allow_pickle=False)
+        except (OSError, ValueError):
+            return None
+        if (nodes.ndim != 2 or index_nodes.shape != (nodes.shape[0], 2) or
+                not np.issubdtype(nodes.dtype, np.floating) or
+                not np.issubdtype(index_nodes.dtype, np.integer)):
+            return None
+        return nodes, index_nodes
 
-        index_nodes = np.array(list(zip(x_indices, y_indices)))
+    def _save_cached_nodes(self, cache_key, nodes, index_nodes):
+        """
+        Save the nodes of a KDTree and its index nodes to the cache
+        directory.  The nodes are stored rather than the tree itself, as
+        transforming the grid coordinates is the expensive part of building
+        the tree.  Each file is written to a temporary name and then renamed,
+        so that concurrent runs never see a partially written file.  Failure
+        to write to the cache is reported as a warning rather than an error.
 
-        return cKDTree(nodes), index_nodes
+        Args:
+            cache_key (str):
+                The key identifying the tree.
+            nodes (numpy.ndarray):
+                The coordinates of the tree nodes.
+            index_nodes (numpy.ndarray):
+                The grid indices that correspond to the tree nodes.
+        """
+        try:
+            os.makedirs(self.cache_directory, exist_ok=True)
+            for path, array in zip(self._cache_paths(cache_key),
+                                   [nodes, index_nodes]):
+                handle, temporary_path = tempfile.mkstemp(
+                    dir=self.cache_directory)
+                try:
+                    with os.fdopen(handle, 'wb') as temporary_file:
+                        np.save(temporary_file, array, allow_pickle=False)
+                    os.replace(temporary_path, path)
+                except BaseException:
+                    os.remove(temporary_path)
+                    raise
+        except OSError as err:
+            warnings.warn('Unable to cache KDTree in {}: {}'.format(
+                self.cache_directory, err))
 
     def select_minimum_dz(self, orography, site_altitude, index_nodes,
                           distance, indices):
@@ -368,66 +500,117 @@ class NeighbourSelection(BasePlugin):
                 point neighbour. Returns None if no valid neighbours were found
                 in the tree query.
         """
+        grid_points, found = self.select_minimum_dz_for_sites(
+            orography, np.array([site_altitude]), index_nodes,
+            np.array([distance]), np.array([indices]))
+        if not found[0]:
+            return None
+        return grid_points[0]
+
+    def select_minimum_dz_for_sites(self, orography, site_altitudes,
+                                    index_nodes, distances, indices):
+        """
+        Given a selection of nearest neighbours to each of a number of sites,
+        find the grid indices of the neighbour of each site with the minimum
+        vertical displacement, as described for select_minimum_dz. All sites
+        are processed together.
+
+        Args:
+            orography (iris.cube.Cube):
+                A cube of orography, used to obtain the grid point altitudes.
+            site_altitudes (numpy.ndarray):
+                The altitudes of the spot sites being considered.
+            index_nodes (numpy.ndarray):
+                An array of shape (n_nodes, 2) that contains the x and y
+                indices that correspond to the selected node,
+            distances (numpy.ndarray):
+                An array of shape (n_sites, n_neighbours) that contains the
+                distances from each spot site to each grid point neighbour
+                being considered. These may be np.inf if the neighbour is
+                beyond the search_radius.
+            indices (numpy.ndarray):
+                An array of shape (n_sites, n_neighbours) of tree node indices
+                identifying the neighbouring grid points, corresponding to the
+                array of distances.
+        Returns:
+            (tuple): tuple containing:
+                **numpy.ndarray**:
+                    An array of shape (n_sites, 2) giving the x and y indices
+                    of the chosen grid point neighbour of each site. Rows for
+                    sites without a valid neighbour should not be used.
+                **numpy.ndarray**:
+                    A boolean array of shape (n_sites,) which is False for
+                    sites where no valid neighbours were found in the tree
+                    query.
+        """
         # Values beyond the imposed search radius are set to inf,
         # these need to be excluded.
-        valid_indices = np.where(np.isfinite(distance))
-
-        # If no valid neighbours are available in the tree, return None.
-        if valid_indices[0].shape[0] == 0:
-            return None
+        valid = np.isfinite(distances)
+        found = valid.any(axis=1)
+        if not found.any():
+            return np.zeros((len(found), 2), dtype=index_nodes.dtype), found
 
         # If the last distance is finite the number of tree nodes may not be
         # sufficient to fill the search radius, raise a warning.
-        if np.isfinite(distance[-1]):
+        if np.isfinite(distances[:, -1]).any():
             msg = ('Limit on number of nearest neighbours to return, {}, may '
                    'not be sufficiently large to fill search_radius {}'.format(
                        self.node_limit, self.search_radius))
             warnings.warn(msg)
 
-        indices = indices[valid_indices]
-
-        # Calculate the difference in height between the spot site
-        # and grid point.
-        grid_point_altitudes = orography.data[tuple(index_nodes[indices].T)]
-        vertical_displacements = abs(grid_point_altitudes - site_altitude)
-
-        # The tree returns an ordered array, the first element
-        # being the closest. We search the array for the first
-        # element that matches the minimum vertical displacement
-        # found, giving us the nearest such point.
-        index_of_minimum = (
-            np.argmax(vertical_displacements ==
-                      vertical_displacements.min()))
-        grid_point = index_nodes[indices][index_of_minimum]
-
-        return grid_point
-
-    def process(self, sites, orography, land_mask):
+        # Calculate the difference in height between each spot site and its
+        # grid point neighbours, using the orography precision. Invalid
+        # neighbours are given an infinite displacement.
+        neighbour_nodes = index_nodes[np.where(valid, indices, 0)]
+        grid_point_altitudes = orography.data[
+            neighbour_nodes[..., 0], neighbour_nodes[..., 1]]
+        site_altitudes = np.asarray(site_altitudes, dtype=float).astype(
+            np.result_type(grid_point_altitudes.dtype, 0.))
+        vertical_displacements = np.where(
+            valid,
+            abs(grid_point_altitudes - site_altitudes[:, np.newaxis]),
+            np.inf)
+
+        # The tree returns ordered arrays, the first element being the
+        # closest. The first element that matches the minimum vertical
+        # displacement found gives us the nearest such point.
+        index_of_minimum = np.argmin(vertical_displacements, axis=1)
+        grid_points = neighbour_nodes[
+            np.arange(neighbour_nodes.shape[0]), index_of_minimum]
+
+        return grid_points, found
+
+    def _prepare_sites(self, sites, orography, land_mask):
         """
-        Using the constraints provided, find the nearest grid point neighbours
-        to the given spot sites for the model/grid given by the input cubes.
-        Returned is a cube that contains the defining characteristics of the
-        spot sites (e.g. x coordinate, y coordinate, altitude) and the indices
-        of the selected grid point neighbour.
+        Check the input cubes and find the coordinates, nearest grid point
+        and altitude of each site, as required by every neighbour finding
+        method.
 
         Args:
             sites (list of dict):
                 A list of dictionaries defining the spot sites for which
-                neighbours are to be found. e.g.:
-
-                   [{'altitude': 11.0, 'latitude': 57.867000579833984,
-                    'longitude': -5.632999897003174, 'wmo_id': 3034}]
-
+                neighbours are to be found.
             orography (iris.cube.Cube):
                 A cube of orography, used to obtain the grid point altitudes.
             land_mask (iris.cube.Cube):
                 A land mask cube for the model/grid from which grid point
                 neighbours are being selected.
         Returns:
-            iris.cube.Cube:
-                A cube containing both the spot site information and for each
-                the grid point indices of its nearest neighbour as per the
-                imposed constraints.
+            (tuple): tuple containing:
+                **sites** (list of dict):
+                    The sites that fall within the domain of the grid.
+                **site_coords** (numpy.ndarray):
+                    The site coordinates in the coordinate system of the grid.
+                **site_x_coords** (numpy.ndarray):
+                    The site x coordinates as given.
+                **site_y_coords** (numpy.ndarray):
+                    The site y coordinates as given.
+                **nearest_indices** (numpy.ndarray):
+                    The x and y indices of the nearest grid point to each
+                    site.
+                **site_altitudes** (numpy.ndarray):
+                    The site altitudes, using the altitude of the nearest
+                    grid point for sites without an altitude.
         """
         # Check if we are dealing with a global grid.
         self.global_coordinate_system = orography.coord(axis='x').circular
@@ -480,47 +663,117 @@ class NeighbourSelection(BasePlugin):
                                   orography.data[tuple(nearest_indices.T)],
                                   site_altitudes)
 
-        # If further constraints are being applied, build a KD Tree which
-        # includes points filtered by constraint.
-        if self.land_constraint or self.minimum_dz:
-            # Build the KDTree, an internal test for the land_constraint checks
-            # whether to exclude sea points from the tree.
-            tree, index_nodes = self.build_KDTree(land_mask)
+        return (sites, site_coords, site_x_coords, site_y_coords,
+                nearest_indices, site_altitudes)
 
-            # Site coordinates made cartesian for global coordinate system
-            if self.global_coordinate_system:
-                site_coords = self.geocentric_cartesian(
-                    orography, site_coords[:, 0], site_coords[:, 1])
-
-            if not self.minimum_dz:
-                # Query the tree for the nearest neighbour, in this case a land
-                # neighbour is returned along with the distance to it.
-                distances, node_indices = tree.query([site_coords])
-                # Look up the grid coordinates that correspond to the tree node
-                land_neighbour_indices, = index_nodes[node_indices]
-                # Use the found land neighbour if it is within the
-                # search_radius, otherwise use the nearest neighbour.
-                distances = np.array([distances[0], distances[0]]).T
-                nearest_indices = np.where(distances < self.search_radius,
-                                           land_neighbour_indices,
-                                           nearest_indices)
-            else:
-                # Query the tree for self.node_limit nearby neighbours.
-                distances, node_indices = tree.query(
-                    [site_coords], distance_upper_bound=self.search_radius,
-                    k=self.node_limit)
-                # Loop over the sites and for each choose the returned
-                # neighbour with the minimum vertical displacement.
-                for index, (distance, indices) in enumerate(zip(
-                        distances[0], node_indices[0])):
-                    grid_point = self.select_minimum_dz(
-                        orography, site_altitudes[index], index_nodes,
-                        distance, indices)
-                    # None is returned if the tree query returned no neighbours
-                    # within the search radius.
-                    if grid_point is not None:
-                        nearest_indices[index] = grid_point
+    def _query_tree(self, orography, land_mask, site_coords):
+        """
+        Build a KDTree, including only land points if land_constraint is set,
+        and query it for up to self.node_limit neighbours of each site within
+        the search radius.  The first neighbour is the nearest, so the same
+        query serves the methods with and without minimum_dz.
+
+        Args:
+            orography (iris.cube.Cube):
+                A cube of orography, defining the model grid.
+            land_mask (iris.cube.Cube):
+                A land mask cube for the model/grid from which grid point
+                neighbours are being selected.
+            site_coords (numpy.ndarray):
+                The site coordinates in the coordinate system of the grid.
+        Returns:
+            (tuple): tuple containing:
+                **index_nodes** (numpy.ndarray):
+                    The x and y indices that correspond to each tree node.
+                **distances** (numpy.ndarray):
+                    An array of shape (n_sites, node_limit) of distances
+                    from each site to its neighbours, nearest first, which
+                    are np.inf beyond the search radius.
+                **node_indices** (numpy.ndarray):
+                    An array of shape (n_sites, node_limit) of the tree nodes
+                    that correspond to the distances.
+        """
+        # Build the KDTree, an internal test for the land_constraint checks
+        # whether to exclude sea points from the tree.
+        tree, index_nodes = self.build_KDTree(land_mask)
+
+        # Site coordinates made cartesian for global coordinate system
+        if self.global_coordinate_system:
+            site_coords = self.geocentric_cartesian(
+                orography, site_coords[:, 0], site_coords[:, 1])
+
+        distances, node_indices = tree.query(
+            [site_coords], distance_upper_bound=self.search_radius,
+            k=self.node_limit)
+        return (index_nodes,
+                distances.reshape(len(site_coords), self.node_limit),
+                node_indices.reshape(len(site_coords), self.node_limit))
+
+    def _select_neighbours(self, orography, site_altitudes, nearest_indices,
+                           index_nodes, distances, node_indices):
+        """
+        Select the neighbour of each site from the result of a tree query,
+        using the nearest neighbour for sites without a neighbour within the
+        search radius.
+
+        Args:
+            orography (iris.cube.Cube):
+                A cube of orography, used to obtain the grid point altitudes.
+            site_altitudes (numpy.ndarray):
+                The altitudes of the spot sites.
+            nearest_indices (numpy.ndarray):
+                The x and y indices of the nearest grid point to each site.
+            index_nodes (numpy.ndarray):
+                The x and y indices that correspond to each tree node.
+            distances (numpy.ndarray):
+                An array of shape (n_sites, n_neighbours) of distances from
+                each site to its neighbours, nearest first.
+            node_indices (numpy.ndarray):
+                An array of shape (n_sites, n_neighbours) of the tree nodes
+                that correspond to the distances.
+        Returns:
+            numpy.ndarray:
+                The x and y indices of the selected neighbour of each site.
+        """
+        if not self.minimum_dz:
+            # The first neighbour returned by the tree is the nearest, in
+            # this case a land neighbour, which is used if it is within the
+            # search radius.
+            found = np.isfinite(distances[:, 0])
+            grid_points = index_nodes[np.where(found, node_indices[:, 0], 0)]
+        else:
+            # For each site choose the returned neighbour with the minimum
+            # vertical displacement, unless the tree query returned no
+            # neighbours within the search radius.
+            grid_points, found = self.select_minimum_dz_for_sites(
+                orography, site_altitudes, index_nodes, distances,
+                node_indices)
+        return np.where(found[:, np.newaxis], grid_points, nearest_indices)
+
+    def _build_neighbour_cube(self, sites, orography, site_x_coords,
+                              site_y_coords, nearest_indices, site_altitudes):
+        """
+        Create a cube that contains the defining characteristics of the spot
+        sites and the indices of the selected grid point neighbour of each.
 
+        Args:
+            sites (list of dict):
+                The spot sites.
+            orography (iris.cube.Cube):
+                A cube of orography, used to obtain the grid point altitudes.
+            site_x_coords (numpy.ndarray):
+                The site x coordinates as given.
+            site_y_coords (numpy.ndarray):
+                The site y coordinates as given.
+            nearest_indices (numpy.ndarray):
+                The x and y indices of the selected neighbour of each site.
+            site_altitudes (numpy.ndarray):
+                The altitudes of the spot sites.
+        Returns:
+            iris.cube.Cube:
+                A cube containing both the spot site information and for each
+                the grid point indices of its selected neighbour.
+        """
         # Calculate the vertical displacements between the chosen grid point
         # and the spot site.
         vertical_displacements = (site_altitudes -
@@ -562,3 +815,96 @@ class NeighbourSelection(BasePlugin):
         neighbour_cube.attributes['model_grid_hash'] = grid_hash
 
         return neighbour_cube
+
+    def process(self, sites, orography, land_mask):
+        """
+        Using the constraints provided, find the nearest grid point neighbours
+        to the given spot sites for the model/grid given by the input cubes.
+        Returned is a cube that contains the defining characteristics of the
+        spot sites (e.g. x coordinate, y coordinate, altitude) and the indices
+        of the selected grid point neighbour.
+
+        Args:
+            sites (list of dict):
+                A list of dictionaries defining the spot sites for which
+                neighbours are to be found. e.g.:
+
+                   [{'altitude': 11.0, 'latitude': 57.867000579833984,
+                    'longitude': -5.632999897003174, 'wmo_id': 3034}]
+
+            orography (iris.cube.Cube):
+                A cube of orography, used to obtain the grid point altitudes.
+            land_mask (iris.cube.Cube):
+                A land mask cube for the model/grid from which grid point
+                neighbours are being selected.
+        Returns:
+            iris.cube.Cube:
+                A cube containing both the spot site information and for each
+                the grid point indices of its nearest neighbour as per the
+                imposed constraints.
+        """
+        (sites, site_coords, site_x_coords, site_y_coords, nearest_indices,
+         site_altitudes) = self._prepare_sites(sites, orography, land_mask)
+
+        # If further constraints are being applied, query a KD Tree which
+        # includes points filtered by constraint.
+        if self.land_constraint or self.minimum_dz:
+            tree_query = self._query_tree(orography, land_mask, site_coords)
+            nearest_indices = self._select_neighbours(
+                orography, site_altitudes, nearest_indices, *tree_query)
+
+        return self._build_neighbour_cube(
+            sites, orography, site_x_coords, site_y_coords, nearest_indices,
+            site_altitudes)
+
+    def process_all_methods(self, sites, orography, land_mask):
+        """
+        Find the grid point neighbours of the given spot sites using each of
+        the neighbour finding methods: nearest, nearest_land,
+        nearest_minimum_dz and nearest_land_minimum_dz. The land_constraint
+        and minimum_dz options of the plugin are ignored.
+
+        The sites are prepared once for all methods, and each KDTree is
+        queried once for self.node_limit neighbours. The land-constrained
+        methods share the query of the land tree, the nearest land
+        neighbour being the first neighbour returned, and the unconstrained
+        minimum_dz method queries a tree of all points. The nearest method
+        does not need a tree.
+
+        Args:
+            sites (list of dict):
+                A list of dictionaries defining the spot sites for which
+                neighbours are to be found.
+            orography (iris.cube.Cube):
+                A cube of orography, used to obtain the grid point altitudes.
+            land_mask (iris.cube.Cube):
+                A land mask cube for the model/grid from which grid point
+                neighbours are being selected.
+        Returns:
+            iris.cube.CubeList:
+                A cube for each method, in the order given above, each the
+                same as the cube returned by process with the corresponding
+                constraints.
+        """
+        (sites, site_coords, site_x_coords, site_y_coords, nearest_indices,
+         site_altitudes) = self._prepare_sites(sites, orography, land_mask)
+
+        neighbour_cubes = iris.cube.CubeList()
+        tree_queries = {}
+        for minimum_dz in [False, True]:
+            for land_constraint in [False, True]:
+                method = copy.copy(self)
+                method.land_constraint = land_constraint
+                method.minimum_dz = minimum_dz
+                method_indices = nearest_indices
+                if land_constraint or minimum_dz:
+                    if land_constraint not in tree_queries:
+                        tree_queries[land_constraint] = method._query_tree(
+                            orography, land_mask, site_coords)
+                    method_indices = method._select_neighbours(
+                        orography, site_altitudes, nearest_indices,
+                        *tree_queries[land_constraint])
+                neighbour_cubes.append(method._build_neighbour_cube(
+                    sites, orography, site_x_coords, site_y_coords,
+                    method_indices, site_altitudes))
+        return neighbour_cubes
@@ -39,7 +39,6 @@ from improver.metadata.constants.attributes import MANDATORY_ATTRIBUTE_DEFAULTS
 from improver.metadata.constants.mo_attributes import MOSG_GRID_ATTRIBUTES
 from improver.metadata.utilities import create_coordinate_hash
 from improver.spotdata.build_spotdata_cube import build_spotdata_cube
-from improver.utilities.cube_manipulation import enforce_coordinate_ordering
 
 
 class SpotExtraction(BasePlugin):
@@ -106,8 +105,9 @@ class SpotExtraction(BasePlugin):
         """
         Extracts diagnostic data from the desired grid points in the diagnostic
         cube. The neighbour finding routine that produces the coordinate cube
-        works in x-y order. As such, the diagnostic cube is changed to match
-        before the indices are used to extract data.
+        works in x-y order. As such, the x and y dimensions of the diagnostic
+        data are moved to the front, in that order, before the indices are
+        used to extract data. The diagnostic cube itself is not modified.
 
         Args:
             coordinate_cube (iris.cube.Cube):
@@ -115,15 +115,19 @@ class SpotExtraction(BasePlugin):
                 point neighbours.
             diagnostic_cube (iris.cube.Cube):
                 A cube of diagnostic data from which spot data is being taken.
+                This may have leading dimensions, such as realization or
+                threshold, in addition to the spatial dimensions.
         Returns:
             numpy.ndarray:
                 An array of diagnostic values at the grid coordinates found
-                within the coordinate cube.
+                within the coordinate cube. The spot index is the first
+                dimension, followed by any leading dimensions of the
+                diagnostic cube in their original order.
         """
-        enforce_coordinate_ordering(
-            diagnostic_cube, [diagnostic_cube.coord(axis='x').name(),
-                              diagnostic_cube.coord(axis='y').name()])
-        spot_values = diagnostic_cube.data[tuple(coordinate_cube.data.T)]
+        x_dim, = diagnostic_cube.coord_dims(diagnostic_cube.coord(axis='x'))
+        y_dim, = diagnostic_cube.coord_dims(diagnostic_cube.coord(axis='y'))
+        data = np.moveaxis(diagnostic_cube.data, [x_dim, y_dim], [0, 1])
+        spot_values = data[tuple(coordinate_cube.data.T)]
         return spot_values
 
     @staticmethod
@@ -186,22 +190,42 @@ class SpotExtraction(BasePlugin):
         coordinate_cube = self.extract_coordinates(neighbour_cube)
 
         # Deal with leading dimensions such as thresholds, realizations, etc.
-        data_cubes = iris.cube.CubeList()
-        for cube in diagnostic_cube.slices(
-                [diagnostic_cube.coord(axis='x').name(),
-                 diagnostic_cube.coord(axis='y').name()]):
-
-            spot_values = self.extract_diagnostic_data(coordinate_cube, cube)
-            spotdata_cube = self.build_diagnostic_cube(neighbour_cube, cube,
-                                                       spot_values)
-
-            # Add scalar coordinates onto the spot cube which can be promoted
-            # to reform and leading dimensions.
-            for coord in cube.coords(dim_coords=False):
-                spotdata_cube.add_aux_coord(coord)
-            data_cubes.append(spotdata_cube)
-
-        spotdata_cube = data_cubes.merge_cube()
+        # Leading dimensions of length one are reduced to scalar coordinates.
+        x_dim, = diagnostic_cube.coord_dims(diagnostic_cube.coord(axis='x'))
+        y_dim, = diagnostic_cube.coord_dims(diagnostic_cube.coord(axis='y'))
+        if any(length == 1 for dim, length in enumerate(diagnostic_cube.shape)
+               if dim not in (x_dim, y_dim)):
+            diagnostic_cube = diagnostic_cube[tuple(
+                0 if length == 1 and dim not in (x_dim, y_dim) else slice(None)
+                for dim, length in enumerate(diagnostic_cube.shape))]
+            x_dim, = diagnostic_cube.coord_dims(
+                diagnostic_cube.coord(axis='x'))
+            y_dim, = diagnostic_cube.coord_dims(
+                diagnostic_cube.coord(axis='y'))
+
+        # Extract the spot data for all leading dimensions at once
+        spot_values = self.extract_diagnostic_data(coordinate_cube,
+                                                   diagnostic_cube)
+        spotdata_cube = self.build_diagnostic_cube(
+            neighbour_cube, diagnostic_cube, spot_values)
+
+        # Add the coordinates that describe the leading dimensions, and any
+        # scalar coordinates, onto the spot cube.  These dimensions follow the
+        # spot index, which is then moved to be the last dimension.
+        leading_dims = [dim for dim in range(diagnostic_cube.ndim)
+                        if dim not in (x_dim, y_dim)]
+        dim_coords = diagnostic_cube.coords(dim_coords=True)
+        for coord in diagnostic_cube.coords():
+            coord_dims = diagnostic_cube.coord_dims(coord)
+            if x_dim in coord_dims or y_dim in coord_dims:
+                continue
+            spot_dims = tuple(
+                leading_dims.index(dim) + 1 for dim in coord_dims)
+            if coord in dim_coords:
+                spotdata_cube.add_dim_coord(coord.copy(), spot_dims)
+            else:
+                spotdata_cube.add_aux_coord(coord.copy(), spot_dims)
+        spotdata_cube.transpose(list(range(1, spotdata_cube.ndim)) + [0])
 
         # Copy attributes from the diagnostic cube that describe the data's
         # provenance
@@ -50,6 +50,7 @@ from improver.metadata.constants.time_types import (
     TIME_REFERENCE_DTYPE, TIME_REFERENCE_UNIT)
 from improver.threshold import BasicThreshold
 from improver.utilities.cube_checker import spatial_coords_match
+from improver.utilities.regrid import RegridWithCachedWeights
 from improver.utilities.spatial import OccurrenceWithinVicinity
 
 
@@ -111,7 +112,8 @@ class StandardiseGridAndMetadata(BasePlugin):
                                 "nearest-with-mask": True}
 
     def __init__(self, regrid_mode='bilinear', extrapolation_mode='nanmask',
-                 landmask=None, landmask_vicinity=25000):
+                 landmask=None, landmask_vicinity=25000,
+                 weights_cache_directory=None):
         """
         Initialise regridding parameters
 
@@ -125,6 +127,10 @@ class StandardiseGridAndMetadata(BasePlugin):
                 Required for "nearest-with-mask" regridding option.
             landmask_vicinity (float):
                 Radius of vicinity to search for a coastline, in metres
+            weights_cache_directory (str or None):
+                Directory in which to store regridding weights, so that they
+                can be reused by later runs on the same source and target
+                grids. If None, weights are only reused within this run.
 
         Raises:
             ValueError: If a landmask is required but not passed in
@@ -138,6 +144,7 @@ class StandardiseGridAndMetadata(BasePlugin):
         self.landmask_vicinity = (
             None if landmask is None else landmask_vicinity)
         self.landmask_name = "land_binary_mask"
+        self.weights_cache_directory = weights_cache_directory
 
     def _adjust_landsea(self, cube, target_grid):
         """
@@ -165,7 +172,9 @@ class StandardiseGridAndMetadata(BasePlugin):
                 self.landmask_name, repr(target_grid)))
             warnings.warn(msg)
 
-        plugin = AdjustLandSeaPoints(vicinity_radius=self.landmask_vicinity)
+        plugin = AdjustLandSeaPoints(
+            vicinity_radius=self.landmask_vicinity,
+            weights_cache_directory=self.weights_cache_directory)
         return plugin.process(cube, self.landmask_source_grid, target_grid)
 
     def _regrid_to_target(self, cube, target_grid, regridded_title):
@@ -189,7 +198,9 @@ class StandardiseGridAndMetadata(BasePlugin):
         regridder = Linear(extrapolation_mode=self.extrapolation_mode)
         if "nearest" in self.regrid_mode:
             regridder = Nearest(extrapolation_mode=self.extrapolation_mode)
-        cube = cube.regrid(target_grid, regridder)
+        cube = RegridWithCachedWeights(
+            regridder, cache_directory=self.weights_cache_directory)(
+                cube, target_grid)
 
         if self.REGRID_REQUIRES_LANDMASK[self.regrid_mode]:
             cube = self._adjust_landsea(cube, target_grid)
@@ -339,7 +350,8 @@ class AdjustLandSeaPoints:
     Where no match is found within the vicinity, the data value is not changed.
     """
 
-    def __init__(self, extrapolation_mode="nanmask", vicinity_radius=25000.):
+    def __init__(self, extrapolation_mode="nanmask", vicinity_radius=25000.,
+                 weights_cache_directory=None):
         """
         Initialise class
 
@@ -353,6 +365,9 @@ class AdjustLandSeaPoints:
                 Defaults to "nanmask".
             vicinity_radius (float):
                 Distance in metres to search for a sea or land point.
+            weights_cache_directory (str or None):
+                Directory in which to store the weights used to regrid the
+                input land mask. If None, weights are only held in memory.
         """
         self.input_land = None
         self.nearest_cube = None
@@ -360,6 +375,7 @@ class AdjustLandSeaPoints:
         self.output_cube = None
         self.regridder = Nearest(extrapolation_mode=extrapolation_mode)
         self.vicinity = OccurrenceWithinVicinity(vicinity_radius)
+        self.weights_cache_directory = weights_cache_directory
 
     def __repr__(self):
         """
@@ -450,7 +466,9 @@ class AdjustLandSeaPoints:
         self.output_land = output_land
 
         # Regrid input_land to output_land grid.
-        self.input_land = input_land.regrid(self.output_land, self.regridder)
+        self.input_land = RegridWithCachedWeights(
+            self.regridder, cache_directory=self.weights_cache_directory)(
+                input_land, self.output_land)
 
         # Slice over x-y grids for multi-realization data.
         result = iris.cube.CubeList()
@@ -95,9 +95,6 @@ def choose(index_array, array_set):
                    index_array.max(), array_set.shape[0]))
         raise IndexError(msg)
 
-    result = np.array(
-        [array_set[index_array[I]][I[1:]]
-         for I in np.lib.index_tricks.ndindex(index_array.shape)]
-        ).reshape(index_array.shape)
+    result = np.take_along_axis(array_set, index_array, axis=0)
 
     return result
@@ -322,3 +322,75 @@ class Integration(BasePlugin):
             self.ensure_monotonic_increase_in_chosen_direction(
                 integrated_cube))
         return integrated_cube
+
+
+def interpolate_multiple_rows(x, xp, fp):
+    """
+    Piecewise linear interpolation of many rows at once, giving the same
+    results as applying numpy.interp to each row in turn.
+
+    Either the sample points, xp, or the sample values, fp, may differ
+    between rows, and each must be monotonically increasing along each row.
+    The points at which to interpolate, x, may be shared by all rows or
+    given for each row. Values of x beyond the sample points are given the
+    first or last value of fp.
+
+    Args:
+        x (numpy.ndarray):
+            Points at which to interpolate, either as a 1D array shared by
+            all rows, or as a 2D array with a row for each row of xp or fp.
+        xp (numpy.ndarray):
+            Sample points, either as a 1D array shared by all rows, or as a
+            2D array with the sample points along the last dimension.
+        fp (numpy.ndarray):
+            Sample values, either as a 1D array shared by all rows, or as a
+            2D array with the sample values along the last dimension.
+
+    Returns:
+        numpy.ndarray:
+            2D array of the interpolated values, with a row for each row of
+            the inputs and a column for each value of x.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    xp = np.atleast_2d(np.asarray(xp, dtype=np.float64))
+    fp = np.atleast_2d(np.asarray(fp, dtype=np.float64))
+    n_rows = max(x.shape[0] if x.ndim == 2 else 1, xp.shape[0], fp.shape[0])
+    n_points = xp.shape[1]
+    x = np.broadcast_to(x, (n_rows, x.shape[-1]))
+    xp = np.broadcast_to(xp, (n_rows, n_points))
+    fp = np.broadcast_to(fp, (n_rows, n_points))
+
+    # Find the index of the last sample point less than or equal to each
+    # value of x.
+    if xp.strides[0] == 0:
+        index = np.searchsorted(xp[0], x, side='right') - 1
+    else:
+        index = np.empty(x.shape, dtype=np.intp)
+        for column in range(x.shape[1]):
+            index[:, column] = np.count_nonzero(
+                xp <= x[:, column:column+1], axis=1) - 1
+
+    lower = np.clip(index, 0, max(n_points - 2, 0))
+    upper = np.minimum(lower + 1, n_points - 1)
+    x_lower = np.take_along_axis(xp, lower, axis=1)
+    x_upper = np.take_along_axis(xp, upper, axis=1)
+    f_lower = np.take_along_axis(fp, lower, axis=1)
+    f_upper = np.take_along_axis(fp, upper, axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (f_upper - f_lower) / (x_upper - x_lower)
+        result = slope * (x - x_lower) + f_lower
+        # If the result is not finite in one direction, as numpy.interp does,
+        # try the other.
+        nan_result = np.isnan(result)
+        result[nan_result] = (slope * (x - x_upper) + f_upper)[nan_result]
+        nan_result = np.isnan(result) & (f_lower == f_upper)
+        result[nan_result] = f_lower[nan_result]
+
+    exact = x == x_lower
+    result[exact] = f_lower[exact]
+    below = index < 0
+    result[below] = np.broadcast_to(fp[:, :1], result.shape)[below]
+    above = index >= n_points - 1
+    result[above] = np.broadcast_to(fp[:, -1:], result.shape)[above]
+    return result
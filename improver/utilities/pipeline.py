@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# (C) British Crown Copyright 2017-2019 Met Office.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Run a pipeline of IMPROVER CLIs, passing results between them in memory.
+
+A pipeline is defined by a dictionary, usually loaded from a JSON file, of
+named steps. Each step gives the CLI command to run and its arguments, as
+they would be given on the command line. An argument may instead be a
+reference to the result of another step, written as {"step": "name"}, in
+which case the result is passed to the command in memory rather than being
+saved to and loaded from a file. Results are only saved for steps which
+declare an "output" file, optionally with an "output_profile" naming one of
+the save profiles in improver.utilities.save.SAVE_PROFILES. For example::
+
+    {
+        "steps": {
+            "threshold": {
+                "command": "threshold",
+                "args": ["input.nc", "--threshold-values=280"]
+            },
+            "nbhood": {
+                "command": "nbhood",
+                "args": [{"step": "threshold"},
+                         "--neighbourhood-output=probabilities",
+                         "--neighbourhood-shape=square",
+                         "--radii=20000"],
+                "output": "output.nc"
+            }
+        }
+    }
+"""
+
+import copy
+import multiprocessing
+import queue
+from collections import Counter, OrderedDict
+
+from improver import BasePlugin
+from improver.utilities.save import SAVE_PROFILES
+
+
+def _run_step(command, args, output=None, return_result=True,
+              output_profile='default'):
+    """Run an IMPROVER CLI command.
+
+    Args:
+        command (str):
+            Name of the CLI command.
+        args (list):
+            Arguments to the command, which may be strings or objects.
+        output (str or None):
+            If given, the file to which the result is saved.
+        return_result (bool):
+            If False, None is returned rather than the result, which avoids
+            transferring results that are not needed from worker processes.
+        output_profile (str):
+            Name of the save profile used for the output file.
+
+    Returns:
+        Result of the command, or None.
+    """
+    from improver.cli import SUBCOMMANDS_DISPATCHER, execute_command
+    from improver.utilities.save import save_netcdf
+    result = execute_command(SUBCOMMANDS_DISPATCHER, 'improver', command,
+                             *args)
+    if output:
+        save_netcdf(result, output, profile=output_profile)
+    return result if return_result else None
+
+
+class RunPipeline(BasePlugin):
+
+    """Plugin to run a pipeline of IMPROVER CLI commands."""
+
+    def __init__(self, processes=1):
+        """
+        Initialise the plugin.
+
+        Args:
+            processes (int):
+                Number of processes used to run independent steps
+                concurrently. If 1, all steps are run in this process, one
+                at a time.
+
+        Raises:
+            ValueError: If processes is less than 1.
+        """
+        if processes < 1:
+            raise ValueError(
+                "Invalid number of processes: must be >= 1: {}".format(
+                    processes))
+        self.processes = processes
+
+    def __repr__(self):
+        """Represent the configured plugin instance as a string."""
+        return '<RunPipeline: processes: {}>'.format(self.processes)
+
+    @staticmethod
+    def _step_references(args):
+        """Return the names of the steps referenced in a list of arguments.
+
+        Args:
+            args (list):
+                Arguments of a step.
+
+        Returns:
+            list of str:
+                Names of the referenced steps.
+        """
+        return [arg['step'] for arg in args if isinstance(arg, dict)]
+
+    def _check_steps(self, steps):
+        """Check the steps of a pipeline and put them in the order in which
+        they can be run.
+
+        Args:
+            steps (dict):
+                Steps of the pipeline, keyed by name.
+
+        Returns:
+            list of str:
+                Names of the steps, ordered so that each step comes after the
+                steps whose results it uses.
+
+        Raises:
+            ValueError: If a step has no command.
+            ValueError: If a step has an unknown output profile.
+            ValueError: If a step refers to a step that does not exist.
+            ValueError: If the steps have a circular dependency.
+        """
+        for name, step in steps.items():
+            if 'command' not in step:
+                raise ValueError("Step {} has no command".format(name))
+            profile = step.get('output_profile', 'default')
+            if profile not in SAVE_PROFILES:
+                raise ValueError(
+                    "Step {} has unknown output profile {}, choose from "
+                    "{}".format(name, profile,
+                                ', '.join(sorted(SAVE_PROFILES))))
+            for reference in self._step_references(step.get('args', [])):
+                if reference not in steps:
+                    raise ValueError(
+                        "Step {} refers to unknown step {}".format(
+                            name, reference))
+
+        order = []
+        remaining = OrderedDict(
+            (name, set(self._step_references(step.get('args', []))))
+            for name, step in steps.items())
+        while remaining:
+            ready = [name for name, references in remaining.items()
+                     if not references - set(order)]
+            if not ready:
+                raise ValueError(
+                    "Steps have a circular dependency: {}".format(
+                        ', '.join(remaining)))
+            for name in ready:
+                order.append(name)
+                del remaining[name]
+        return order
+
+    @staticmethod
+    def _resolve_args(args, results, uses):
+        """Replace step references with the results of those steps.
+
+        CLIs may modify their inputs in place, so a result which is still
+        needed by another step is copied, and only its last use is given
+        the result itself.
+
+        Args:
+            args (list):
+                Arguments of a step.
+            results (dict):
+                Results of the completed steps, keyed by name.
+            uses (collections.Counter):
+                Number of remaining uses of the result of each step,
+                including the uses in args.
+
+        Returns:
+            list:
+                Arguments, with step references replaced by results.
+        """
+        remaining_uses = Counter(uses)
+        resolved = []
+        for arg in args:
+            if isinstance(arg, dict):
+                name = arg['step']
+                remaining_uses[name] -= 1
+                arg = results[name]
+                if remaining_uses[name]:
+                    arg = copy.deepcopy(arg)
+            resolved.append(arg)
+        return resolved
+
+    def process(self, config):
+        """Run the steps of a pipeline.
+
+        Each step is run once the steps whose results it uses have
+        completed. Results are discarded as soon as they are no longer
+        needed by any step. If more than one process is used, steps are
+        run in a pool of worker processes as soon as they are ready, so
+        that independent branches of the pipeline run concurrently. Results
+        are then transferred between processes by pickling, which is still
+        much cheaper than saving and loading compressed netCDF files.
+
+        Args:
+            config (dict):
+                Pipeline definition, with a "steps" dictionary mapping the
+                name of each step to a dictionary containing its "command",
+                an optional list of "args", an optional "output" file and an
+                optional "output_profile".
+
+        Returns:
+            dict:
+                Results of the steps that neither declare an output file nor
+                are used by another step, keyed by name.
+        """
+        steps = config['steps']
+        order = self._check_steps(steps)
+        uses = Counter(
+            reference for step in steps.values()
+            for reference in self._step_references(step.get('args', [])))
+
+        results = {}
+        final_results = {}
+
+        def complete(name, result):
+            """Store the result of a step, and discard the results which
+            are no longer needed."""
+            if uses[name]:
+                results[name] = result
+            elif not steps[name].get('output'):
+                final_results[name] = result
+            for reference in self._step_references(
+                    steps[name].get('args', [])):
+                uses[reference] -= 1
+                if not uses[reference]:
+                    del results[reference]
+
+        def step_task(name):
+            """Return the arguments of _run_step for a step."""
+            step = steps[name]
+            return (step['command'],
+                    self._resolve_args(step.get('args', []), results, uses),
+                    step.get('output'),
+                    bool(uses[name]) or not step.get('output'),
+                    step.get('output_profile', 'default'))
+
+        if self.processes == 1:
+            for name in order:
+                complete(name, _run_step(*step_task(name)))
+            return final_results
+
+        # Workers are spawned rather than forked, as forking a process in
+        # which dask has started its thread pool can deadlock.
+        finished = queue.Queue()
+        waiting = list(order)
+        running = set()
+        completed = set()
+        with multiprocessing.get_context('spawn').Pool(
+                self.processes) as pool:
+            while waiting or running:
+                for name in list(waiting):
+                    if set(self._step_references(
+                            steps[name].get('args', []))) <= completed:
+                        pool.apply_async(
+                            _run_step, step_task(name),
+                            callback=lambda result, name=name: finished.put(
+                                (name, result, None)),
+                            error_callback=lambda error, name=name:
+                            finished.put((name, None, error)))
+                        waiting.remove(name)
+                        running.add(name)
+                name, result, error = finished.get()
+                if error is not None:
+                    raise error
+                running.remove(name)
+                complete(name, result)
+                completed.add(name)
+        return final_results
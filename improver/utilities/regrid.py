@@ -0,0 +1,508 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# (C) British Crown Copyright 2017-2019 Met Office.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Utilities for regridding cubes using cached regridding weights."""
+
+import copy
+import os
+import tempfile
+import warnings
+from collections import OrderedDict
+
+import iris
+import numpy as np
+from iris.analysis import Linear, Nearest
+from iris.util import guess_coord_axis
+from scipy.sparse import csr_matrix
+
+from improver import BasePlugin
+from improver.metadata.utilities import create_coordinate_hash, generate_hash
+
+# Values used to fill points outside the source domain, and the mask fraction
+# used at those points, for each of the iris extrapolation modes. The "linear"
+# mode of the iris Linear scheme is an alias of "extrapolate".
+EXTRAPOLATION_FILL_VALUES = {
+    'extrapolate': (None, None),
+    'linear': (None, None),
+    'error': (0, 0),
+    'nan': (np.nan, 0),
+    'mask': (np.nan, 1),
+    'nanmask': (np.nan, 1)}
+
+# The number of sets of regridding weights held in memory.
+MAX_CACHED_WEIGHTS = 8
+
+# Regridding weights held in memory, with the most recently used last.
+_CACHED_WEIGHTS = OrderedDict()
+
+
+def _interpolation_points(coord, extend_circular=False):
+    """
+    Return the points of a source grid coordinate in increasing order, as
+    used by iris to interpolate, and the index of the source grid point that
+    each of them corresponds to.
+
+    Args:
+        coord (iris.coords.DimCoord):
+            Source grid coordinate.
+        extend_circular (bool):
+            If True and the coordinate is circular, the first point is
+            repeated, one modulus on, at the end of the points.
+
+    Returns:
+        (tuple): tuple containing:
+            **numpy.ndarray**:
+                The increasing coordinate points.
+            **numpy.ndarray**:
+                The index of the source grid point for each coordinate point.
+    """
+    points = coord.points
+    indices = np.arange(len(points))
+    if points.size > 1 and points[0] > points[1]:
+        points = points[::-1]
+        indices = indices[::-1]
+    if extend_circular and coord.circular:
+        modulus = np.array(coord.units.modulus or 0, dtype=coord.dtype)
+        points = np.append(points, points[0] + modulus)
+        indices = np.append(indices, indices[0])
+    return points, indices
+
+
+def _find_indices(sample_points, grid_points):
+    """
+    Find the grid points either side of each sample point, and the distance
+    of each sample point from the lower of them as a fraction of the grid
+    spacing, in the same way as the iris regridder.
+
+    Args:
+        sample_points (numpy.ndarray):
+            Points at which the grid is to be sampled.
+        grid_points (numpy.ndarray):
+            Increasing grid points.
+
+    Returns:
+        (tuple): tuple containing:
+            **numpy.ndarray**:
+                Index of the grid point below each sample point.
+            **numpy.ndarray**:
+                Normalised distance of each sample point above this grid
+                point.
+            **numpy.ndarray**:
+                True where the sample point lies outside the grid.
+    """
+    indices = np.searchsorted(grid_points, sample_points) - 1
+    indices[indices < 0] = 0
+    indices[indices > grid_points.size - 2] = grid_points.size - 2
+    if grid_points.size == 1:
+        norm_distances = sample_points - grid_points[indices]
+    else:
+        norm_distances = (
+            (sample_points - grid_points[indices]) /
+            (grid_points[indices + 1] - grid_points[indices]))
+    out_of_bounds = ((sample_points < grid_points[0]) |
+                     (sample_points > grid_points[-1]))
+    return indices, norm_distances, out_of_bounds
+
+
+def compute_regrid_weights(cube, target_grid, method):
+    """
+    Compute the weights that regrid data from the grid of a cube to a target
+    grid, as a sparse matrix that gives the same results as the iris linear
+    or nearest-neighbour regridders.
+
+    Args:
+        cube (iris.cube.Cube):
+            Cube on the source grid.
+        target_grid (iris.cube.Cube):
+            Cube on the target grid.
+        method (str):
+            Either "linear" or "nearest".
+
+    Returns:
+        (tuple): tuple containing:
+            **scipy.sparse.csr_matrix**:
+                Matrix of weights with a row for each target grid point and
+                a column for each source grid point, with both grids
+                flattened in (y, x) order.
+            **numpy.ndarray**:
+                True for each target grid point that lies outside the source
+                grid.
+    """
+    src_x = cube.coord(axis='x', dim_coords=True)
+    src_y = cube.coord(axis='y', dim_coords=True)
+    target_x = target_grid.coord(axis='x', dim_coords=True)
+    target_y = target_grid.coord(axis='y', dim_coords=True)
+
+    x_points, x_indices = _interpolation_points(src_x, extend_circular=True)
+    y_points, y_indices = _interpolation_points(src_y)
+
+    # Find the target grid points in the source coordinate system, skipping
+    # the transform if possible to avoid precision problems.
+    sample_x, sample_y = np.meshgrid(target_x.points, target_y.points)
+    if src_x.coord_system != target_x.coord_system:
+        transformed = src_x.coord_system.as_cartopy_crs().transform_points(
+            target_x.coord_system.as_cartopy_crs(), sample_x, sample_y)
+        sample_x, sample_y = transformed[..., 0], transformed[..., 1]
+    sample_x = sample_x.astype(np.float64).ravel()
+    sample_y = sample_y.astype(np.float64).ravel()
+
+    # Map the sample points into the range of the source points, centred on
+    # the source domain.
+    if src_x.units.modulus:
+        modulus = src_x.units.modulus
+        offset = (x_points.max() + x_points.min() - modulus) * 0.5
+        sample_x -= offset
+        sample_x = (sample_x % modulus) + offset
+
+    x_lower, x_distances, x_outside = _find_indices(sample_x, x_points)
+    y_lower, y_distances, y_outside = _find_indices(sample_y, y_points)
+    out_of_bounds = x_outside | y_outside
+
+    def source_index(x_index, y_index):
+        """Flattened source grid index of interpolation point indices."""
+        return (y_indices[y_index % y_points.size] * src_x.shape[0] +
+                x_indices[x_index % x_points.size])
+
+    if method == 'nearest':
+        columns = source_index(
+            np.where(x_distances <= 0.5, x_lower, x_lower + 1),
+            np.where(y_distances <= 0.5, y_lower, y_lower + 1))
+        weights = np.ones(columns.shape)
+        columns_per_row = 1
+    else:
+        # The corners around each target point are ordered as in iris, so
+        # that the weighted sums are accumulated in the same order.
+        corners = [(x_index, y_index, x_weight * y_weight)
+                   for x_index, x_weight in [(x_lower, 1 - x_distances),
+                                             (x_lower + 1, x_distances)]
+                   for y_index, y_weight in [(y_lower, 1 - y_distances),
+                                             (y_lower + 1, y_distances)]]
+        columns = np.stack([source_index(x_index, y_index)
+                            for x_index, y_index, _ in corners], axis=-1)
+        weights = np.stack([weight for _, _, weight in corners], axis=-1)
+        columns_per_row = len(corners)
+
+    n_target = sample_x.size
+    matrix = csr_matrix(
+        (weights.ravel(), columns.ravel(),
+         np.arange(0, n_target * columns_per_row + 1, columns_per_row)),
+        shape=(n_target, src_x.shape[0] * src_y.shape[0]))
+    return matrix, out_of_bounds
+
+
+class RegridWithCachedWeights(BasePlugin):
+    """
+    Regrid cubes with the iris linear or nearest-neighbour regridding schemes,
+    reusing the regridding weights for each pair of source and target grids.
+
+    The weights are computed once for each pair of grids and held in memory
+    for later calls, with the least recently used weights discarded once
+    MAX_CACHED_WEIGHTS sets are held. They may also be stored on disk as
+    sparse matrices, to be shared between runs. Each regrid is then a sparse
+    matrix product over all the leading dimensions of the cube at once.
+    """
+
+    def __init__(self, scheme, cache_directory=None):
+        """
+        Initialise the plugin.
+
+        Args:
+            scheme (iris.analysis.Linear or iris.analysis.Nearest):
+                The iris regridding scheme whose results are reproduced.
+                Cubes are regridded with any other scheme directly.
+            cache_directory (str or None):
+                Directory in which to store regridding weights to be shared
+                between runs. If None, weights are only held in memory.
+        """
+        self.scheme = scheme
+        self.cache_directory = cache_directory
+        self.method = None
+        if isinstance(scheme, Linear):
+            self.method = 'linear'
+        elif isinstance(scheme, Nearest):
+            self.method = 'nearest'
+
+    def __repr__(self):
+        """Represent the configured plugin instance as a string."""
+        return ('<RegridWithCachedWeights: scheme: {}; '
+                'cache_directory: {}>'.format(self.scheme,
+                                              self.cache_directory))
+
+    def _weights_cache_key(self, cube, target_grid):
+        """
+        Generate a key that identifies the regridding weights by the source
+        and target grids and the regridding method.
+
+        Args:
+            cube (iris.cube.Cube):
+                Cube on the source grid.
+            target_grid (iris.cube.Cube):
+                Cube on the target grid.
+        Returns:
+            str:
+                A hexadecimal string identifying the weights.
+        """
+        return generate_hash([
+            create_coordinate_hash(cube),
+            cube.coord(axis='x', dim_coords=True).circular,
+            create_coordinate_hash(target_grid), self.method])
+
+    def _cache_path(self, cache_key):
+        """
+        Return the path of the file in which cached regridding weights are
+        stored.
+
+        Args:
+            cache_key (str):
+                The key identifying the weights.
+        Returns:
+            str:
+                Path of the weights file.
+        """
+        return os.path.join(self.cache_directory,
+                            'regrid_weights_{}.npz'.format(cache_key))
+
+    def _load_cached_weights(self, cache_key):
+        """
+        Load regridding weights from the cache directory.
+
+        Args:
+            cache_key (str):
+                The key identifying the weights.
+        Returns:
+            tuple or None:
+                The weights matrix and out of bounds points, as returned by
+                compute_regrid_weights, or None if the weights are not in the
+                cache or cannot be read.
+        """
+        try:
+            with np.load(self._cache_path(cache_key)) as stored:
+                matrix = csr_matrix(
+                    (stored['data'], stored['indices'], stored['indptr']),
+                    shape=tuple(stored['shape']))
+                out_of_bounds = stored['out_of_bounds']
+        except (OSError, KeyError, ValueError):
+            return None
+        return matrix, out_of_bounds
+
+    def _save_cached_weights(self, cache_key, weights):
+        """
+        Save regridding weights to the cache directory. The file is written
+        to a temporary name and then renamed, so that concurrent runs never
+        see a partially written file. Failure to write to the cache is
+        reported as a warning rather than an error.
+
+        Args:
+            cache_key (str):
+                The key identifying the weights.
+            weights (tuple):
+                The weights matrix and out of bounds points, as returned by
+                compute_regrid_weights.
+        """
+        matrix, out_of_bounds = weights
+        try:
+            os.makedirs(self.cache_directory, exist_ok=True)
+            handle, temporary_path = tempfile.mkstemp(
+                dir=self.cache_directory)
+            try:
+                with os.fdopen(handle, 'wb') as temporary_file:
+                    np.savez(temporary_file, data=matrix.data,
+                             indices=matrix.indices, indptr=matrix.indptr,
+                             shape=matrix.shape, out_of_bounds=out_of_bounds)
+                os.replace(temporary_path, self._cache_path(cache_key))
+            except BaseException:
+                os.remove(temporary_path)
+                raise
+        except OSError as err:
+            warnings.warn('Unable to cache regridding weights in {}: '
+                          '{}'.format(self.cache_directory, err))
+
+    def _get_weights(self, cube, target_grid):
+        """
+        Get the regridding weights from the grid of a cube to the target
+        grid, from memory or the cache directory if available, otherwise
+        computing and caching them.
+
+        Args:
+            cube (iris.cube.Cube):
+                Cube on the source grid.
+            target_grid (iris.cube.Cube):
+                Cube on the target grid.
+        Returns:
+            tuple:
+                The weights matrix and out of bounds points, as returned by
+                compute_regrid_weights.
+        """
+        cache_key = self._weights_cache_key(cube, target_grid)
+        weights = _CACHED_WEIGHTS.pop(cache_key, None)
+        if weights is None and self.cache_directory is not None:
+            weights = self._load_cached_weights(cache_key)
+        if weights is None:
+            weights = compute_regrid_weights(cube, target_grid, self.method)
+            if self.cache_directory is not None:
+                self._save_cached_weights(cache_key, weights)
+        _CACHED_WEIGHTS[cache_key] = weights
+        while len(_CACHED_WEIGHTS) > MAX_CACHED_WEIGHTS:
+            _CACHED_WEIGHTS.popitem(last=False)
+        return weights
+
+    def _regrid_data(self, data, weights):
+        """
+        Regrid an array whose last two dimensions are the y and x dimensions
+        of the source grid, handling masked data and points outside the
+        source grid as the iris regridder does.
+
+        Args:
+            data (numpy.ndarray or numpy.ma.MaskedArray):
+                Data on the source grid, flattened to (leading points,
+                source grid points).
+            weights (tuple):
+                The weights matrix and out of bounds points, as returned by
+                compute_regrid_weights.
+        Returns:
+            numpy.ndarray or numpy.ma.MaskedArray:
+                Regridded data, with shape (leading points, target grid
+                points).
+
+        Raises:
+            ValueError: If the extrapolation mode is "error" and a target
+                point lies outside the source grid.
+        """
+        matrix, out_of_bounds = weights
+        mode = self.scheme.extrapolation_mode
+        fill_value, mask_fill_value = EXTRAPOLATION_FILL_VALUES[mode]
+        if mode == 'error' and np.any(out_of_bounds):
+            raise ValueError('One of the requested target grid points is '
+                             'out of bounds of the source grid')
+
+        # The interpolation is done in floating point, and linear regridding
+        # of integer data gives a floating point result.
+        dtype = data.dtype
+        if self.method == 'linear' and dtype.kind == 'i':
+            dtype = np.promote_types(dtype, np.float16)
+        values_dtype = (data.dtype if np.issubdtype(data.dtype, np.inexact)
+                        else np.float64)
+
+        def interpolate(values):
+            """Apply the weights to each row of the values."""
+            values = values.astype(values_dtype, copy=False)
+            if self.method == 'nearest':
+                result = values[:, matrix.indices]
+            else:
+                result = (matrix * values.T).T
+            return result
+
+        result = interpolate(np.ma.getdata(data))
+        if fill_value is not None:
+            result[:, out_of_bounds] = fill_value
+        result = result.astype(dtype)
+
+        if np.ma.isMaskedArray(data) or mode == 'mask':
+            mask_fraction = interpolate(np.ma.getmaskarray(data))
+            if mask_fill_value is not None:
+                mask_fraction[:, out_of_bounds] = mask_fill_value
+            new_mask = mask_fraction > 0
+            if np.ma.isMaskedArray(data) or np.any(new_mask):
+                result = np.ma.MaskedArray(result, mask=new_mask)
+        return result
+
+    @staticmethod
+    def _create_regridded_cube(cube, target_grid, data):
+        """
+        Create the regridded cube, with the target grid coordinates and the
+        metadata and other coordinates of the source cube, as iris does.
+
+        Args:
+            cube (iris.cube.Cube):
+                Cube on the source grid.
+            target_grid (iris.cube.Cube):
+                Cube on the target grid.
+            data (numpy.ndarray):
+                Regridded data.
+        Returns:
+            iris.cube.Cube:
+                Regridded cube.
+        """
+        grid_dims = []
+        result = iris.cube.Cube(data)
+        for axis in ['x', 'y']:
+            dim, = cube.coord_dims(cube.coord(axis=axis, dim_coords=True))
+            result.add_dim_coord(
+                target_grid.coord(axis=axis, dim_coords=True).copy(), dim)
+            grid_dims.append(dim)
+        result.metadata = copy.deepcopy(cube.metadata)
+
+        for coords, add_coord in [(cube.dim_coords, result.add_dim_coord),
+                                  (cube.aux_coords, result.add_aux_coord)]:
+            for coord in coords:
+                dims = cube.coord_dims(coord)
+                if (set(grid_dims).intersection(dims) or
+                        guess_coord_axis(coord) in ['X', 'Y']):
+                    continue
+                add_coord(coord.copy(), dims)
+        return result
+
+    def process(self, cube, target_grid):
+        """
+        Regrid a cube to the target grid.
+
+        Args:
+            cube (iris.cube.Cube):
+                Cube to be regridded.
+            target_grid (iris.cube.Cube):
+                Cube on the target grid.
+        Returns:
+            iris.cube.Cube:
+                Regridded cube, identical to that from cube.regrid with the
+                scheme.
+        """
+        src_cs = cube.coord(axis='x', dim_coords=True).coord_system
+        target_cs = target_grid.coord(axis='x', dim_coords=True).coord_system
+        # Regrid anything these weights cannot reproduce exactly, such as
+        # cubes with derived coordinates, using iris directly.
+        if (self.method is None or cube.aux_factories or src_cs is None or
+                target_cs is None):
+            return cube.regrid(target_grid, self.scheme)
+
+        weights = self._get_weights(cube, target_grid)
+
+        # Regrid all the leading dimensions at once, with the grid last.
+        x_dim, = cube.coord_dims(cube.coord(axis='x', dim_coords=True))
+        y_dim, = cube.coord_dims(cube.coord(axis='y', dim_coords=True))
+        data = np.moveaxis(cube.data, [y_dim, x_dim], [-2, -1])
+        leading_shape = data.shape[:-2]
+        data = data.reshape((-1, data.shape[-2] * data.shape[-1]))
+        data = self._regrid_data(data, weights)
+        target_shape = (target_grid.coord(axis='y', dim_coords=True).shape +
+                        target_grid.coord(axis='x', dim_coords=True).shape)
+        data = data.reshape(leading_shape + target_shape)
+        data = np.moveaxis(data, [-2, -1], [y_dim, x_dim])
+
+        return self._create_regridded_cube(cube, target_grid, data)
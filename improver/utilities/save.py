@@ -39,6 +39,25 @@ import iris
 from improver.metadata.check_datatypes import (
     check_datatypes, check_time_coordinate_metadata)
 
+# Named profiles of the compression and chunking options used when saving.
+# "chunking" is the number of trailing dimensions that each chunk spans in
+# full, with one point along every other dimension: 2 gives chunks of whole
+# x-y slices of gridded data, 1 gives chunks of all sites of spot data, and
+# None saves variables contiguously, which requires no compression.
+SAVE_PROFILES = {
+    # Balanced compression, for general use
+    'default': {'zlib': True, 'complevel': 1, 'shuffle': True,
+                'chunking': 2},
+    # Fastest to write and read, for files which are only read once
+    'intermediate': {'zlib': False, 'shuffle': False, 'chunking': None},
+    # Smallest files, for long term storage
+    'archive': {'zlib': True, 'complevel': 6, 'shuffle': True,
+                'chunking': 2},
+    # Compressed chunks along the site dimension, for spot data
+    'spot': {'zlib': True, 'complevel': 1, 'shuffle': True,
+             'chunking': 1},
+}
+
 
 def _append_metadata_cube(cubelist, global_keys):
     """ Create a metadata cube associated with statistical
@@ -126,7 +145,39 @@ def _check_metadata(cube):
         raise ValueError('{} has unknown units'.format(cube.name()))
 
 
-def save_netcdf(cubelist, filename):
+def _chunksizes(cubelist, chunking):
+    """
+    Get the netCDF chunk sizes for saving a list of cubes.
+
+    Args:
+        cubelist (iris.cube.CubeList):
+            Cubes to be saved.
+        chunking (int or None):
+            Number of trailing dimensions that each chunk spans in full, with
+            one point along every other dimension.
+
+    Returns:
+        tuple of int or None:
+            Chunk sizes, or None if the data are not to be chunked or the
+            cubes would need different chunk sizes.
+
+    Warns:
+        UserWarning: If the cubes would need different chunk sizes.
+    """
+    if chunking is None:
+        return None
+    chunksizes = set(
+        tuple([1] * (cube.ndim - chunking) + list(cube.shape[-chunking:]))
+        if cube.ndim >= chunking else None for cube in cubelist)
+    if len(chunksizes) == 1:
+        return chunksizes.pop()
+    msg = ("Chunksize not set as cubelist "
+           "contains cubes of varying dimensions")
+    warnings.warn(msg)
+    return None
+
+
+def save_netcdf(cubelist, filename, profile='default'):
     """Save the input Cube or CubeList as a NetCDF file and check metadata
     where required for integrity.
 
@@ -139,10 +190,23 @@ def save_netcdf(cubelist, filename):
             Cube or list of cubes to be saved
         filename (str):
             Filename to save input cube(s)
+        profile (str):
+            Name of the compression and chunking profile in SAVE_PROFILES:
+            "default" for compressed files chunked by x-y slice,
+            "intermediate" for uncompressed contiguous files which are
+            quickest to write and read, "archive" for the smallest files or
+            "spot" for compressed files chunked along the site dimension.
 
     Raises:
+        ValueError: if the profile is not recognised.
         warning if cubelist contains cubes of varying dimensions.
     """
+    try:
+        chunking = SAVE_PROFILES[profile]['chunking']
+    except KeyError:
+        raise ValueError('Unknown save profile {}, choose from {}'.format(
+            profile, ', '.join(sorted(SAVE_PROFILES))))
+
     if isinstance(cubelist, iris.cube.Cube):
         cubelist = iris.cube.CubeList([cubelist])
     elif not isinstance(cubelist, iris.cube.CubeList):
@@ -152,18 +216,11 @@ def save_netcdf(cubelist, filename):
         _order_cell_methods(cube)
         _check_metadata(cube)
 
-    # If all xy slices are the same shape, use this to determine
-    # the chunksize for the netCDF (eg. 1, 1, 970, 1042)
-    chunksizes = None
-    if len(set([cube.shape[:2] for cube in cubelist])) == 1:
-        cube = cubelist[0]
-        if cube.ndim >= 2:
-            xy_chunksizes = [cube.shape[-2], cube.shape[-1]]
-            chunksizes = tuple([1] * (cube.ndim - 2) + xy_chunksizes)
-    else:
-        msg = ("Chunksize not set as cubelist "
-               "contains cubes of varying dimensions")
-        warnings.warn(msg)
+    # If all cubes have the same chunk shape, eg. x-y slices of
+    # (1, 1, 970, 1042), use this for the netCDF
+    chunksizes = _chunksizes(cubelist, chunking)
+    compression = {key: value for key, value in SAVE_PROFILES[profile].items()
+                   if key != 'chunking'}
 
     global_keys = ['title', 'um_version', 'grid_id', 'source', 'Conventions',
                    'mosg__grid_type', 'mosg__model_configuration',
@@ -177,6 +234,6 @@ def save_netcdf(cubelist, filename):
     # save atomically by writing to a temporary file and then renaming
     ftmp = str(filename) + '.tmp'
     iris.fileformats.netcdf.save(cubelist, ftmp, local_keys=local_keys,
-                                 complevel=1, shuffle=True, zlib=True,
-                                 chunksizes=chunksizes)
+                                 contiguous=chunking is None,
+                                 chunksizes=chunksizes, **compression)
     os.rename(ftmp, filename)
@@ -39,6 +39,8 @@ from iris.exceptions import CoordinateNotFoundError
 from improver import BasePlugin
 from improver.metadata.probabilistic import find_percentile_coordinate
 from improver.utilities.cube_checker import check_cube_coordinates
+from improver.utilities.mathematical_operations import (
+    interpolate_multiple_rows)
 
 
 class ProbabilitiesFromPercentiles2D(BasePlugin):
@@ -203,128 +205,32 @@ class ProbabilitiesFromPercentiles2D(BasePlugin):
                   [3.0, 3.0, 3.0],
                   [5.0, 5.0, 5.0] ]
 
-            value_bounds::
+            1. The distribution at each point is treated as a row of values,
+               with the percentiles as the values to be interpolated. All
+               rows are interpolated at once to the threshold value of each
+               point; this finds the last percentile band in which the
+               threshold value falls, using the correct inequality (as
+               determined by inverse_ordering), and interpolates linearly
+               within that band. Here we assume inverse_ordering is False, so
+               the threshold value of 3.0 falls in the band between the 0th
+               percentile (2.0) and the 50th percentile (4.0), giving::
 
-                [ [[np.nan, np.nan, np.nan],
-                   [np.nan, np.nan, np.nan],
-                   [np.nan, np.nan, np.nan]],
-
-                  [[np.nan, np.nan, np.nan],
-                   [np.nan, np.nan, np.nan],
-                   [np.nan, np.nan, np.nan]] ]
-
-            percentile_bounds::
-
-                [ [[-1, -1, -1],
-                   [-1, -1, -1],
-                   [-1, -1, -1]],
-
-                  [[-1, -1, -1],
-                   [-1, -1, -1],
-                   [-1, -1, -1]] ]
-
-            1. Create slices over each percentile, and using the correct
-               inequality (as determined by inverse_ordering) compare the
-               threshold values to the percentiles slice; here we assume
-               inverse_ordering is False, so we use >=. We then populate the
-               value_bounds and percentile_bounds arrays.
-
-               Slice 0 - 0th Percentile::
-
-                   [[1.0 >= 2.0, 1.0 >= 2.0, 1.0 >= 2.0],
-                    [3.0 >= 2.0, 3.0 >= 2.0, 3.0 >= 2.0],
-                    [5.0 >= 2.0, 5.0 >= 2.0, 5.0 >= 2.0]]
-
-                   [[False, False, False],
-                    [True, True, True],
-                    [True, True, True]]
-
-               The value_bounds array has a leading dimensions with 2 indices
-               to be associated with the lower [0] and upper bounds [1] about
-               the threshold being considered. The [0] index is populated with
-               the values in the slice of percentiles_cube at every True index.
-               The [1] index is populated with the values in the next slice of
-               percentiles_cube.
-               ::
-
-                   [ [[np.nan, np.nan, np.nan],
-                      [2.0, 2.0, 2.0],
-                      [2.0, 2.0, 2.0]],
-
-                     [[np.nan, np.nan, np.nan],
-                      [4.0, 4.0, 4.0],
-                      [4.0, 4.0, 4.0]] ]
-
-               The percentile_bounds array is also contains a leading dimension
-               associated with lower and upper bounds about the thresholds. The
-               lower bound array is populated at every True index with the
-               current percentile value (0 in this first slice), whilst the
-               upper bound array takes the percentile value from the next
-               slice.
-               ::
-
-                   [ [[-1, -1, -1],
-                      [0, 0, 0],
-                      [0, 0, 0]],
-
-                     [[-1, -1, -1],
-                      [50, 50, 50],
-                      [50, 50, 50]] ]
-
-               After the same process is applied to the next slice, the 50th
-               percentile, we end up with value_bounds::
-
-                   [ [[np.nan, np.nan, np.nan],
-                      [2.0, 2.0, 2.0],
-                      [4.0, 4.0, 4.0]],
-
-                     [[np.nan, np.nan, np.nan],
-                      [4.0, 4.0, 4.0],
-                      [4.0, 4.0, 4.0]] ]
-
-               And percentile bounds::
-
-                   [ [[-1, -1, -1],
-                      [0, 0, 0],
-                      [50, 50, 50]],
-
-                     [[-1, -1, -1],
-                      [50, 50, 50],
-                      [50, 50, 50]] ]
-
-               Note that where there is no availble +1 index in the
-               percentiles_cube the upper bound is set to be the same as the
-               lower_bound.
-
-            2. When all slices have been interated over, the interpolants are
-               calculated using the threshold values and the values_bounds.
-               ::
-
-                   (threshold_cube.data - lower_bound) /
-                   (upper_bound - lower_bound)
-
-               If the upper_bound and lower_bound are the same this leads to
-               a divide by 0 calculation, resulting in np.inf as the output.
-
-            3. The interpolants are used to calculate the percentile value at
-               each point in the array using the percentile_bounds.
-               ::
-
-                   lower_percentile_bound + interpolants *
-                   (upper_percentile_bounds - lower_percentile_bounds)
+                   0 + (3.0 - 2.0) / (4.0 - 2.0) * (50 - 0) = 25
 
                The percentiles are divided by 100 to give a fractional
                probability.
 
-            5. Any probabilities that are calculated to be np.inf indicate that
-               the associated point has a threshold value that is above
-               the top percentile band. These points are given a probability
-               value of 1.
+            2. Any points that have a threshold value at or above the top
+               percentile band are given a probability value of 1.
 
-            4. Any points for which the calculated probability is np.nan had
-               threshold values that were never found to fall within a
-               percentile band, and so must be below the lowest band. These
-               points are given a probability value of 0.
+            3. Any points that have a threshold value below the lowest
+               percentile band are given a probability value of 0.
+
+            This gives probabilities::
+
+                [ [0.0, 0.0, 0.0],
+                  [0.25, 0.25, 0.25],
+                  [1.0, 1.0, 1.0] ]
 
         Args:
             threshold_cube (iris.cube.Cube):
@@ -347,48 +253,27 @@ class ProbabilitiesFromPercentiles2D(BasePlugin):
         probabilities = self.create_probability_cube(percentiles_cube,
                                                      threshold_cube)
 
-        # Create array with additional 2 dimensions to contain upper and lower
-        # bounds.
-        array_shape = [2] + list(threshold_cube.shape)
-        percentile_bounds = np.full(array_shape, -1, dtype=np.float32)
-        value_bounds = np.full(array_shape, np.nan, dtype=np.float32)
-
-        for index, pslice in enumerate(percentiles_cube.slices_over(
-                self.percentile_coordinate)):
-            # Change to use < & > to force degenerate percentile distributions
-            # to use the first percentile band that the threshold falls within.
-            indices = (threshold_cube.data <= pslice.data
-                       if self.inverse_ordering else
-                       threshold_cube.data >= pslice.data)
-            percentile_bounds[0, indices] = percentiles[index]
-            value_bounds[0, indices] = pslice.data[indices]
-            try:
-                # Usual behaviour where the threshold value falls between
-                # values corresponding to percentiles.
-                percentile_bounds[1, indices] = percentiles[index + 1]
-                value_bounds[1, indices] = percentiles_cube[index+1].data[
-                    indices]
-            except IndexError:
-                # Invoked if we have reached the top of the available values.
-                percentile_bounds[1, indices] = percentiles[index]
-                value_bounds[1, indices] = pslice.data[indices]
-
-        with np.errstate(divide='ignore', invalid='ignore'):
-            numerator = (threshold_cube.data - value_bounds[0])
-            denominator = np.diff(value_bounds, n=1, axis=0)[0]
-            interpolants = numerator/denominator
-            interpolants[denominator == 0] = np.inf
-
-        with np.errstate(invalid='ignore'):
-            probabilities.data, = (percentile_bounds[0] + interpolants *
-                                   np.diff(percentile_bounds, n=1, axis=0))
-        probabilities.data = probabilities.data/np.float32(100.)
-
-        above_top_band = np.isinf(interpolants)
-        below_bottom_band = np.isnan(value_bounds[0])
-        probabilities.data[below_bottom_band] = 0.
-        probabilities.data[above_top_band] = 1.
-
+        # Arrange the percentile distributions as rows. Where the values
+        # decrease with percentile, negate the values so that they increase,
+        # keeping the choice of the last band in which a threshold falls.
+        values = percentiles_cube.data.reshape(len(percentiles), -1).T
+        thresholds = threshold_cube.data.reshape(-1, 1)
+        if self.inverse_ordering:
+            values = -values
+            thresholds = -thresholds
+
+        interpolated = interpolate_multiple_rows(
+            thresholds, values, percentiles)[:, 0]
+        interpolated = interpolated / 100.
+
+        index = np.count_nonzero(values <= thresholds, axis=1) - 1
+        interpolated[index < 0] = 0.
+        interpolated[index >= len(percentiles) - 1] = 1.
+
+        dtype = np.result_type(threshold_cube.dtype, percentiles_cube.dtype,
+                               np.float32)
+        probabilities.data = interpolated.reshape(
+            threshold_cube.shape).astype(dtype)
         return probabilities
 
     def process(self, threshold_cube):
@@ -31,7 +31,7 @@
 """Module containing weather symbol implementation."""
 
 
-import copy
+import operator
 
 import iris
 import numpy as np
@@ -46,6 +46,9 @@ from improver.wxcode.wxcode_decision_tree import (
 from improver.wxcode.wxcode_decision_tree_global import (
     START_NODE_GLOBAL, wxcode_decision_tree_global)
 
+COMPARISON_OPERATORS = {'<': operator.lt, '<=': operator.le,
+                        '>': operator.gt, '>=': operator.ge}
+
 
 class WeatherSymbols(BasePlugin):
     """
@@ -230,116 +233,6 @@ class WeatherSymbols(BasePlugin):
 
         return inverted_threshold, inverted_combination
 
-    @staticmethod
-    def construct_condition(extract_constraint, condition,
-                            probability_threshold, gamma):
-        """
-        Create a string representing a comparison condition.
-
-        Args:
-            extract_constraint (str or list of str):
-                A string, or list of strings, encoding iris constraints
-                that will be used to extract the correct diagnostic cube
-                (by name) from the input cube list and the correct threshold
-                from that cube.
-            condition (str):
-                The condition statement (e.g. greater than, >).
-            probability_threshold (float):
-                The probability value to use in the comparison.
-            gamma (float or None):
-                The gamma factor to multiply one field by when performing
-                a subtraction. This value will be None in the case that
-                extract_constraint is not a list; it will not be used.
-        Returns:
-            string:
-                The formatted condition statement,
-                e.g.::
-
-                  cubes.extract(Constraint(
-                          name='probability_of_rainfall_rate_above_threshold',
-                          coord_values={'threshold': 0.03})
-                                )[0].data < 0.5)
-        """
-        if isinstance(extract_constraint, list):
-            return ('(cubes.extract({})[0].data - cubes.extract({})[0].data * '
-                    '{}) {} {}'.format(
-                        extract_constraint[0], extract_constraint[1], gamma,
-                        condition, probability_threshold))
-        return 'cubes.extract({})[0].data {} {}'.format(
-            extract_constraint, condition, probability_threshold)
-
-    @staticmethod
-    def format_condition_chain(conditions, condition_combination='AND'):
-        """
-        Chain individual condition statements together in a format that
-        numpy.where can use to make a series of comparisons.
-
-        Args:
-            conditions (list):
-                A list of conditions to be combined into a single comparison
-                statement.
-            condition_combination (str):
-                The method by which multiple conditions should be combined,
-                either AND or OR.
-        Returns:
-            string:
-                A string formatted as a chain of conditions suitable for use in
-                a numpy.where statement.
-                e.g. (condition 1) & (condition 2)
-        """
-        if condition_combination == 'OR':
-            return ('({}) | '*len(conditions)).format(*conditions).strip('| ')
-        return ('({}) & '*len(conditions)).format(*conditions).strip('& ')
-
-    def create_condition_chain(self, test_conditions):
-        """
-        A wrapper to call the construct_condition function for all the
-        conditions specified in a single query.
-
-        Args:
-            test_conditions (dict):
-                A query from the decision tree.
-        Returns:
-            list of str:
-                A list of strings that describe the conditions comprising the
-                query.
-                e.g.::
-
-                  [
-                    "(cubes.extract(Constraint(
-                          name='probability_of_rainfall_rate_above_threshold',
-                          coord_values={'threshold': 0.03})
-                     )[0].data < 0.5) |
-                     (cubes.extract(Constraint(
-                          name=
-                          'probability_of_lwe_snowfall_rate_above_threshold',
-                          coord_values={'threshold': 0.03})
-                     )[0].data < 0.5)"
-                  ]
-        """
-        conditions = []
-        loop = 0
-        for diagnostic, p_threshold, d_threshold in zip(
-                test_conditions['diagnostic_fields'],
-                test_conditions['probability_thresholds'],
-                test_conditions['diagnostic_thresholds']):
-
-            gamma = test_conditions.get('diagnostic_gamma')
-            if gamma is not None:
-                gamma = gamma[loop]
-            loop += 1
-
-            extract_constraint = self.construct_extract_constraint(
-                diagnostic, d_threshold, self.coord_named_threshold)
-            conditions.append(
-                WeatherSymbols.construct_condition(
-                    extract_constraint, test_conditions['threshold_condition'],
-                    p_threshold, gamma))
-        condition_chain = WeatherSymbols.format_condition_chain(
-            conditions,
-            condition_combination=test_conditions['condition_combination'])
-        return [condition_chain]
-
     def construct_extract_constraint(
             self, diagnostics, thresholds, coord_named_threshold):
         """
@@ -358,13 +251,14 @@ class WeatherSymbols(BasePlugin):
                 coordinate name from diagnostic name
 
         Returns:
-            str or list of str:
-                String, or list of strings, encoding iris cube constraints.
+            iris.Constraint or list of iris.Constraint:
+                Constraint, or list of constraints, to extract the diagnostic
+                cube at the required threshold.
         """
-        def _constraint_string(diagnostic, threshold_name, threshold_val):
+        def _constraint(diagnostic, threshold_name, threshold_val):
             """
-            Return iris constraint as a string for deferred creation of the
-            lambda functions.
+            Return iris constraint for the diagnostic at the given threshold.
+
             Args:
                 diagnostic (str):
                     Name of diagnostic
@@ -372,111 +266,158 @@ class WeatherSymbols(BasePlugin):
                     Name of threshold coordinate on input cubes
                 threshold_val (float):
                     Value of threshold coordinate required
-            Returns: (str)
+            Returns:
+                iris.Constraint
             """
-            if abs(threshold_val) < WeatherSymbols().float_abs_tolerance:
-                cell_constraint_str = (
-                    " -{float_abs_tol} < cell < "
-                    "{float_abs_tol}".format(
-                        float_abs_tol=WeatherSymbols().float_abs_tolerance))
+            if abs(threshold_val) < self.float_abs_tolerance:
+                lower = -self.float_abs_tolerance
+                upper = self.float_abs_tolerance
             else:
-                cell_constraint_str = (
-                    "{threshold_val} * {float_min} < cell < "
-                    "{threshold_val} * {float_max}".format(
-                        threshold_val=threshold_val,
-                        float_min=(1. - WeatherSymbols().float_tolerance),
-                        float_max=(1. + WeatherSymbols().float_tolerance)))
-            constraint_str = (
-                    "iris.Constraint(name='{diagnostic}', {threshold_name}="
-                    "lambda cell: {cell_constraint})".format(
-                        diagnostic=diagnostic, threshold_name=threshold_name,
-                        cell_constraint=cell_constraint_str))
-            return constraint_str
-
-        # if input is list, loop over and return a list of strings
+                lower = threshold_val * (1. - self.float_tolerance)
+                upper = threshold_val * (1. + self.float_tolerance)
+            return iris.Constraint(
+                name=diagnostic,
+                coord_values={
+                    threshold_name: lambda cell: lower < cell < upper})
+
+        def _threshold_coord_name(diagnostic):
+            """Return the name of the threshold coordinate of a diagnostic"""
+            if coord_named_threshold:
+                return "threshold"
+            if diagnostic in self.threshold_coord_names:
+                return self.threshold_coord_names[diagnostic]
+            return extract_diagnostic_name(diagnostic)
+
+        # if input is list, loop over and return a list of constraints
         if isinstance(diagnostics, list):
-            constraints = []
-            for diagnostic, threshold in zip(diagnostics, thresholds):
-                if coord_named_threshold:
-                    threshold_coord_name = "threshold"
-                elif diagnostic in self.threshold_coord_names:
-                    threshold_coord_name = (
-                        self.threshold_coord_names[diagnostic])
-                else:
-                    threshold_coord_name = extract_diagnostic_name(diagnostic)
-                threshold_val = threshold.points.item()
-                constraints.append(
-                    _constraint_string(
-                        diagnostic, threshold_coord_name, threshold_val))
-            return constraints
-
-        # otherwise, return a string
-        if coord_named_threshold:
-            threshold_coord_name = "threshold"
-        elif diagnostics in self.threshold_coord_names:
-            threshold_coord_name = self.threshold_coord_names[diagnostics]
-        else:
-            threshold_coord_name = extract_diagnostic_name(diagnostics)
-        threshold_val = thresholds.points.item()
-        constraint = _constraint_string(
-            diagnostics, threshold_coord_name, threshold_val)
-        return constraint
+            return [_constraint(diagnostic, _threshold_coord_name(diagnostic),
+                                threshold.points.item())
+                    for diagnostic, threshold in zip(diagnostics, thresholds)]
+
+        # otherwise, return a single constraint
+        return _constraint(diagnostics, _threshold_coord_name(diagnostics),
+                           thresholds.points.item())
+
+    def evaluate_condition(self, cubes, test_conditions, extracted_data=None):
+        """
+        Evaluate the conditions specified in a single query of the decision
+        tree, combining the outcomes for each of its diagnostics.
+
+        Args:
+            cubes (iris.cube.CubeList):
+                A cubelist containing the diagnostics required for the query.
+            test_conditions (dict):
+                A query from the decision tree.
+            extracted_data (dict or None):
+                Diagnostic data already extracted from the cubes, keyed by
+                diagnostic name and threshold.  Data extracted for this query
+                are added to it, so that each field is extracted only once
+                when several queries are evaluated.
+        Returns:
+            numpy.ndarray:
+                Boolean array which is True where the query condition is
+                satisfied.  Where the input data are masked, the condition is
+                not satisfied.
+        """
+        if extracted_data is None:
+            extracted_data = {}
+
+        def _data(diagnostic, threshold):
+            """Return the data of the diagnostic at the given threshold"""
+            key = (diagnostic, threshold.points.item())
+            if key not in extracted_data:
+                constraint = self.construct_extract_constraint(
+                    diagnostic, threshold, self.coord_named_threshold)
+                extracted_data[key] = cubes.extract(constraint)[0].data
+            return extracted_data[key]
+
+        comparison = COMPARISON_OPERATORS[
+            test_conditions['threshold_condition']]
+        gammas = test_conditions.get('diagnostic_gamma')
+        outcomes = []
+        for index, (diagnostic, p_threshold, d_threshold) in enumerate(zip(
+                test_conditions['diagnostic_fields'],
+                test_conditions['probability_thresholds'],
+                test_conditions['diagnostic_thresholds'])):
+            if isinstance(diagnostic, list):
+                # Subtract a fraction, gamma, of the second field from the
+                # first before comparing
+                values = (_data(diagnostic[0], d_threshold[0]) -
+                          _data(diagnostic[1], d_threshold[1]) *
+                          gammas[index])
+            else:
+                values = _data(diagnostic, d_threshold)
+            outcomes.append(comparison(values, p_threshold))
+
+        outcome = outcomes[0]
+        for other in outcomes[1:]:
+            if test_conditions['condition_combination'] == 'OR':
+                outcome = outcome | other
+            else:
+                outcome = outcome & other
+        return np.ma.filled(outcome, False)
 
     @staticmethod
-    def find_all_routes(graph, start, end, omit_nodes=None, route=None):
+    def compile_decision_tree(graph, start, omit_nodes=None):
         """
-        Function to trace all routes through the decision tree.
+        Compile the decision tree into an ordered list of evaluation steps,
+        in which every node is preceded by all the nodes that lead to it.
 
         Args:
             graph (dict):
                 A dictionary that describes each node in the tree,
                 e.g. {<node_name>: [<succeed_name>, <fail_name>]}
             start (str):
-                The node name of the tree root (currently always
-                heavy_precipitation).
-            end (int):
-                The weather symbol code to which we are tracing all routes.
-            omit_nodes (dict) or None:
+                The node name of the tree root.
+            omit_nodes (dict or None):
                 A dictionary of (keyword) nodes names where the diagnostic
                 data is missing and (values) node associated with
-                diagnostic_missing_action.
-            route (list):
-                A list of node names found so far.
+                diagnostic_missing_action.  Branches leading to an omitted
+                node lead to this associated node instead.
 
         Returns:
-            list of str:
-                A list of node names that defines the route from the tree root
-                to the weather symbol leaf (end of chain).
+            (tuple): tuple containing:
+                **start** (str or int):
+                    The node name of the tree root, or a weather symbol code
+                    if the root is omitted and leads directly to one.
+                **steps** (list of tuple):
+                    A (node, succeed, fail) tuple for each node reachable from
+                    the root, where succeed and fail are the names of the
+                    following nodes, or weather symbol codes, after skipping
+                    any omitted nodes.
 
-        References:
-            Method based upon Python Patterns - Implementing Graphs essay
-            https://www.python.org/doc/essays/graphs/
+        Raises:
+            ValueError: If the tree contains a loop.
         """
-        if route is None:
-            route = []
-
-        if omit_nodes:
-            start_not_valid = True
-            while start_not_valid:
-                if start in omit_nodes:
-                    start = omit_nodes[start]
-                else:
-                    start_not_valid = False
-        route = route + [start]
-        if start == end:
-            return [route]
-        if start not in graph.keys():
-            return []
-
-        routes = []
-        for node in graph[start]:
-            if node not in route:
-                newroutes = WeatherSymbols.find_all_routes(
-                    graph, node, end,
-                    omit_nodes=omit_nodes,
-                    route=route)
-                routes.extend(newroutes)
-        return routes
+        def _resolve(node):
+            """Skip over omitted nodes"""
+            while omit_nodes and node in omit_nodes:
+                node = omit_nodes[node]
+            return node
+
+        start = _resolve(start)
+        steps = []
+        visited = set()
+        in_progress = set()
+
+        def _visit(node):
+            """Add steps for the node's descendents, then the node itself, so
+            that reversing the steps gives a top-down order"""
+            if isinstance(node, int) or node in visited:
+                return
+            if node in in_progress:
+                raise ValueError(
+                    'Decision tree contains a loop at node {}'.format(node))
+            in_progress.add(node)
+            succeed, fail = (_resolve(target) for target in graph[node])
+            _visit(fail)
+            _visit(succeed)
+            in_progress.remove(node)
+            visited.add(node)
+            steps.append((node, succeed, fail))
+
+        _visit(start)
+        return start, steps[::-1]
 
     @staticmethod
     def create_symbol_cube(cube):
@@ -523,48 +464,41 @@ class WeatherSymbols(BasePlugin):
         graph = {key: [self.queries[key]['succeed'], self.queries[key]['fail']]
                  for key in self.queries.keys()}
 
-        # Search through tree for all leaves (weather code end points)
-        defined_symbols = []
-        for item in self.queries.values():
-            for value in item.values():
-                if isinstance(value, int):
-                    defined_symbols.append(value)
+        # Compile the tree into an order in which each node is evaluated after
+        # all the nodes leading to it.
+        start, steps = self.compile_decision_tree(
+            graph, self.start_node, omit_nodes=optional_node_data_missing)
 
         # Create symbol cube
         symbols = self.create_symbol_cube(cubes[0])
 
-        # Loop over possible symbols
-        for symbol_code in defined_symbols:
-
-            # In current decision tree
-            # start node is heavy_precipitation
-            routes = self.find_all_routes(
-                graph, self.start_node,
-                symbol_code,
-                omit_nodes=optional_node_data_missing)
-            # Loop over possible routes from root to leaf
-
-            for route in routes:
-                conditions = []
-                for i_node in range(len(route)-1):
-                    current_node = route[i_node]
-                    current = copy.copy(self.queries[current_node])
-                    try:
-                        next_node = route[i_node+1]
-                    except KeyError:
-                        next_node = symbol_code
-
-                    if current['fail'] == next_node:
-                        (current['threshold_condition'],
-                         current['condition_combination']) = (
-                             self.invert_condition(current))
-
-                    conditions.extend(self.create_condition_chain(current))
-
-                test_chain = self.format_condition_chain(conditions)
-
-                # Set grid locations to suitable weather symbol
-                symbols.data[np.where(eval(test_chain))] = symbol_code
+        # Pass the points reaching each node down the tree, splitting them
+        # between the succeed and fail branches.  The condition for the fail
+        # branch is evaluated as the inverse of the query, so that points
+        # with invalid data follow neither branch.
+        if isinstance(start, int):
+            symbols.data[...] = start
+            steps = []
+        reaching = {start: np.ones(symbols.data.shape, dtype=bool)}
+        extracted_data = {}
+        for node, succeed, fail in steps:
+            points = reaching.pop(node)
+            query = self.queries[node]
+            inverted = dict(query)
+            (inverted['threshold_condition'],
+             inverted['condition_combination']) = self.invert_condition(query)
+            for target, test_conditions in [(succeed, query),
+                                            (fail, inverted)]:
+                target_points = points & self.evaluate_condition(
+                    cubes, test_conditions, extracted_data)
+                if isinstance(target, int):
+                    # Set grid locations to suitable weather symbol
+                    symbols.data[target_points] = target
+                elif target in reaching:
+                    reaching[target] |= target_points
+                else:
+                    reaching[target] = target_points
+
         # Update symbols for day or night.
         symbols = update_daynight(symbols)
         return symbols
@@ -137,6 +137,37 @@ def generate_matching_weights_array(weights, shape):
     return weights_array.astype(np.float32)
 
 
+def reference_blend_percentiles(perc_values, percentiles, weights):
+    """Blend the percentiles at a single point, one blending slice at a
+    time, using numpy.interp.
+
+    Args:
+        perc_values (numpy.ndarray):
+            Percentile values with shape (length of coord to blend, num of
+            percentiles).
+        percentiles (numpy.ndarray):
+            The percentiles of the values.
+        weights (numpy.ndarray):
+            Weight of each slice along the coord to blend.
+
+    Returns:
+        numpy.ndarray:
+            The blended percentile values.
+    """
+    num = perc_values.shape[0]
+    combined_pdf = np.zeros((num, len(percentiles)), dtype=np.float32)
+    for i in range(num):
+        for j in range(num):
+            if i == j:
+                recalc_values_in_pdf = percentiles
+            else:
+                recalc_values_in_pdf = np.interp(
+                    perc_values[i], perc_values[j], percentiles)
+            combined_pdf[i] += recalc_values_in_pdf * weights[j]
+    return np.interp(percentiles, np.sort(combined_pdf.flatten()),
+                     np.sort(perc_values.flatten())).astype(np.float32)
+
+
 class Test__repr__(IrisTest):
 
     """Test the repr method."""
@@ -301,5 +332,42 @@ class Test_blend_percentiles(IrisTest):
         self.assertArrayAlmostEqual(result, expected_result)
 
 
+class Test_blend_percentiles_at_points(IrisTest):
+    """Test the blend_percentiles_at_points method"""
+    def test_matches_reference_at_each_point(self):
+        """Test the result at each point matches a reference blend of that
+        point alone, computed with numpy.interp, for points with different
+        weights and for points whose percentile values are not sorted"""
+        percentiles = np.array([0., 10., 20., 30., 40., 50.,
+                                60., 70., 80., 90., 100.])
+        unsorted_values = PERCENTILE_VALUES.copy()
+        unsorted_values[0, [2, 7]] = unsorted_values[0, [7, 2]]
+        unsorted_values[2] = unsorted_values[2, ::-1]
+        perc_values = np.stack(
+            [PERCENTILE_VALUES, unsorted_values, PERCENTILE_VALUES[::-1]],
+            axis=-1)
+        weights = np.array([[0.38872692, 0.6, 0.1],
+                            [0.33041788, 0.3, 0.0],
+                            [0.2808552, 0.1, 0.9]])[:, np.newaxis, :]
+        result = PercentileBlendingAggregator.blend_percentiles_at_points(
+            perc_values, percentiles, weights)
+        self.assertEqual(result.shape, (11, 3))
+        for point in range(3):
+            expected = reference_blend_percentiles(
+                perc_values[:, :, point], percentiles, weights[:, 0, point])
+            self.assertArrayAlmostEqual(result[:, point], expected)
+
+    def test_different_weights_at_points(self):
+        """Test the weights are applied separately at each point"""
+        weights = np.array([[[1.0, 0.5]], [[0.0, 0.5]]])
+        percentiles = np.array([20.0, 50.0, 80.0])
+        perc_values = np.array([[[5.0, 5.0], [6.0, 6.0], [7.0, 7.0]],
+                                [[5.0, 5.0], [6.5, 6.5], [7.0, 7.0]]])
+        result = PercentileBlendingAggregator.blend_percentiles_at_points(
+            perc_values, percentiles, weights)
+        expected_result = np.array([[5.0, 5.0], [6.0, 6.2], [7.0, 7.0]])
+        self.assertArrayAlmostEqual(result, expected_result)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -30,14 +30,18 @@
 # POSSIBILITY OF SUCH DAMAGE.
 """Unit tests for cli.__init__"""
 
+import sys
 import unittest
 from unittest.mock import patch
 
+import clize
+
 import improver
 from improver.cli import (
-    create_constrained_inputcubelist_converter, docutilize, inputcube,
-    inputjson, maybe_coerce_with, unbracket, with_intermediate_output,
-    with_output)
+    SUBCOMMANDS_TABLE, LazySubcommand, _subcommands_manifest,
+    build_subcommands_manifest, create_constrained_inputcubelist_converter,
+    docutilize, inputcube, inputjson, maybe_coerce_with, save_profile,
+    unbracket, with_intermediate_output, with_output)
 from improver.utilities.load import load_cube
 
 
@@ -141,6 +145,29 @@ class Test_inputjson(unittest.TestCase):
         self.assertEqual(result, {"mocked": 1})
 
 
+class Test_save_profile(unittest.TestCase):
+    """Tests the save profile converter"""
+
+    def test_basic(self):
+        """Tests that a known profile name is returned"""
+        self.assertEqual(save_profile("intermediate"), "intermediate")
+
+    def test_unknown_profile(self):
+        """Tests that an unknown profile name is rejected"""
+        msg = "Unknown save profile foo"
+        with self.assertRaisesRegex(clize.errors.CliValueError, msg):
+            save_profile("foo")
+
+    def test_rejected_when_parsing(self):
+        """Tests that an unknown profile is rejected when the command line
+        is parsed, before the wrapped function is called"""
+        with patch('improver.utilities.save.save_netcdf') as m:
+            with self.assertRaises(clize.errors.BadArgumentFormat):
+                clize.Clize.get_cli(wrapped_with_output)(
+                    "wrapped", "2", "--output=foo", "--output-profile=foo")
+        m.assert_not_called()
+
+
 class Test_with_output(unittest.TestCase):
     """Tests the with_output wrapper"""
 
@@ -157,7 +184,16 @@ class Test_with_output(unittest.TestCase):
         # pylint disable is needed as it can't see the wrappers output kwarg.
         # pylint: disable=E1123
         result = wrapped_with_output(2, output="foo")
-        m.assert_called_with(4, 'foo')
+        m.assert_called_with(4, 'foo', profile='default')
+        self.assertEqual(result, None)
+
+    @patch('improver.utilities.save.save_netcdf')
+    def test_with_output_profile(self, m):
+        """Tests that save_netcdf is called with the output profile"""
+        # pylint: disable=E1123
+        result = wrapped_with_output(
+            2, output="foo", output_profile="intermediate")
+        m.assert_called_with(4, 'foo', profile='intermediate')
         self.assertEqual(result, None)
 
 
@@ -224,5 +260,49 @@ class Test_unbracket(unittest.TestCase):
             unbracket(['foo', ']', 'bar'])
 
 
+class Test_LazySubcommand(unittest.TestCase):
+    """Test the LazySubcommand class"""
+
+    def test_table(self):
+        """Tests that the subcommands are in the table without being
+        loaded"""
+        command = SUBCOMMANDS_TABLE['threshold']
+        self.assertIsInstance(command, LazySubcommand)
+        self.assertEqual(command.name, 'threshold')
+
+    def test_helper_from_manifest(self):
+        """Tests that the help summary does not need the module"""
+        command = LazySubcommand('threshold')
+        with patch.dict(sys.modules, {'improver.cli.threshold': None}):
+            description = command.helper.description
+        self.assertIn('threshold', description)
+        self.assertIsNone(command.import_time)
+
+    def test_helper_not_in_manifest(self):
+        """Tests that the module is loaded for the help summary if it is
+        not in the manifest"""
+        command = LazySubcommand('threshold')
+        with patch.dict(_subcommands_manifest(), clear=True):
+            description = command.helper.description
+        self.assertIn('threshold', description)
+        self.assertIsNotNone(command.import_time)
+
+    def test_call(self):
+        """Tests that calling the subcommand loads and runs it"""
+        command = LazySubcommand('threshold')
+        result = command('improver threshold', '--help')
+        self.assertIn('Usage: improver threshold', result)
+        self.assertGreaterEqual(command.import_time, 0)
+
+
+class Test_build_subcommands_manifest(unittest.TestCase):
+    """Test the build_subcommands_manifest function"""
+
+    def test_manifest_up_to_date(self):
+        """Tests that the manifest matches the subcommands. If this fails,
+        update the manifest with improver.cli.write_subcommands_manifest"""
+        self.assertEqual(build_subcommands_manifest(), _subcommands_manifest())
+
+
 if __name__ == '__main__':
     unittest.main()
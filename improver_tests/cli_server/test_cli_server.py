@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# (C) British Crown Copyright 2017-2019 Met Office.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Unit tests for the cli_server module."""
+
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from improver.cli_server import (
+    SOCKET_ENV_VAR, _peer_uid, _receive_message, _send_message, exit_status,
+    run_command, serve)
+
+
+class Test_exit_status(unittest.TestCase):
+
+    """Test conversion of SystemExit into an exit status."""
+
+    def test_none(self):
+        """Test that no code gives a zero status."""
+        self.assertEqual(exit_status(SystemExit()), 0)
+
+    def test_int(self):
+        """Test that an integer code is returned unchanged."""
+        self.assertEqual(exit_status(SystemExit(2)), 2)
+
+    def test_message(self):
+        """Test that a message code gives a status of 1."""
+        with patch('sys.stderr'):
+            self.assertEqual(exit_status(SystemExit("error")), 1)
+
+
+class Test_messages(unittest.TestCase):
+
+    """Test sending and receiving messages over a socket."""
+
+    def test_round_trip(self):
+        """Test that a message and file descriptors are passed across."""
+        sender, receiver = socket.socketpair()
+        read_fd, write_fd = os.pipe()
+        message = {'argv': ['improver', 'help'], 'env': {'A': 'x' * 100000}}
+        try:
+            _send_message(sender, message, fds=[write_fd])
+            result, fds = _receive_message(receiver, max_fds=1)
+            self.assertEqual(result, message)
+            self.assertEqual(len(fds), 1)
+            os.write(fds[0], b'abc')
+            os.close(fds[0])
+            self.assertEqual(os.read(read_fd, 3), b'abc')
+        finally:
+            for item in (sender, receiver):
+                item.close()
+            for fd in (read_fd, write_fd):
+                os.close(fd)
+
+    def test_closed(self):
+        """Test that None is returned if the connection is closed."""
+        sender, receiver = socket.socketpair()
+        sender.close()
+        result, fds = _receive_message(receiver)
+        receiver.close()
+        self.assertIsNone(result)
+        self.assertEqual(fds, [])
+
+
+class Test__peer_uid(unittest.TestCase):
+
+    """Test finding the user at the other end of a socket."""
+
+    @unittest.skipUnless(hasattr(socket, 'SO_PEERCRED'),
+                         "Platform does not report peer credentials")
+    def test_basic(self):
+        """Test that the user of this process is returned."""
+        sender, receiver = socket.socketpair()
+        try:
+            self.assertEqual(_peer_uid(receiver), os.getuid())
+        finally:
+            sender.close()
+            receiver.close()
+
+
+class Test_serve(unittest.TestCase):
+
+    """Test that commands run in the server behave as in a new process."""
+
+    def setUp(self):
+        """Start a server in a child process."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.socket_path = os.path.join(self.directory.name, 'socket')
+        self.start_server()
+
+    def start_server(self):
+        """Start a server in a child process and wait for its socket."""
+        self.server_pid = os.fork()
+        if self.server_pid == 0:
+            try:
+                serve(self.socket_path, preload_modules=False)
+            finally:
+                os._exit(0)
+        for _ in range(100):
+            if os.path.exists(self.socket_path):
+                break
+            time.sleep(0.1)
+
+    def tearDown(self):
+        """Stop the server."""
+        self.stop_server()
+        self.directory.cleanup()
+
+    def stop_server(self):
+        """Stop the server if it is running."""
+        if self.server_pid is not None:
+            os.kill(self.server_pid, signal.SIGTERM)
+            os.waitpid(self.server_pid, 0)
+            self.server_pid = None
+
+    def run_both(self, *args):
+        """Run a command in a new process and in the server."""
+        results = []
+        for module in ('improver.cli', 'improver.cli_server'):
+            env = dict(os.environ, **{SOCKET_ENV_VAR: self.socket_path})
+            results.append(subprocess.run(
+                [sys.executable, '-m', module] + list(args),
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env))
+        return results
+
+    def test_help(self):
+        """Test that the output and exit status match."""
+        expected, result = self.run_both('help', 'threshold')
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(result.returncode, expected.returncode)
+        self.assertEqual(result.stdout, expected.stdout)
+        self.assertIn(b'threshold', result.stdout)
+
+    def test_error(self):
+        """Test that errors and exit status match."""
+        expected, result = self.run_both('no_such_command')
+        self.assertEqual(result.returncode, 2)
+        self.assertEqual(result.returncode, expected.returncode)
+        self.assertEqual(result.stderr, expected.stderr)
+
+    def test_socket_permissions(self):
+        """Test that only the user running the server can use the socket,
+        whatever the umask."""
+        self.stop_server()
+        umask = os.umask(0)
+        try:
+            self.start_server()
+        finally:
+            os.umask(umask)
+        self.assertEqual(os.stat(self.socket_path).st_mode & 0o777, 0o600)
+
+    def test_other_user_rejected(self):
+        """Test that a connection from another user is closed without
+        running the command."""
+        self.stop_server()
+        with patch('improver.cli_server._peer_uid',
+                   return_value=os.getuid() + 1):
+            self.start_server()
+        with self.assertRaises(ConnectionError):
+            run_command(self.socket_path, ['improver', 'help'])
+
+    def test_fallback(self):
+        """Test that the command runs if the server is not available."""
+        self.stop_server()
+        self.assertFalse(os.path.exists(self.socket_path))
+        expected, result = self.run_both('help', 'threshold')
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(result.stdout, expected.stdout)
+
+
+if __name__ == '__main__':
+    unittest.main()
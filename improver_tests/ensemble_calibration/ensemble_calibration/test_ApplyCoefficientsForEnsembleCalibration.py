@@ -85,6 +85,14 @@ class SetupCoefficientsCubes(SetupCubes, SetupExpectedCoefficients):
             estimator.create_coefficients_cube(
                 self.expected_mean_predictor_gaussian,
                 self.current_temperature_forecast_cube))
+        # Set up a coefficients cube with the same coefficients at each
+        # grid point.
+        self.coeffs_from_mean_by_point = (
+            estimator.create_coefficients_cube(
+                np.broadcast_to(
+                    self.expected_mean_predictor_gaussian[:, None, None],
+                    (4, 3, 3)),
+                self.current_temperature_forecast_cube))
 
         # Set up a coefficients cube when using the ensemble realization as the
         # predictor and the coefficients have been estimated using statsmodels.
@@ -273,6 +281,28 @@ class Test__spatial_domain_match(SetupCoefficientsCubes):
         with self.assertRaisesRegex(ValueError, msg):
             self.plugin._spatial_domain_match()
 
+    def test_matching_coefficients_by_point(self):
+        """Test case in which the grid of coefficients estimated at each
+        point matches the grid of the current forecast."""
+        self.plugin.current_forecast = self.current_temperature_forecast_cube
+        self.plugin.coefficients_cube = self.coeffs_from_mean_by_point
+        self.plugin._spatial_domain_match()
+
+    def test_unmatching_coefficients_by_point(self):
+        """Test case in which the grid of coefficients estimated at each
+        point has the same extent as the grid of the current forecast, but
+        different points."""
+        x_points = np.copy(
+            self.current_temperature_forecast_cube.coord(axis='x').points)
+        x_points[1] += 0.5 * (x_points[2] - x_points[1])
+        self.current_temperature_forecast_cube.coord(axis='x').points = (
+            x_points)
+        self.plugin.current_forecast = self.current_temperature_forecast_cube
+        self.plugin.coefficients_cube = self.coeffs_from_mean_by_point
+        msg = "The domain along the x axis given by the current forecast"
+        with self.assertRaisesRegex(ValueError, msg):
+            self.plugin._spatial_domain_match()
+
 
 class Test__calculate_location_parameter_from_mean(
         SetupCoefficientsCubes, EnsembleCalibrationAssertions):
@@ -472,6 +502,48 @@ class Test_process(SetupCoefficientsCubes, EnsembleCalibrationAssertions):
             self.expected_scale_param_mean)
         self.assertEqual(calibrated_forecast_predictor.dtype, np.float32)
 
+    @ManageWarnings(
+        ignored_messages=["Collapsing a non-contiguous coordinate."])
+    def test_end_to_end_coefficients_by_point(self):
+        """Test that coefficients estimated at each grid point are applied
+        at each grid point, by using the same coefficients at every point."""
+        calibrated_forecast_predictor, calibrated_forecast_var = (
+            self.plugin.process(self.current_temperature_forecast_cube,
+                                self.coeffs_from_mean_by_point))
+
+        self.assertCalibratedVariablesAlmostEqual(
+            calibrated_forecast_predictor.data,
+            self.expected_loc_param_mean)
+        self.assertCalibratedVariablesAlmostEqual(
+            calibrated_forecast_var.data,
+            self.expected_scale_param_mean)
+        self.assertEqual(calibrated_forecast_predictor.dtype, np.float32)
+
+    @ManageWarnings(
+        ignored_messages=["Collapsing a non-contiguous coordinate."])
+    def test_end_to_end_realizations_coefficients_by_point(self):
+        """Test that coefficients estimated at each grid point are applied
+        at each grid point when the ensemble realizations are the predictor,
+        by varying the coefficients between grid points."""
+        coeffs = self.coeffs_from_statsmodels_realizations.data
+        coeffs_by_point = np.broadcast_to(
+            coeffs[:, None, None], (6, 3, 3)).copy()
+        coeffs_by_point[2, 0, 0] += 1.
+        estimator = EstimateCoefficientsForEnsembleCalibration(
+            "gaussian", "20171110T0000Z", desired_units="Celsius",
+            predictor_of_mean_flag="realizations")
+        coefficients_cube = estimator.create_coefficients_cube(
+            coeffs_by_point, self.current_temperature_forecast_cube)
+        expected = self.expected_loc_param_statsmodels_realizations.copy()
+        expected[0, 0] += 1.
+
+        calibrated_forecast_predictor, _ = (
+            Plugin(predictor="realizations").process(
+                self.current_temperature_forecast_cube, coefficients_cube))
+
+        self.assertCalibratedVariablesAlmostEqual(
+            calibrated_forecast_predictor.data, expected)
+
     @ManageWarnings(
         ignored_messages=["Collapsing a non-contiguous coordinate."])
     def test_end_to_end_with_mask(self):
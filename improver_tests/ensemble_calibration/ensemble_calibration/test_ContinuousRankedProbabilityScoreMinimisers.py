@@ -39,6 +39,7 @@ import unittest
 import iris
 import numpy as np
 from iris.tests import IrisTest
+from scipy.optimize import approx_fprime
 
 from improver.ensemble_calibration.ensemble_calibration import \
     ContinuousRankedProbabilityScoreMinimisers as Plugin
@@ -193,6 +194,77 @@ class Test_calculate_normal_crps(SetupGaussianInputs):
         self.assertAlmostEqual(result, plugin.BAD_VALUE)
 
 
+class Test_calculate_normal_crps_and_gradient(SetupGaussianInputs):
+
+    """Test calculating the CRPS and its gradient for a gaussian
+    distribution."""
+
+    def setUp(self):
+        """Set up the design matrices and a set of coefficients."""
+        super().setUp()
+        self.design_matrix = np.column_stack(
+            (np.ones(self.truth_data.shape), self.forecast_predictor_data))
+        self.design_matrix_realizations = np.column_stack(
+            (np.ones(self.truth_data.shape),
+             self.forecast_predictor_data_realizations))
+        self.coeffs = np.array([0.5, 0.8, 0.1, 0.9], dtype=np.float64)
+
+    @ManageWarnings(
+        ignored_messages=["Collapsing a non-contiguous coordinate."])
+    def test_basic_mean_predictor(self):
+        """Test that the CRPS matches calculate_normal_crps and that the
+        gradient matches a finite difference estimate, with the ensemble
+        mean as the predictor."""
+        plugin = Plugin()
+        args = (self.design_matrix, self.truth_data,
+                self.forecast_variance_data, self.sqrt_pi, "mean")
+        result, gradient = plugin.calculate_normal_crps_and_gradient(
+            self.coeffs, *args)
+        expected = plugin.calculate_normal_crps(
+            self.coeffs, self.forecast_predictor_data, self.truth_data,
+            self.forecast_variance_data, self.sqrt_pi, "mean")
+        expected_gradient = approx_fprime(
+            self.coeffs,
+            lambda x: plugin.calculate_normal_crps_and_gradient(x, *args)[0],
+            1e-7)
+        self.assertAlmostEqual(result, expected)
+        self.assertArrayAllClose(
+            gradient, expected_gradient, rtol=1e-5, atol=1e-6)
+
+    @ManageWarnings(
+        ignored_messages=["Collapsing a non-contiguous coordinate."])
+    def test_basic_realizations_predictor(self):
+        """Test that the gradient matches a finite difference estimate, with
+        the ensemble realizations as the predictor."""
+        plugin = Plugin()
+        coeffs = np.array([0.5, 0.8, 0.1, 0.5, 0.6, 0.7], dtype=np.float64)
+        args = (self.design_matrix_realizations, self.truth_data,
+                self.forecast_variance_data, self.sqrt_pi, "realizations")
+        _, gradient = plugin.calculate_normal_crps_and_gradient(
+            coeffs, *args)
+        expected_gradient = approx_fprime(
+            coeffs,
+            lambda x: plugin.calculate_normal_crps_and_gradient(x, *args)[0],
+            1e-7)
+        self.assertArrayAllClose(
+            gradient, expected_gradient, rtol=1e-5, atol=1e-6)
+
+    @ManageWarnings(
+        ignored_messages=["Collapsing a non-contiguous coordinate.",
+                          "invalid value encountered in"],
+        warning_types=[UserWarning, RuntimeWarning])
+    def test_basic_mean_predictor_bad_value(self):
+        """Test that the BAD_VALUE and a zero gradient are returned when the
+        appropriate condition is found."""
+        initial_guess = np.array([1e65, 1e65, 1e65, 1e65], dtype=np.float32)
+        plugin = Plugin()
+        result, gradient = plugin.calculate_normal_crps_and_gradient(
+            initial_guess, self.design_matrix, self.truth_data,
+            self.forecast_variance_data, self.sqrt_pi, "mean")
+        self.assertAlmostEqual(result, plugin.BAD_VALUE)
+        self.assertArrayEqual(gradient, np.zeros(4))
+
+
 class Test_process_gaussian_distribution(
         SetupGaussianInputs, EnsembleCalibrationAssertions):
 
@@ -257,6 +329,56 @@ class Test_process_gaussian_distribution(
         self.assertEMOSCoefficientsAlmostEqual(
             result, self.expected_realizations_coefficients)
 
+    @ManageWarnings(
+        ignored_messages=["Collapsing a non-contiguous coordinate.",
+                          "The final iteration resulted in",
+                          "invalid value encountered in",
+                          "divide by zero encountered in"],
+        warning_types=[UserWarning, UserWarning, RuntimeWarning,
+                       RuntimeWarning])
+    def test_use_gradient_mean_predictor(self):
+        """
+        Test that minimising with the analytic gradient gives coefficients
+        with a CRPS at least as low as the Nelder-Mead algorithm. The ensemble
+        mean is the predictor.
+        """
+        plugin = Plugin(tolerance=self.tolerance, use_gradient=True)
+        result = plugin.process(
+            self.initial_guess_for_mean, self.forecast_predictor_mean,
+            self.truth, self.forecast_variance, "mean", "gaussian")
+        self.assertEqual(result.dtype, np.float32)
+        crps = plugin.calculate_normal_crps(
+            result.astype(np.float64), self.forecast_predictor_data,
+            self.truth_data, self.forecast_variance_data, self.sqrt_pi,
+            "mean")
+        expected_crps = plugin.calculate_normal_crps(
+            np.array(self.expected_mean_coefficients),
+            self.forecast_predictor_data, self.truth_data,
+            self.forecast_variance_data, self.sqrt_pi, "mean")
+        self.assertLessEqual(crps, expected_crps + 1e-6)
+
+    @ManageWarnings(
+        ignored_messages=["Collapsing a non-contiguous coordinate.",
+                          "Minimisation did not result in convergence",
+                          "The final iteration resulted in",
+                          "invalid value encountered in",
+                          "divide by zero encountered in"],
+        warning_types=[UserWarning, UserWarning, UserWarning,
+                       RuntimeWarning, RuntimeWarning])
+    def test_use_gradient_fallback(self):
+        """
+        Test that the Nelder-Mead algorithm is used if the minimisation
+        using the analytic gradient does not converge.
+        """
+        args = (self.initial_guess_for_mean, self.forecast_predictor_mean,
+                self.truth, self.forecast_variance, "mean", "gaussian")
+        result = Plugin(
+            tolerance=self.tolerance, max_iterations=3,
+            use_gradient=True).process(*args)
+        expected = Plugin(
+            tolerance=self.tolerance, max_iterations=3).process(*args)
+        self.assertArrayEqual(result, expected)
+
     @ManageWarnings(
         ignored_messages=["Collapsing a non-contiguous coordinate."])
     def test_mean_predictor_keyerror(self):
@@ -487,6 +609,40 @@ class Test_calculate_truncated_normal_crps(SetupTruncatedGaussianInputs):
         self.assertAlmostEqual(result, plugin.BAD_VALUE)
 
 
+class Test_calculate_truncated_normal_crps_and_gradient(
+        SetupTruncatedGaussianInputs):
+
+    """Test calculating the CRPS and its gradient for a truncated gaussian
+    distribution."""
+
+    @ManageWarnings(
+        ignored_messages=["Collapsing a non-contiguous coordinate."])
+    def test_basic_mean_predictor(self):
+        """Test that the CRPS matches calculate_truncated_normal_crps and
+        that the gradient matches a finite difference estimate, with the
+        ensemble mean as the predictor."""
+        plugin = Plugin()
+        coeffs = np.array([0.5, 0.8, 0.1, 0.9], dtype=np.float64)
+        args = (np.column_stack((np.ones(self.truth_data.shape),
+                                 self.forecast_predictor_data)),
+                self.truth_data, self.forecast_variance_data, self.sqrt_pi,
+                "mean")
+        result, gradient = (
+            plugin.calculate_truncated_normal_crps_and_gradient(
+                coeffs, *args))
+        expected = plugin.calculate_truncated_normal_crps(
+            coeffs, self.forecast_predictor_data, self.truth_data,
+            self.forecast_variance_data, self.sqrt_pi, "mean")
+        expected_gradient = approx_fprime(
+            coeffs,
+            lambda x: plugin.calculate_truncated_normal_crps_and_gradient(
+                x, *args)[0],
+            1e-7)
+        self.assertAlmostEqual(result, expected)
+        self.assertArrayAllClose(
+            gradient, expected_gradient, rtol=1e-5, atol=1e-6)
+
+
 class Test_process_truncated_gaussian_distribution(
         SetupTruncatedGaussianInputs, EnsembleCalibrationAssertions):
 
@@ -207,6 +207,12 @@ class Test__init__(SetupCubes):
         with self.assertRaisesRegex(ValueError, msg):
             Plugin(distribution, self.desired_units)
 
+    def test_invalid_processes(self):
+        """Test an error is raised for an invalid number of processes."""
+        msg = "Invalid number of processes"
+        with self.assertRaisesRegex(ValueError, msg):
+            Plugin(self.distribution, self.desired_units, processes=0)
+
     @unittest.skipIf(
         STATSMODELS_FOUND is True, "statsmodels module is available.")
     @ManageWarnings(
@@ -288,7 +294,9 @@ class Test__repr__(IrisTest):
                "ContinuousRankedProbabilityScoreMinimisers'>; "
                "coeff_names: ['gamma', 'delta', 'alpha', 'beta']; "
                "tolerance: 0.01; "
-               "max_iterations: 1000>")
+               "max_iterations: 1000; "
+               "point_by_point: False; "
+               "processes: 1>")
         self.assertEqual(result, msg)
 
     @ManageWarnings(
@@ -298,7 +306,8 @@ class Test__repr__(IrisTest):
         result = str(Plugin(
             self.distribution, self.current_cycle,
             desired_units="Kelvin", predictor_of_mean_flag="realizations",
-            tolerance=10, max_iterations=10))
+            tolerance=10, max_iterations=10, point_by_point=True,
+            processes=2))
         msg = ("<EstimateCoefficientsForEnsembleCalibration: "
                "distribution: gaussian; "
                "current_cycle: 20171110T0000Z; "
@@ -309,7 +318,9 @@ class Test__repr__(IrisTest):
                "ContinuousRankedProbabilityScoreMinimisers'>; "
                "coeff_names: ['gamma', 'delta', 'alpha', 'beta']; "
                "tolerance: 10; "
-               "max_iterations: 10>")
+               "max_iterations: 10; "
+               "point_by_point: True; "
+               "processes: 2>")
         self.assertEqual(result, msg)
 
 
@@ -469,6 +480,29 @@ class Test_create_coefficients_cube(IrisTest):
             plugin.create_coefficients_cube(
                 optimised_coeffs, self.historic_forecast_with_realizations)
 
+    @ManageWarnings(
+        ignored_messages=IGNORED_MESSAGES, warning_types=WARNING_TYPES)
+    def test_coefficients_by_point(self):
+        """Test that the coefficients cube has the grid of the historic
+        forecast if the coefficients have been estimated at each point."""
+        optimised_coeffs = np.broadcast_to(
+            self.optimised_coeffs[:, None, None], (4, 3, 3))
+        result = self.plugin.create_coefficients_cube(
+            optimised_coeffs, self.historic_forecast_with_realizations)
+        self.assertArrayEqual(result.data, optimised_coeffs)
+        for axis, dim in [("y", 1), ("x", 2)]:
+            self.assertEqual(result.coord_dims(result.coord(axis=axis)),
+                             (dim,))
+            self.assertEqual(
+                result.coord(axis=axis),
+                self.historic_forecast_with_realizations.coord(axis=axis))
+        self.assertFalse(result.coords("realization"))
+        self.assertEqual(result.coord("time"), self.expected.coord("time"))
+        self.assertEqual(result.coord("forecast_reference_time"),
+                         self.expected.coord("forecast_reference_time"))
+        self.assertArrayEqual(
+            result.coord("coefficient_name").points, self.plugin.coeff_names)
+
 
 class Test_compute_initial_guess(IrisTest):
 
@@ -1194,6 +1228,80 @@ class Test_process(SetupCubes, EnsembleCalibrationAssertions,
             result.coord("coefficient_name").points,
             self.coeff_names_realizations)
 
+    @ManageWarnings(
+        ignored_messages=IGNORED_MESSAGES, warning_types=WARNING_TYPES)
+    def test_coefficients_by_point(self):
+        """Test that the coefficients are estimated separately at each grid
+        point, starting from the initial guess estimated from all points."""
+        plugin = Plugin(
+            self.distribution, self.current_cycle, point_by_point=True)
+        result = plugin.process(
+            self.historic_temperature_forecast_cube,
+            self.temperature_truth_cube)
+
+        self.assertEqual(result.shape, (4, 3, 3))
+        self.assertArrayEqual(
+            result.coord("coefficient_name").points, self.coeff_names)
+        forecast_predictor = self.historic_temperature_forecast_cube.collapsed(
+            "realization", iris.analysis.MEAN)
+        forecast_var = self.historic_temperature_forecast_cube.collapsed(
+            "realization", iris.analysis.VARIANCE)
+        initial_guess = plugin.compute_initial_guess(
+            self.temperature_truth_cube, forecast_predictor, "mean", True)
+        for index in np.ndindex(3, 3):
+            expected = ContinuousRankedProbabilityScoreMinimisers().process(
+                initial_guess, forecast_predictor[(...,) + index],
+                self.temperature_truth_cube[(...,) + index],
+                forecast_var[(...,) + index], "mean", self.distribution)
+            self.assertArrayAlmostEqual(
+                result.data[(slice(None),) + index], expected)
+
+    @ManageWarnings(
+        ignored_messages=IGNORED_MESSAGES, warning_types=WARNING_TYPES)
+    def test_coefficients_by_point_landsea_mask(self):
+        """Test that the coefficients are not estimated at the masked sea
+        points, and are the same at the land points as without the mask."""
+        plugin = Plugin(
+            self.distribution, self.current_cycle, point_by_point=True)
+        expected = plugin.process(
+            self.historic_temperature_forecast_cube,
+            self.temperature_truth_cube)
+        result = plugin.process(
+            self.historic_temperature_forecast_cube_halo,
+            self.temperature_truth_cube_halo,
+            landsea_mask=self.landsea_cube)
+
+        self.assertEqual(result.shape, (4, 5, 5))
+        self.assertArrayAlmostEqual(result.data[:, 1:-1, 1:-1], expected.data)
+        sea = self.landsea_cube.data == 0
+        self.assertTrue(np.all(np.isnan(result.data[:, sea])))
+
+    @ManageWarnings(
+        ignored_messages=IGNORED_MESSAGES, warning_types=WARNING_TYPES)
+    def test_coefficients_by_point_realizations_processes(self):
+        """Test that the coefficients estimated at each grid point using the
+        ensemble realizations as the predictor are the same if they are
+        estimated in a pool of processes."""
+        predictor_of_mean_flag = "realizations"
+        expected = Plugin(
+            self.distribution, self.current_cycle,
+            predictor_of_mean_flag=predictor_of_mean_flag,
+            point_by_point=True).process(
+                self.historic_temperature_forecast_cube,
+                self.temperature_truth_cube)
+        result = Plugin(
+            self.distribution, self.current_cycle,
+            predictor_of_mean_flag=predictor_of_mean_flag,
+            point_by_point=True, processes=2).process(
+                self.historic_temperature_forecast_cube,
+                self.temperature_truth_cube)
+
+        self.assertEqual(result.shape, (6, 3, 3))
+        self.assertArrayEqual(result.data, expected.data)
+        self.assertArrayEqual(
+            result.coord("coefficient_name").points,
+            self.coeff_names_realizations)
+
     @ManageWarnings(
         ignored_messages=IGNORED_MESSAGES, warning_types=WARNING_TYPES)
     def test_truth_unit_conversion(self):
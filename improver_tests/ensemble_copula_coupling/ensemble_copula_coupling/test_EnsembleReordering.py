@@ -35,6 +35,7 @@ Unit tests for the
 """
 import itertools
 import unittest
+from datetime import datetime
 
 import numpy as np
 from iris.cube import Cube
@@ -47,6 +48,8 @@ from improver.utilities.warnings_handler import ManageWarnings
 from ...ensemble_calibration.ensemble_calibration.helper_functions import (
     add_forecast_reference_time_and_forecast_period, set_up_cube,
     set_up_temperature_cube)
+from ...set_up_test_cubes import (
+    add_coordinate, set_up_percentile_cube, set_up_variable_cube)
 
 
 class Test__recycle_raw_ensemble_realizations(IrisTest):
@@ -563,6 +566,66 @@ class Test_rank_ecc(IrisTest):
             np.array_equal(aresult, result.data) for aresult in permutations]
         self.assertIn(True, matches)
 
+    def test_multiple_times_random_seed(self):
+        """
+        Test that the result for each time is the same as for a cube
+        containing only that time, when there are tied values within the
+        raw ensemble realizations and a random seed is specified.
+        """
+        raw_data = np.array([[[1, 1], [2, 2]],
+                             [[2, 1], [1, 2]],
+                             [[1, 1], [1, 1]],
+                             [[2, 2], [1, 2]]], dtype=np.float32)
+        calibrated_data = np.array([[[1, 1], [1, 1]],
+                                    [[2, 2], [2, 2]],
+                                    [[3, 3], [3, 3]],
+                                    [[4, 4], [4, 4]]], dtype=np.float32)
+        times = [datetime(2017, 11, 10, hour) for hour in [4, 5, 6]]
+        raw_cube = add_coordinate(
+            set_up_variable_cube(raw_data), times, "time",
+            is_datetime=True, order=[1, 0, 2, 3])
+        raw_cube.data[:, 1] = raw_cube.data[:, 1, ::-1]
+        calibrated_cube = add_coordinate(
+            set_up_percentile_cube(
+                calibrated_data,
+                np.array([20, 40, 60, 80], dtype=np.float32)),
+            times, "time", is_datetime=True, order=[1, 0, 2, 3])
+
+        plugin = Plugin()
+        result = plugin.rank_ecc(calibrated_cube, raw_cube, random_seed=0)
+        self.assertEqual(result.coord_dims("time"), (1,))
+        for index in range(len(times)):
+            expected = plugin.rank_ecc(
+                calibrated_cube[:, index], raw_cube[:, index], random_seed=0)
+            self.assertArrayEqual(result.data[:, index], expected.data)
+
+    def test_raw_dimension_order(self):
+        """
+        Test that the raw forecast dimensions are matched to those of the
+        post-processed forecast by coordinate, if they are in a different
+        order.
+        """
+        raw_data = np.array([[[3, 1]],
+                             [[2, 2]],
+                             [[1, 3]]])
+        calibrated_data = np.array([[[1, 1]],
+                                    [[2, 2]],
+                                    [[3, 3]]])
+        result_data = np.array([[[3, 1]],
+                                [[2, 2]],
+                                [[1, 3]]])
+        cube = self.cube.copy()
+        cube = cube[:, :, :2, 0]
+        raw_cube = cube.copy()
+        raw_cube.data = raw_data
+        raw_cube.transpose([2, 1, 0])
+        calibrated_cube = cube.copy()
+        calibrated_cube.data = calibrated_data
+
+        plugin = Plugin()
+        result = plugin.rank_ecc(calibrated_cube, raw_cube)
+        self.assertArrayAlmostEqual(result.data, result_data)
+
 
 class Test_process(IrisTest):
 
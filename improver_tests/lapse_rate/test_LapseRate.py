@@ -63,69 +63,98 @@ class Test__repr__(IrisTest):
         self.assertEqual(result, msg)
 
 
-class Test__calc_lapse_rate(IrisTest):
-    """Test the _calc_lapse_rate function."""
+class Test__calc_lapse_rates(IrisTest):
+    """Test the _calc_lapse_rates function."""
 
     def setUp(self):
         """Sets up arrays."""
 
-        self.temperature = np.array([280.06, 279.97, 279.90, 280.15, 280.03,
-                                     279.96, 280.25, 280.33, 280.27])
-        self.orography = np.array([174.67, 179.87, 188.46, 155.84, 169.58,
-                                   185.05, 134.90, 144.00, 157.89])
+        self.temperature = np.array([[[280.06, 279.97, 279.90],
+                                      [280.15, 280.03, 279.96],
+                                      [280.25, 280.33, 280.27]]])
+        self.orography = np.array([[174.67, 179.87, 188.46],
+                                   [155.84, 169.58, 185.05],
+                                   [134.90, 144.00, 157.89]])
 
     def test_returns_expected_values(self):
         """Test that the function returns expected lapse rate. """
 
         expected_out = -0.00765005774676
-        result = LapseRate(nbhood_radius=1)._calc_lapse_rate(self.temperature,
-                                                             self.orography)
-        self.assertArrayAlmostEqual(result, expected_out)
+        result = LapseRate(nbhood_radius=1)._calc_lapse_rates(
+            self.temperature, self.orography)
+        self.assertEqual(result.shape, (1, 3, 3))
+        self.assertEqual(result.dtype, np.float32)
+        self.assertArrayAlmostEqual(result[0, 1, 1], expected_out)
 
     def test_handles_nan(self):
         """Test that the function returns DALR value when central point
            is NaN."""
 
-        self.temperature[4] = np.nan
+        self.temperature[0, 1, 1] = np.nan
         expected_out = DALR
-        result = LapseRate(nbhood_radius=1)._calc_lapse_rate(self.temperature,
-                                                             self.orography)
-        self.assertArrayAlmostEqual(result, expected_out)
-
-
-class Test__create_heightdiff_mask(IrisTest):
-    """Test the _create_heightdiff_mask function."""
-
-    def setUp(self):
-        """Sets up arrays."""
-
-        self.orography = np.array([[35, 40, 20, 10, 0, 10, 20, -30, -40],
-                                   [35, 40, 20, 10, 0, 10, 20, -30, -40]])
-
-    def test_returns_expected_values(self):
-        """Test that the function returns True at points where the height
-           difference to the central pixel is greater than 35m."""
-
-        expected_out = np.array(
-            [[True, True, False, False, False, False, False, False, True],
-             [True, True, False, False, False, False, False, False, True]])
-
-        result = LapseRate(nbhood_radius=1)._create_heightdiff_mask(
-            self.orography)
-        self.assertArrayAlmostEqual(result, expected_out)
+        result = LapseRate(nbhood_radius=1)._calc_lapse_rates(
+            self.temperature, self.orography)
+        self.assertArrayAlmostEqual(result[0, 1, 1], expected_out)
+
+    def test_excludes_nan_neighbours(self):
+        """Test that neighbours with NaN temperatures are excluded from the
+           fit."""
+
+        self.temperature[0, 0, 0] = np.nan
+        expected_out = np.polyfit(self.orography.flatten()[1:],
+                                  self.temperature[0].flatten()[1:], 1)[0]
+        result = LapseRate(nbhood_radius=1)._calc_lapse_rates(
+            self.temperature, self.orography)
+        self.assertArrayAlmostEqual(result[0, 1, 1], expected_out)
+
+    def test_excludes_height_difference(self):
+        """Test that neighbours whose height difference to the central point
+           is at least max_height_diff are excluded from the fit."""
+
+        self.orography[0, 0] = self.orography[1, 1] + 35.
+        self.temperature[0, 0, 0] = 300.
+        expected_out = np.polyfit(self.orography.flatten()[1:],
+                                  self.temperature[0].flatten()[1:], 1)[0]
+        result = LapseRate(nbhood_radius=1)._calc_lapse_rates(
+            self.temperature, self.orography)
+        self.assertArrayAlmostEqual(result[0, 1, 1], expected_out)
 
     def test_change_height_thresh(self):
         """Test that the function performs as expected when the height
            difference threshold has been changed."""
 
-        expected_out = np.array(
-            [[False, True, False, False, False, False, False, False, True],
-             [False, True, False, False, False, False, False, False, True]])
-
-        result = LapseRate(max_height_diff=40,
-                           nbhood_radius=1)._create_heightdiff_mask(
-            self.orography)
-        self.assertArrayAlmostEqual(result, expected_out)
+        self.orography[0, 0] = self.orography[1, 1] + 35.
+        self.temperature[0, 0, 0] = 300.
+        expected_out = np.polyfit(self.orography.flatten(),
+                                  self.temperature[0].flatten(), 1)[0]
+        result = LapseRate(max_height_diff=40, nbhood_radius=1)\
+            ._calc_lapse_rates(self.temperature, self.orography)
+        self.assertArrayAlmostEqual(result[0, 1, 1], expected_out)
+
+    def test_multiple_realizations(self):
+        """Test that each realization is fitted separately."""
+
+        temperature = np.concatenate(
+            [self.temperature, 2*self.temperature[:, ::-1]])
+        result = LapseRate(nbhood_radius=1)._calc_lapse_rates(
+            temperature, self.orography)
+        expected_out = [
+            np.polyfit(self.orography.flatten(), data.flatten(), 1)[0]
+            for data in temperature]
+        self.assertArrayAlmostEqual(result[:, 1, 1], expected_out)
+
+    def test_blocks(self):
+        """Test that the result does not depend on the number of rows
+           processed at once."""
+
+        temperature = np.tile(self.temperature, (2, 4, 3))
+        temperature[1] += np.arange(12.)[:, np.newaxis] / 10.
+        orography = np.tile(self.orography, (4, 3))
+        plugin = LapseRate(nbhood_radius=1)
+        expected = plugin._calc_lapse_rates(temperature, orography)
+        plugin.ROWS_PER_BLOCK = 2
+        result = plugin._calc_lapse_rates(temperature, orography)
+        self.assertArrayAlmostEqual(result, expected)
 
 
 class Test_process(IrisTest):
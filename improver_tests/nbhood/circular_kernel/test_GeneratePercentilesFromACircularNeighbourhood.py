@@ -56,9 +56,28 @@ class Test__repr__(IrisTest):
         """Test that the __repr__ returns the expected string."""
         result = str(GeneratePercentilesFromACircularNeighbourhood())
         msg = ('<GeneratePercentilesFromACircularNeighbourhood: '
-               'percentiles: {}>'.format(DEFAULT_PERCENTILES))
+               'percentiles: {}, num_bins: None>'.format(DEFAULT_PERCENTILES))
         self.assertEqual(str(result), msg)
 
+    def test_num_bins(self):
+        """Test that the __repr__ includes the number of bins."""
+        result = str(GeneratePercentilesFromACircularNeighbourhood(
+            percentiles=[50], num_bins=10))
+        msg = ('<GeneratePercentilesFromACircularNeighbourhood: '
+               'percentiles: (50,), num_bins: 10>')
+        self.assertEqual(str(result), msg)
+
+
+class Test__init__(IrisTest):
+
+    """Test the init method."""
+
+    def test_invalid_num_bins(self):
+        """Test that an error is raised for fewer than one bin."""
+        msg = "Invalid number of bins"
+        with self.assertRaisesRegex(ValueError, msg):
+            GeneratePercentilesFromACircularNeighbourhood(num_bins=0)
+
 
 class Test_make_percentile_cube(IrisTest):
 
@@ -183,6 +202,59 @@ class Test_pad_and_unpad_cube(IrisTest):
         self.assertIsInstance(result, Cube)
         self.assertArrayAlmostEqual(result.data, expected)
 
+    def test_binned_matches_exact(self):
+        """Test that the binned percentiles match the exact percentiles if
+        there are fewer distinct values than bins."""
+        kernel = np.array(
+            [[0., 1., 0.],
+             [1., 0., 1.],
+             [0., 0., 1.]])
+        cube = self.cube[0, 0, :, :]
+        cube.data = np.arange(25, dtype=np.float32).reshape(5, 5) % 4
+        expected = GeneratePercentilesFromACircularNeighbourhood(
+            percentiles=[10, 50, 90]).pad_and_unpad_cube(cube, kernel)
+        plugin = GeneratePercentilesFromACircularNeighbourhood(
+            percentiles=[10, 50, 90], num_bins=20)
+        result = plugin.pad_and_unpad_cube(cube, kernel)
+        self.assertEqual(result.data.dtype, np.float32)
+        self.assertArrayAlmostEqual(result.data, expected.data)
+
+    def test_binned_approximate(self):
+        """Test that the binned percentiles are within one bin width of the
+        exact percentiles if there are more distinct values than bins."""
+        kernel = np.ones((5, 5))
+        cube = self.cube[0, 0, :, :]
+        cube.data = np.random.RandomState(0).rand(5, 5).astype(np.float32)
+        expected = GeneratePercentilesFromACircularNeighbourhood(
+            percentiles=[10, 50, 90]).pad_and_unpad_cube(cube, kernel)
+        plugin = GeneratePercentilesFromACircularNeighbourhood(
+            percentiles=[10, 50, 90], num_bins=10)
+        result = plugin.pad_and_unpad_cube(cube, kernel)
+        bin_width = (cube.data.max() - cube.data.min()) / 10
+        self.assertTrue(
+            np.all(np.abs(result.data - expected.data) <= bin_width))
+
+    def test_binned_nan(self):
+        """Test that a NaN value only gives NaN percentiles for the points
+        whose neighbourhoods contain it, as for the exact percentiles."""
+        kernel = np.ones((3, 3))
+        cube = set_up_cube(
+            zero_point_indices=((0, 0, 3, 3),), num_grid_points=7)[0, 0]
+        cube.data = np.random.RandomState(0).rand(7, 7).astype(np.float32)
+        cube.data[1, 1] = np.nan
+        expected = GeneratePercentilesFromACircularNeighbourhood(
+            percentiles=[10, 50, 90]).pad_and_unpad_cube(cube, kernel)
+        plugin = GeneratePercentilesFromACircularNeighbourhood(
+            percentiles=[10, 50, 90], num_bins=10)
+        result = plugin.pad_and_unpad_cube(cube, kernel)
+        expected_nan = np.zeros((3, 7, 7), dtype=bool)
+        expected_nan[:, :3, :3] = True
+        self.assertArrayEqual(np.isnan(result.data), expected_nan)
+        self.assertArrayEqual(np.isnan(expected.data), expected_nan)
+        bin_width = (np.nanmax(cube.data) - np.nanmin(cube.data)) / 10
+        self.assertTrue(np.all(
+            np.abs(result.data - expected.data)[~expected_nan] <= bin_width))
+
     def test_single_point_almost_edge(self):
         """Test behaviour for a non-zero grid cell quite near the edge."""
         cube = set_up_cube(
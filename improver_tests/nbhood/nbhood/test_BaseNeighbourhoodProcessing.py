@@ -339,6 +339,64 @@ class Test__find_radii(IrisTest):
         self.assertArrayAlmostEqual(result, expected_result)
 
 
+class Test__realization_chunks(IrisTest):
+
+    """Test splitting a cube into single realizations."""
+
+    def test_basic(self):
+        """Test that each chunk contains a single realization, which is kept
+        as a dimension."""
+        cube = set_up_cube(num_realization_points=3)
+        result = NBHood._realization_chunks(cube)
+        self.assertEqual(len(result), 3)
+        for index, chunk in enumerate(result):
+            self.assertEqual(chunk.shape, (1, 1, 16, 16))
+            self.assertArrayEqual(chunk.coord("realization").points, [index])
+
+    def test_no_realizations(self):
+        """Test that a cube without a realization dimension is returned
+        unchanged."""
+        cube = set_up_cube_with_no_realizations()
+        result = NBHood._realization_chunks(cube)
+        self.assertEqual(len(result), 1)
+        self.assertIs(result[0], cube)
+
+
+class Test__radius_blocks(IrisTest):
+
+    """Test splitting a cube into blocks of times that share a radius."""
+
+    def setUp(self):
+        """Set up a cube with radii defined at its lead times."""
+        cube = set_up_cube(num_time_points=4, num_realization_points=2)
+        fp_points = [2, 3, 4, 5]
+        self.cube = add_forecast_reference_time_and_forecast_period(
+            cube, time_point=cube.coord("time").points, fp_point=fp_points)
+        self.lead_times = [2, 3, 4, 5]
+
+    def test_lead_times_is_none(self):
+        """Test that the whole cube is a single block if no lead times are
+        given."""
+        plugin = NBHood(SquareNeighbourhood(), 6000)
+        result = plugin._radius_blocks(self.cube)
+        self.assertEqual(len(result), 1)
+        self.assertIs(result[0][0], self.cube)
+        self.assertEqual(result[0][1], 6000.)
+
+    def test_grouped_by_grid_cells(self):
+        """Test that successive times whose radii give the same number of
+        grid cells are grouped into a single block."""
+        radii = [2000, 2100, 6000, 4000]
+        plugin = NBHood(SquareNeighbourhood(), radii, self.lead_times)
+        result = plugin._radius_blocks(self.cube)
+        self.assertEqual([block.shape for block, _ in result],
+                         [(2, 2, 16, 16), (2, 1, 16, 16), (2, 1, 16, 16)])
+        self.assertEqual([radius for _, radius in result],
+                         [2000., 6000., 4000.])
+        self.assertArrayEqual(result[1][0].coord("forecast_period").points,
+                              [4])
+
+
 class Test_process(IrisTest):
 
     """Tests for the process method of NeighbourhoodProcessing."""
@@ -534,6 +592,42 @@ class Test_process(IrisTest):
         result = plugin.process(cube)
         self.assertArrayAlmostEqual(result.data, expected)
 
+    def test_radii_varying_with_lead_time_multiple_realizations(self):
+        """Test that each time of each realization is processed with the
+        radius for its lead time, when times are grouped into blocks."""
+        cube = set_up_cube(
+            zero_point_indices=((0, 0, 7, 7), (1, 1, 7, 7), (1, 2, 7, 7)),
+            num_time_points=3, num_realization_points=2)
+        cube = add_forecast_reference_time_and_forecast_period(
+            cube, time_point=cube.coord("time").points, fp_point=[2, 3, 4])
+        radii = [2000, 2100, 4000]
+        plugin = NBHood(SquareNeighbourhood(), radii, lead_times=[2, 3, 4])
+        result = plugin.process(cube)
+        self.assertEqual(result.shape, cube.shape)
+        self.assertEqual(result.coord("forecast_period"),
+                         cube.coord("forecast_period"))
+        for index, radius in enumerate(radii):
+            expected = SquareNeighbourhood().run(
+                cube[:, index:index+1], radius)
+            self.assertArrayAlmostEqual(
+                result.data[:, index:index+1], expected.data)
+
+    def test_chunk_realizations(self):
+        """Test that processing one realization at a time gives the same
+        result as processing the whole cube."""
+        cube = set_up_cube(
+            zero_point_indices=((0, 0, 7, 7), (1, 1, 7, 7)),
+            num_time_points=2, num_realization_points=2)
+        cube = add_forecast_reference_time_and_forecast_period(
+            cube, time_point=cube.coord("time").points, fp_point=[2, 3])
+        expected = NBHood(
+            SquareNeighbourhood(), [2000, 4000], lead_times=[2, 3]).process(
+                cube.copy())
+        result = NBHood(
+            SquareNeighbourhood(), [2000, 4000], lead_times=[2, 3],
+            chunk_realizations=True).process(cube.copy())
+        self.assertEqual(result, expected)
+
     def test_use_mask_cube_occurrences_not_masked(self):
         """Test that the plugin returns an iris.cube.Cube with the correct
         data array if a mask cube is used and the mask cube does not mask
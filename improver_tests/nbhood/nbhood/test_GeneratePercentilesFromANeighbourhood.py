@@ -55,7 +55,8 @@ class Test__init__(IrisTest):
         radii = 10000
         result = NBHood(neighbourhood_method, radii)
         msg = ('<GeneratePercentilesFromACircularNeighbourhood: percentiles: '
-               '(0, 5, 10, 20, 25, 30, 40, 50, 60, 70, 75, 80, 90, 95, 100)>')
+               '(0, 5, 10, 20, 25, 30, 40, 50, 60, 70, 75, 80, 90, 95, 100), '
+               'num_bins: None>')
         self.assertEqual(str(result.neighbourhood_method), msg)
 
     def test_neighbourhood_method_does_not_exist(self):
@@ -79,7 +80,8 @@ class Test__repr__(IrisTest):
         result = str(NBHood("circular", 10000))
         msg = ('<BaseNeighbourhoodProcessing: neighbourhood_method: '
                '<GeneratePercentilesFromACircularNeighbourhood: percentiles: '
-               '(0, 5, 10, 20, 25, 30, 40, 50, 60, 70, 75, 80, 90, 95, 100)>; '
+               '(0, 5, 10, 20, 25, 30, 40, 50, 60, 70, 75, 80, 90, 95, 100), '
+               'num_bins: None>; '
                'radii: 10000.0; lead_times: None>')
         self.assertEqual(result, msg)
 
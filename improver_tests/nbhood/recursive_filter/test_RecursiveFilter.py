@@ -42,7 +42,7 @@ from improver.utilities.cube_manipulation import enforce_coordinate_ordering
 from improver.utilities.pad_spatial import pad_cube_with_halo
 from improver.utilities.warnings_handler import ManageWarnings
 
-from ...set_up_test_cubes import set_up_variable_cube
+from ...set_up_test_cubes import add_coordinate, set_up_variable_cube
 
 
 class Test__repr__(IrisTest):
@@ -231,6 +231,19 @@ class Test__recurse_forward(Test_RecursiveFilter):
         self.assertIsInstance(result, np.ndarray)
         self.assertArrayAlmostEqual(result, expected_result)
 
+    def test_stacked_grid(self):
+        """Test that a stack of 2D slices is filtered slice by slice along
+        the correct axis, using the 2D array of alphas for every slice."""
+        grid = np.stack([self.cube.data[0], 2.*self.cube.data[0]])
+        expected_result = np.stack([
+            RecursiveFilter()._recurse_forward(
+                self.cube.data[0].copy(), self.alphas_cube.data, 1),
+            RecursiveFilter()._recurse_forward(
+                2.*self.cube.data[0], self.alphas_cube.data, 1)])
+        result = RecursiveFilter()._recurse_forward(
+            grid, self.alphas_cube.data, 1)
+        self.assertArrayAlmostEqual(result, expected_result)
+
 
 class Test__recurse_backward(Test_RecursiveFilter):
 
@@ -394,6 +407,26 @@ class Test_process(Test_RecursiveFilter):
         self.assertEqual(result.data.shape, expected_shape)
         self.assertEqual(result.data.shape, expected_shape)
 
+    def test_multiple_slices(self):
+        """Test that filtering a cube with several x-y slices gives the same
+        result as filtering each slice separately, when the leading
+        dimension is not first in the cube."""
+        cube = add_coordinate(self.cube[0], [0, 1, 2], "realization")
+        cube.data[1] *= 0.5
+        cube.data[2, 3, 2] = np.nan
+        enforce_coordinate_ordering(
+            cube, ["latitude", "realization"])
+        plugin = RecursiveFilter(alpha_x=self.alpha_x, alpha_y=0.2,
+                                 iterations=2, re_mask=True)
+        result = plugin.process(cube.copy())
+        self.assertSequenceEqual(
+            [x.name() for x in result.coords(dim_coords=True)],
+            [x.name() for x in cube.coords(dim_coords=True)])
+        for index, cube_slice in enumerate(cube.slices_over("realization")):
+            expected = plugin.process(cube_slice.copy())
+            self.assertArrayAlmostEqual(result.data[:, index, :],
+                                        expected.data)
+
     def test_coordinate_reordering_with_different_alphas(self):
         """Test that x and y alphas still apply to the right coordinate when
         the input cube spatial dimensions are (x, y) not (y, x)"""
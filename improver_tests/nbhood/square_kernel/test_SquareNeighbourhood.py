@@ -32,6 +32,7 @@
 
 
 import unittest
+from unittest.mock import patch
 
 import iris
 import numpy as np
@@ -329,6 +330,65 @@ class Test_set_up_cubes_to_be_neighbourhooded(IrisTest):
         self.assertArrayEqual(result_nan_array, expected_nans)
 
 
+class Test_set_up_arrays_to_be_neighbourhooded(IrisTest):
+
+    """Test the set up of stacked arrays prior to neighbourhooding."""
+
+    def setUp(self):
+        """Set up a stack of two 5x5 slices."""
+        self.data = np.ones((2, 5, 5), dtype=np.float32)
+        self.data[0, 2, 2] = 0.5
+        self.data[1, 1, 3] = 0.5
+
+    def test_without_masked_data(self):
+        """Test that unmasked data without nans is returned unchanged with
+        a mask of ones."""
+        data, mask, nan_array = (
+            SquareNeighbourhood.set_up_arrays_to_be_neighbourhooded(
+                self.data))
+        self.assertArrayEqual(data, self.data)
+        self.assertEqual(data.dtype, np.float32)
+        self.assertArrayEqual(mask, np.ones((2, 5, 5)))
+        self.assertFalse(nan_array.any())
+
+    def test_with_masked_data_and_nan(self):
+        """Test that masked points and nans are zeroed in a single slice of
+        the stack, and that the input array is not modified."""
+        data = np.ma.masked_equal(self.data.copy(), 0.5)
+        data.data[1, 4, 4] = np.nan
+        expected_mask = np.ones((2, 5, 5))
+        expected_mask[0, 2, 2] = 0.0
+        expected_mask[1, 1, 3] = 0.0
+        expected_mask[1, 4, 4] = 0.0
+        expected_nans = np.zeros((2, 5, 5), dtype=bool)
+        expected_nans[1, 4, 4] = True
+        result_data, result_mask, result_nan_array = (
+            SquareNeighbourhood.set_up_arrays_to_be_neighbourhooded(data))
+        self.assertNotIsInstance(result_data, np.ma.MaskedArray)
+        self.assertArrayEqual(result_data, expected_mask)
+        self.assertArrayEqual(result_mask, expected_mask)
+        self.assertArrayEqual(result_nan_array, expected_nans)
+        self.assertTrue(np.isnan(data.data[1, 4, 4]))
+
+    def test_with_separate_mask(self):
+        """Test that a 2D mask is broadcast across all slices of the stack
+        and is not modified."""
+        mask = np.ones((5, 5), dtype=int)
+        mask[0, 0] = 0
+        data = self.data.copy()
+        data[1, 3, 3] = np.nan
+        expected_mask = np.ones((2, 5, 5))
+        expected_mask[:, 0, 0] = 0.0
+        expected_mask[1, 3, 3] = 0.0
+        expected_data = self.data * expected_mask
+        result_data, result_mask, _ = (
+            SquareNeighbourhood.set_up_arrays_to_be_neighbourhooded(
+                data, mask=mask))
+        self.assertArrayEqual(result_data, expected_data)
+        self.assertArrayEqual(result_mask, expected_mask)
+        self.assertEqual(mask.sum(), 24)
+
+
 class Test__pad_and_calculate_neighbourhood(IrisTest):
 
     """Test the padding and calculation of neighbourhood processing."""
@@ -531,6 +591,98 @@ class Test__remove_padding_and_mask(IrisTest):
         self.assertArrayAlmostEqual(nbcube.data, expected)
 
 
+class Test__summed_area_table(IrisTest):
+
+    """Test for cumulating a stack of arrays in the y and x dimensions."""
+
+    def test_basic(self):
+        """Test that each slice of the stack is cumulated along y and x with
+        a leading row and column of zeros, in the requested precision."""
+        data = np.ones((2, 3, 4), dtype=np.float32)
+        data[1] *= 2.
+        expected_slice = np.array([[0., 0., 0., 0., 0.],
+                                   [0., 1., 2., 3., 4.],
+                                   [0., 2., 4., 6., 8.],
+                                   [0., 3., 6., 9., 12.]])
+        result = SquareNeighbourhood._summed_area_table(data, np.float64)
+        self.assertEqual(result.dtype, np.float64)
+        self.assertArrayEqual(result[0], expected_slice)
+        self.assertArrayEqual(result[1], 2.*expected_slice)
+
+
+class Test__neighbourhood_totals(IrisTest):
+
+    """Test calculating neighbourhood totals from summed area tables."""
+
+    def test_basic(self):
+        """Test that neighbourhood totals only include points within the
+        domain, so match the interior of the totals calculated from a padded
+        array by calculate_neighbourhood."""
+        data = np.ones((1, 5, 5))
+        data[0, 2, 2] = 0.
+        expected = np.array([[[4., 6., 6., 6., 4.],
+                              [6., 8., 8., 8., 6.],
+                              [6., 8., 8., 8., 6.],
+                              [6., 8., 8., 8., 6.],
+                              [4., 6., 6., 6., 4.]]])
+        summed_data = SquareNeighbourhood._summed_area_table(data, float)
+        result = SquareNeighbourhood._neighbourhood_totals(summed_data, 1, 1)
+        self.assertArrayEqual(result, expected)
+
+    def test_different_x_and_y(self):
+        """Test that different neighbourhood radii in x and y are applied to
+        the correct dimensions."""
+        data = np.ones((1, 3, 5))
+        expected = np.array([[[2., 3., 3., 3., 2.],
+                              [2., 3., 3., 3., 2.],
+                              [2., 3., 3., 3., 2.]]])
+        summed_data = SquareNeighbourhood._summed_area_table(data, float)
+        result = SquareNeighbourhood._neighbourhood_totals(summed_data, 1, 0)
+        self.assertArrayEqual(result, expected)
+
+
+class Test_neighbourhood_with_masks(IrisTest):
+
+    """Test applying each of a stack of masks to a stack of slices."""
+
+    def setUp(self):
+        """Set up a stack of slices and a stack of masks."""
+        self.data = np.ones((2, 5, 5), dtype=np.float32)
+        self.data[0, 2, 2] = 0.
+        self.data[1, 1, 1] = 0.
+        self.masks = np.zeros((3, 5, 5), dtype=np.float32)
+        self.masks[0, :3, :2] = 1.
+        self.masks[1, 1:3, 2:4] = 1.
+        self.masks[2, 3:, 3:] = 1.
+
+    def test_basic(self):
+        """Test that each slice is processed with each mask, matching the
+        result of processing every combination separately."""
+        plugin = SquareNeighbourhood(re_mask=False)
+        result, result_mask = plugin.neighbourhood_with_masks(
+            self.data, self.masks, 1, 1)
+        self.assertEqual(result.shape, (2, 3, 5, 5))
+        self.assertIsNone(result_mask)
+        for index, mask in enumerate(self.masks):
+            expected, _ = plugin._neighbourhood_stack(
+                self.data, mask, 1, 1)
+            self.assertArrayAlmostEqual(result[:, index], expected)
+
+    def test_masked_data(self):
+        """Test that masked data are removed from the masks of the slices
+        that contain them, and that the result is re-masked."""
+        data = np.ma.masked_array(self.data, mask=np.zeros_like(self.data))
+        data.mask[1, 0, 0] = True
+        plugin = SquareNeighbourhood()
+        result, result_mask = plugin.neighbourhood_with_masks(
+            data, self.masks, 1, 1)
+        for index, mask in enumerate(self.masks):
+            expected, expected_mask = plugin._neighbourhood_stack(
+                data, mask, 1, 1)
+            self.assertArrayAlmostEqual(result[:, index], expected)
+            self.assertArrayEqual(result_mask[:, index], expected_mask)
+
+
 class Test_run(IrisTest):
 
     """Test the run method on the SquareNeighbourhood class."""
@@ -821,6 +973,25 @@ class Test_run(IrisTest):
         result = SquareNeighbourhood(re_mask=False).run(cube, self.RADIUS)
         self.assertArrayAlmostEqual(result.data, expected_array)
 
+    @patch("improver.nbhood.square_kernel.MAX_BATCH_SIZE_IN_GRID_CELLS", 25)
+    def test_multiple_batches(self):
+        """Test that the run method gives the same result for each time
+        whether or not the slices are processed in separate batches, and
+        that only slices containing masked data are re-masked."""
+        cube = set_up_cube(
+            zero_point_indices=((0, 0, 2, 2),), num_time_points=3,
+            num_grid_points=5)
+        mask = np.zeros(cube.shape, dtype=bool)
+        mask[0, 1, 0, 0] = True
+        cube.data = np.ma.masked_array(cube.data, mask=mask)
+        result = SquareNeighbourhood().run(cube, self.RADIUS)
+        self.assertFalse(np.ma.getmaskarray(result.data)[0, 0].any())
+        self.assertTrue(result.data.mask[0, 1, 0, 0])
+        self.assertFalse(np.ma.getmaskarray(result.data)[0, 2].any())
+        for index, cube_slice in enumerate(cube.slices_over("time")):
+            expected = SquareNeighbourhood().run(cube_slice, self.RADIUS)
+            self.assertArrayAlmostEqual(result.data[:, index], expected.data)
+
     def test_multiple_times_nan(self):
         """Test that a cube with correct data is produced by the run method
         for multiple times and for when nans are present."""
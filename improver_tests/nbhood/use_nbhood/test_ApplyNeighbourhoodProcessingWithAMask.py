@@ -38,6 +38,7 @@ import numpy as np
 from iris.coords import DimCoord
 from iris.tests import IrisTest
 
+from improver.nbhood.nbhood import NeighbourhoodProcessing
 from improver.nbhood.use_nbhood import ApplyNeighbourhoodProcessingWithAMask
 
 from ..nbhood.test_BaseNeighbourhoodProcessing import set_up_cube
@@ -279,6 +280,48 @@ class Test_process(IrisTest):
         for realization_slice in result.slices_over("realization"):
             self.assertArrayAlmostEqual(realization_slice.data, expected)
 
+    def test_lead_time_radii(self):
+        """Test that slices with different radii at different lead times, for
+        several realizations, match neighbourhood processing each slice with
+        each mask separately."""
+        cube = set_up_cube(
+            zero_point_indices=((0, 0, 2, 2), (0, 1, 1, 3), (1, 0, 3, 1),
+                                (1, 2, 2, 2), (1, 2, 0, 4)),
+            num_grid_points=5, num_time_points=3, num_realization_points=2)
+        cube.coord("projection_x_coordinate").guess_bounds()
+        cube.coord("projection_y_coordinate").guess_bounds()
+        frt = cube.coord("time").points[0] - 1
+        cube.add_aux_coord(
+            iris.coords.AuxCoord(frt, "forecast_reference_time",
+                                 units=cube.coord("time").units))
+        radii = [2000, 4000]
+        lead_times = [1, 3]
+        plugin = ApplyNeighbourhoodProcessingWithAMask(
+            "topographic_zone", radii, lead_times=lead_times)
+        result = plugin.process(cube, self.mask_cube)
+        self.assertSequenceEqual(result.shape, (2, 3, 3, 5, 5))
+        self.assertGreater(
+            len(np.unique(plugin._slice_radii(
+                cube, NeighbourhoodProcessing(
+                    "square", radii, lead_times=lead_times)))), 1)
+        for realization in range(2):
+            for time in range(3):
+                for zone, mask_slice in enumerate(
+                        self.mask_cube.slices_over("topographic_zone")):
+                    expected = NeighbourhoodProcessing(
+                        "square", radii, lead_times=lead_times).process(
+                            cube[realization, time], mask_cube=mask_slice)
+                    self.assertArrayAlmostEqual(
+                        result.data[realization, time, zone], expected.data)
+
+    def test_nan_data(self):
+        """Test that an error is raised if the cube contains NaNs."""
+        self.cube.data[2, 2] = np.nan
+        msg = "NaN detected in input cube data"
+        with self.assertRaisesRegex(ValueError, msg):
+            ApplyNeighbourhoodProcessingWithAMask(
+                "topographic_zone", 2000).process(self.cube, self.mask_cube)
+
 
 if __name__ == '__main__':
     unittest.main()
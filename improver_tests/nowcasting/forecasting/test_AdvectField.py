@@ -105,52 +105,55 @@ class Test__repr__(IrisTest):
         self.assertEqual(result, expected_result)
 
 
-class Test__increment_output_array(IrisTest):
-    """Tests for the _increment_output_array method"""
+class Test__advection_operator(IrisTest):
+    """Tests for the _advection_operator method"""
 
     def setUp(self):
-        """Create input arrays"""
-        vel_x = set_up_xy_velocity_cube("advection_velocity_x")
-        vel_y = vel_x.copy(data=2.*np.ones(shape=(4, 3)))
-        self.dummy_plugin = AdvectField(vel_x, vel_y)
-
-        self.data = np.array([[2., 3., 4.],
-                              [1., 2., 3.],
-                              [0., 1., 2.],
-                              [0., 0., 1.]])
-        (self.xgrid, self.ygrid) = np.meshgrid(np.arange(3),
-                                               np.arange(4))
+        """Set up dimensionless velocity arrays"""
+        self.grid_vel_x = np.full((4, 3), 0.5, dtype=np.float32)
+        self.grid_vel_y = np.full((4, 3), 1., dtype=np.float32)
 
     def test_basic(self):
-        """Test one increment from the points negative x-wards and positive
-        y-wards on the source grid, with different directional weightings"""
-        xsrc = np.array([[-1, 0, 1],
-                         [-1, 0, 1],
-                         [-1, 0, 1],
-                         [-1, 0, 1]])
-        ysrc = np.array([[1, 1, 1],
-                         [2, 2, 2],
-                         [3, 3, 3],
-                         [4, 4, 4]])
-        cond = np.array([[False, True, True],
-                         [False, True, True],
-                         [False, True, True],
-                         [False, False, False]])
-        xfrac = np.full((4, 3), 0.5)
-        yfrac = np.full((4, 3), 0.75)
-        outdata = np.zeros(shape=(4, 3))
-
-        expected_output = np.array([[0., 0.375, 0.750],
-                                    [0., 0.000, 0.375],
-                                    [0., 0.000, 0.000],
-                                    [0., 0.000, 0.000]])
-
-        self.dummy_plugin._increment_output_array(
-            self.data, outdata, cond, self.xgrid, self.ygrid,
-            xsrc, ysrc, xfrac, yfrac)
-
-        self.assertIsInstance(outdata, np.ndarray)
-        self.assertArrayAlmostEqual(outdata, expected_output)
+        """Test the shapes and types of the returned arrays"""
+        in_bounds, source_indices, x_weights, y_weights = (
+            AdvectField._advection_operator(
+                self.grid_vel_x, self.grid_vel_y, 0.5))
+        self.assertEqual(in_bounds.dtype, bool)
+        self.assertEqual(in_bounds.shape, (4, 3))
+        self.assertEqual(source_indices.shape, (4, 4, 3))
+        self.assertEqual(x_weights.dtype, np.float32)
+        self.assertEqual(y_weights.dtype, np.float32)
+
+    def test_values(self):
+        """Test source points and weights for advection by a quarter of a
+        grid point in the x direction and half a grid point in the y
+        direction.  Source points outside the domain refer to index 12."""
+        in_bounds, source_indices, x_weights, y_weights = (
+            AdvectField._advection_operator(
+                self.grid_vel_x, self.grid_vel_y, 0.5))
+        expected_in_bounds = np.array([[False, False, False],
+                                       [False, True, True],
+                                       [False, True, True],
+                                       [False, True, True]])
+        # Source points of the output point at [1, 1], which is advected from
+        # the fractional location [0.5, 0.75]
+        expected_indices = [0, 3, 1, 4]
+        expected_x_weights = [0.25, 0.25, 0.75, 0.75]
+        expected_y_weights = [0.5, 0.5, 0.5, 0.5]
+        self.assertArrayEqual(in_bounds, expected_in_bounds)
+        self.assertArrayEqual(source_indices[:, 1, 1], expected_indices)
+        self.assertArrayAlmostEqual(x_weights[:, 1, 1], expected_x_weights)
+        self.assertArrayAlmostEqual(y_weights[:, 1, 1], expected_y_weights)
+
+    def test_source_points_out_of_bounds(self):
+        """Test that source points outside the domain refer to the index
+        beyond the end of the flattened data (12).  With negative velocities
+        the output point at [0, 2] is advected from the fractional location
+        [0.5, 2.25], which has no upper source points in x."""
+        in_bounds, source_indices, _, _ = AdvectField._advection_operator(
+            -self.grid_vel_x, -self.grid_vel_y, 0.5)
+        self.assertTrue(in_bounds[0, 2])
+        self.assertArrayEqual(source_indices[:, 0, 2], [2, 5, 12, 12])
 
 
 class Test__advect_field(IrisTest):
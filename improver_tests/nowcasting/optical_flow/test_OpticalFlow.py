@@ -199,34 +199,28 @@ class Test__partial_derivative_temporal(OpticalFlowUtilityTest):
         self.assertArrayAlmostEqual(result, expected_output)
 
 
-class Test__make_subboxes(OpticalFlowUtilityTest):
-    """Test _make_subboxes function"""
+class Test__sum_over_boxes(OpticalFlowUtilityTest):
+    """Test _sum_over_boxes function"""
 
-    def test_basic(self):
-        """Test for correct output types"""
+    def test_values(self):
+        """Test the field is summed over boxes as expected, including the
+        smaller boxes at the edges"""
+        expected_sums = np.array([[4., 12., 9.], [0., 3., 3.]])
         self.plugin.boxsize = 2
-        boxes, weights = self.plugin._make_subboxes(self.plugin.data1)
-        self.assertIsInstance(boxes, list)
-        self.assertIsInstance(boxes[0], np.ndarray)
-        self.assertIsInstance(weights, np.ndarray)
+        result = self.plugin._sum_over_boxes(self.plugin.data1)
+        self.assertArrayAlmostEqual(result, expected_sums)
 
-    def test_box_list(self):
-        """Test function carves up array as expected"""
-        expected_boxes = \
-            [np.array([[1., 2.], [0., 1.]]), np.array([[3., 4.], [2., 3.]]),
-             np.array([[5.], [4.]]), np.array([[0., 0.]]),
-             np.array([[1., 2.]]), np.array([[3.]])]
-        self.plugin.boxsize = 2
-        boxes, _ = self.plugin._make_subboxes(self.plugin.data1)
-        for box, ebox in zip(boxes, expected_boxes):
-            self.assertArrayAlmostEqual(box, ebox)
 
-    def test_weights_values(self):
+class Test__box_weights(OpticalFlowUtilityTest):
+    """Test _box_weights function"""
+
+    def test_values(self):
         """Test output weights values"""
-        expected_weights = np.array([0.54216664, 0.95606307, 0.917915, 0.,
-                                     0.46473857, 0.54216664])
+        expected_weights = np.array([[0.54216664, 0.95606307, 0.917915],
+                                     [0., 0.46473857, 0.54216664]])
         self.plugin.boxsize = 2
-        _, weights = self.plugin._make_subboxes(self.plugin.data1)
+        weights = self.plugin._box_weights()
+        self.assertIsInstance(weights, np.ndarray)
         self.assertArrayAlmostEqual(weights, expected_weights)
 
 
@@ -317,23 +311,28 @@ class Test_smooth(OpticalFlowDisplacementTest):
         self.assertArrayAlmostEqual(output, self.umat)
 
 
-class Test__smart_smooth(OpticalFlowDisplacementTest):
-    """Test _smart_smooth function"""
+class Test__smart_smoothing_operator(OpticalFlowDisplacementTest):
+    """Test _smart_smoothing_operator function"""
 
     def test_basic(self):
         """Test for correct output types"""
-        umat = self.plugin._smart_smooth(self.umat, self.umat, self.weights)
-        self.assertIsInstance(umat, np.ndarray)
-        self.assertSequenceEqual(umat.shape, self.umat.shape)
+        matrix, offset = self.plugin._smart_smoothing_operator(
+            self.umat, self.weights)
+        self.assertSequenceEqual(matrix.shape,
+                                 (self.umat.size, self.umat.size))
+        self.assertSequenceEqual(offset.shape, (self.umat.size,))
 
     def test_values(self):
-        """Test output matrices have expected values"""
+        """Test a single iteration of smart smoothing has expected values"""
         expected_umat = np.array([[1., 1., 1., 0., 0.],
                                   [1.25352113, 1.19354839, 1., 0.08333333, 0.],
                                   [1.48780488, 1.50000000, 1., 1.00000000, 1.],
                                   [2., 2., 1., 1., 1.]])
-        umat = self.plugin._smart_smooth(self.umat, self.umat, self.weights)
-        self.assertArrayAlmostEqual(umat, expected_umat)
+        matrix, offset = self.plugin._smart_smoothing_operator(
+            self.umat, self.weights)
+        umat = matrix.dot(self.umat.flatten()) + offset
+        self.assertArrayAlmostEqual(umat.reshape(self.umat.shape),
+                                    expected_umat)
 
 
 class Test__smooth_advection_fields(OpticalFlowDisplacementTest):
@@ -379,6 +378,23 @@ class Test_solve_for_uv(IrisTest):
         self.assertAlmostEqual(v, 2.)
 
 
+class Test__solve_normal_equations(IrisTest):
+    """Test _solve_normal_equations function"""
+
+    def test_values(self):
+        """Test solving for several boxes at once, including a singular
+        matrix for which zero displacement is returned"""
+        sum_xx = np.array([5., 1.])
+        sum_xy = np.array([4., 1.])
+        sum_yy = np.array([13., 1.])
+        sum_xt = np.array([-13., 2.])
+        sum_yt = np.array([-30., 2.])
+        u, v = OpticalFlow._solve_normal_equations(
+            sum_xx, sum_xy, sum_yy, sum_xt, sum_yt)
+        self.assertArrayAlmostEqual(u, [1., 0.])
+        self.assertArrayAlmostEqual(v, [2., 0.])
+
+
 class Test_extreme_value_check(IrisTest):
     """Test extreme_value_check function"""
 
@@ -586,15 +602,15 @@ class Test_process_dimensionless(IrisTest):
             self.first_input, self.second_input, 0, 1, self.smoothing_kernel)
         self.assertIsInstance(ucomp, np.ndarray)
         self.assertIsInstance(vcomp, np.ndarray)
-        self.assertAlmostEqual(np.mean(ucomp), 0.97735876)
-        self.assertAlmostEqual(np.mean(vcomp), -0.97735894)
+        self.assertAlmostEqual(np.mean(ucomp), 0.9773587)
+        self.assertAlmostEqual(np.mean(vcomp), -0.9773589)
 
     def test_axis_inversion(self):
         """Test inverting x and y axis indices gives the correct result"""
         ucomp, vcomp = self.plugin.process_dimensionless(
             self.first_input, self.second_input, 1, 0, self.smoothing_kernel)
-        self.assertAlmostEqual(np.mean(ucomp), -0.97735894)
-        self.assertAlmostEqual(np.mean(vcomp), 0.97735876)
+        self.assertAlmostEqual(np.mean(ucomp), -0.9773589)
+        self.assertAlmostEqual(np.mean(vcomp), 0.9773587)
 
 
 class Test_process(IrisTest):
@@ -716,13 +732,13 @@ class Test_process(IrisTest):
             unmasked_cube1, unmasked_cube2, boxsize=3)
 
         self.assertAlmostEqual(
-            np.mean(ucube_masked.data), -1.4995803)
+            np.mean(ucube_masked.data), -1.4995799)
         self.assertAlmostEqual(
-            np.mean(vcube_masked.data), 1.4995805)
+            np.mean(vcube_masked.data), 1.4995801)
         self.assertAlmostEqual(
             np.mean(ucube_unmasked.data), -0.2869996)
         self.assertAlmostEqual(
-            np.mean(vcube_unmasked.data), 0.28699964)
+            np.mean(vcube_unmasked.data), 0.28699955)
 
     def test_error_for_unconvertable_units(self):
         """Test that an exception is raised if the input precipitation cubes
@@ -438,23 +438,36 @@ class Test__point_orogenh(IrisTest):
         self.assertArrayAlmostEqual(result, expected_values)
 
 
+class Test__get_max_range_of_influence(IrisTest):
+    """Test the _get_max_range_of_influence function"""
+
+    def test_values(self):
+        """Test the range is truncated to whole grid squares"""
+        max_sin_cos = np.array([[1., 0.8], [0.75, 0.70710678]])
+        plugin = OrographicEnhancement()
+        plugin.grid_spacing_km = 3.
+        result = plugin._get_max_range_of_influence(max_sin_cos)
+        self.assertArrayEqual(result, [[5, 4], [3, 3]])
+
+
 class Test__get_point_distances(IrisTest):
     """Test the _get_point_distances function"""
 
     def setUp(self):
         """Define input matrices and plugin"""
-        self.wind_speed = np.ones((3, 4), dtype=np.float32)
         sin_wind_dir = np.linspace(0, 1, 12).reshape(3, 4)
         cos_wind_dir = np.sqrt(1. - np.square(sin_wind_dir))
         self.max_sin_cos = np.where(abs(sin_wind_dir) > abs(cos_wind_dir),
                                     abs(sin_wind_dir), abs(cos_wind_dir))
         self.plugin = OrographicEnhancement()
         self.plugin.grid_spacing_km = 3.
+        self.max_roi = self.plugin._get_max_range_of_influence(
+            self.max_sin_cos)
 
     def test_basic(self):
         """Test the function returns an array of the expected shape"""
         distance = self.plugin._get_point_distances(
-            self.wind_speed, self.max_sin_cos)
+            self.max_roi, self.max_sin_cos)
         self.assertIsInstance(distance, np.ndarray)
         self.assertSequenceEqual(distance.shape, (5, 3, 4))
 
@@ -475,10 +488,19 @@ class Test__get_point_distances(IrisTest):
         expected_data = np.array([slice_0, slice_1, slice_2, slice_3, slice_4])
 
         distance = self.plugin._get_point_distances(
-            self.wind_speed, self.max_sin_cos)
+            self.max_roi, self.max_sin_cos)
         self.assertTrue(
             np.allclose(distance, expected_data, equal_nan=True))
 
+    def test_steps(self):
+        """Test a range of upstream steps can be requested"""
+        distance = self.plugin._get_point_distances(
+            self.max_roi, self.max_sin_cos)
+        result = self.plugin._get_point_distances(
+            self.max_roi, self.max_sin_cos, steps=slice(3, 4))
+        self.assertSequenceEqual(result.shape, (1, 3, 4))
+        self.assertArrayEqual(result, distance[3:4])
+
 
 class Test__locate_source_points(IrisTest):
     """Test the _locate_source_points method"""
@@ -494,7 +516,8 @@ class Test__locate_source_points(IrisTest):
     def test_basic(self):
         """Test location of source points"""
         distance = self.plugin._get_point_distances(
-            self.wind_speed, self.cos_wind_dir)
+            self.plugin._get_max_range_of_influence(self.cos_wind_dir),
+            self.cos_wind_dir)
         xsrc, ysrc = self.plugin._locate_source_points(
             self.wind_speed, distance,
             self.sin_wind_dir, self.cos_wind_dir)
@@ -531,7 +554,8 @@ class Test__compute_weighted_values(IrisTest):
         sin_wind_dir = np.full((5, 5), 0.4, dtype=np.float32)
         cos_wind_dir = np.full((5, 5), np.sqrt(0.84), dtype=np.float32)
         self.distance = self.plugin._get_point_distances(
-            self.wind_speed, cos_wind_dir)
+            self.plugin._get_max_range_of_influence(cos_wind_dir),
+            cos_wind_dir)
         self.xsrc, self.ysrc = self.plugin._locate_source_points(
             self.wind_speed, self.distance, sin_wind_dir, cos_wind_dir)
 
@@ -32,10 +32,12 @@
 
 import unittest
 
+import iris
 import numpy as np
 from cf_units import Unit
 from iris.tests import IrisTest
 
+from improver.psychrometric_calculations import svp_table
 from improver.psychrometric_calculations.psychrometric_calculations import (
     Utilities)
 
@@ -148,6 +150,32 @@ class Test_saturation_vapour_pressure_goff_gratch(Test_Utilities):
         np.testing.assert_allclose(result.data, expected, rtol=1.e-5)
         self.assertEqual(result.units, Unit('Pa'))
 
+    def test_svp_table(self):
+        """Test that the values held in the SVP lookup table, which cover
+        temperatures both above and below the triple point of water, are
+        reproduced."""
+        temperatures = np.arange(svp_table.T_MIN,
+                                 svp_table.T_MAX + 0.5*svp_table.T_INCREMENT,
+                                 svp_table.T_INCREMENT)
+        temperature = iris.cube.Cube(temperatures, 'air_temperature',
+                                     units='K')
+        result = Utilities.saturation_vapour_pressure_goff_gratch(temperature)
+        np.testing.assert_allclose(result.data, svp_table.DATA, rtol=1.e-6)
+
+    def test_masked_data(self):
+        """Test that masked points are retained and that the type of the
+        input data is preserved."""
+        self.temperature.data = np.ma.masked_array(
+            self.temperature.data, mask=[[False, True, False]])
+        result = Utilities.saturation_vapour_pressure_goff_gratch(
+            self.temperature)
+        expected = np.ma.masked_array([[195.6419, 0., 990.9421]],
+                                      mask=[[False, True, False]])
+        self.assertEqual(result.dtype, np.float32)
+        self.assertArrayEqual(result.data.mask, expected.mask)
+        np.testing.assert_allclose(result.data.compressed(),
+                                   expected.compressed(), rtol=1.e-5)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -30,7 +30,11 @@
 # POSSIBILITY OF SUCH DAMAGE.
 """Unit tests for NeighbourSelection class"""
 
+import os
+import shutil
 import unittest
+from tempfile import mkdtemp
+from unittest.mock import patch
 
 import cartopy.crs as ccrs
 import iris
@@ -521,6 +525,102 @@ class Test_build_KDTree(Test_NeighbourSelection):
         self.assertIsInstance(result, scipy.spatial.ckdtree.cKDTree)
 
 
+class Test_build_KDTree_cache(Test_NeighbourSelection):
+
+    """Test caching of KDTrees in a cache directory."""
+
+    def setUp(self):
+        """Create a temporary cache directory."""
+        super().setUp()
+        self.directory = mkdtemp()
+        self.cache_directory = os.path.join(self.directory, 'kdtrees')
+
+    def tearDown(self):
+        """Remove the temporary cache directory."""
+        shutil.rmtree(self.directory)
+
+    def test_tree_cached(self):
+        """Test that the tree nodes are saved to the cache directory and that
+        a tree built from the memory-mapped cached nodes, without
+        transforming the grid coordinates again, is returned on a subsequent
+        call, matching a tree built without the cache."""
+        plugin = NeighbourSelection(land_constraint=True,
+                                    cache_directory=self.cache_directory)
+        plugin.global_coordinate_system = True
+        plugin.build_KDTree(self.global_land_mask)
+        self.assertEqual(
+            sorted(name.split('_', 2)[-1]
+                   for name in os.listdir(self.cache_directory)),
+            ['index_nodes.npy', 'nodes.npy'])
+
+        with patch.object(plugin, 'geocentric_cartesian') as mock_transform:
+            cached_tree, cached_index_nodes = plugin.build_KDTree(
+                self.global_land_mask)
+        mock_transform.assert_not_called()
+        expected_plugin = NeighbourSelection(land_constraint=True)
+        expected_plugin.global_coordinate_system = True
+        expected_tree, expected_index_nodes = expected_plugin.build_KDTree(
+            self.global_land_mask)
+        self.assertIsInstance(cached_tree, scipy.spatial.ckdtree.cKDTree)
+        self.assertIsInstance(cached_index_nodes, np.memmap)
+        self.assertArrayEqual(cached_index_nodes, expected_index_nodes)
+        self.assertArrayEqual(cached_tree.data, expected_tree.data)
+        query_point = expected_tree.data[0] + 1.e3
+        self.assertEqual(cached_tree.query(query_point),
+                         expected_tree.query(query_point))
+
+    def test_unreadable_cache(self):
+        """Test that the tree is rebuilt, without unpickling anything, if the
+        cached nodes are corrupt, are a pickled object or do not match the
+        index nodes."""
+        plugin = NeighbourSelection(land_constraint=True,
+                                    cache_directory=self.cache_directory)
+        expected_tree, expected_index_nodes = plugin.build_KDTree(
+            self.region_land_mask)
+        cache_key = plugin._kdtree_cache_key(
+            self.region_land_mask,
+            *np.nonzero(self.region_land_mask.data))
+        nodes_path, _ = plugin._cache_paths(cache_key)
+        for write in [
+                lambda fh: fh.write(b'not an array'),
+                lambda fh: np.save(fh, np.array([{}]), allow_pickle=True),
+                lambda fh: np.save(fh, np.ones((1, 2)))]:
+            with open(nodes_path, 'wb') as nodes_file:
+                write(nodes_file)
+            self.assertIsNone(plugin._load_cached_nodes(cache_key))
+            with patch('numpy.lib.format.pickle.load') as mock_unpickle:
+                tree, index_nodes = plugin.build_KDTree(
+                    self.region_land_mask)
+            mock_unpickle.assert_not_called()
+            self.assertArrayEqual(tree.data, expected_tree.data)
+            self.assertArrayEqual(index_nodes, expected_index_nodes)
+
+    def test_different_trees(self):
+        """Test that trees built from different points of the same grid are
+        cached separately."""
+        NeighbourSelection(
+            land_constraint=True,
+            cache_directory=self.cache_directory).build_KDTree(
+                self.region_land_mask)
+        plugin = NeighbourSelection(cache_directory=self.cache_directory)
+        _, index_nodes = plugin.build_KDTree(self.region_land_mask)
+        self.assertEqual(len(os.listdir(self.cache_directory)), 4)
+        self.assertEqual(index_nodes.shape[0], self.region_land_mask.data.size)
+
+    @ManageWarnings(record=True)
+    def test_unwritable_cache(self, warning_list=None):
+        """Test that a warning is raised and the tree is still returned if the
+        cache directory cannot be created."""
+        filepath = os.path.join(self.directory, 'file')
+        open(filepath, 'w').close()
+        plugin = NeighbourSelection(
+            cache_directory=os.path.join(filepath, 'kdtrees'))
+        tree, _ = plugin.build_KDTree(self.region_land_mask)
+        self.assertIsInstance(tree, scipy.spatial.ckdtree.cKDTree)
+        self.assertTrue(any('Unable to cache KDTree' in str(item)
+                            for item in warning_list))
+
+
 class Test_select_minimum_dz(Test_NeighbourSelection):
 
     """Test extraction of the minimum height difference points from a provided
@@ -599,6 +699,47 @@ class Test_select_minimum_dz(Test_NeighbourSelection):
                             for item in warning_list))
 
 
+class Test_select_minimum_dz_for_sites(Test_NeighbourSelection):
+
+    """Test extraction of the minimum height difference points for several
+    sites at once. The nodes are chosen along the line of islands at a y index
+    of 4 in the region orography, with altitudes [1, 5, 0, 0, 0]."""
+
+    def test_several_sites(self):
+        """Test the neighbour chosen for each site, including a tie between
+        neighbours with the same displacement, in which case the nearest is
+        chosen, and a site with no valid neighbours."""
+
+        plugin = NeighbourSelection()
+        site_altitudes = np.array([3., 5., 0., 3.])
+        nodes = np.array([[0, 4], [1, 4], [2, 4], [3, 4], [4, 4]])
+        distances = np.array([[0, 1, 2, 3, np.inf],
+                              [0, 1, 2, 3, np.inf],
+                              [0, 1, 2, np.inf, np.inf],
+                              [np.inf, np.inf, np.inf, np.inf, np.inf]])
+        indices = np.array([[0, 1, 2, 3, 5],
+                            [0, 1, 2, 3, 5],
+                            [1, 0, 3, 5, 5],
+                            [5, 5, 5, 5, 5]])
+
+        grid_points, found = plugin.select_minimum_dz_for_sites(
+            self.region_orography, site_altitudes, nodes, distances, indices)
+        self.assertArrayEqual(found, [True, True, True, False])
+        self.assertArrayEqual(grid_points[:3], [[0, 4], [1, 4], [3, 4]])
+
+    def test_no_valid_neighbours(self):
+        """Test that no sites are found when no neighbours are within the
+        search radius, even if the tree is empty."""
+
+        plugin = NeighbourSelection()
+        distances = np.full((2, 3), np.inf)
+        indices = np.zeros((2, 3), dtype=int)
+        _, found = plugin.select_minimum_dz_for_sites(
+            self.region_orography, np.array([1., 2.]),
+            np.empty((0, 2), dtype=int), distances, indices)
+        self.assertArrayEqual(found, [False, False])
+
+
 class Test_process(Test_NeighbourSelection):
 
     """Test the process method of the NeighbourSelection class."""
@@ -874,5 +1015,60 @@ class Test_process(Test_NeighbourSelection):
         self.assertArrayEqual(result.data, expected)
 
 
+class Test_process_all_methods(Test_NeighbourSelection):
+
+    """Test the process_all_methods method of the NeighbourSelection
+    class."""
+
+    def setUp(self):
+        """Set up sites scattered over the global grid, some of which have
+        different land and unconstrained neighbours."""
+        super().setUp()
+        self.global_sites = [
+            {'altitude': altitude, 'latitude': latitude,
+             'longitude': longitude, 'wmo_id': index}
+            for index, (altitude, latitude, longitude) in enumerate(
+                [(2.0, 0.0, -64.0), (0.5, 12.0, -20.0), (3.0, -41.0, 90.0),
+                 (1.0, 63.0, 150.0), (2.5, -7.0, 35.0), (5.0, 0.0, -150.0)])]
+
+    def test_matches_process(self):
+        """Test that each cube matches the cube returned by process with the
+        corresponding constraints."""
+        plugin = NeighbourSelection(search_radius=5E6, node_limit=5)
+        result = plugin.process_all_methods(
+            self.global_sites, self.global_orography, self.global_land_mask)
+        self.assertIsInstance(result, iris.cube.CubeList)
+        self.assertEqual(
+            [cube.coord('neighbour_selection_method_name').points[0]
+             for cube in result],
+            ['nearest', 'nearest_land', 'nearest_minimum_dz',
+             'nearest_land_minimum_dz'])
+        for cube, (land_constraint, minimum_dz) in zip(
+                result, [(False, False), (True, False), (False, True),
+                         (True, True)]):
+            expected = NeighbourSelection(
+                land_constraint=land_constraint, minimum_dz=minimum_dz,
+                search_radius=5E6, node_limit=5).process(
+                    self.global_sites, self.global_orography,
+                    self.global_land_mask)
+            self.assertEqual(cube, expected)
+        self.assertFalse(plugin.land_constraint or plugin.minimum_dz)
+
+    def test_one_query_per_tree(self):
+        """Test that the land tree and the tree of all points are each
+        queried once."""
+        plugin = NeighbourSelection(search_radius=5E6, node_limit=5)
+        with patch.object(NeighbourSelection, '_query_tree', autospec=True,
+                          side_effect=NeighbourSelection._query_tree) as (
+                              mock_query):
+            plugin.process_all_methods(
+                self.global_sites, self.global_orography,
+                self.global_land_mask)
+        self.assertEqual(
+            sorted(call[0][0].land_constraint
+                   for call in mock_query.call_args_list),
+            [False, True])
+
+
 if __name__ == '__main__':
     unittest.main()
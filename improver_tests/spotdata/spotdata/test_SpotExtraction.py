@@ -40,6 +40,7 @@ from improver.metadata.constants.mo_attributes import MOSG_GRID_ATTRIBUTES
 from improver.metadata.utilities import create_coordinate_hash
 from improver.spotdata.build_spotdata_cube import build_spotdata_cube
 from improver.spotdata.spot_extraction import SpotExtraction
+from improver.utilities.cube_manipulation import enforce_coordinate_ordering
 
 
 class Test_SpotExtraction(IrisTest):
@@ -198,6 +199,23 @@ class Test_extract_diagnostic_data(Test_SpotExtraction):
                                                 self.diagnostic_cube_yx)
         self.assertArrayEqual(result, expected)
 
+    def test_leading_dimensions(self):
+        """Test extraction of diagnostic data from a cube with a leading
+        dimension. The spot index is returned as the first dimension and the
+        diagnostic cube is not modified."""
+        cube = iris.cube.CubeList(
+            [self.diagnostic_cube_yx.copy(), self.diagnostic_cube_yx.copy()])
+        for index, realization_cube in enumerate(cube):
+            realization_cube.data = realization_cube.data + 100*index
+            realization_cube.add_aux_coord(iris.coords.AuxCoord(
+                index, standard_name='realization', units=1))
+        cube = cube.merge_cube()
+        plugin = SpotExtraction()
+        expected = [[0, 100], [0, 100], [12, 112], [12, 112]]
+        result = plugin.extract_diagnostic_data(self.coordinate_cube, cube)
+        self.assertArrayEqual(result, expected)
+        self.assertEqual(cube.coord_dims('latitude'), (1,))
+
 
 class Test_build_diagnostic_cube(Test_SpotExtraction):
 
@@ -298,6 +316,51 @@ class Test_process(Test_SpotExtraction):
         self.assertEqual(result.coord('realization'), expected_coord)
         self.assertDictEqual(result.attributes, self.expected_attributes)
 
+    def test_cube_with_multiple_leading_dimensions(self):
+        """Test that a cube with several leading dimensions results in a
+        spotdata cube with the same leading dimensions, in the same order,
+        with auxiliary coordinates on those dimensions retained."""
+        cubes = iris.cube.CubeList()
+        for time_index in range(2):
+            for realization in range(3):
+                cube = self.diagnostic_cube_xy.copy()
+                cube.data = cube.data + 100*time_index + realization
+                cube.add_aux_coord(iris.coords.AuxCoord(
+                    realization, standard_name='realization', units=1))
+                cube.add_aux_coord(iris.coords.AuxCoord(
+                    1500000000 + 3600*time_index, standard_name='time',
+                    units='seconds since 1970-01-01 00:00:00'))
+                cube.add_aux_coord(iris.coords.AuxCoord(
+                    3600*time_index, standard_name='forecast_period',
+                    units='s'))
+                cubes.append(cube)
+        cube = cubes.merge_cube()
+        enforce_coordinate_ordering(cube, ['time', 'realization'])
+
+        plugin = SpotExtraction()
+        result = plugin.process(self.neighbour_cube, cube)
+        self.assertEqual(result.shape, (2, 3, 4))
+        self.assertArrayEqual(result.data[1, 2], [102, 102, 114, 114])
+        self.assertEqual(result.coord_dims('time'), (0,))
+        self.assertEqual(result.coord_dims('realization'), (1,))
+        self.assertEqual(result.coord_dims('forecast_period'), (0,))
+        self.assertEqual(result.coord_dims('wmo_id'), (2,))
+        self.assertEqual(result.coord('time'), cube.coord('time'))
+        self.assertDictEqual(result.attributes, self.expected_attributes)
+
+    def test_cube_with_length_one_leading_dimension(self):
+        """Test that a leading dimension of length one is returned as a
+        scalar coordinate on the spotdata cube."""
+        cube = iris.util.new_axis(self.diagnostic_cube_xy.copy())
+        cube.add_dim_coord(iris.coords.DimCoord(
+            [0], standard_name='realization', units=1), 0)
+
+        plugin = SpotExtraction()
+        result = plugin.process(self.neighbour_cube, cube)
+        self.assertArrayEqual(result.data, [0, 0, 12, 12])
+        self.assertEqual(result.coord('realization').points, [0])
+        self.assertEqual(result.coord_dims('realization'), ())
+
 
 if __name__ == '__main__':
     unittest.main()
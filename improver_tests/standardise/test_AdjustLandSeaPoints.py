@@ -60,7 +60,8 @@ class Test__init__(IrisTest):
         expected_members = {'nearest_cube': None,
                             'input_land': None,
                             'output_land': None,
-                            'output_cube': None}
+                            'output_cube': None,
+                            'weights_cache_directory': None}
         result = AdjustLandSeaPoints()
         members = {attr: getattr(result, attr) for attr in dir(result)
                    if not callable(getattr(result, attr)) and
@@ -138,6 +138,21 @@ class Test_choose(IrisTest):
         with self.assertRaisesRegex(ValueError, msg):
             choose(index_array, self.small_data)
 
+    def test_masked_array_set(self):
+        """Test that the mask of a masked array_set is reordered with the
+        data."""
+        index_array = np.array([[[0, 1], [1, 0]],
+                                [[0, 2], [0, 1]],
+                                [[1, 1], [2, 0]]])
+        array_set = np.ma.masked_equal(self.small_data, 6)
+        expected = np.ma.masked_equal(
+            np.array([[[1, 6], [7, 4]],
+                      [[1, 10], [3, 8]],
+                      [[5, 6], [11, 4]]]), 6)
+        result = choose(index_array, array_set)
+        self.assertArrayEqual(result.data, expected.data)
+        self.assertArrayEqual(result.mask, expected.mask)
+
 
 if __name__ == '__main__':
     unittest.main()
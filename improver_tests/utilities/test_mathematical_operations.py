@@ -37,7 +37,8 @@ import iris
 import numpy as np
 from iris.tests import IrisTest
 
-from improver.utilities.mathematical_operations import Integration
+from improver.utilities.mathematical_operations import (
+    Integration, interpolate_multiple_rows)
 
 from ..ensemble_calibration.ensemble_calibration.helper_functions import (
     set_up_temperature_cube)
@@ -596,5 +597,56 @@ class Test_process(IrisTest):
         self.assertArrayAlmostEqual(result.data, expected)
 
 
+class Test_interpolate_multiple_rows(IrisTest):
+
+    """Test the interpolate_multiple_rows function."""
+
+    def setUp(self):
+        """Set up arrays of sample points and values, including repeated
+        sample points and values."""
+        self.xp = np.array([[0., 1., 2., 3.],
+                            [0., 0., 0.5, 1.],
+                            [0.2, 0.2, 0.2, 0.2]])
+        self.fp = np.array([[10., 20., 20., 40.],
+                            [1., 2., 3., 4.],
+                            [5., 6., 7., 8.]])
+        self.x = np.array([-1., 0., 0.2, 0.25, 1., 2.5, 3., 4.])
+
+    def expected(self, x, xp, fp):
+        """Interpolate each row with numpy.interp."""
+        n_rows = max(np.atleast_2d(array).shape[0] for array in [x, xp, fp])
+        x, xp, fp = [np.broadcast_to(np.atleast_2d(array),
+                                     (n_rows, np.shape(array)[-1]))
+                     for array in [x, xp, fp]]
+        return np.array([np.interp(*row) for row in zip(x, xp, fp)])
+
+    def test_sample_points_for_each_row(self):
+        """Test that rows with different sample points match numpy.interp,
+        with the sample values shared by all rows."""
+        result = interpolate_multiple_rows(self.x, self.xp, self.fp[0])
+        self.assertEqual(result.shape, (3, 8))
+        self.assertArrayEqual(
+            result, self.expected(self.x, self.xp, self.fp[0]))
+
+    def test_sample_values_for_each_row(self):
+        """Test that rows with different sample values match numpy.interp,
+        with the sample points shared by all rows."""
+        result = interpolate_multiple_rows(self.x, self.xp[0], self.fp)
+        self.assertArrayEqual(
+            result, self.expected(self.x, self.xp[0], self.fp))
+
+    def test_points_for_each_row(self):
+        """Test that different points at which to interpolate can be given
+        for each row."""
+        x = np.array([[0.5], [0.], [1.]])
+        result = interpolate_multiple_rows(x, self.xp, self.fp[0])
+        self.assertArrayEqual(result, [[15.], [20.], [40.]])
+
+    def test_single_sample_point(self):
+        """Test that a single sample point gives its value everywhere."""
+        result = interpolate_multiple_rows(self.x, [1.], [[3.], [4.]])
+        self.assertArrayEqual(result, np.repeat([[3.], [4.]], 8, axis=1))
+
+
 if __name__ == '__main__':
     unittest.main()
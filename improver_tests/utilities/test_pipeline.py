@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# (C) British Crown Copyright 2017-2019 Met Office.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Unit tests for the pipeline utilities."""
+
+import os
+import shutil
+import unittest
+from tempfile import mkdtemp
+from unittest.mock import patch
+
+import numpy as np
+from iris.tests import IrisTest
+
+from improver.utilities.pipeline import RunPipeline
+from improver.utilities.save import save_netcdf
+
+from ..set_up_test_cubes import set_up_variable_cube
+
+
+def set_up_config():
+    """Set up a pipeline with two branches from a common step."""
+    return {"steps": {
+        "first": {"command": "threshold", "args": ["input.nc"]},
+        "second": {"command": "nbhood",
+                   "args": [{"step": "first"}, "--radii=1"],
+                   "output": "second.nc"},
+        "third": {"command": "nbhood",
+                  "args": [{"step": "first"}, "--radii=2"]}}}
+
+
+class Test__init__(IrisTest):
+
+    """Test the __init__ method."""
+
+    def test_invalid_processes(self):
+        """Test an error is raised for fewer than one process."""
+        msg = "Invalid number of processes"
+        with self.assertRaisesRegex(ValueError, msg):
+            RunPipeline(processes=0)
+
+
+class Test__repr__(IrisTest):
+
+    """Test the __repr__ method."""
+
+    def test_basic(self):
+        """Test the string representation."""
+        self.assertEqual(str(RunPipeline(processes=2)),
+                         '<RunPipeline: processes: 2>')
+
+
+class Test__check_steps(IrisTest):
+
+    """Test the _check_steps method."""
+
+    def test_order(self):
+        """Test that steps are ordered after the steps they use."""
+        steps = set_up_config()["steps"]
+        steps["zeroth"] = {"command": "threshold",
+                           "args": [{"step": "third"}]}
+        result = RunPipeline()._check_steps(steps)
+        self.assertEqual(result, ["first", "second", "third", "zeroth"])
+
+    def test_no_command(self):
+        """Test an error is raised if a step has no command."""
+        steps = {"first": {"args": ["input.nc"]}}
+        with self.assertRaisesRegex(ValueError, "Step first has no command"):
+            RunPipeline()._check_steps(steps)
+
+    def test_unknown_output_profile(self):
+        """Test an error is raised for an unknown output profile."""
+        steps = set_up_config()["steps"]
+        steps["third"]["output_profile"] = "fastest"
+        msg = "Step third has unknown output profile fastest"
+        with self.assertRaisesRegex(ValueError, msg):
+            RunPipeline()._check_steps(steps)
+
+    def test_unknown_step(self):
+        """Test an error is raised for a reference to an unknown step."""
+        steps = set_up_config()["steps"]
+        del steps["first"]
+        msg = "Step second refers to unknown step first"
+        with self.assertRaisesRegex(ValueError, msg):
+            RunPipeline()._check_steps(steps)
+
+    def test_circular(self):
+        """Test an error is raised for a circular dependency."""
+        steps = set_up_config()["steps"]
+        steps["first"]["args"] = [{"step": "third"}]
+        msg = "Steps have a circular dependency: first, second, third"
+        with self.assertRaisesRegex(ValueError, msg):
+            RunPipeline()._check_steps(steps)
+
+
+class Test_process(IrisTest):
+
+    """Test the process method."""
+
+    @patch('improver.utilities.pipeline._run_step')
+    def test_results_passed(self, mock_run_step):
+        """Test that results are passed between steps and the results of the
+        final steps are returned."""
+        mock_run_step.side_effect = ["first result", None, "third result"]
+        result = RunPipeline()(set_up_config())
+        self.assertEqual(result, {"third": "third result"})
+        self.assertEqual(mock_run_step.call_args_list[0][0],
+                         ("threshold", ["input.nc"], None, True, "default"))
+        self.assertEqual(
+            mock_run_step.call_args_list[1][0],
+            ("nbhood", ["first result", "--radii=1"], "second.nc", False,
+             "default"))
+        self.assertEqual(
+            mock_run_step.call_args_list[2][0],
+            ("nbhood", ["first result", "--radii=2"], None, True, "default"))
+
+    def test_processes(self):
+        """Test that running steps in worker processes gives the same
+        results as running them in this process."""
+        directory = mkdtemp()
+        input_path = os.path.join(directory, "input.nc")
+        data = np.linspace(270, 290, 100, dtype=np.float32).reshape(10, 10)
+        save_netcdf(set_up_variable_cube(data, spatial_grid="equalarea"),
+                    input_path)
+        nbhood_args = ["--neighbourhood-output=probabilities",
+                       "--neighbourhood-shape=square"]
+        config = {"steps": {
+            "first": {"command": "threshold",
+                      "args": [input_path, "--threshold-values=280"]},
+            "second": {"command": "nbhood",
+                       "args": [{"step": "first"}, "--radii=100000"] +
+                       nbhood_args},
+            "third": {"command": "nbhood",
+                      "args": [{"step": "first"}, "--radii=200000"] +
+                      nbhood_args}}}
+        try:
+            expected = RunPipeline()(config)
+            result = RunPipeline(processes=2)(config)
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(sorted(result), ["second", "third"])
+        for name in ["second", "third"]:
+            self.assertEqual(result[name], expected[name])
+
+    def test_result_copied_for_each_use(self):
+        """Test that each step using a result gets its own copy, so that
+        a step modifying its input in place does not affect other steps."""
+        directory = mkdtemp()
+        input_path = os.path.join(directory, "input.nc")
+        data = np.linspace(0, 350, 100, dtype=np.float32).reshape(10, 10)
+        save_netcdf(set_up_variable_cube(
+            data, name="wind_from_direction", units="degrees",
+            spatial_grid="equalarea"), input_path)
+        nbhood_args = ["--neighbourhood-output=probabilities",
+                       "--neighbourhood-shape=square", "--degrees-as-complex"]
+        config = {"steps": {
+            "first": {"command": "standardise", "args": [input_path]},
+            "second": {"command": "nbhood",
+                       "args": [{"step": "first"}, "--radii=100000"] +
+                       nbhood_args},
+            "third": {"command": "nbhood",
+                      "args": [{"step": "first"}, "--radii=100000"] +
+                      nbhood_args}}}
+        try:
+            result = RunPipeline()(config)
+            del config["steps"]["second"]
+            expected = RunPipeline()(config)
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(result["second"], expected["third"])
+        self.assertEqual(result["third"], expected["third"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# (C) British Crown Copyright 2017-2019 Met Office.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+"""Unit tests for the regrid utilities."""
+
+import os
+import shutil
+import unittest
+from tempfile import mkdtemp
+
+import iris
+import numpy as np
+from iris.analysis import Linear, Nearest
+from iris.tests import IrisTest
+
+import improver.utilities.regrid as regrid
+from improver.utilities.regrid import (
+    RegridWithCachedWeights, compute_regrid_weights)
+
+from ..set_up_test_cubes import set_up_variable_cube
+
+
+def set_up_cubes():
+    """Set up a source cube with a realization dimension on a lat-lon grid,
+    and a target grid on the UK standard grid that extends beyond it."""
+    data = np.arange(3 * 10 * 12, dtype=np.float32).reshape((3, 10, 12))
+    source = set_up_variable_cube(data, realizations=[0, 1, 2])
+    source.coord('latitude').points = np.linspace(
+        48., 60., 10, dtype=np.float32)
+    source.coord('longitude').points = np.linspace(
+        -10., 4., 12, dtype=np.float32)
+    target = set_up_variable_cube(
+        np.zeros((8, 7), dtype=np.float32), name='land_binary_mask',
+        units='1', spatial_grid='equalarea')
+    return source, target
+
+
+class Test_compute_regrid_weights(IrisTest):
+
+    """Test the regridding weights."""
+
+    def setUp(self):
+        """Set up cubes."""
+        self.source, self.target = set_up_cubes()
+
+    def test_linear(self):
+        """Test the weights are a sparse matrix with four entries summing to
+        one in each row, from the target to the source grid points."""
+        matrix, out_of_bounds = compute_regrid_weights(
+            self.source, self.target, 'linear')
+        self.assertEqual(matrix.shape, (8 * 7, 10 * 12))
+        self.assertArrayEqual(np.diff(matrix.indptr), 4)
+        self.assertArrayAlmostEqual(matrix.sum(axis=1), 1.)
+        self.assertEqual(out_of_bounds.shape, (8 * 7,))
+        self.assertTrue(out_of_bounds.any())
+        self.assertFalse(out_of_bounds.all())
+
+    def test_nearest(self):
+        """Test the nearest-neighbour weights select one source point for
+        each target point."""
+        matrix, _ = compute_regrid_weights(
+            self.source, self.target, 'nearest')
+        self.assertArrayEqual(np.diff(matrix.indptr), 1)
+        self.assertArrayEqual(matrix.data, 1.)
+
+    def test_same_grid(self):
+        """Test regridding to the source grid selects each source point."""
+        matrix, out_of_bounds = compute_regrid_weights(
+            self.source, self.source, 'nearest')
+        self.assertArrayEqual(matrix.indices, np.arange(10 * 12))
+        self.assertFalse(out_of_bounds.any())
+
+
+class Test_process(IrisTest):
+
+    """Test regridding with cached weights."""
+
+    def setUp(self):
+        """Set up cubes, and clear the weights held in memory."""
+        self.source, self.target = set_up_cubes()
+        regrid._CACHED_WEIGHTS.clear()
+
+    def tearDown(self):
+        """Clear the weights held in memory."""
+        regrid._CACHED_WEIGHTS.clear()
+
+    def test_matches_iris(self):
+        """Test the result is identical to regridding with iris, for each
+        scheme."""
+        for scheme in [Linear(), Nearest(), Linear(extrapolation_mode='nan'),
+                       Nearest(extrapolation_mode='nanmask')]:
+            expected = self.source.regrid(self.target, scheme)
+            result = RegridWithCachedWeights(scheme)(
+                self.source, self.target)
+            self.assertEqual(result.metadata, expected.metadata)
+            self.assertEqual(result.coords(), expected.coords())
+            self.assertArrayEqual(result.data, expected.data)
+
+    def test_masked_data(self):
+        """Test masked source points and points outside the source grid are
+        masked as they are by iris."""
+        self.source.data = np.ma.masked_greater(self.source.data, 300)
+        scheme = Linear(extrapolation_mode='nanmask')
+        expected = self.source.regrid(self.target, scheme)
+        result = RegridWithCachedWeights(scheme)(self.source, self.target)
+        self.assertIsInstance(result.data, np.ma.MaskedArray)
+        self.assertArrayEqual(result.data.mask, expected.data.mask)
+        self.assertArrayEqual(result.data, expected.data)
+
+    def test_transposed_cube(self):
+        """Test a cube with the realization dimension between the spatial
+        dimensions is regridded as by iris."""
+        self.source.transpose([1, 0, 2])
+        expected = self.source.regrid(self.target, Linear())
+        result = RegridWithCachedWeights(Linear())(self.source, self.target)
+        self.assertEqual(result, expected)
+
+    def test_error_extrapolation_mode(self):
+        """Test an error is raised if regridding would extrapolate with the
+        "error" extrapolation mode."""
+        plugin = RegridWithCachedWeights(Linear(extrapolation_mode='error'))
+        msg = 'out of bounds'
+        with self.assertRaisesRegex(ValueError, msg):
+            plugin(self.source, self.target)
+
+    def test_weights_reused(self):
+        """Test the weights are computed once for each pair of grids and
+        method, and reused for other cubes on the same grids."""
+        RegridWithCachedWeights(Linear())(self.source, self.target)
+        RegridWithCachedWeights(Linear())(self.source[0], self.target)
+        self.assertEqual(len(regrid._CACHED_WEIGHTS), 1)
+        RegridWithCachedWeights(Nearest())(self.source, self.target)
+        RegridWithCachedWeights(Linear())(self.target, self.source)
+        self.assertEqual(len(regrid._CACHED_WEIGHTS), 3)
+
+    def test_least_recently_used_discarded(self):
+        """Test the least recently used weights are discarded once the
+        maximum number of weights are held in memory."""
+        for points in range(regrid.MAX_CACHED_WEIGHTS + 1):
+            target = self.target.copy()
+            target.coord(axis='x').points = (
+                target.coord(axis='x').points + points)
+            RegridWithCachedWeights(Linear())(self.source, target)
+        self.assertEqual(len(regrid._CACHED_WEIGHTS),
+                         regrid.MAX_CACHED_WEIGHTS)
+        self.assertNotIn(
+            RegridWithCachedWeights(Linear())._weights_cache_key(
+                self.source, self.target), regrid._CACHED_WEIGHTS)
+
+
+class Test_process_cache_directory(IrisTest):
+
+    """Test storing regridding weights in a cache directory."""
+
+    def setUp(self):
+        """Set up cubes and a temporary cache directory."""
+        self.source, self.target = set_up_cubes()
+        self.directory = mkdtemp()
+        self.cache_directory = os.path.join(self.directory, 'weights')
+        regrid._CACHED_WEIGHTS.clear()
+
+    def tearDown(self):
+        """Remove the temporary cache directory."""
+        shutil.rmtree(self.directory)
+        regrid._CACHED_WEIGHTS.clear()
+
+    def test_weights_cached(self):
+        """Test the weights are written to the cache directory and read from
+        it when they are not held in memory."""
+        plugin = RegridWithCachedWeights(
+            Linear(), cache_directory=self.cache_directory)
+        expected = plugin(self.source, self.target)
+        self.assertEqual(len(os.listdir(self.cache_directory)), 1)
+
+        regrid._CACHED_WEIGHTS.clear()
+        cache_key = plugin._weights_cache_key(self.source, self.target)
+        matrix, out_of_bounds = plugin._load_cached_weights(cache_key)
+        expected_matrix, expected_out_of_bounds = compute_regrid_weights(
+            self.source, self.target, 'linear')
+        self.assertArrayEqual(matrix.toarray(), expected_matrix.toarray())
+        self.assertArrayEqual(out_of_bounds, expected_out_of_bounds)
+        result = plugin(self.source, self.target)
+        self.assertArrayEqual(result.data, expected.data)
+
+    def test_unwritable_cache_directory(self):
+        """Test a warning is raised and the cube still regridded if the
+        weights cannot be written to the cache directory."""
+        os.mknod(self.cache_directory)
+        plugin = RegridWithCachedWeights(
+            Linear(), cache_directory=self.cache_directory)
+        with self.assertWarnsRegex(UserWarning, 'Unable to cache'):
+            result = plugin(self.source, self.target)
+        self.assertIsInstance(result, iris.cube.Cube)
+
+
+if __name__ == '__main__':
+    unittest.main()
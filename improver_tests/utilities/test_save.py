@@ -32,6 +32,7 @@
 
 import os
 import unittest
+import warnings
 from tempfile import mkdtemp
 
 import iris
@@ -42,7 +43,7 @@ from netCDF4 import Dataset
 
 from improver.utilities.load import load_cube
 from improver.utilities.save import (
-    _append_metadata_cube, _order_cell_methods, save_netcdf)
+    _append_metadata_cube, _chunksizes, _order_cell_methods, save_netcdf)
 
 from ..set_up_test_cubes import set_up_variable_cube
 
@@ -186,6 +187,76 @@ class Test_save_netcdf(IrisTest):
         with self.assertRaisesRegex(ValueError, msg):
             save_netcdf(no_units_cube, self.filepath)
 
+    def test_default_profile(self):
+        """ Test the data are compressed and chunked by x-y slice """
+        save_netcdf(self.cube, self.filepath)
+        variable = Dataset(self.filepath, mode='r')['air_temperature']
+        self.assertTrue(variable.filters()['zlib'])
+        self.assertEqual(variable.filters()['complevel'], 1)
+        self.assertEqual(variable.chunking(), [1, 3, 3])
+
+    def test_intermediate_profile(self):
+        """ Test the data are saved uncompressed and contiguously """
+        save_netcdf(self.cube, self.filepath, profile='intermediate')
+        variable = Dataset(self.filepath, mode='r')['air_temperature']
+        self.assertFalse(variable.filters()['zlib'])
+        self.assertEqual(variable.chunking(), 'contiguous')
+        self.assertArrayEqual(load_cube(self.filepath).data, self.cube.data)
+
+    def test_archive_profile(self):
+        """ Test the data are saved with more compression """
+        save_netcdf(self.cube, self.filepath, profile='archive')
+        variable = Dataset(self.filepath, mode='r')['air_temperature']
+        self.assertTrue(variable.filters()['zlib'])
+        self.assertEqual(variable.filters()['complevel'], 6)
+
+    def test_spot_profile(self):
+        """ Test the data are chunked along the last dimension """
+        save_netcdf(self.cube, self.filepath, profile='spot')
+        variable = Dataset(self.filepath, mode='r')['air_temperature']
+        self.assertTrue(variable.filters()['zlib'])
+        self.assertEqual(variable.chunking(), [1, 1, 3])
+
+    def test_error_unknown_profile(self):
+        """ Test an error is raised for an unknown profile """
+        msg = 'Unknown save profile'
+        with self.assertRaisesRegex(ValueError, msg):
+            save_netcdf(self.cube, self.filepath, profile='kittens')
+
+
+class Test__chunksizes(IrisTest):
+    """ Test function to get the chunk sizes for saving cubes. """
+
+    def setUp(self):
+        """ Set up a cube. """
+        self.cube = set_up_test_cube()
+
+    def test_xy_slices(self):
+        """ Test chunks of whole x-y slices """
+        result = _chunksizes(iris.cube.CubeList([self.cube]), 2)
+        self.assertEqual(result, (1, 3, 3))
+
+    def test_last_dimension(self):
+        """ Test chunks along the last dimension """
+        result = _chunksizes(iris.cube.CubeList([self.cube]), 1)
+        self.assertEqual(result, (1, 1, 3))
+
+    def test_contiguous(self):
+        """ Test no chunks are set for contiguous saving """
+        result = _chunksizes(iris.cube.CubeList([self.cube]), None)
+        self.assertIsNone(result)
+
+    def test_varying_dimensions(self):
+        """ Test no chunks are set, with a warning, for cubes which would
+        need different chunks """
+        cubes = iris.cube.CubeList([self.cube, self.cube[0, :2]])
+        with warnings.catch_warnings(record=True) as warning_list:
+            warnings.simplefilter("always")
+            result = _chunksizes(cubes, 2)
+        self.assertIsNone(result)
+        self.assertTrue(any("Chunksize not set" in str(item.message)
+                            for item in warning_list))
+
 
 class Test__order_cell_methods(IrisTest):
     """ Test function that sorts cube cell_methods before saving. """
@@ -346,192 +346,52 @@ class Test_invert_condition(IrisTest):
             self.assertEqual(result[1], inverse_outputs[i])
 
 
-class Test_construct_condition(IrisTest):
-
-    """Test the construct condition method."""
-
-    def test_basic(self):
-        """Test that the construct_condition method returns a string."""
-        plugin = WeatherSymbols()
-        constraint_value = iris.Constraint(
-            name='probability_of_rainfall_rate_above_threshold',
-            coord_values={'threshold': 0.03})
-        condition = '<'
-        prob_threshold = 0.5
-        gamma = None
-        expected = ("cubes.extract(Constraint(name="
-                    "'probability_of_rainfall_rate_above_threshold',"
-                    " coord_values={'threshold': 0.03})"
-                    ")[0].data < 0.5")
-        result = plugin.construct_condition(constraint_value,
-                                            condition,
-                                            prob_threshold,
-                                            gamma)
-        self.assertIsInstance(result, str)
-        self.assertEqual(result, expected)
-
-    def test_works_with_lists(self):
-        """Test that the construct_condition method works with a list
-        of Constraints. """
-        plugin = WeatherSymbols()
-        constraint_list = [
-            iris.Constraint(
-                name='probability_of_lwe_snowfall_rate_above_threshold',
-                coord_values={'threshold': 0.03}),
-            iris.Constraint(
-                name='probability_of_rainfall_rate_above_threshold',
-                coord_values={'threshold': 0.03})]
-        condition = '<'
-        prob_threshold = 0.5
-        gamma = 0.7
-        expected = ("(cubes.extract(Constraint(name="
-                    "'probability_of_lwe_snowfall_rate_above_threshold', "
-                    "coord_values={'threshold': 0.03}))[0].data - "
-                    "cubes.extract(Constraint(name="
-                    "'probability_of_rainfall_rate_above_threshold', "
-                    "coord_values={'threshold': 0.03}))[0].data * 0.7) < 0.5")
-        result = plugin.construct_condition(constraint_list,
-                                            condition,
-                                            prob_threshold,
-                                            gamma)
-        self.assertIsInstance(result, str)
-        self.assertEqual(result, expected)
-
-
-class Test_format_condition_chain(IrisTest):
-
-    """Test the format_condition_chain method."""
-
-    def test_basic(self):
-        """Test that the format_condition_chain method returns a string."""
-        plugin = WeatherSymbols()
-        conditions = ['condition1', 'condition2']
-        expected = '(condition1) & (condition2)'
-        result = plugin.format_condition_chain(conditions)
-        self.assertIsInstance(result, str)
-        self.assertEqual(result, expected)
-
-    def test_works_with_or(self):
-        """Test that the format_condition_chain method works with OR."""
-        plugin = WeatherSymbols()
-        conditions = ['condition1', 'condition2']
-        expected = '(condition1) | (condition2)'
-        result = plugin.format_condition_chain(conditions,
-                                               condition_combination='OR')
-        self.assertIsInstance(result, str)
-        self.assertEqual(result, expected)
-
-
-class Test_create_condition_chain(IrisTest):
-    """Test the create_condition_chain method."""
-
-    def setUp(self):
-        """ Set up queries for testing"""
-        self.dummy_queries = {
-            'significant_precipitation': {
-                'succeed': 'heavy_precipitation',
-                'fail': 'any_precipitation',
-                'probability_thresholds': [0.5, 0.5],
-                'threshold_condition': '>=',
-                'condition_combination': 'OR',
-                'diagnostic_fields':
-                    ['probability_of_rainfall_rate_above_threshold',
-                     'probability_of_lwe_snowfall_rate_above_threshold'],
-                'diagnostic_thresholds': [AuxCoord(0.03, units='mm hr-1'),
-                                          AuxCoord(0.03, units='mm hr-1')],
-                'diagnostic_conditions': ['above', 'above']}
-        }
-
-    def test_basic(self):
-        """Test create_condition_chain returns a list of strings."""
-        plugin = WeatherSymbols()
-        test_condition = self.dummy_queries['significant_precipitation']
-        result = plugin.create_condition_chain(test_condition)
-        expected = ("(cubes.extract(iris.Constraint(name='probability_of_"
-                    "rainfall_rate_above_threshold', rainfall_rate=lambda "
-                    "cell: 0.03 * {t_min} < "
-                    "cell < 0.03 * {t_max}))[0].data >= 0.5) | (cubes.extract"
-                    "(iris.Constraint("
-                    "name='probability_of_lwe_snowfall_rate_above_threshold',"
-                    " lwe_snowfall_rate=lambda cell: 0.03 * {t_min} < cell < "
-                    "0.03 * {t_max}))[0].data >= 0.5)".format(
-                        t_min=(1. - WeatherSymbols().float_tolerance),
-                        t_max=(1. + WeatherSymbols().float_tolerance)))
-        self.assertIsInstance(result, list)
-        self.assertIsInstance(result[0], str)
-        self.assertEqual(result[0], expected)
-
-    def test_old_naming_convention(self):
-        """Test create_condition_chain can return conditions using old
-        threshold coordinate name"""
-        plugin = WeatherSymbols()
-        plugin.coord_named_threshold = True
-        test_condition = self.dummy_queries['significant_precipitation']
-        result = plugin.create_condition_chain(test_condition)
-        expected = ("(cubes.extract(iris.Constraint(name='probability_of_"
-                    "rainfall_rate_above_threshold', threshold=lambda "
-                    "cell: 0.03 * {t_min} < "
-                    "cell < 0.03 * {t_max}))[0].data >= 0.5) | (cubes.extract"
-                    "(iris.Constraint("
-                    "name='probability_of_lwe_snowfall_rate_above_threshold',"
-                    " threshold=lambda cell: 0.03 * {t_min} < cell < "
-                    "0.03 * {t_max}))[0].data >= 0.5)".format(
-                        t_min=(1. - WeatherSymbols().float_tolerance),
-                        t_max=(1. + WeatherSymbols().float_tolerance)))
-        self.assertIsInstance(result, list)
-        self.assertIsInstance(result[0], str)
-        self.assertEqual(result[0], expected)
-
-
 class Test_construct_extract_constraint(IrisTest):
 
     """Test the construct_extract_constraint method ."""
 
+    def setUp(self):
+        """Set up cubes for testing."""
+        self.cubes, _ = set_up_wxcubes()
+        self.diagnostic = 'probability_of_rainfall_rate_above_threshold'
+
     def test_basic(self):
-        """Test construct_extract_constraint returns a iris.Constraint."""
+        """Test construct_extract_constraint returns an iris.Constraint that
+        extracts the diagnostic at the required threshold, within the float
+        tolerance."""
         plugin = WeatherSymbols()
-        diagnostic = 'probability_of_rainfall_rate_above_threshold'
-        threshold = AuxCoord(0.03, units='mm hr-1')
-        result = plugin.construct_extract_constraint(diagnostic,
+        threshold = AuxCoord(8.33333e-09, units='m s-1')
+        result = plugin.construct_extract_constraint(self.diagnostic,
                                                      threshold, False)
-        expected = ("iris.Constraint("
-                    "name='probability_of_rainfall_rate_above_threshold', "
-                    "rainfall_rate=lambda cell: 0.03 * {t_min} < cell < "
-                    "0.03 * {t_max})".format(
-                        t_min=(1. - WeatherSymbols().float_tolerance),
-                        t_max=(1. + WeatherSymbols().float_tolerance)))
-        self.assertIsInstance(result, str)
-        self.assertEqual(result, expected)
+        self.assertIsInstance(result, iris.Constraint)
+        cube, = self.cubes.extract(result)
+        self.assertEqual(cube.name(), self.diagnostic)
+        self.assertAlmostEqual(cube.coord('rainfall_rate').points[0],
+                               8.33333333e-09)
 
     def test_old_naming_convention(self):
         """Test construct_extract_constraint can return a constraint with a
         "threshold" coordinate"""
         plugin = WeatherSymbols()
-        diagnostic = 'probability_of_rainfall_rate_above_threshold'
-        threshold = AuxCoord(0.03, units='mm hr-1')
-        result = plugin.construct_extract_constraint(diagnostic,
+        rain_cube = self.cubes.extract(self.diagnostic)[0]
+        find_threshold_coordinate(rain_cube).rename('threshold')
+        threshold = AuxCoord(8.33333333e-09, units='m s-1')
+        result = plugin.construct_extract_constraint(self.diagnostic,
                                                      threshold, True)
-        expected = ("iris.Constraint("
-                    "name='probability_of_rainfall_rate_above_threshold', "
-                    "threshold=lambda cell: 0.03 * {t_min} < cell < 0.03 * "
-                    "{t_max})".format(
-                        t_min=(1. - WeatherSymbols().float_tolerance),
-                        t_max=(1. + WeatherSymbols().float_tolerance)))
-        self.assertIsInstance(result, str)
-        self.assertEqual(result, expected)
+        cube, = self.cubes.extract(result)
+        self.assertAlmostEqual(cube.coord('threshold').points[0],
+                               8.33333333e-09)
 
     def test_zero_threshold(self):
         """Test construct_extract_constraint when threshold is zero."""
         plugin = WeatherSymbols()
-        diagnostic = 'probability_of_rainfall_rate_above_threshold'
-        threshold = AuxCoord(0.0, units='mm hr-1')
+        diagnostic = ('probability_of_number_of_lightning_flashes_per_unit_'
+                      'area_in_vicinity_above_threshold')
+        threshold = AuxCoord(0.0, units='m-2')
         result = plugin.construct_extract_constraint(diagnostic,
                                                      threshold, False)
-        expected = ("iris.Constraint("
-                    "name='probability_of_rainfall_rate_above_threshold', "
-                    "rainfall_rate=lambda cell:  -1e-12 < cell < 1e-12)")
-        self.assertIsInstance(result, str)
-        self.assertEqual(result, expected)
+        cube, = self.cubes.extract(result)
+        self.assertEqual(cube.name(), diagnostic)
 
     def test_list_of_constraints(self):
         """Test construct_extract_constraint returns a list
@@ -543,22 +403,82 @@ class Test_construct_extract_constraint(IrisTest):
                       AuxCoord(0.03, units='mm hr-1')]
         result = plugin.construct_extract_constraint(diagnostics,
                                                      thresholds, False)
-
-        expected = ("iris.Constraint("
-                    "name='probability_of_lwe_snowfall_rate_above_threshold', "
-                    "lwe_snowfall_rate=lambda cell: 0.03 * {t_min} < cell "
-                    "< 0.03 * {t_max})".format(
-                        t_min=(1. - WeatherSymbols().float_tolerance),
-                        t_max=(1. + WeatherSymbols().float_tolerance)))
         self.assertIsInstance(result, list)
-        self.assertIsInstance(result[1], str)
         self.assertEqual(len(result), 2)
-        self.assertEqual(result[1], expected)
+        self.assertIsInstance(result[1], iris.Constraint)
+
+
+class Test_evaluate_condition(IrisTest):
+
+    """Test the evaluate_condition method."""
+
+    def setUp(self):
+        """Set up cubes and a query for testing."""
+        self.cubes, _ = set_up_wxcubes()
+        self.diagnostic = 'probability_of_cloud_area_fraction_above_threshold'
+        self.query = {
+            'succeed': 1,
+            'fail': 2,
+            'probability_thresholds': [0.5, 0.5],
+            'threshold_condition': '>=',
+            'condition_combination': 'AND',
+            'diagnostic_fields': [self.diagnostic, self.diagnostic],
+            'diagnostic_thresholds': [AuxCoord(0.1875, units=1),
+                                      AuxCoord(0.8125, units=1)],
+            'diagnostic_conditions': ['above', 'above']}
+        self.cloud_any = np.array(
+            [0, 1, 0, 0, 1, 1, 0, 0, 1], dtype=bool).reshape(1, 3, 3)
+        self.cloud_most = np.array(
+            [0, 0, 0, 0, 1, 1, 0, 0, 1], dtype=bool).reshape(1, 3, 3)
+
+    def test_basic(self):
+        """Test the conditions are evaluated and combined with AND, and that
+        the extracted data are stored for reuse."""
+        plugin = WeatherSymbols()
+        extracted_data = {}
+        result = plugin.evaluate_condition(self.cubes, self.query,
+                                           extracted_data)
+        self.assertEqual(result.dtype, bool)
+        self.assertArrayEqual(result, self.cloud_any & self.cloud_most)
+        self.assertEqual(len(extracted_data), 2)
+
+    def test_or(self):
+        """Test the conditions are combined with OR."""
+        plugin = WeatherSymbols()
+        self.query['threshold_condition'] = '<'
+        self.query['condition_combination'] = 'OR'
+        result = plugin.evaluate_condition(self.cubes, self.query)
+        self.assertArrayEqual(result, ~self.cloud_any | ~self.cloud_most)
+
+    def test_gamma(self):
+        """Test a condition on the difference between two fields, one of
+        which is scaled by gamma."""
+        plugin = WeatherSymbols()
+        self.query.update({
+            'probability_thresholds': [0.5],
+            'diagnostic_fields': [[self.diagnostic, self.diagnostic]],
+            'diagnostic_thresholds': [[AuxCoord(0.1875, units=1),
+                                       AuxCoord(0.8125, units=1)]],
+            'diagnostic_gamma': [0.7]})
+        result = plugin.evaluate_condition(self.cubes, self.query)
+        self.assertArrayEqual(result, self.cloud_any & ~self.cloud_most)
+
+    def test_masked_data(self):
+        """Test that the condition is not satisfied for masked data."""
+        plugin = WeatherSymbols()
+        cloud = self.cubes.extract(self.diagnostic)[0]
+        mask = np.zeros(cloud.shape, dtype=bool)
+        mask[:, 0, 2, 2] = True
+        cloud.data = np.ma.masked_array(cloud.data, mask=mask)
+        result = plugin.evaluate_condition(self.cubes, self.query)
+        expected = self.cloud_any & self.cloud_most
+        expected[0, 2, 2] = False
+        self.assertArrayEqual(result, expected)
 
 
-class Test_find_all_routes(IrisTest):
+class Test_compile_decision_tree(IrisTest):
 
-    """Test the find_all_routes method ."""
+    """Test the compile_decision_tree method ."""
 
     def setUp(self):
         """ Setup testing graph """
@@ -566,95 +486,64 @@ class Test_find_all_routes(IrisTest):
                            'success_1': ['success_1_1', 'fail_1_0'],
                            'fail_0': ['success_0_1', 3],
                            'success_1_1': [1, 2],
-                           'fail_1_0': [2, 4],
+                           'fail_1_0': [2, 'success_1_1'],
                            'success_0_1': [5, 1]}
 
     def test_basic(self):
-        """Test find_all_routes returns a list of expected nodes."""
+        """Test compile_decision_tree returns every node after all the nodes
+        leading to it."""
         plugin = WeatherSymbols()
-        result = plugin.find_all_routes(self.test_graph,
-                                        'start_node',
-                                        3)
-        expected_nodes = [['start_node',
-                           'fail_0',
-                           3]]
-        self.assertIsInstance(result, list)
-        self.assertListEqual(result, expected_nodes)
-
-    def test_multiple_routes(self):
-        """Test finds multiple routes."""
-        plugin = WeatherSymbols()
-        result = plugin.find_all_routes(self.test_graph,
-                                        'start_node',
-                                        1)
-        expected_nodes = [['start_node',
-                           'success_1',
-                           'success_1_1',
-                           1],
-                          ['start_node',
-                           'fail_0',
-                           'success_0_1',
-                           1]]
-        self.assertIsInstance(result, list)
-        self.assertListEqual(result, expected_nodes)
+        start, steps = plugin.compile_decision_tree(self.test_graph,
+                                                    'start_node')
+        self.assertEqual(start, 'start_node')
+        self.assertEqual(len(steps), len(self.test_graph))
+        self.assertEqual(steps[0], ('start_node', 'success_1', 'fail_0'))
+        order = [node for node, _, _ in steps]
+        for node, succeed, fail in steps:
+            for target in (succeed, fail):
+                if not isinstance(target, int):
+                    self.assertLess(order.index(node), order.index(target))
+            self.assertEqual([succeed, fail], self.test_graph[node])
 
     def test_omit_nodes_top_node(self):
-        """Test find_all_routes where omit node is top node."""
+        """Test compile_decision_tree where omit node is top node."""
         omit_nodes = {'start_node': 'success_1'}
         plugin = WeatherSymbols()
-        result = plugin.find_all_routes(self.test_graph,
-                                        'start_node',
-                                        1,
-                                        omit_nodes=omit_nodes,)
-        expected_nodes = [['success_1',
-                           'success_1_1',
-                           1]]
-        self.assertIsInstance(result, list)
-        self.assertListEqual(result, expected_nodes)
+        start, steps = plugin.compile_decision_tree(
+            self.test_graph, 'start_node', omit_nodes=omit_nodes)
+        self.assertEqual(start, 'success_1')
+        self.assertEqual(
+            steps, [('success_1', 'success_1_1', 'fail_1_0'),
+                    ('fail_1_0', 2, 'success_1_1'),
+                    ('success_1_1', 1, 2)])
 
     def test_omit_nodes_midtree(self):
-        """Test find_all_routes where omit node is mid tree."""
-        omit_nodes = {'success_1': 'success_1_1'}
+        """Test compile_decision_tree where omit nodes are mid tree, so that
+        branches leading to them lead to their replacements instead."""
+        omit_nodes = {'fail_0': 3, 'success_1': 'success_1_1'}
         plugin = WeatherSymbols()
-        result = plugin.find_all_routes(self.test_graph,
-                                        'start_node',
-                                        1,
-                                        omit_nodes=omit_nodes,)
-        expected_nodes = [['start_node',
-                           'success_1_1',
-                           1],
-                          ['start_node',
-                           'fail_0',
-                           'success_0_1',
-                           1]]
-        self.assertIsInstance(result, list)
-        self.assertListEqual(result, expected_nodes)
-
-    def test_omit_nodes_blocked(self):
-        """Test find_all_routes where omitted node is no longer accessible."""
-        omit_nodes = {'fail_0': 3}
+        start, steps = plugin.compile_decision_tree(
+            self.test_graph, 'start_node', omit_nodes=omit_nodes)
+        self.assertEqual(start, 'start_node')
+        self.assertEqual(steps, [('start_node', 'success_1_1', 3),
+                                 ('success_1_1', 1, 2)])
+
+    def test_omit_to_symbol(self):
+        """Test compile_decision_tree where the top node is omitted and
+        leads directly to a weather symbol."""
         plugin = WeatherSymbols()
-        result = plugin.find_all_routes(self.test_graph,
-                                        'start_node',
-                                        5,
-                                        omit_nodes=omit_nodes,)
-        expected_nodes = []
-        self.assertIsInstance(result, list)
-        self.assertListEqual(result, expected_nodes)
-
-    def test_omit_nodes_multi(self):
-        """Test find_all_routes where multiple omitted nodes."""
-        omit_nodes = {'fail_0': 3, 'success_1': 'success_1_1'}
+        start, steps = plugin.compile_decision_tree(
+            self.test_graph, 'start_node', omit_nodes={'start_node': 7})
+        self.assertEqual(start, 7)
+        self.assertEqual(steps, [])
+
+    def test_loop(self):
+        """Test an error is raised if the tree contains a loop."""
+        self.test_graph['success_1_1'] = [1, 'start_node']
         plugin = WeatherSymbols()
-        result = plugin.find_all_routes(self.test_graph,
-                                        'start_node',
-                                        1,
-                                        omit_nodes=omit_nodes,)
-        expected_nodes = [['start_node',
-                           'success_1_1',
-                           1]]
-        self.assertIsInstance(result, list)
-        self.assertListEqual(result, expected_nodes)
+        msg = "Decision tree contains a loop"
+        with self.assertRaisesRegex(ValueError, msg):
+            plugin.compile_decision_tree(self.test_graph, 'start_node')
 
 
 class Test_create_symbol_cube(IrisTest):
@@ -686,7 +575,7 @@ class Test_create_symbol_cube(IrisTest):
 
 class Test_process(IrisTest):
 
-    """Test the find_all_routes method ."""
+    """Test the process method."""
 
     def setUp(self):
         """ Set up wxcubes for testing. """